@@ -0,0 +1,459 @@
+"""Wire codecs for event envelopes, shared by agent core, runner and control plane.
+
+``json`` is always available (and uses orjson when it is installed).
+``msgpack`` is a compact binary encoding: envelopes with exactly the
+EventEnvelope fields are packed positionally, with well-known ids,
+timestamps and event types shrunk to binary or integer forms, and any other
+event is packed as a plain map. It uses the msgpack package when installed
+and an equivalent pure-Python packer otherwise.
+"""
+
+import json
+import re
+import struct
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Any, Mapping, Sequence
+
+from shared_models import EventEnvelope
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+Event = Mapping[str, Any] | EventEnvelope
+
+
+def json_default(obj: object) -> Any:
+    """``default=`` hook for json/orjson: serializes mappings that are not dicts, e.g. EventEnvelope."""
+    if isinstance(obj, EventEnvelope):
+        return _envelope_fields(obj)
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class EventCodec(ABC):
+    name: str
+    content_type: str
+
+    @abstractmethod
+    def encode(self, event: Event) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def decode(self, data: bytes) -> dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def join(self, encoded: Sequence[bytes]) -> bytes:
+        """Frame individually encoded events as one batch."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def decode_batch(self, data: bytes) -> list[dict[str, Any]]:
+        raise NotImplementedError
+
+    def encode_batch(self, events: Sequence[Event]) -> bytes:
+        return self.join([self.encode(event) for event in events])
+
+
+class JsonCodec(EventCodec):
+    """Compact JSON, via orjson when available unless ``fast`` is False."""
+
+    name = JSON
+    content_type = "application/json"
+
+    def __init__(self, fast: bool = True) -> None:
+        self.backend = "orjson" if fast and orjson is not None else "json"
+
+    def encode(self, event: Event) -> bytes:
+        if isinstance(event, EventEnvelope):
+            event = _envelope_fields(event)
+        if self.backend == "orjson":
+            return orjson.dumps(event, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(event, separators=(",", ":"), default=json_default).encode("utf-8")
+
+    def decode(self, data: bytes) -> dict[str, Any]:
+        event = orjson.loads(data) if self.backend == "orjson" else json.loads(data)
+        if not isinstance(event, dict):
+            raise ValueError("event must decode to an object")
+        return event
+
+    def join(self, encoded: Sequence[bytes]) -> bytes:
+        return b"[" + b",".join(encoded) + b"]"
+
+    def decode_batch(self, data: bytes) -> list[dict[str, Any]]:
+        events = orjson.loads(data) if self.backend == "orjson" else json.loads(data)
+        if not isinstance(events, list) or not all(isinstance(event, dict) for event in events):
+            raise ValueError("batch must be an array of objects")
+        return events
+
+
+# Positional layout of a packed envelope; bump the version for any change.
+_ENVELOPE_VERSION = 1
+_ENVELOPE_KEYS = frozenset({"id", "ts", "type", "session_id", "run_id", "payload"})
+# Append only: packed events refer to types by index.
+EVENT_TYPES = (
+    "run_queued",
+    "run_dispatched",
+    "run_started",
+    "step_started",
+    "step_finished",
+    "run_finished",
+    "run_completed",
+    "step_failed",
+    "check_started",
+    "check_output",
+    "check_finished",
+    "check_cached",
+)
+_TYPE_INDEX = {event_type: index for index, event_type in enumerate(EVENT_TYPES)}
+_HEX_ID = re.compile(r"[0-9a-f]{32}")
+_CANONICAL_TS = re.compile(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d{6})?\+00:00")
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class MsgpackCodec(EventCodec):
+    """Schema-aware msgpack: ``[1, id, ts, type, session_id, run_id, payload]`` for envelopes.
+
+    In an envelope, ``<prefix>_<32 hex>`` ids become 16 raw bytes, canonical
+    UTC ISO timestamps become integer microseconds and known event types
+    become their index in EVENT_TYPES; other values are kept as strings, so
+    decoding always restores the original event.
+    """
+
+    name = MSGPACK
+    content_type = "application/msgpack"
+
+    def __init__(self, native: bool = True) -> None:
+        self.backend = "msgpack" if native and msgpack is not None else "python"
+
+    def encode(self, event: Event) -> bytes:
+        return self._pack(self._to_wire(event))
+
+    def decode(self, data: bytes) -> dict[str, Any]:
+        return self._from_wire(self._unpack(data))
+
+    def join(self, encoded: Sequence[bytes]) -> bytes:
+        header = bytearray()
+        _pack_header(header, len(encoded), 0x90, 0xDC)
+        return bytes(header) + b"".join(encoded)
+
+    def decode_batch(self, data: bytes) -> list[dict[str, Any]]:
+        items = self._unpack(data)
+        if not isinstance(items, list):
+            raise ValueError("batch must be an array")
+        return [self._from_wire(item) for item in items]
+
+    def _pack(self, obj: object) -> bytes:
+        if self.backend == "msgpack":
+            return msgpack.packb(obj, use_bin_type=True)
+        buf = bytearray()
+        _pack_into(buf, obj)
+        return bytes(buf)
+
+    def _unpack(self, data: bytes) -> Any:
+        if self.backend == "msgpack":
+            try:
+                return msgpack.unpackb(data, raw=False, strict_map_key=False)
+            except (msgpack.UnpackException, ValueError) as exc:
+                raise ValueError(f"invalid msgpack data: {exc}") from exc
+        obj, end = _unpack_from(memoryview(data), 0)
+        if end != len(data):
+            raise ValueError("trailing bytes after msgpack value")
+        return obj
+
+    def _to_wire(self, event: Event) -> object:
+        if isinstance(event, EventEnvelope):
+            event = _envelope_fields(event)
+        elif not isinstance(event, Mapping):
+            raise TypeError("event must be a mapping or EventEnvelope")
+        if len(event) != 6 or event.keys() != _ENVELOPE_KEYS:
+            return event
+        event_id, ts, event_type = event["id"], event["ts"], event["type"]
+        session_id, run_id = event["session_id"], event["run_id"]
+        if not all(isinstance(value, str) for value in (event_id, ts, event_type, session_id, run_id)):
+            # Packed slots are only unambiguous for string fields.
+            return event
+        return [
+            _ENVELOPE_VERSION,
+            _pack_id("evt_", event_id),
+            _pack_ts(ts),
+            _TYPE_INDEX.get(event_type, event_type),
+            _pack_id("sess_", session_id),
+            _pack_id("run_", run_id),
+            event["payload"],
+        ]
+
+    def _from_wire(self, obj: Any) -> dict[str, Any]:
+        if isinstance(obj, dict):
+            return obj
+        if not isinstance(obj, list) or len(obj) != 7 or obj[0] != _ENVELOPE_VERSION:
+            raise ValueError("event must decode to a map or a packed envelope")
+        _, event_id, ts, event_type, session_id, run_id, payload = obj
+        if isinstance(event_type, int):
+            if not 0 <= event_type < len(EVENT_TYPES):
+                raise ValueError(f"unknown event type index: {event_type}")
+            event_type = EVENT_TYPES[event_type]
+        return {
+            "id": _unpack_id("evt_", event_id),
+            "ts": (_EPOCH + timedelta(microseconds=ts)).isoformat() if isinstance(ts, int) else ts,
+            "type": event_type,
+            "session_id": _unpack_id("sess_", session_id),
+            "run_id": _unpack_id("run_", run_id),
+            "payload": payload,
+        }
+
+
+def _envelope_fields(envelope: EventEnvelope) -> dict[str, Any]:
+    # Unlike EventEnvelope.to_dict(), shares the payload instead of copying it.
+    return {
+        "id": envelope.id,
+        "ts": envelope.ts,
+        "type": envelope.type,
+        "session_id": envelope.session_id,
+        "run_id": envelope.run_id,
+        "payload": envelope.payload,
+    }
+
+
+def _pack_id(prefix: str, value: object) -> object:
+    if isinstance(value, str) and len(value) == len(prefix) + 32 and value.startswith(prefix):
+        digits = value[len(prefix) :]
+        if _HEX_ID.fullmatch(digits):
+            return bytes.fromhex(digits)
+    return value
+
+
+def _unpack_id(prefix: str, value: object) -> object:
+    if isinstance(value, (bytes, bytearray)):
+        if len(value) != 16:
+            raise ValueError("packed id must be 16 bytes")
+        return prefix + value.hex()
+    return value
+
+
+def _pack_ts(ts: object) -> object:
+    # Only the exact form datetime.isoformat() produces for UTC is packed, so
+    # unpacking formats back to the identical string.
+    if not isinstance(ts, str) or not _CANONICAL_TS.fullmatch(ts) or ts[19:26] == ".000000":
+        return ts
+    try:
+        delta = datetime.fromisoformat(ts) - _EPOCH
+    except ValueError:
+        return ts
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _pack_header(buf: bytearray, size: int, fix: int, wide: int) -> None:
+    """Array (0x90, 0xdc) or map (0x80, 0xde) header."""
+    if size < 16:
+        buf.append(fix | size)
+    elif size < 0x10000:
+        buf.append(wide)
+        buf += size.to_bytes(2, "big")
+    else:
+        buf.append(wide + 1)
+        buf += size.to_bytes(4, "big")
+
+
+def _pack_into(buf: bytearray, obj: object) -> None:
+    kind = type(obj)
+    if kind is str:
+        data = obj.encode("utf-8")
+        size = len(data)
+        if size < 32:
+            buf.append(0xA0 | size)
+        elif size < 0x100:
+            buf.append(0xD9)
+            buf.append(size)
+        elif size < 0x10000:
+            buf.append(0xDA)
+            buf += size.to_bytes(2, "big")
+        else:
+            buf.append(0xDB)
+            buf += size.to_bytes(4, "big")
+        buf += data
+    elif kind is int:
+        _pack_int(buf, obj)
+    elif obj is None:
+        buf.append(0xC0)
+    elif kind is bool:
+        buf.append(0xC3 if obj else 0xC2)
+    elif kind is float:
+        buf.append(0xCB)
+        buf += struct.pack(">d", obj)
+    elif kind is dict or isinstance(obj, Mapping):
+        _pack_header(buf, len(obj), 0x80, 0xDE)
+        for key, value in obj.items():
+            _pack_into(buf, key)
+            _pack_into(buf, value)
+    elif kind is list or kind is tuple:
+        _pack_header(buf, len(obj), 0x90, 0xDC)
+        for item in obj:
+            _pack_into(buf, item)
+    elif kind is bytes or kind is bytearray or kind is memoryview:
+        size = len(obj)
+        if size < 0x100:
+            buf.append(0xC4)
+            buf.append(size)
+        elif size < 0x10000:
+            buf.append(0xC5)
+            buf += size.to_bytes(2, "big")
+        else:
+            buf.append(0xC6)
+            buf += size.to_bytes(4, "big")
+        buf += obj
+    elif isinstance(obj, str):
+        _pack_into(buf, str(obj))
+    elif isinstance(obj, int):
+        _pack_into(buf, int(obj))
+    elif isinstance(obj, (list, tuple)):
+        _pack_into(buf, list(obj))
+    else:
+        raise TypeError(f"cannot encode {kind.__name__} as msgpack")
+
+
+def _pack_int(buf: bytearray, value: int) -> None:
+    if 0 <= value < 0x80:
+        buf.append(value)
+    elif -32 <= value < 0:
+        buf.append(value & 0xFF)
+    elif value >= 0:
+        for marker, size in ((0xCC, 1), (0xCD, 2), (0xCE, 4), (0xCF, 8)):
+            if value < 1 << (8 * size):
+                buf.append(marker)
+                buf += value.to_bytes(size, "big")
+                return
+        raise OverflowError("int too large for msgpack")
+    else:
+        for marker, size in ((0xD0, 1), (0xD1, 2), (0xD2, 4), (0xD3, 8)):
+            if value >= -(1 << (8 * size - 1)):
+                buf.append(marker)
+                buf += value.to_bytes(size, "big", signed=True)
+                return
+        raise OverflowError("int too small for msgpack")
+
+
+_FIXED_WIDTH = {
+    0xCC: (1, False), 0xCD: (2, False), 0xCE: (4, False), 0xCF: (8, False),
+    0xD0: (1, True), 0xD1: (2, True), 0xD2: (4, True), 0xD3: (8, True),
+}
+
+
+def _unpack_from(data: memoryview, pos: int) -> tuple[Any, int]:
+    try:
+        marker = data[pos]
+    except IndexError:
+        raise ValueError("truncated msgpack data") from None
+    pos += 1
+    if marker < 0x80:
+        return marker, pos
+    if marker >= 0xE0:
+        return marker - 0x100, pos
+    if 0xA0 <= marker <= 0xBF:
+        return _read_str(data, pos, marker & 0x1F)
+    if 0x90 <= marker <= 0x9F:
+        return _read_array(data, pos, marker & 0x0F)
+    if 0x80 <= marker <= 0x8F:
+        return _read_map(data, pos, marker & 0x0F)
+    if marker == 0xC0:
+        return None, pos
+    if marker == 0xC2:
+        return False, pos
+    if marker == 0xC3:
+        return True, pos
+    if marker in _FIXED_WIDTH:
+        size, signed = _FIXED_WIDTH[marker]
+        _check(data, pos, size)
+        return int.from_bytes(data[pos : pos + size], "big", signed=signed), pos + size
+    if marker == 0xCB:
+        _check(data, pos, 8)
+        return struct.unpack_from(">d", data, pos)[0], pos + 8
+    if marker == 0xCA:
+        _check(data, pos, 4)
+        return struct.unpack_from(">f", data, pos)[0], pos + 4
+    if marker in (0xD9, 0xDA, 0xDB, 0xC4, 0xC5, 0xC6, 0xDC, 0xDD, 0xDE, 0xDF):
+        width = {0xD9: 1, 0xDA: 2, 0xDB: 4, 0xC4: 1, 0xC5: 2, 0xC6: 4, 0xDC: 2, 0xDD: 4, 0xDE: 2, 0xDF: 4}[marker]
+        _check(data, pos, width)
+        size = int.from_bytes(data[pos : pos + width], "big")
+        pos += width
+        if marker in (0xD9, 0xDA, 0xDB):
+            return _read_str(data, pos, size)
+        if marker in (0xC4, 0xC5, 0xC6):
+            _check(data, pos, size)
+            return bytes(data[pos : pos + size]), pos + size
+        if marker in (0xDC, 0xDD):
+            return _read_array(data, pos, size)
+        return _read_map(data, pos, size)
+    raise ValueError(f"unsupported msgpack type byte: {marker:#x}")
+
+
+def _check(data: memoryview, pos: int, size: int) -> None:
+    if pos + size > len(data):
+        raise ValueError("truncated msgpack data")
+
+
+def _read_str(data: memoryview, pos: int, size: int) -> tuple[str, int]:
+    _check(data, pos, size)
+    return str(data[pos : pos + size], "utf-8"), pos + size
+
+
+def _read_array(data: memoryview, pos: int, size: int) -> tuple[list, int]:
+    items = []
+    for _ in range(size):
+        item, pos = _unpack_from(data, pos)
+        items.append(item)
+    return items, pos
+
+
+def _read_map(data: memoryview, pos: int, size: int) -> tuple[dict, int]:
+    result = {}
+    for _ in range(size):
+        key, pos = _unpack_from(data, pos)
+        value, pos = _unpack_from(data, pos)
+        if isinstance(key, (list, dict)):
+            raise ValueError("unhashable msgpack map key")
+        result[key] = value
+    return result, pos
+
+
+_CODECS: dict[str, EventCodec] = {JSON: JsonCodec(), MSGPACK: MsgpackCodec()}
+# Preference order. The pure-Python packer saves bytes but costs far more
+# CPU than (or)json, so msgpack only leads when the native package is present.
+SUPPORTED_CODECS = (MSGPACK, JSON) if msgpack is not None else (JSON, MSGPACK)
+
+
+def get_codec(name: str) -> EventCodec:
+    if not isinstance(name, str):
+        raise TypeError("name must be str")
+    if name not in _CODECS:
+        raise KeyError(f"unknown codec: {name}")
+    return _CODECS[name]
+
+
+def codec_for_content_type(content_type: str | None) -> EventCodec:
+    """Codec for a Content-Type header; a missing header means JSON."""
+    media_type = (content_type or JsonCodec.content_type).split(";", 1)[0].strip().lower()
+    for codec in _CODECS.values():
+        if codec.content_type == media_type:
+            return codec
+    raise KeyError(f"unsupported content type: {content_type}")
+
+
+def negotiate(preferred: Sequence[str], supported: Sequence[str]) -> str:
+    """First codec in ``preferred`` the peer supports; JSON when they share nothing else."""
+    for name in preferred:
+        if name in supported and name in _CODECS:
+            return name
+    return JSON
@@ -11,3 +11,4 @@ class FeatureFlags:
 class AgentSettings:
     max_steps: int = 8
     timeout_s: int = 120
+    max_parallel: int = 4
@@ -0,0 +1,261 @@
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Mapping, Sequence
+
+from event_codecs import json_default
+from shared_models import EventLog
+
+
+class EventSink(ABC):
+    """Destination for batches of events written by BufferedEventLog."""
+
+    @abstractmethod
+    def write(self, events: Sequence[Mapping[str, object]]) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Make everything written so far durable."""
+        return None
+
+    def close(self) -> None:
+        return None
+
+
+class FileSink(EventSink):
+    """Appends events to a file as JSON lines; ``fsync`` makes ``flush`` durable across crashes."""
+
+    def __init__(self, path: str, fsync: bool = False) -> None:
+        if not isinstance(path, str):
+            raise TypeError("path must be str")
+        self.path = path
+        self.fsync = fsync
+        self._handle = open(path, "a", encoding="utf-8")
+
+    def write(self, events: Sequence[Mapping[str, object]]) -> None:
+        self._handle.write("".join(json.dumps(event, separators=(",", ":"), default=json_default) + "\n" for event in events))
+
+    def flush(self) -> None:
+        self._handle.flush()
+        if self.fsync:
+            os.fsync(self._handle.fileno())
+
+    def close(self) -> None:
+        if not self._handle.closed:
+            self.flush()
+            self._handle.close()
+
+
+class HttpSink(EventSink):
+    """POSTs each batch to ``url`` as a JSON array; any non-2xx response fails the write."""
+
+    def __init__(self, url: str, headers: Mapping[str, str] | None = None, timeout_s: float = 10.0) -> None:
+        if not isinstance(url, str):
+            raise TypeError("url must be str")
+        self.url = url
+        self.headers = dict(headers or {})
+        self.timeout_s = timeout_s
+
+    def write(self, events: Sequence[Mapping[str, object]]) -> None:
+        data = json.dumps(list(events), separators=(",", ":"), default=json_default).encode("utf-8")
+        req = urllib.request.Request(self.url, data=data, method="POST")
+        req.add_header("Content-Type", "application/json")
+        for name, value in self.headers.items():
+            req.add_header(name, value)
+        with urllib.request.urlopen(req, timeout=self.timeout_s) as resp:
+            resp.read()
+
+
+class CallableSink(EventSink):
+    """Adapts any batch writer, e.g. a state backend's ``append_events`` or a runner StreamClient's ``send``."""
+
+    def __init__(self, write: Callable[[Sequence[Mapping[str, object]]], object], flush: Callable[[], object] | None = None) -> None:
+        if not callable(write):
+            raise TypeError("write must be callable")
+        self._write = write
+        self._flush = flush
+
+    def write(self, events: Sequence[Mapping[str, object]]) -> None:
+        self._write(events)
+
+    def flush(self) -> None:
+        if self._flush is not None:
+            self._flush()
+
+
+@dataclass
+class EventLogStats:
+    # An event is dropped when at least one sink gave up on it.
+    written: int = 0
+    batches: int = 0
+    retries: int = 0
+    dropped: int = 0
+
+
+@dataclass(eq=False)
+class _Marker:
+    close: bool = False
+    done: threading.Event = field(default_factory=threading.Event)
+    errors: list[str] = field(default_factory=list)
+
+
+class BufferedEventLog(EventLog):
+    """EventLog whose ``append`` only enqueues; a background thread writes to sinks.
+
+    ``append`` puts the event on a ``queue.SimpleQueue`` and returns, so the
+    agent loop never waits on disk or network. The writer thread takes
+    batches of up to ``max_batch`` events, waiting at most
+    ``flush_interval_s`` for a batch to fill, and writes each batch to every
+    sink in append order. A failed write is retried ``max_retries`` times
+    with backoff before the batch is counted as dropped for that sink.
+
+    ``flush`` returns once every event appended before it was written to
+    every sink and each sink was flushed, and raises RuntimeError if any of
+    those writes was dropped. ``close`` flushes, then the writer closes the
+    sinks and stops. If ``close`` times out, the close stays pending: later
+    ``close`` and ``flush`` calls wait for it and report its errors. With
+    ``keep_events`` the events also stay in memory for ``list()``, like the
+    base EventLog.
+    """
+
+    def __init__(
+        self,
+        sinks: Iterable[EventSink],
+        max_batch: int = 256,
+        flush_interval_s: float = 0.05,
+        max_retries: int = 5,
+        retry_initial_s: float = 0.05,
+        keep_events: bool = True,
+    ) -> None:
+        super().__init__()
+        self.sinks = list(sinks)
+        if not all(isinstance(sink, EventSink) for sink in self.sinks):
+            raise TypeError("sinks must be EventSink")
+        if max_batch < 1:
+            raise ValueError("max_batch must be >= 1")
+        self.max_batch = max_batch
+        self.flush_interval_s = flush_interval_s
+        self.max_retries = max_retries
+        self.retry_initial_s = retry_initial_s
+        self.keep_events = keep_events
+        self.stats = EventLogStats()
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._errors: list[str] = []
+        # Set once by close(); nothing is enqueued after it.
+        self._close_marker: _Marker | None = None
+        self._lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_loop, name="event-log-writer", daemon=True)
+        self._writer.start()
+
+    def append(self, event: Mapping[str, object]) -> None:
+        if not isinstance(event, Mapping):
+            raise TypeError("event must be a mapping")
+        # Under the lock, so an append racing close() is queued ahead of its marker or refused.
+        with self._lock:
+            if self._close_marker is not None:
+                raise RuntimeError("event log is closed")
+            if self.keep_events:
+                self._events.append(event)
+            self._queue.put(event)
+
+    def flush(self, timeout_s: float | None = None) -> bool:
+        """Wait until earlier events reached every sink; False if ``timeout_s`` ran out first."""
+        with self._lock:
+            # After close(), its marker is the last item the writer will see.
+            marker = self._close_marker
+            if marker is None:
+                marker = _Marker()
+                self._queue.put(marker)
+        return self._wait(marker, timeout_s)
+
+    def close(self, timeout_s: float | None = None) -> bool:
+        """Flush, stop the writer and close the sinks; False if ``timeout_s`` ran out first."""
+        with self._lock:
+            if self._close_marker is None:
+                self._close_marker = _Marker(close=True)
+                self._queue.put(self._close_marker)
+            marker = self._close_marker
+        if not self._wait(marker, timeout_s):
+            return False
+        self._writer.join()
+        return True
+
+    def __enter__(self) -> "BufferedEventLog":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _wait(self, marker: _Marker, timeout_s: float | None) -> bool:
+        if not marker.done.wait(timeout_s):
+            return False
+        if marker.errors:
+            raise RuntimeError(f"event sink failed: {'; '.join(marker.errors)}")
+        return True
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch = []
+            deadline = time.monotonic() + self.flush_interval_s
+            while not isinstance(item, _Marker):
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            if isinstance(item, _Marker):
+                self._sync_sinks()
+                if item.close:
+                    self._close_sinks()
+                # Errors since the previous flush belong to this one.
+                item.errors.extend(self._errors)
+                self._errors = []
+                item.done.set()
+                if item.close:
+                    return
+
+    def _write(self, batch: list[Mapping[str, object]]) -> None:
+        self.stats.batches += 1
+        delivered = True
+        for sink in self.sinks:
+            delay = self.retry_initial_s
+            for attempt in range(self.max_retries + 1):
+                try:
+                    sink.write(batch)
+                    break
+                except Exception as exc:
+                    if attempt == self.max_retries:
+                        delivered = False
+                        self._errors.append(f"{type(sink).__name__}: {exc}")
+                        break
+                    self.stats.retries += 1
+                    time.sleep(delay)
+                    delay *= 2
+        if delivered:
+            self.stats.written += len(batch)
+        else:
+            self.stats.dropped += len(batch)
+
+    def _sync_sinks(self) -> None:
+        for sink in self.sinks:
+            try:
+                sink.flush()
+            except Exception as exc:
+                self._errors.append(f"{type(sink).__name__}: {exc}")
+
+    def _close_sinks(self) -> None:
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as exc:
+                self._errors.append(f"{type(sink).__name__}: {exc}")
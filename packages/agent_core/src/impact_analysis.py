@@ -0,0 +1,393 @@
+"""Select the tests a change can affect, so verification runs only those.
+
+A changed path maps to test targets through, in order:
+
+1. ``ImpactRule``s: fnmatch patterns (``*`` also matches ``/``) naming
+   targets explicitly; a rule with no targets marks paths that affect no
+   tests, such as docs;
+2. the Python import graph: a changed module affects every test file that
+   imports it, directly or through other modules, and a changed test file
+   selects itself;
+3. a ``CoverageMap`` recorded from earlier runs: tests that executed the
+   file, which also catches non-Python inputs and dynamic imports.
+
+The full suite runs instead when a path matches ``full_suite_patterns``
+(conftest.py, packaging and lock files), when any path maps to no tests
+(a module no test imports may still run through a subprocess), when the
+selection covers more than ``max_fraction`` of all test files, or when
+there are no changes at all. Only a rule can map a path to no tests.
+Targets are test file paths relative to the repository root;
+``impacted_checks`` turns a selection into Checks for ``run_verification``,
+and ``changed_paths`` gets the changed paths from a patch set.
+"""
+
+import ast
+import fnmatch
+import json
+import os
+import shlex
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Iterable, Sequence
+
+from patch_unified import FilePatch
+from verification_runtime import Check
+
+_SKIP_DIRS = frozenset({".git", ".hg", ".venv", "venv", "node_modules", "__pycache__", ".mypy_cache", ".pytest_cache", ".tox"})
+
+
+@dataclass(frozen=True)
+class ImpactRule:
+    pattern: str
+    targets: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class ImpactConfig:
+    rules: tuple[ImpactRule, ...] = ()
+    # Directories, relative to the root, that are on sys.path; module names are relative to them.
+    source_roots: tuple[str, ...] = (".",)
+    test_patterns: tuple[str, ...] = ("test_*.py", "*_test.py")
+    full_suite_patterns: tuple[str, ...] = (
+        "conftest.py",
+        "*/conftest.py",
+        "pyproject.toml",
+        "setup.py",
+        "setup.cfg",
+        "tox.ini",
+        "pytest.ini",
+        "requirements*.txt",
+        "*.lock",
+    )
+    max_fraction: float = 0.5
+
+
+@dataclass(frozen=True)
+class ImpactSelection:
+    targets: tuple[str, ...]
+    full_suite: bool
+    reason: str
+    # Changed paths that nothing mapped to tests.
+    unmapped: tuple[str, ...] = ()
+
+
+class CoverageMap:
+    """Which files each test target executed, optionally persisted as JSON at ``path``.
+
+    Feed it from coverage data of earlier runs (e.g. coverage.py with
+    per-test contexts); ``targets_for`` answers the reverse question.
+    """
+
+    def __init__(self, path: str | None = None) -> None:
+        if path is not None and not isinstance(path, str):
+            raise TypeError("path must be str")
+        self.path = path
+        self._covered: dict[str, frozenset[str]] = {}
+        self._by_file: dict[str, set[str]] | None = None
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path, encoding="utf-8") as handle:
+                for target, files in json.load(handle).items():
+                    self._covered[target] = frozenset(files)
+
+    def record(self, target: str, files: Iterable[str]) -> None:
+        if not isinstance(target, str):
+            raise TypeError("target must be str")
+        with self._lock:
+            self._covered[target] = frozenset(_normalize(path) for path in files)
+            self._by_file = None
+
+    def forget(self, target: str) -> None:
+        with self._lock:
+            self._covered.pop(target, None)
+            self._by_file = None
+
+    def targets_for(self, path: str) -> set[str]:
+        with self._lock:
+            if self._by_file is None:
+                self._by_file = {}
+                for target, files in self._covered.items():
+                    for covered in files:
+                        self._by_file.setdefault(covered, set()).add(target)
+            return set(self._by_file.get(_normalize(path), ()))
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            data = {target: sorted(files) for target, files in self._covered.items()}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(data, handle)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self) -> int:
+        return len(self._covered)
+
+
+class TestImpactAnalyzer:
+    """Maps changed paths under ``root`` to the test files they affect.
+
+    Each ``select`` rescans the tree, but a file is only parsed again when
+    its size or mtime changed; with a ``cache_path`` the parsed imports are
+    kept on disk between runs.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        config: ImpactConfig = ImpactConfig(),
+        coverage: CoverageMap | None = None,
+        cache_path: str | None = None,
+    ) -> None:
+        if not isinstance(root, str):
+            raise TypeError("root must be str")
+        if not isinstance(config, ImpactConfig):
+            raise TypeError("config must be ImpactConfig")
+        if coverage is not None and not isinstance(coverage, CoverageMap):
+            raise TypeError("coverage must be CoverageMap")
+        self.root = os.path.abspath(root)
+        self.config = config
+        self.coverage = coverage
+        self.cache_path = cache_path
+        # path -> (mtime_ns, size, imported module names)
+        self._parsed: dict[str, tuple[int, int, list[str]]] = {}
+        self._lock = threading.Lock()
+        if cache_path is not None and os.path.exists(cache_path):
+            with open(cache_path, encoding="utf-8") as handle:
+                self._parsed = {path: (mtime, size, imports) for path, (mtime, size, imports) in json.load(handle).items()}
+
+    def select(self, changed: Iterable[str]) -> ImpactSelection:
+        changed = sorted({_normalize(path) for path in changed})
+        if not changed:
+            return ImpactSelection((), True, "no changes")
+        for path in changed:
+            if _matches(path, self.config.full_suite_patterns):
+                return ImpactSelection((), True, f"{path} affects every test")
+
+        graph = self._graph()
+        targets: set[str] = set()
+        unmapped: list[str] = []
+        for path in changed:
+            found, mapped = self._targets_for(path, graph)
+            targets |= found
+            if not mapped:
+                unmapped.append(path)
+        if unmapped:
+            return ImpactSelection((), True, f"no test mapping for {unmapped[0]}", tuple(unmapped))
+        if graph.tests and len(targets) > self.config.max_fraction * len(graph.tests):
+            return ImpactSelection((), True, f"{len(targets)} of {len(graph.tests)} test files affected")
+        return ImpactSelection(tuple(sorted(targets)), False, f"{len(targets)} of {len(graph.tests)} test files affected")
+
+    def _targets_for(self, path: str, graph: "_ImportGraph") -> tuple[set[str], bool]:
+        """Targets for one path, and whether anything mapped it (only a rule maps to no tests)."""
+        for rule in self.config.rules:
+            if fnmatch.fnmatchcase(path, rule.pattern):
+                return set(rule.targets), True
+        targets: set[str] = set()
+        mapped = False
+        if graph.is_test(path) and os.path.exists(os.path.join(self.root, path)):
+            mapped = True
+            targets.add(path)
+        module = graph.module_for(path)
+        if module is not None:
+            affected = graph.affected_tests(module)
+            if affected:
+                mapped = True
+                targets |= affected
+        if self.coverage is not None:
+            covered = self.coverage.targets_for(path)
+            if covered:
+                mapped = True
+                targets |= covered
+        return targets, mapped
+
+    def _graph(self) -> "_ImportGraph":
+        graph = _ImportGraph(self.config)
+        seen: set[str] = set()
+        dirty = False
+        with self._lock:
+            for path in self._python_files():
+                full = os.path.join(self.root, path)
+                try:
+                    stat = os.stat(full)
+                except OSError:
+                    continue
+                seen.add(path)
+                cached = self._parsed.get(path)
+                if cached is None or cached[0] != stat.st_mtime_ns or cached[1] != stat.st_size:
+                    cached = (stat.st_mtime_ns, stat.st_size, _imports_of(full))
+                    self._parsed[path] = cached
+                    dirty = True
+                graph.add(path, cached[2])
+            for path in self._parsed.keys() - seen:
+                del self._parsed[path]
+                dirty = True
+            if dirty:
+                self._save()
+        graph.build()
+        return graph
+
+    def _python_files(self) -> Iterable[str]:
+        for directory, subdirs, files in os.walk(self.root):
+            subdirs[:] = [name for name in subdirs if name not in _SKIP_DIRS and not name.endswith(".egg-info")]
+            relative = os.path.relpath(directory, self.root)
+            for name in files:
+                if name.endswith(".py"):
+                    yield _normalize(os.path.join(relative, name))
+
+    def _save(self) -> None:
+        if self.cache_path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(self._parsed, handle)
+        os.replace(tmp_path, self.cache_path)
+
+
+def changed_paths(patches: Iterable[FilePatch]) -> list[str]:
+    """Paths a patch set touches: both sides of each file, so deletions and renames count."""
+    paths: set[str] = set()
+    for patch in patches:
+        for path in (patch.source, patch.target):
+            if path is not None:
+                paths.add(path)
+    return sorted(paths)
+
+
+def impacted_checks(
+    selection: ImpactSelection,
+    full_suite: Sequence[Check],
+    command: str = "python -m pytest -q {targets}",
+    shards: int = 1,
+) -> list[Check]:
+    """Checks to run for a selection: ``full_suite`` as given, or the impacted targets split into ``shards``."""
+    if not isinstance(selection, ImpactSelection):
+        raise TypeError("selection must be ImpactSelection")
+    if shards < 1:
+        raise ValueError("shards must be >= 1")
+    if selection.full_suite:
+        return list(full_suite)
+    targets = list(selection.targets)
+    shards = min(shards, len(targets))
+    checks = []
+    for index in range(shards):
+        shard = targets[index::shards]
+        name = "impacted tests" if shards == 1 else f"impacted tests [{index + 1}/{shards}]"
+        checks.append(Check(name=name, command=command.format(targets=" ".join(shlex.quote(target) for target in shard))))
+    return checks
+
+
+@dataclass
+class _ImportGraph:
+    config: ImpactConfig
+    # module name -> file, for every module under a source root
+    modules: dict[str, str] = field(default_factory=dict)
+    # file -> imported module names as written (absolute)
+    imports: dict[str, list[str]] = field(default_factory=dict)
+    tests: set[str] = field(default_factory=set)
+    # module name -> files importing it
+    importers: dict[str, set[str]] = field(default_factory=dict)
+
+    def add(self, path: str, imports: list[str]) -> None:
+        self.imports[path] = imports
+        if self.is_test(path):
+            self.tests.add(path)
+        module = self.module_for(path)
+        if module is not None:
+            self.modules.setdefault(module, path)
+
+    def build(self) -> None:
+        for path, names in self.imports.items():
+            package = self._package_of(path)
+            for name in names:
+                for module in self._resolve(name, package):
+                    self.importers.setdefault(module, set()).add(path)
+
+    def module_for(self, path: str) -> str | None:
+        if not path.endswith(".py"):
+            return None
+        for source_root in self.config.source_roots:
+            root = _normalize(source_root)
+            if root in ("", "."):
+                relative = path
+            elif path.startswith(root + "/"):
+                relative = path[len(root) + 1 :]
+            else:
+                continue
+            parts = relative[: -len(".py")].split("/")
+            if parts[-1] == "__init__":
+                parts.pop()
+            if parts and all(part.isidentifier() for part in parts):
+                return ".".join(parts)
+        return None
+
+    def is_test(self, path: str) -> bool:
+        return _matches(path.rsplit("/", 1)[-1], self.config.test_patterns)
+
+    def affected_tests(self, module: str) -> set[str]:
+        """Test files importing ``module``, directly or transitively."""
+        seen_modules = {module}
+        seen_files: set[str] = set()
+        queue = deque([module])
+        while queue:
+            for path in self.importers.get(queue.popleft(), ()):
+                if path in seen_files:
+                    continue
+                seen_files.add(path)
+                importer = self.module_for(path)
+                if importer is not None and importer not in seen_modules:
+                    seen_modules.add(importer)
+                    queue.append(importer)
+        return {path for path in seen_files if path in self.tests}
+
+    def _package_of(self, path: str) -> str:
+        module = self.module_for(path) or ""
+        if path.endswith("/__init__.py") or path == "__init__.py":
+            return module
+        return module.rpartition(".")[0]
+
+    def _resolve(self, name: str, package: str) -> list[str]:
+        """Modules an import executes: the named one, if known, and its parent packages."""
+        if name.startswith("."):
+            level = len(name) - len(name.lstrip("."))
+            base = package.split(".") if package else []
+            if level - 1 > len(base):
+                return []
+            base = base[: len(base) - (level - 1)]
+            name = ".".join(base + ([name.lstrip(".")] if name.lstrip(".") else []))
+        parts = name.split(".")
+        return [candidate for candidate in (".".join(parts[:size]) for size in range(1, len(parts) + 1)) if candidate in self.modules]
+
+
+def _imports_of(path: str) -> list[str]:
+    """Module names a file imports; ``from x import y`` yields both ``x`` and ``x.y``, relative ones keep their dots."""
+    try:
+        with open(path, "rb") as handle:
+            tree = ast.parse(handle.read(), filename=path)
+    except (OSError, SyntaxError, ValueError):
+        return []
+    names: list[str] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = "." * node.level + (node.module or "")
+            names.append(base)
+            joiner = "" if base.endswith(".") else "."
+            names.extend(f"{base}{joiner}{alias.name}" for alias in node.names if alias.name != "*")
+    return names
+
+
+def _normalize(path: str) -> str:
+    path = path.replace(os.sep, "/")
+    while path.startswith("./"):
+        path = path[2:]
+    return path
+
+
+def _matches(path: str, patterns: Iterable[str]) -> bool:
+    return any(fnmatch.fnmatchcase(path, pattern) for pattern in patterns)
@@ -0,0 +1,208 @@
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Iterable, Mapping
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+@dataclass
+class JsonStoreStats:
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    # Entries dropped from the memory LRU.
+    evictions: int = 0
+    # Files removed to keep the directory under max_bytes.
+    disk_evictions: int = 0
+    disk_bytes: int = 0
+
+
+class JsonLruStore:
+    """An in-memory LRU of JSON mappings, optionally backed by a directory.
+
+    Memory holds up to ``max_entries`` values. With a ``directory``, values
+    stored with ``disk=True`` are also written there as JSON, one file per
+    key, and a memory miss falls back to disk, so they outlive the process
+    and can be shared with other processes using the same directory. With a
+    ``max_bytes``, the directory is kept under that size by removing the
+    least recently used files. Values are shared between callers and must
+    be treated as read-only.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        directory: str | None = None,
+        max_bytes: int | None = None,
+        stats: JsonStoreStats | None = None,
+    ) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        if directory is not None and not isinstance(directory, str):
+            raise TypeError("directory must be str")
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError("max_bytes must be >= 0")
+        if stats is not None and not isinstance(stats, JsonStoreStats):
+            raise TypeError("stats must be JsonStoreStats")
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = stats if stats is not None else JsonStoreStats()
+        self._entries: OrderedDict[str, Mapping[str, Any]] = OrderedDict()
+        # Disk entries, least recently used first: key -> size in bytes. Only kept with a max_bytes.
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            if max_bytes is not None:
+                self._load_index()
+
+    def get(self, key: str, disk: bool = True) -> Mapping[str, Any] | None:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return value
+        value = self._read_disk(key) if disk else None
+        with self._lock:
+            if value is None:
+                self.stats.misses += 1
+                return None
+            self.stats.disk_hits += 1
+            self._remember(key, value)
+            if key in self._disk:
+                self._disk.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Mapping[str, Any], disk: bool = True) -> None:
+        if not isinstance(value, Mapping):
+            raise TypeError("value must be a mapping")
+        with self._lock:
+            self.stats.stores += 1
+            self._remember(key, value)
+        if disk:
+            self._write_disk(key, value)
+
+    def clear(self) -> None:
+        """Drop the memory tier; files on disk are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _remember(self, key: str, value: Mapping[str, Any]) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load_index(self) -> None:
+        found = []
+        for directory, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime_ns, name[: -len(".json")], stat.st_size))
+        for _, key, size in sorted(found):
+            self._disk[key] = size
+        self.stats.disk_bytes = sum(self._disk.values())
+        self._unlink(self._over_budget())
+
+    def _read_disk(self, key: str) -> Mapping[str, Any] | None:
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as handle:
+                data = handle.read()
+            # Refresh the mtime so other processes sharing the directory see the use.
+            os.utime(path)
+        except OSError:
+            return None
+        try:
+            value = orjson.loads(data) if orjson is not None else json.loads(data)
+        except ValueError:
+            return None
+        return value if isinstance(value, dict) else None
+
+    def _write_disk(self, key: str, value: Mapping[str, Any]) -> None:
+        if self.directory is None:
+            return
+        try:
+            data = canonical_json(value)
+        except (TypeError, ValueError):
+            # Not JSON: the memory tier still has it.
+            return
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+        if self.max_bytes is None:
+            return
+        with self._lock:
+            self.stats.disk_bytes += len(data) - self._disk.get(key, 0)
+            self._disk[key] = len(data)
+            self._disk.move_to_end(key)
+            evict = self._over_budget()
+        self._unlink(evict)
+
+    def _over_budget(self) -> list[str]:
+        # Called with the lock held, or before the store is shared.
+        evict = []
+        while self.stats.disk_bytes > self.max_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self.stats.disk_bytes -= size
+            self.stats.disk_evictions += 1
+            evict.append(key)
+        return evict
+
+    def _unlink(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                # Another process sharing the directory got there first.
+                pass
+
+
+def canonical_json(value: Mapping[str, Any]) -> bytes:
+    """Compact JSON for ``value`` with sorted keys, so equal mappings give equal bytes."""
+    if not isinstance(value, Mapping):
+        raise TypeError("value must be a mapping")
+    if orjson is not None:
+        return orjson.dumps(value, default=_mapping_default, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=_mapping_default).encode("utf-8")
+
+
+def _mapping_default(obj: object) -> Any:
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
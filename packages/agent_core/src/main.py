@@ -1,16 +1,36 @@
+import heapq
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from typing import Iterable
 
-from protocol import event_run_finished, event_run_started, event_step_finished, event_step_started
+from config import AgentSettings
+from protocol import EventFactory
 from shared_models import EventLog
 from tools import ToolRegistry
 
+# How often run_agent_loop checks for a stop request while steps run.
+_STOP_POLL_S = 0.05
+# How long canceled steps get to return before they are abandoned.
+_CANCEL_GRACE_S = 10.0
+
 
 @dataclass(frozen=True)
 class PlanStep:
+    """One unit of work in a plan.
+
+    ``depends_on`` names the ``step_id``s of earlier steps that must finish
+    first; an empty tuple makes the step ready at once. ``None`` keeps plans
+    without dependency information sequential: the step waits for the one
+    before it.
+    """
+
     description: str
     tool_name: str | None = None
     tool_input: dict | None = None
+    step_id: str | None = None
+    depends_on: tuple[str, ...] | None = None
 
 
 def plan_from_prompt(prompt: str) -> Iterable[PlanStep]:
@@ -28,19 +48,27 @@ def plan_from_prompt(prompt: str) -> Iterable[PlanStep]:
 @dataclass(frozen=True)
 class RunPolicy:
     max_steps: int = 8
+    max_parallel: int = 4
+    step_timeout_s: float | None = None
+
+    @classmethod
+    def from_settings(cls, settings: AgentSettings) -> "RunPolicy":
+        if not isinstance(settings, AgentSettings):
+            raise TypeError("settings must be AgentSettings")
+        return cls(max_steps=settings.max_steps, max_parallel=settings.max_parallel, step_timeout_s=settings.timeout_s)
 
 
 class StopController:
-    """Tracks stop requests for the running agent."""
+    """Tracks stop requests for the running agent; safe to use from any thread."""
 
     def __init__(self) -> None:
-        self._stop_requested = False
+        self._stop_requested = threading.Event()
 
     def request_stop(self) -> None:
-        self._stop_requested = True
+        self._stop_requested.set()
 
     def should_stop(self) -> bool:
-        return self._stop_requested
+        return self._stop_requested.is_set()
 
 
 @dataclass(frozen=True)
@@ -63,7 +91,22 @@ def run_agent_loop(
     policy: RunPolicy,
     stop_controller: StopController,
 ) -> AgentResult:
-    """Run a deterministic agent loop over planned steps."""
+    """Run a deterministic agent loop over planned steps.
+
+    Steps run on a pool of ``policy.max_parallel`` workers as soon as their
+    dependencies have finished; when several are ready, they start in plan
+    order. Events are only appended from the calling thread, so each step's
+    ``step_started`` precedes its ``step_finished``/``step_failed``, and
+    steps that finish together are reported in plan order.
+
+    Every step gets a cancel event, passed to its tool call (see
+    ``ToolRegistry.run``). It is set when the step runs past
+    ``policy.step_timeout_s``, which fails the step, and for every running
+    step once a stop is requested or another step fails; no new steps start
+    then. Canceled steps get ``_CANCEL_GRACE_S`` to return before they are
+    abandoned and reported failed. The first failure is then raised, while
+    errors of steps canceled by a stop are only logged.
+    """
     if not isinstance(agent_input, AgentInput):
         raise TypeError("agent_input must be AgentInput")
     if not isinstance(tool_registry, ToolRegistry):
@@ -74,20 +117,86 @@ def run_agent_loop(
         raise TypeError("policy must be RunPolicy")
     if not isinstance(stop_controller, StopController):
         raise TypeError("stop_controller must be StopController")
-
-    event_log.append(event_run_started(agent_input.session_id, agent_input.run_id, agent_input.prompt))
-    steps = plan_from_prompt(agent_input.prompt)
+    if policy.max_parallel < 1:
+        raise ValueError("max_parallel must be >= 1")
+
+    events = EventFactory(agent_input.session_id, agent_input.run_id)
+    event_log.append(events.run_started(agent_input.prompt))
+    steps = list(_limit_steps(plan_from_prompt(agent_input.prompt), policy.max_steps))
+    dependencies = _resolve_dependencies(steps)
+    waiting_on = [len(deps) for deps in dependencies]
+    dependents: list[list[int]] = [[] for _ in steps]
+    for index, deps in enumerate(dependencies):
+        for dep in deps:
+            dependents[dep].append(index)
+    # Ascending, so already a heap.
+    ready = [index for index, count in enumerate(waiting_on) if count == 0]
+    running: dict[Future, _RunningStep] = {}
+    # Futures of steps that timed out, still to be waited for before returning.
+    timed_out: list[Future] = []
+    failure: BaseException | None = None
     steps_executed = 0
 
-    for step in _limit_steps(steps, policy.max_steps):
-        if stop_controller.should_stop():
-            break
-        event_log.append(event_step_started(agent_input.session_id, agent_input.run_id, step.description))
-        _execute_step(step, tool_registry)
-        event_log.append(event_step_finished(agent_input.session_id, agent_input.run_id, step.description))
+    def finish(entry: _RunningStep, error: BaseException | None) -> None:
+        nonlocal steps_executed
+        step = steps[entry.index]
+        if error is not None:
+            event_log.append(events.step_failed(step.description, str(error) or type(error).__name__, step.step_id))
+            return
+        event_log.append(events.step_finished(step.description, step.step_id))
         steps_executed += 1
-
-    event_log.append(event_run_finished(agent_input.session_id, agent_input.run_id, stop_controller.should_stop()))
+        for dependent in dependents[entry.index]:
+            waiting_on[dependent] -= 1
+            if waiting_on[dependent] == 0:
+                heapq.heappush(ready, dependent)
+
+    executor = ThreadPoolExecutor(max_workers=policy.max_parallel, thread_name_prefix="agent-step")
+    try:
+        while failure is None and not stop_controller.should_stop():
+            while ready and len(running) < policy.max_parallel:
+                index = heapq.heappop(ready)
+                step = steps[index]
+                event_log.append(events.step_started(step.description, step.step_id))
+                deadline = None if policy.step_timeout_s is None else time.monotonic() + policy.step_timeout_s
+                entry = _RunningStep(index, threading.Event(), deadline)
+                running[executor.submit(_execute_step, step, tool_registry, entry.cancel)] = entry
+            if not running:
+                break
+            deadlines = [entry.deadline for entry in running.values() if entry.deadline is not None]
+            timeout_s = _STOP_POLL_S if not deadlines else max(0.0, min(_STOP_POLL_S, min(deadlines) - time.monotonic()))
+            done, _ = wait(running, timeout=timeout_s, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=lambda future: running[future].index):
+                error = future.exception()
+                finish(running.pop(future), error)
+                if error is not None and failure is None:
+                    failure = error
+            now = time.monotonic()
+            for future, entry in sorted(running.items(), key=lambda item: item[1].index):
+                if entry.deadline is None or now < entry.deadline:
+                    continue
+                entry.cancel.set()
+                del running[future]
+                timed_out.append(future)
+                error = TimeoutError(f"step timed out after {policy.step_timeout_s}s: {steps[entry.index].description}")
+                finish(entry, error)
+                if failure is None:
+                    failure = error
+
+        for entry in running.values():
+            entry.cancel.set()
+        # Timed out steps too: only a step that ignores its cancel event outlives the run.
+        wait([*running, *timed_out], timeout=_CANCEL_GRACE_S)
+        for future, entry in sorted(running.items(), key=lambda item: item[1].index):
+            if future.done():
+                finish(entry, future.exception())
+            else:
+                finish(entry, TimeoutError(f"step did not stop within {_CANCEL_GRACE_S}s: {steps[entry.index].description}"))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if failure is not None:
+        raise failure
+    event_log.append(events.run_finished(stop_controller.should_stop()))
     return AgentResult(steps_executed=steps_executed, stopped=stop_controller.should_stop())
 
 
@@ -103,11 +212,42 @@ def _limit_steps(steps: Iterable[PlanStep], max_steps: int) -> Iterable[PlanStep
         yield step
 
 
-def _execute_step(step: PlanStep, tool_registry: ToolRegistry) -> None:
-    """Execute a single step by calling a tool if specified."""
+def _resolve_dependencies(steps: list[PlanStep]) -> list[frozenset[int]]:
+    """Map each step to the indexes of the steps it waits for.
+
+    Dependencies must name earlier steps, so plan order is always a valid
+    execution order and a plan cannot contain a cycle.
+    """
+    indexes: dict[str, int] = {}
+    dependencies: list[frozenset[int]] = []
+    for index, step in enumerate(steps):
+        if not isinstance(step, PlanStep):
+            raise TypeError("step must be PlanStep")
+        if step.depends_on is None:
+            dependencies.append(frozenset({index - 1}) if index else frozenset())
+        else:
+            unknown = [step_id for step_id in step.depends_on if step_id not in indexes]
+            if unknown:
+                raise ValueError(f"step {step.step_id or index} depends on unknown or later steps: {', '.join(unknown)}")
+            dependencies.append(frozenset(indexes[step_id] for step_id in step.depends_on))
+        if step.step_id is not None:
+            if step.step_id in indexes:
+                raise ValueError(f"duplicate step_id: {step.step_id}")
+            indexes[step.step_id] = index
+    return dependencies
+
+
+@dataclass
+class _RunningStep:
+    index: int
+    cancel: threading.Event
+    deadline: float | None
+
+
+def _execute_step(step: PlanStep, tool_registry: ToolRegistry, cancel: threading.Event | None = None) -> None:
+    """Execute a single step by calling a tool if specified; ``cancel`` goes to the tool call."""
     if not isinstance(step, PlanStep):
         raise TypeError("step must be PlanStep")
     if step.tool_name is None:
         return
-    tool = tool_registry.get(step.tool_name)
-    tool.run(step.tool_input or {})
+    tool_registry.run(step.tool_name, step.tool_input or {}, cancel)
@@ -1,3 +1,9 @@
+"""ndiff patches: the full text of both sides, with character-level change hints.
+
+Quadratic and as large as the file; patch_unified produces and applies
+compact unified diffs instead.
+"""
+
 import difflib
 from typing import Iterable
 
@@ -0,0 +1,568 @@
+"""Unified diffs: compact patches that carry only changed lines and their context.
+
+``make_patch`` diffs two texts line by line with one of three algorithms:
+
+- ``myers``: shortest edit script (linear-space Myers, as in diff-match-patch);
+- ``patience``: anchors on lines unique to both sides, Myers in between;
+- ``histogram``: patience, but where no line is unique to both sides it
+  anchors on the rarest common lines instead (as git's histogram diff
+  does), which copes better with repetitive files.
+
+Common prefixes and suffixes are stripped first, so the cost of a small edit
+to a large file is dominated by reading it. ``apply_patch`` applies hunk by
+hunk: each hunk is searched for near its recorded position, so earlier edits
+to the file only shift it, and with ``fuzz`` it may also drop up to that many
+lines of leading and trailing context that no longer match. ``make_patch_set``
+and ``apply_patch_set`` do the same for several files at once, including
+created and deleted ones. Line endings, including a missing final newline,
+round-trip exactly.
+"""
+
+from dataclasses import dataclass
+from typing import Iterable, Mapping
+
+ALGORITHMS = ("myers", "patience", "histogram")
+DEV_NULL = "/dev/null"
+NO_NEWLINE = "\\ No newline at end of file"
+
+# Lines occurring more often than this are never histogram anchors.
+_MAX_CHAIN = 64
+# Myers gives up on a region needing more than this many edits and replaces
+# it wholesale; its cost grows with the square of the edit count.
+_MAX_MYERS_EDITS = 4000
+
+
+class PatchError(ValueError):
+    """A patch is malformed or does not apply."""
+
+
+@dataclass(frozen=True)
+class Hunk:
+    old_start: int
+    old_len: int
+    new_start: int
+    new_len: int
+    # " context", "-removed" or "+added", each with its original line ending.
+    lines: tuple[str, ...]
+
+    @property
+    def before(self) -> list[str]:
+        return [line[1:] for line in self.lines if line[0] != "+"]
+
+    @property
+    def after(self) -> list[str]:
+        return [line[1:] for line in self.lines if line[0] != "-"]
+
+    @property
+    def leading_context(self) -> int:
+        count = 0
+        for line in self.lines:
+            if line[0] != " ":
+                break
+            count += 1
+        return count
+
+    @property
+    def trailing_context(self) -> int:
+        count = 0
+        for line in reversed(self.lines):
+            if line[0] != " ":
+                break
+            count += 1
+        return count
+
+
+@dataclass(frozen=True)
+class FilePatch:
+    """Hunks for one file; ``old_path`` or ``new_path`` is /dev/null for a created or deleted file."""
+
+    old_path: str
+    new_path: str
+    hunks: tuple[Hunk, ...]
+
+    @property
+    def path(self) -> str:
+        return _strip_prefix(self.old_path if self.new_path == DEV_NULL else self.new_path)
+
+    @property
+    def source(self) -> str | None:
+        return None if self.old_path == DEV_NULL else _strip_prefix(self.old_path)
+
+    @property
+    def target(self) -> str | None:
+        return None if self.new_path == DEV_NULL else _strip_prefix(self.new_path)
+
+
+def make_patch(
+    original: str,
+    updated: str,
+    path: str = "file",
+    context: int = 3,
+    algorithm: str = "histogram",
+) -> FilePatch:
+    """Diff two texts into a FilePatch with ``context`` lines around each change."""
+    if not isinstance(original, str) or not isinstance(updated, str):
+        raise TypeError("original and updated must be str")
+    if not isinstance(path, str):
+        raise TypeError("path must be str")
+    if context < 0:
+        raise ValueError("context must be >= 0")
+    a = _split_lines(original)
+    b = _split_lines(updated)
+    blocks = diff_lines(a, b, algorithm)
+    return FilePatch(f"a/{path}", f"b/{path}", tuple(_hunks(a, b, blocks, context)))
+
+
+def make_patch_set(
+    original: Mapping[str, str],
+    updated: Mapping[str, str],
+    context: int = 3,
+    algorithm: str = "histogram",
+) -> list[FilePatch]:
+    """Patches turning files ``original`` into ``updated`` (path -> text); paths only on one side are created or deleted."""
+    patches = []
+    for path in sorted(original.keys() | updated.keys()):
+        before = original.get(path)
+        after = updated.get(path)
+        if before == after:
+            continue
+        patch = make_patch(before or "", after or "", path, context, algorithm)
+        patches.append(
+            FilePatch(
+                DEV_NULL if before is None else patch.old_path,
+                DEV_NULL if after is None else patch.new_path,
+                patch.hunks,
+            )
+        )
+    return patches
+
+
+def diff_lines(a: list[str], b: list[str], algorithm: str = "histogram") -> list[tuple[int, int, int]]:
+    """Matching blocks ``(i, j, size)`` with ``a[i:i + size] == b[j:j + size]``, in order."""
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"unknown diff algorithm: {algorithm}")
+    ids: dict[str, int] = {}
+    a_ids = [ids.setdefault(line, len(ids)) for line in a]
+    b_ids = [ids.setdefault(line, len(ids)) for line in b]
+    blocks: list[tuple[int, int, int]] = []
+    if algorithm == "myers":
+        _myers(a_ids, b_ids, 0, len(a_ids), 0, len(b_ids), blocks)
+    else:
+        _anchored(a_ids, b_ids, blocks, algorithm == "histogram")
+    blocks.sort()
+    merged: list[tuple[int, int, int]] = []
+    for i, j, size in blocks:
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            last = merged.pop()
+            merged.append((last[0], last[1], last[2] + size))
+        else:
+            merged.append((i, j, size))
+    return merged
+
+
+def patch_to_text(patches: FilePatch | Iterable[FilePatch]) -> str:
+    """Render one or more FilePatches as unified diff text."""
+    if isinstance(patches, FilePatch):
+        patches = [patches]
+    out: list[str] = []
+    for patch in patches:
+        out.append(f"--- {patch.old_path}\n+++ {patch.new_path}\n")
+        for hunk in patch.hunks:
+            out.append(f"@@ -{_range(hunk.old_start, hunk.old_len)} +{_range(hunk.new_start, hunk.new_len)} @@\n")
+            for line in hunk.lines:
+                out.append(line)
+                if not line.endswith("\n"):
+                    out.append(f"\n{NO_NEWLINE}\n")
+    return "".join(out)
+
+
+def parse_patch(text: str) -> list[FilePatch]:
+    """Parse unified diff text, one FilePatch per file; ``diff --git`` and other header lines are skipped."""
+    if not isinstance(text, str):
+        raise TypeError("text must be str")
+    lines = _split_lines(text)
+    patches: list[FilePatch] = []
+    index = 0
+    while index < len(lines):
+        if not (lines[index].startswith("--- ") and index + 1 < len(lines) and lines[index + 1].startswith("+++ ")):
+            index += 1
+            continue
+        old_path = _header_path(lines[index])
+        new_path = _header_path(lines[index + 1])
+        index += 2
+        hunks: list[Hunk] = []
+        while index < len(lines) and lines[index].startswith("@@"):
+            hunk, index = _parse_hunk(lines, index)
+            hunks.append(hunk)
+        patches.append(FilePatch(old_path, new_path, tuple(hunks)))
+    return patches
+
+
+def apply_patch(original: str, patch: FilePatch, fuzz: int = 2) -> str:
+    """Apply ``patch`` to ``original``; raises PatchError naming the first hunk that does not fit."""
+    if not isinstance(original, str):
+        raise TypeError("original must be str")
+    if not isinstance(patch, FilePatch):
+        raise TypeError("patch must be FilePatch")
+    if fuzz < 0:
+        raise ValueError("fuzz must be >= 0")
+    lines = _split_lines(original)
+    out: list[str] = []
+    position = 0
+    offset = 0
+    for number, hunk in enumerate(patch.hunks, start=1):
+        before = hunk.before
+        after = hunk.after
+        claimed = (hunk.old_start - 1 if hunk.old_len else hunk.old_start) + offset
+        leading = hunk.leading_context
+        trailing = hunk.trailing_context
+        for level in range(fuzz + 1):
+            drop_head = min(level, leading)
+            drop_tail = min(level, trailing)
+            if level and not (drop_head or drop_tail):
+                continue
+            wanted = before[drop_head : len(before) - drop_tail]
+            at = _locate(lines, wanted, claimed + drop_head, position)
+            if at is not None:
+                break
+        else:
+            raise PatchError(f"{patch.path}: hunk {number} does not apply at line {hunk.old_start}")
+        out.extend(lines[position:at])
+        out.extend(after[drop_head : len(after) - drop_tail])
+        position = at + len(wanted)
+        offset = at - drop_head - (claimed - offset)
+    out.extend(lines[position:])
+    return "".join(out)
+
+
+def apply_patch_set(files: Mapping[str, str], patches: Iterable[FilePatch], fuzz: int = 2) -> dict[str, str | None]:
+    """Apply patches to ``files`` (path -> text) and return the changed files; None marks a deleted one.
+
+    Nothing is returned unless every patch applies, so a failure leaves the
+    caller with no partial result to write.
+    """
+    changed: dict[str, str | None] = {}
+    for patch in patches:
+        source = patch.source
+        if source is None:
+            current = None
+        elif source in changed:
+            current = changed[source]
+        else:
+            current = files.get(source)
+        if source is not None and current is None:
+            raise PatchError(f"{source}: file not found")
+        target = patch.target
+        exists = changed[target] is not None if target in changed else target in files
+        if source is None and exists:
+            raise PatchError(f"{patch.target}: file already exists")
+        result = apply_patch(current or "", patch, fuzz)
+        if source is not None and source != target:
+            changed[source] = None
+        if target is not None:
+            changed[target] = result
+    return changed
+
+
+def _myers(a: list[int], b: list[int], a0: int, a1: int, b0: int, b1: int, blocks: list[tuple[int, int, int]]) -> None:
+    stack = [(a0, a1, b0, b1)]
+    while stack:
+        a0, a1, b0, b1 = stack.pop()
+        a0, a1, b0, b1 = _trim(a, b, a0, a1, b0, b1, blocks)
+        if a0 == a1 or b0 == b1:
+            continue
+        split = _bisect(a, b, a0, a1, b0, b1)
+        if split is None:
+            continue
+        x, y = split
+        stack.append((a0, x, b0, y))
+        stack.append((x, a1, y, b1))
+
+
+def _trim(a: list[int], b: list[int], a0: int, a1: int, b0: int, b1: int, blocks: list[tuple[int, int, int]]) -> tuple[int, int, int, int]:
+    """Record the region's common prefix and suffix as matches and return what is left between them."""
+    start = a0
+    while a0 < a1 and b0 < b1 and a[a0] == b[b0]:
+        a0 += 1
+        b0 += 1
+    if a0 > start:
+        blocks.append((start, b0 - (a0 - start), a0 - start))
+    end = a1
+    while a1 > a0 and b1 > b0 and a[a1 - 1] == b[b1 - 1]:
+        a1 -= 1
+        b1 -= 1
+    if a1 < end:
+        blocks.append((a1, b1, end - a1))
+    return a0, a1, b0, b1
+
+
+def _bisect(a: list[int], b: list[int], a0: int, a1: int, b0: int, b1: int) -> tuple[int, int] | None:
+    """Middle of a shortest edit path for a[a0:a1] -> b[b0:b1], or None if it is a plain replace."""
+    n = a1 - a0
+    m = b1 - b0
+    max_d = (n + m + 1) // 2
+    offset = max_d
+    size = 2 * max_d + 2
+    forward = [-1] * size
+    backward = [-1] * size
+    forward[offset + 1] = 0
+    backward[offset + 1] = 0
+    delta = n - m
+    front = delta % 2 != 0
+    k1_start = k1_end = k2_start = k2_end = 0
+    for d in range(min(max_d, _MAX_MYERS_EDITS // 2)):
+        for k1 in range(-d + k1_start, d + 1 - k1_end, 2):
+            k1_offset = offset + k1
+            if k1 == -d or (k1 != d and forward[k1_offset - 1] < forward[k1_offset + 1]):
+                x1 = forward[k1_offset + 1]
+            else:
+                x1 = forward[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[a0 + x1] == b[b0 + y1]:
+                x1 += 1
+                y1 += 1
+            forward[k1_offset] = x1
+            if x1 > n:
+                k1_end += 2
+            elif y1 > m:
+                k1_start += 2
+            elif front:
+                k2_offset = offset + delta - k1
+                if 0 <= k2_offset < size and backward[k2_offset] != -1 and x1 >= n - backward[k2_offset]:
+                    return a0 + x1, b0 + y1
+        for k2 in range(-d + k2_start, d + 1 - k2_end, 2):
+            k2_offset = offset + k2
+            if k2 == -d or (k2 != d and backward[k2_offset - 1] < backward[k2_offset + 1]):
+                x2 = backward[k2_offset + 1]
+            else:
+                x2 = backward[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[a1 - 1 - x2] == b[b1 - 1 - y2]:
+                x2 += 1
+                y2 += 1
+            backward[k2_offset] = x2
+            if x2 > n:
+                k2_end += 2
+            elif y2 > m:
+                k2_start += 2
+            elif not front:
+                k1_offset = offset + delta - k2
+                if 0 <= k1_offset < size and forward[k1_offset] != -1:
+                    x1 = forward[k1_offset]
+                    if x1 >= n - x2:
+                        return a0 + x1, b0 + x1 - (k1_offset - offset)
+    return None
+
+
+def _anchored(a: list[int], b: list[int], blocks: list[tuple[int, int, int]], histogram: bool) -> None:
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        a0, a1, b0, b1 = _trim(a, b, *stack.pop(), blocks)
+        if a0 == a1 or b0 == b1:
+            continue
+        anchors = _patience_anchors(a, b, a0, a1, b0, b1)
+        if not anchors and histogram:
+            anchors = _histogram_anchor(a, b, a0, a1, b0, b1)
+        if not anchors:
+            _myers(a, b, a0, a1, b0, b1, blocks)
+            continue
+        for i, j, size in anchors:
+            blocks.append((i, j, size))
+            stack.append((a0, i, b0, j))
+            a0, b0 = i + size, j + size
+        stack.append((a0, a1, b0, b1))
+
+
+def _patience_anchors(a: list[int], b: list[int], a0: int, a1: int, b0: int, b1: int) -> list[tuple[int, int, int]]:
+    """Lines unique in both regions, reduced to the longest run that is in order on both sides."""
+    in_a: dict[int, int] = {}
+    for i in range(a0, a1):
+        in_a[a[i]] = -1 if a[i] in in_a else i
+    in_b: dict[int, int] = {}
+    for j in range(b0, b1):
+        line = b[j]
+        if in_a.get(line, -1) != -1:
+            in_b[line] = -1 if line in in_b else j
+    pairs = sorted((in_a[line], j) for line, j in in_b.items() if j != -1)
+    # Longest increasing subsequence of b positions (patience sorting).
+    tails: list[int] = []
+    tail_pairs: list[int] = []
+    previous = [-1] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        low, high = 0, len(tails)
+        while low < high:
+            mid = (low + high) // 2
+            if tails[mid] < j:
+                low = mid + 1
+            else:
+                high = mid
+        if low == len(tails):
+            tails.append(j)
+            tail_pairs.append(index)
+        else:
+            tails[low] = j
+            tail_pairs[low] = index
+        previous[index] = tail_pairs[low - 1] if low else -1
+    anchors: list[tuple[int, int, int]] = []
+    index = tail_pairs[-1] if tail_pairs else -1
+    while index != -1:
+        i, j = pairs[index]
+        anchors.append((i, j, 1))
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+
+def _histogram_anchor(a: list[int], b: list[int], a0: int, a1: int, b0: int, b1: int) -> list[tuple[int, int, int]]:
+    """The common run containing the rarest line of ``a``, longest among equally rare ones."""
+    positions: dict[int, list[int]] = {}
+    for i in range(a0, a1):
+        positions.setdefault(a[i], []).append(i)
+    best: tuple[int, int, int] | None = None
+    best_count = _MAX_CHAIN + 1
+    j = b0
+    while j < b1:
+        occurrences = positions.get(b[j])
+        next_j = j + 1
+        if occurrences is not None and len(occurrences) <= best_count:
+            for i in occurrences:
+                start_a, start_b = i, j
+                while start_a > a0 and start_b > b0 and a[start_a - 1] == b[start_b - 1]:
+                    start_a -= 1
+                    start_b -= 1
+                end_a, end_b = i + 1, j + 1
+                while end_a < a1 and end_b < b1 and a[end_a] == b[end_b]:
+                    end_a += 1
+                    end_b += 1
+                count = min(len(positions[a[k]]) for k in range(start_a, end_a))
+                size = end_a - start_a
+                if best is None or count < best_count or (count == best_count and size > best[2]):
+                    best = (start_a, start_b, size)
+                    best_count = count
+                next_j = max(next_j, end_b)
+        j = next_j
+    return [best] if best is not None else []
+
+
+def _hunks(a: list[str], b: list[str], blocks: list[tuple[int, int, int]], context: int) -> list[Hunk]:
+    changes: list[tuple[int, int, int, int]] = []
+    i = j = 0
+    for block_i, block_j, size in [*blocks, (len(a), len(b), 0)]:
+        if i < block_i or j < block_j:
+            changes.append((i, block_i, j, block_j))
+        i, j = block_i + size, block_j + size
+    groups: list[list[tuple[int, int, int, int]]] = []
+    for change in changes:
+        # Changes separated by at most 2 * context equal lines share a hunk.
+        if groups and change[0] - groups[-1][-1][1] <= 2 * context:
+            groups[-1].append(change)
+        else:
+            groups.append([change])
+    hunks = []
+    for group in groups:
+        first, last = group[0], group[-1]
+        lead = min(context, first[0])
+        trail = min(context, len(a) - last[1])
+        old_start, old_end = first[0] - lead, last[1] + trail
+        new_start, new_end = first[2] - lead, last[3] + trail
+        lines: list[str] = [" " + line for line in a[old_start : first[0]]]
+        for index, (i1, i2, j1, j2) in enumerate(group):
+            if index:
+                lines.extend(" " + line for line in a[group[index - 1][1] : i1])
+            lines.extend("-" + line for line in a[i1:i2])
+            lines.extend("+" + line for line in b[j1:j2])
+        lines.extend(" " + line for line in a[last[1] : old_end])
+        old_len = old_end - old_start
+        new_len = new_end - new_start
+        hunks.append(
+            Hunk(
+                old_start=old_start + 1 if old_len else old_start,
+                old_len=old_len,
+                new_start=new_start + 1 if new_len else new_start,
+                new_len=new_len,
+                lines=tuple(lines),
+            )
+        )
+    return hunks
+
+
+def _locate(lines: list[str], wanted: list[str], expected: int, lower: int) -> int | None:
+    """Index at or after ``lower`` where ``wanted`` occurs, nearest to ``expected``."""
+    size = len(wanted)
+    upper = len(lines) - size
+    if upper < lower:
+        return None
+    expected = min(max(expected, lower), upper)
+    if not size:
+        return expected
+    first = wanted[0]
+    for distance in range(max(expected - lower, upper - expected) + 1):
+        for at in (expected - distance, expected + distance) if distance else (expected,):
+            if lower <= at <= upper and lines[at] == first and lines[at : at + size] == wanted:
+                return at
+    return None
+
+
+def _split_lines(text: str) -> list[str]:
+    # Unlike str.splitlines, only "\n" ends a line; "\r" and the like are content.
+    lines = text.split("\n")
+    last = lines.pop()
+    result = [line + "\n" for line in lines]
+    if last:
+        result.append(last)
+    return result
+
+
+def _range(start: int, length: int) -> str:
+    return str(start) if length == 1 else f"{start},{length}"
+
+
+def _header_path(line: str) -> str:
+    path = line[4:].rstrip("\r\n")
+    # Drop a trailing timestamp, as written by diff -u.
+    return path.split("\t", 1)[0]
+
+
+def _strip_prefix(path: str) -> str:
+    return path[2:] if path.startswith(("a/", "b/")) else path
+
+
+def _parse_hunk(lines: list[str], index: int) -> tuple[Hunk, int]:
+    header = lines[index]
+    try:
+        old_part, new_part = header.split("@@")[1].split()
+        old_start, old_len = _parse_range(old_part, "-")
+        new_start, new_len = _parse_range(new_part, "+")
+    except (IndexError, ValueError):
+        raise PatchError(f"malformed hunk header: {header.rstrip()}") from None
+    body: list[str] = []
+    old_seen = new_seen = 0
+    index += 1
+    while (old_seen < old_len or new_seen < new_len) and index < len(lines):
+        line = lines[index]
+        tag = line[:1]
+        if tag not in (" ", "-", "+"):
+            if line in ("\n", "\r\n"):
+                # Some tools drop the space of an empty context line.
+                line, tag = " " + line, " "
+            else:
+                break
+        old_seen += tag != "+"
+        new_seen += tag != "-"
+        body.append(line)
+        index += 1
+        if index < len(lines) and lines[index].startswith("\\ "):
+            # The line had no newline; rendering added one before the marker.
+            if body[-1].endswith("\n"):
+                body[-1] = body[-1][:-1]
+            index += 1
+    if old_seen != old_len or new_seen != new_len:
+        raise PatchError(f"hunk body does not match its header: {header.rstrip()}")
+    return Hunk(old_start, old_len, new_start, new_len, tuple(body)), index
+
+
+def _parse_range(part: str, sign: str) -> tuple[int, int]:
+    if not part.startswith(sign):
+        raise ValueError(part)
+    start, _, length = part[1:].partition(",")
+    return int(start), int(length) if length else 1
@@ -1,71 +1,179 @@
+import itertools
 import json
-import uuid
-from datetime import datetime, timezone
-from typing import Any, Mapping
+import os
+import random
+import threading
+import time
+from typing import Any, Iterator, Mapping
 
+from event_codecs import JSON, Event, get_codec, json_default
 from shared_models import EventEnvelope
 
 
+class _EventClock:
+    """One clock read per event yields both a time-ordered id and its ISO8601 timestamp.
+
+    Ids follow the UUIDv7 layout (48-bit Unix milliseconds, version, 12
+    random bits, variant, 62 random bits) as 32 lowercase hex digits, so they
+    sort in the order events were made. Within a millisecond, or while the
+    wall clock is behind the last id, the low bits come from a counter that
+    starts at a random value instead of being redrawn, so the ids one thread
+    sees strictly increase. Everything but the counter is formatted once per
+    millisecond, and the timestamp, which matches ``datetime.isoformat()``
+    for UTC, only goes through strftime once per second.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        # (ms, id head, counter); next() on itertools.count is atomic, so only
+        # moving to a new millisecond takes the lock.
+        self._ms_state: tuple[int, str, Iterator[int]] = (-1, "", itertools.count())
+        self._second_state = (-1, "")
+
+    def reseed(self) -> None:
+        # A forked child must not continue the parent's sequence.
+        self._rng.seed()
+        self._ms_state = (-1, "", itertools.count())
+
+    def stamp(self) -> tuple[str, str]:
+        """Return an id (hex digits) and the timestamp it was taken at."""
+        now_ns = time.time_ns()
+        ms, head, counter = self._ms_state
+        if now_ns // 1_000_000 > ms:
+            ms, head, counter = self._advance(now_ns // 1_000_000)
+        event_id = f"{head}{next(counter):016x}"
+        second, prefix = self._second_state
+        if now_ns // 1_000_000_000 != second:
+            second = now_ns // 1_000_000_000
+            prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+            self._second_state = (second, prefix)
+        micros = now_ns // 1000 % 1_000_000
+        return event_id, f"{prefix}.{micros:06d}+00:00" if micros else f"{prefix}+00:00"
+
+    def _advance(self, now_ms: int) -> tuple[int, str, Iterator[int]]:
+        with self._lock:
+            if self._ms_state[0] < now_ms:
+                head = f"{now_ms:012x}7{self._rng.getrandbits(12):03x}"
+                # Variant bits, then a random start; 2**61 increments of
+                # headroom cannot run out within a millisecond.
+                self._ms_state = (now_ms, head, itertools.count(0b10 << 62 | self._rng.getrandbits(61)))
+            return self._ms_state
+
+
+_CLOCK = _EventClock()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_CLOCK.reseed)
+
+
 def utc_now_iso() -> str:
     """Return an ISO8601 timestamp in UTC."""
-    return datetime.now(timezone.utc).isoformat()
+    return _CLOCK.stamp()[1]
 
 
 def _event_id(prefix: str) -> str:
-    return f"{prefix}_{uuid.uuid4().hex}"
-
-
-def event_run_started(session_id: str, run_id: str, prompt: str) -> Mapping[str, object]:
-    return EventEnvelope(
-        id=_event_id("evt"),
-        ts=utc_now_iso(),
-        type="run_started",
-        session_id=session_id,
-        run_id=run_id,
-        payload={"prompt": prompt},
-    ).to_dict()
-
-
-def event_step_started(session_id: str, run_id: str, description: str) -> Mapping[str, object]:
-    return EventEnvelope(
-        id=_event_id("evt"),
-        ts=utc_now_iso(),
-        type="step_started",
-        session_id=session_id,
-        run_id=run_id,
-        payload={"description": description},
-    ).to_dict()
-
-
-def event_step_finished(session_id: str, run_id: str, description: str) -> Mapping[str, object]:
-    return EventEnvelope(
-        id=_event_id("evt"),
-        ts=utc_now_iso(),
-        type="step_finished",
-        session_id=session_id,
-        run_id=run_id,
-        payload={"description": description},
-    ).to_dict()
-
-
-def event_run_finished(session_id: str, run_id: str, stopped: bool) -> Mapping[str, object]:
-    return EventEnvelope(
-        id=_event_id("evt"),
-        ts=utc_now_iso(),
-        type="run_finished",
-        session_id=session_id,
-        run_id=run_id,
-        payload={"stopped": stopped},
-    ).to_dict()
+    return f"{prefix}_{_CLOCK.stamp()[0]}"
+
+
+class EventFactory:
+    """Builds the envelopes of one run.
+
+    Each event costs one clock read and one EventEnvelope; the envelope is
+    itself the event mapping, so nothing is copied into a dict on the way to
+    the event log or a codec. Event ids sort in creation order.
+    """
+
+    __slots__ = ("session_id", "run_id")
+
+    def __init__(self, session_id: str, run_id: str) -> None:
+        if not isinstance(session_id, str):
+            raise TypeError("session_id must be str")
+        if not isinstance(run_id, str):
+            raise TypeError("run_id must be str")
+        self.session_id = session_id
+        self.run_id = run_id
+
+    def event(self, event_type: str, payload: Mapping[str, Any]) -> EventEnvelope:
+        event_id, ts = _CLOCK.stamp()
+        return EventEnvelope(f"evt_{event_id}", ts, event_type, self.session_id, self.run_id, payload)
+
+    def run_started(self, prompt: str) -> EventEnvelope:
+        return self.event("run_started", {"prompt": prompt})
+
+    def step_started(self, description: str, step_id: str | None = None) -> EventEnvelope:
+        return self.event("step_started", _step_payload(description, step_id))
+
+    def step_finished(self, description: str, step_id: str | None = None) -> EventEnvelope:
+        return self.event("step_finished", _step_payload(description, step_id))
+
+    def step_failed(self, description: str, error: str, step_id: str | None = None) -> EventEnvelope:
+        payload = _step_payload(description, step_id)
+        payload["error"] = error
+        return self.event("step_failed", payload)
+
+    def run_finished(self, stopped: bool) -> EventEnvelope:
+        return self.event("run_finished", {"stopped": stopped})
+
+    def check_started(self, name: str, command: str) -> EventEnvelope:
+        return self.event("check_started", {"name": name, "command": command})
+
+    def check_output(self, name: str, stream: str, text: str) -> EventEnvelope:
+        return self.event("check_output", {"name": name, "stream": stream, "text": text})
+
+    def check_finished(self, name: str, status: str, exit_code: int | None, duration_s: float) -> EventEnvelope:
+        return self.event("check_finished", {"name": name, "status": status, "exit_code": exit_code, "duration_s": duration_s})
+
+    def check_cached(self, name: str, status: str, exit_code: int | None, duration_s: float, cache_key: str) -> EventEnvelope:
+        payload = {"name": name, "status": status, "exit_code": exit_code, "duration_s": duration_s, "cache_key": cache_key}
+        return self.event("check_cached", payload)
+
+
+def _step_payload(description: str, step_id: str | None) -> dict[str, Any]:
+    if step_id is None:
+        return {"description": description}
+    return {"description": description, "step_id": step_id}
+
+
+def event_run_started(session_id: str, run_id: str, prompt: str) -> EventEnvelope:
+    return EventFactory(session_id, run_id).run_started(prompt)
+
+
+def event_step_started(session_id: str, run_id: str, description: str) -> EventEnvelope:
+    return EventFactory(session_id, run_id).step_started(description)
+
+
+def event_step_finished(session_id: str, run_id: str, description: str) -> EventEnvelope:
+    return EventFactory(session_id, run_id).step_finished(description)
+
+
+def event_step_failed(session_id: str, run_id: str, description: str, error: str) -> EventEnvelope:
+    return EventFactory(session_id, run_id).step_failed(description, error)
+
+
+def event_run_finished(session_id: str, run_id: str, stopped: bool) -> EventEnvelope:
+    return EventFactory(session_id, run_id).run_finished(stopped)
 
 
 def serialize_event(event: Mapping[str, Any]) -> str:
     if not isinstance(event, Mapping):
         raise TypeError("event must be a mapping")
-    return json.dumps(event, separators=(",", ":"))
+    return json.dumps(event, separators=(",", ":"), default=json_default)
 
 
 def deserialize_event(data: str) -> Mapping[str, Any]:
     if not isinstance(data, str):
         raise TypeError("data must be str")
     return json.loads(data)
+
+
+def encode_event(event: Event, codec: str = JSON) -> bytes:
+    """Encode an event (or an EventEnvelope, without copying its payload) with a named codec."""
+    if not isinstance(event, (Mapping, EventEnvelope)):
+        raise TypeError("event must be a mapping or EventEnvelope")
+    return get_codec(codec).encode(event)
+
+
+def decode_event(data: bytes, codec: str = JSON) -> Mapping[str, Any]:
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        raise TypeError("data must be bytes")
+    return get_codec(codec).decode(bytes(data))
@@ -0,0 +1,117 @@
+import hashlib
+import threading
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Mapping
+
+from json_store import JsonLruStore, JsonStoreStats, canonical_json
+
+
+@dataclass
+class ToolCacheStats(JsonStoreStats):
+    invalidations: int = 0
+    # Calls whose input could not be canonicalized; they always run the tool.
+    uncacheable: int = 0
+
+
+@dataclass
+class CacheScope:
+    """The workspace a run's tool results depend on.
+
+    While the workspace still matches its snapshot, results are keyed by the
+    snapshot id alone, so they are shared with every other run on that
+    snapshot and may go to the disk tier. After ``ToolResultCache.invalidate``
+    records a write, results are keyed by this workspace and its write
+    generation instead, so nothing cached before the write, or by another
+    workspace, can be returned.
+    """
+
+    snapshot_id: str
+    generation: int = 0
+    _workspace: str = field(default_factory=lambda: uuid.uuid4().hex, repr=False)
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.snapshot_id, str):
+            raise TypeError("snapshot_id must be str")
+
+    @property
+    def pristine(self) -> bool:
+        return self.generation == 0
+
+    @property
+    def key(self) -> str:
+        if self.pristine:
+            return self.snapshot_id
+        return f"{self.snapshot_id}@{self._workspace}.{self.generation}"
+
+
+class ToolResultCache:
+    """Memoizes results of read-only tools by (tool name, canonical input, CacheScope).
+
+    Results live in a ``JsonLruStore`` of up to ``max_entries``; with a
+    ``directory``, only results for pristine snapshots go to its disk tier.
+    """
+
+    def __init__(self, max_entries: int = 1024, directory: str | None = None) -> None:
+        self.stats = ToolCacheStats()
+        self._store = JsonLruStore(max_entries, directory, stats=self.stats)
+        self._lock = threading.Lock()
+
+    def key(self, scope: CacheScope, tool_name: str, payload: Mapping[str, Any]) -> str | None:
+        """Cache key for a call, or None when the input cannot be canonicalized."""
+        if not isinstance(scope, CacheScope):
+            raise TypeError("scope must be CacheScope")
+        if not isinstance(tool_name, str):
+            raise TypeError("tool_name must be str")
+        try:
+            canonical = canonical_json(payload)
+        except (TypeError, ValueError):
+            with self._lock:
+                self.stats.uncacheable += 1
+            return None
+        digest = hashlib.sha256()
+        for part in (tool_name.encode("utf-8"), scope.key.encode("utf-8"), canonical):
+            digest.update(len(part).to_bytes(8, "big"))
+            digest.update(part)
+        # The prefix tells get() and put() whether the entry may go to disk.
+        return f"{'s' if scope.pristine else 'w'}{digest.hexdigest()}"
+
+    def get(self, key: str) -> Mapping[str, Any] | None:
+        # The prefix is only the disk flag; the scope is already in the digest.
+        return self._store.get(key[1:], disk=key.startswith("s"))
+
+    def put(self, key: str, result: Mapping[str, Any]) -> None:
+        # Only results for a pristine snapshot are shareable beyond this workspace.
+        self._store.put(key[1:], result, disk=key.startswith("s"))
+
+    def invalidate(self, scope: CacheScope) -> None:
+        """Record that the scope's workspace was written.
+
+        Bumping the generation changes every later key, so entries from
+        before the write are never returned again; they age out of the LRU.
+        """
+        if not isinstance(scope, CacheScope):
+            raise TypeError("scope must be CacheScope")
+        with self._lock:
+            scope.generation += 1
+            self.stats.invalidations += 1
+
+    def begin_write(self, scope: CacheScope) -> None:
+        """Invalidate before a write; ``end_write`` invalidates again once it is done.
+
+        A read that overlaps any part of the write sees the generation change
+        and must not store its result (see ``ToolRegistry.run``).
+        """
+        if not isinstance(scope, CacheScope):
+            raise TypeError("scope must be CacheScope")
+        with self._lock:
+            scope.generation += 1
+
+    def end_write(self, scope: CacheScope) -> None:
+        self.invalidate(scope)
+
+    def clear(self) -> None:
+        self._store.clear()
+
+    def __len__(self) -> int:
+        return len(self._store)
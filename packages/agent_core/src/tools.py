@@ -1,28 +1,75 @@
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass, field
-from typing import Any, Callable, Iterable, Mapping
+from typing import Any, Callable, Iterable, Iterator, Mapping, Protocol
 
 from shared_models import ToolContract
-
-ToolHandler = Callable[[Mapping[str, Any]], Mapping[str, Any]]
+from tool_cache import CacheScope, ToolResultCache
+from tool_handlers import AsyncToolHandler, ToolHandler, acall_handler, call_handler, is_async_handler
 
 ToolSpec = ToolContract
 
+# on_output(stream, text), stream being "stdout" or "stderr".
+OutputCallback = Callable[[str, str], None]
+
+_CANCEL: ContextVar[threading.Event | None] = ContextVar("tool_cancel", default=None)
+
+
+def current_cancel() -> threading.Event | None:
+    """The ``cancel`` event of the ToolRegistry call running in this context, if any."""
+    return _CANCEL.get()
+
 
 @dataclass
 class Tool:
+    """A tool contract and its handler, which may be a plain or an ``async def`` function.
+
+    ``arun`` awaits async handlers on the caller's event loop and runs sync
+    ones on ``executor`` (the loop's default thread pool when None), so
+    blocking handlers never stall the loop. ``run`` serves sync callers and
+    drives an async handler to completion on a private event loop.
+    """
+
     spec: ToolSpec
-    handler: ToolHandler
+    handler: ToolHandler | AsyncToolHandler
+
+    @property
+    def is_async(self) -> bool:
+        return is_async_handler(self.handler)
 
     def run(self, payload: Mapping[str, Any]) -> Mapping[str, Any]:
         if not isinstance(payload, Mapping):
             raise TypeError("payload must be a mapping")
-        return self.handler(payload)
+        return call_handler(self.handler, payload, self.spec.name)
+
+    async def arun(self, payload: Mapping[str, Any], executor: Executor | None = None) -> Mapping[str, Any]:
+        if not isinstance(payload, Mapping):
+            raise TypeError("payload must be a mapping")
+        return await acall_handler(self.handler, payload, executor)
 
 
 @dataclass
 class ToolRegistry:
+    """Tools by name; ``run``/``arun`` dispatch a call to sync and async tools alike.
+
+    ``executor`` is the thread pool that ``arun`` offloads sync handlers to;
+    None uses the event loop's default executor. With a ``cache`` and a
+    ``cache_scope`` for the run's workspace, calls to ``read_only`` tools are
+    memoized, and any other tool call counts as a workspace write that
+    invalidates them.
+
+    A call's ``cancel`` event is visible to its handler via
+    ``current_cancel()``; ``ExecutorProxy`` passes it on to the commands it
+    runs, so setting it stops them.
+    """
+
     _tools: dict[str, Tool] = field(default_factory=dict)
+    executor: Executor | None = None
+    cache: ToolResultCache | None = None
+    cache_scope: CacheScope | None = None
 
     def register(self, tool: Tool) -> None:
         if not isinstance(tool, Tool):
@@ -42,12 +89,79 @@ class ToolRegistry:
     def list(self) -> Iterable[str]:
         return list(self._tools.keys())
 
+    def run(self, name: str, payload: Mapping[str, Any], cancel: threading.Event | None = None) -> Mapping[str, Any]:
+        tool = self.get(name)
+        with _cancelling(cancel):
+            if self.cache is None or self.cache_scope is None:
+                return tool.run(payload)
+            if not tool.spec.read_only:
+                with self._writing():
+                    return tool.run(payload)
+            key, generation, result = self._lookup(name, payload)
+            if result is None:
+                result = tool.run(payload)
+                self._store(key, generation, result)
+            return result
+
+    async def arun(self, name: str, payload: Mapping[str, Any], cancel: threading.Event | None = None) -> Mapping[str, Any]:
+        tool = self.get(name)
+        # acall_handler copies the context, so sync handlers on the executor see the event too.
+        with _cancelling(cancel):
+            if self.cache is None or self.cache_scope is None:
+                return await tool.arun(payload, self.executor)
+            if not tool.spec.read_only:
+                with self._writing():
+                    return await tool.arun(payload, self.executor)
+            key, generation, result = self._lookup(name, payload)
+            if result is None:
+                result = await tool.arun(payload, self.executor)
+                self._store(key, generation, result)
+            return result
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        self.cache.begin_write(self.cache_scope)
+        try:
+            yield
+        finally:
+            self.cache.end_write(self.cache_scope)
+
+    def _lookup(self, name: str, payload: Mapping[str, Any]) -> tuple[str | None, int, Mapping[str, Any] | None]:
+        # The generation is read first, so _store can tell whether a write overlapped the call.
+        generation = self.cache_scope.generation
+        key = self.cache.key(self.cache_scope, name, payload)
+        return key, generation, self.cache.get(key) if key is not None else None
+
+    def _store(self, key: str | None, generation: int, result: Mapping[str, Any]) -> None:
+        # Don't keep a read that a concurrent write may have overlapped.
+        if key is not None and self.cache_scope.generation == generation:
+            self.cache.put(key, result)
+
+
+@contextmanager
+def _cancelling(cancel: threading.Event | None) -> Iterator[None]:
+    if cancel is None:
+        yield
+        return
+    if not isinstance(cancel, threading.Event):
+        raise TypeError("cancel must be threading.Event")
+    token = _CANCEL.set(cancel)
+    try:
+        yield
+    finally:
+        _CANCEL.reset(token)
+
 
 @dataclass(frozen=True)
 class ShellResult:
     exit_code: int
     stdout: str
     stderr: str
+    timed_out: bool = False
+    # stdout/stderr were cut to a head and tail; the *_log paths, when set, hold the full streams.
+    truncated: bool = False
+    stdout_log: str | None = None
+    stderr_log: str | None = None
 
 
 class SandboxProxy(ABC):
@@ -57,6 +171,26 @@ class SandboxProxy(ABC):
     def run(self, command: str, timeout_s: int) -> ShellResult:
         raise NotImplementedError
 
+    def run_streaming(
+        self,
+        command: str,
+        timeout_s: int,
+        on_output: OutputCallback,
+        cancel: threading.Event | None = None,
+    ) -> ShellResult:
+        """``run``, passing output to ``on_output`` as it arrives.
+
+        This default can neither stream nor stop early: it reports each
+        stream once the command is done. Proxies over an executor that
+        streams, like ``ExecutorProxy``, override it and stop the command
+        once ``cancel`` is set.
+        """
+        result = self.run(command, timeout_s)
+        for stream, text in (("stdout", result.stdout), ("stderr", result.stderr)):
+            if text:
+                on_output(stream, text)
+        return result
+
     @abstractmethod
     def read_file(self, path: str) -> str:
         raise NotImplementedError
@@ -64,3 +198,68 @@ class SandboxProxy(ABC):
     @abstractmethod
     def write_file(self, path: str, content: str) -> None:
         raise NotImplementedError
+
+
+class StreamingExecutor(Protocol):
+    """An executor that streams output and can be stopped, e.g. the runner's ``SubprocessExecutor``.
+
+    ``run`` returns a result with ShellResult's fields, such as the runner's ``ExecResult``.
+    """
+
+    def run(
+        self, command: str, timeout_s: int, on_output: OutputCallback | None = None, cancel: threading.Event | None = None
+    ) -> Any: ...
+
+
+class TextFilesystem(Protocol):
+    def read_text(self, path: str) -> str: ...
+
+    def write_text(self, path: str, content: str) -> None: ...
+
+
+class ExecutorProxy(SandboxProxy):
+    """SandboxProxy over an executor and filesystem in this process, e.g. a runner ``LocalSandbox``'s.
+
+    ``run_streaming`` hands ``on_output`` and ``cancel`` to the executor, so
+    output arrives while the command runs and setting ``cancel`` stops it.
+    Without an explicit ``cancel``, both ``run`` and ``run_streaming`` use
+    ``current_cancel()``, the cancel event of the tool call they serve.
+    """
+
+    def __init__(self, executor: StreamingExecutor, filesystem: TextFilesystem) -> None:
+        if not callable(getattr(executor, "run", None)):
+            raise TypeError("executor must have a run method")
+        self.executor = executor
+        self.filesystem = filesystem
+
+    def run(self, command: str, timeout_s: int) -> ShellResult:
+        return _shell_result(self.executor.run(command, timeout_s, cancel=current_cancel()))
+
+    def run_streaming(
+        self,
+        command: str,
+        timeout_s: int,
+        on_output: OutputCallback,
+        cancel: threading.Event | None = None,
+    ) -> ShellResult:
+        if cancel is None:
+            cancel = current_cancel()
+        return _shell_result(self.executor.run(command, timeout_s, on_output=on_output, cancel=cancel))
+
+    def read_file(self, path: str) -> str:
+        return self.filesystem.read_text(path)
+
+    def write_file(self, path: str, content: str) -> None:
+        self.filesystem.write_text(path, content)
+
+
+def _shell_result(result: Any) -> ShellResult:
+    return ShellResult(
+        exit_code=result.exit_code,
+        stdout=result.stdout,
+        stderr=result.stderr,
+        timed_out=result.timed_out,
+        truncated=result.truncated,
+        stdout_log=result.stdout_log,
+        stderr_log=result.stderr_log,
+    )
@@ -0,0 +1,152 @@
+import fnmatch
+import hashlib
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Mapping
+
+from json_store import JsonLruStore, JsonStoreStats
+
+_SKIP_DIRS = frozenset({".git", ".hg", "__pycache__", ".mypy_cache", ".pytest_cache", ".ruff_cache", ".tox"})
+
+# digests() -> {path relative to the workspace root: content digest}
+DigestSource = Callable[[], Mapping[str, str]]
+
+# A file modified this close to a scan may be rewritten again within the
+# same timestamp tick without changing its stat (1 s on ext3 or HFS+).
+_RACY_WINDOW_NS = 1_000_000_000
+
+VerificationCacheStats = JsonStoreStats
+
+
+@dataclass(frozen=True)
+class VerificationScope:
+    """What a run's check results depend on besides the command.
+
+    ``toolchain`` names the interpreter, compilers and installed dependencies
+    (e.g. the snapshot's toolchain id), and ``digests`` lists the workspace's
+    files with a digest of each (a ``TreeHasher``, or blob ids from
+    ``git ls-files -s`` in a remote sandbox).
+    """
+
+    toolchain: str
+    digests: DigestSource
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.toolchain, str):
+            raise TypeError("toolchain must be str")
+        if not callable(self.digests):
+            raise TypeError("digests must be callable")
+
+
+class TreeHasher:
+    """SHA-256 digests of the files under ``root``, rehashing only files whose stat changed.
+
+    As in git's racy-clean check, a file modified within a second of the
+    scan that hashed it is rehashed until a scan sees it settled: an equal
+    stat alone can't rule out a same-size rewrite in the same timestamp tick.
+    """
+
+    def __init__(self, root: str) -> None:
+        if not isinstance(root, str):
+            raise TypeError("root must be str")
+        self.root = os.path.abspath(root)
+        # path -> (mtime_ns, size, ino, digest, settled)
+        self._known: dict[str, tuple[int, int, int, str, bool]] = {}
+        self._lock = threading.Lock()
+
+    def digests(self) -> dict[str, str]:
+        with self._lock:
+            # Taken before any stat, so a write during the scan counts as racy.
+            started_ns = time.time_ns()
+            current: dict[str, str] = {}
+            known: dict[str, tuple[int, int, int, str, bool]] = {}
+            for directory, subdirs, files in os.walk(self.root):
+                subdirs[:] = [name for name in subdirs if name not in _SKIP_DIRS]
+                for name in files:
+                    full = os.path.join(directory, name)
+                    path = os.path.relpath(full, self.root).replace(os.sep, "/")
+                    try:
+                        stat = os.stat(full)
+                    except OSError:
+                        continue
+                    entry = self._known.get(path)
+                    if entry is None or not entry[4] or entry[:3] != (stat.st_mtime_ns, stat.st_size, stat.st_ino):
+                        digest = _file_digest(full)
+                        if digest is None:
+                            continue
+                        settled = started_ns - stat.st_mtime_ns >= _RACY_WINDOW_NS
+                        entry = (stat.st_mtime_ns, stat.st_size, stat.st_ino, digest, settled)
+                    known[path] = entry
+                    current[path] = entry[3]
+            self._known = known
+            return current
+
+
+def input_hash(digests: Mapping[str, str], patterns: Iterable[str] | None = None) -> str:
+    """Digest of the files matching ``patterns`` (fnmatch; ``*`` also matches ``/``), or of all files."""
+    if patterns is None:
+        selected = digests.items()
+    else:
+        patterns = list(patterns)
+        if not patterns:
+            selected = ()
+        else:
+            match = re.compile("|".join(f"(?:{fnmatch.translate(pattern)})" for pattern in patterns)).match
+            selected = [(path, digest) for path, digest in digests.items() if match(path)]
+    hasher = hashlib.sha256()
+    for path, digest in sorted(selected):
+        hasher.update(f"{path}\0{digest}\n".encode("utf-8"))
+    return hasher.hexdigest()
+
+
+class VerificationCache:
+    """Check results by (command, input hash, toolchain).
+
+    Results live in a ``JsonLruStore`` of up to ``max_entries``. With a
+    ``directory``, every result also goes to its disk tier, kept under
+    ``max_bytes``, so every run on the same snapshot and toolchain can
+    reuse them.
+    """
+
+    def __init__(self, max_entries: int = 1024, directory: str | None = None, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.stats = VerificationCacheStats()
+        self._store = JsonLruStore(max_entries, directory, max_bytes, stats=self.stats)
+
+    def key(self, command: str, scope: VerificationScope, digests: Mapping[str, str], inputs: Iterable[str] | None = None) -> str:
+        """Cache key for ``command`` run on the files in ``digests`` (only those matching ``inputs``, when given)."""
+        if not isinstance(command, str):
+            raise TypeError("command must be str")
+        if not isinstance(scope, VerificationScope):
+            raise TypeError("scope must be VerificationScope")
+        hasher = hashlib.sha256()
+        for part in (command, scope.toolchain, input_hash(digests, inputs)):
+            data = part.encode("utf-8")
+            hasher.update(len(data).to_bytes(8, "big"))
+            hasher.update(data)
+        return hasher.hexdigest()
+
+    def get(self, key: str) -> Mapping[str, Any] | None:
+        return self._store.get(key)
+
+    def put(self, key: str, result: Mapping[str, Any]) -> None:
+        self._store.put(key, result)
+
+    def clear(self) -> None:
+        self._store.clear()
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+
+def _file_digest(path: str) -> str | None:
+    hasher = hashlib.sha256()
+    try:
+        with open(path, "rb") as handle:
+            for block in iter(lambda: handle.read(1024 * 1024), b""):
+                hasher.update(block)
+    except OSError:
+        return None
+    return hasher.hexdigest()
@@ -1,7 +1,62 @@
-from dataclasses import dataclass
-from typing import Iterable
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Iterable, Mapping
 
-from tools import SandboxProxy
+from protocol import EventFactory
+from shared_models import EventEnvelope, EventLog
+from tools import OutputCallback, SandboxProxy, ShellResult
+from verification_cache import VerificationCache, VerificationScope
+
+PASSED = "passed"
+FAILED = "failed"
+TIMED_OUT = "timed_out"
+# The sandbox raised instead of returning a result.
+ERROR = "error"
+# Not run, or stopped, because fail-fast tripped on another check.
+CANCELED = "canceled"
+# Outcomes that follow from the command and its inputs alone; only these are cached.
+CACHEABLE_STATUSES = frozenset({PASSED, FAILED})
+
+
+@dataclass(frozen=True)
+class ResourceLimits:
+    """Per-check limits, applied with ``ulimit`` in a subshell around the command."""
+
+    cpu_s: int | None = None
+    memory_mb: int | None = None
+    open_files: int | None = None
+
+    def wrap(self, command: str) -> str:
+        limits = [
+            f"ulimit -{flag} {value}"
+            for flag, value in (("t", self.cpu_s), ("v", self.memory_mb and self.memory_mb * 1024), ("n", self.open_files))
+            if value is not None
+        ]
+        if not limits:
+            return command
+        return f"({' && '.join(limits)} &&\n{command}\n)"
+
+
+@dataclass(frozen=True)
+class Check:
+    name: str
+    command: str
+    # None uses VerificationPolicy.timeout_s.
+    timeout_s: int | None = None
+    limits: ResourceLimits | None = None
+    # Patterns of the files the result depends on, for the result cache; None means all files.
+    inputs: tuple[str, ...] | None = None
+
+
+@dataclass(frozen=True)
+class VerificationPolicy:
+    max_parallel: int = 4
+    # Stop at the first check that does not pass: queued checks are skipped
+    # and running ones are asked to stop.
+    fail_fast: bool = False
+    timeout_s: int = 120
 
 
 @dataclass(frozen=True)
@@ -9,18 +64,183 @@ class CheckResult:
     name: str
     passed: bool
     output: str
+    command: str = ""
+    status: str = PASSED
+    exit_code: int | None = None
+    duration_s: float = 0.0
+    # output is a head and tail of what the command printed.
+    truncated: bool = False
+    # Reused from the result cache; duration_s is then that of the original run.
+    cached: bool = False
+
+
+@dataclass(frozen=True)
+class VerificationReport:
+    results: tuple[CheckResult, ...]
+    duration_s: float
+    canceled: bool = False
+
+    @property
+    def passed(self) -> bool:
+        return all(result.passed for result in self.results)
+
+    @property
+    def failures(self) -> list[CheckResult]:
+        return [result for result in self.results if result.status not in (PASSED, CANCELED)]
+
 
+def run_verification(
+    sandbox: SandboxProxy,
+    checks: Iterable[Check | str],
+    policy: VerificationPolicy = VerificationPolicy(),
+    event_log: EventLog | None = None,
+    events: EventFactory | None = None,
+    cache: VerificationCache | None = None,
+    cache_scope: VerificationScope | None = None,
+) -> VerificationReport:
+    """Run independent checks concurrently, at most ``policy.max_parallel`` at a time.
 
-def run_checks(sandbox: SandboxProxy, commands: Iterable[str]) -> list[CheckResult]:
+    A plain string is a check named after its command. The sandbox proxy is
+    called from several threads at once. With an ``event_log``, each check
+    appends ``check_started``, ``check_output`` as output streams in (see
+    ``SandboxProxy.run_streaming``) and ``check_finished``; events of
+    concurrent checks interleave. Results keep the order of ``checks``. With
+    ``policy.fail_fast``, a check still running when another fails is
+    reported canceled unless it passed.
+
+    With a ``cache`` and a ``cache_scope``, a check whose command, input
+    files and toolchain match an earlier passed or failed run is not run
+    again: its stored result comes back with ``cached`` set, and the event
+    log gets ``check_cached`` in place of ``check_started``/``check_finished``.
+    The workspace is hashed once, before any check runs.
+    """
+    if not isinstance(sandbox, SandboxProxy):
+        raise TypeError("sandbox must be SandboxProxy")
+    if not isinstance(policy, VerificationPolicy):
+        raise TypeError("policy must be VerificationPolicy")
+    if policy.max_parallel < 1:
+        raise ValueError("max_parallel must be >= 1")
+    if event_log is not None and not isinstance(events, EventFactory):
+        raise TypeError("events must be EventFactory when event_log is given")
+    if cache is not None and not isinstance(cache, VerificationCache):
+        raise TypeError("cache must be VerificationCache")
+    if cache_scope is not None and not isinstance(cache_scope, VerificationScope):
+        raise TypeError("cache_scope must be VerificationScope")
+    specs = [_as_check(check) for check in checks]
+
+    started = time.monotonic()
+    keys: list[str | None] = [None] * len(specs)
+    if cache is not None and cache_scope is not None and specs:
+        digests = cache_scope.digests()
+        keys = [cache.key(_command(spec), cache_scope, digests, spec.inputs) for spec in specs]
+    cancel = threading.Event()
+    run = _CheckRun(sandbox, policy, cancel, event_log, events, cache)
+    if len(specs) <= 1 or policy.max_parallel == 1:
+        results = [run(spec, key) for spec, key in zip(specs, keys)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(policy.max_parallel, len(specs)), thread_name_prefix="verify") as pool:
+            results = list(pool.map(run, specs, keys))
+    return VerificationReport(tuple(results), time.monotonic() - started, canceled=cancel.is_set())
+
+
+def run_checks(sandbox: SandboxProxy, commands: Iterable[Check | str], policy: VerificationPolicy = VerificationPolicy()) -> list[CheckResult]:
     """Run verification commands via the sandbox proxy."""
-    results: list[CheckResult] = []
-    for command in commands:
-        result = sandbox.run(command, timeout_s=120)
-        results.append(
-            CheckResult(
-                name=command,
-                passed=result.exit_code == 0,
-                output=result.stdout + result.stderr,
+    return list(run_verification(sandbox, commands, policy).results)
+
+
+@dataclass
+class _CheckRun:
+    sandbox: SandboxProxy
+    policy: VerificationPolicy
+    cancel: threading.Event
+    event_log: EventLog | None
+    events: EventFactory | None
+    cache: VerificationCache | None = None
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def __call__(self, check: Check, key: str | None = None) -> CheckResult:
+        if self.cancel.is_set():
+            result = CheckResult(check.name, False, "", check.command, CANCELED)
+            self._emit(lambda events: events.check_finished(check.name, CANCELED, None, 0.0))
+            return result
+        stored = self.cache.get(key) if self.cache is not None and key is not None else None
+        result = _from_cache(check, stored) if stored is not None else None
+        if result is not None:
+            if not result.passed and self.policy.fail_fast:
+                self.cancel.set()
+            self._emit(lambda events: events.check_cached(result.name, result.status, result.exit_code, result.duration_s, key))
+            return result
+        self._emit(lambda events: events.check_started(check.name, check.command))
+        command = _command(check)
+        timeout_s = check.timeout_s if check.timeout_s is not None else self.policy.timeout_s
+        started = time.monotonic()
+        try:
+            shell = self.sandbox.run_streaming(command, timeout_s, self._output(check.name), self.cancel)
+        except Exception as exc:
+            duration_s = time.monotonic() - started
+            result = CheckResult(check.name, False, f"{type(exc).__name__}: {exc}", check.command, ERROR, None, duration_s)
+        else:
+            duration_s = time.monotonic() - started
+            result = CheckResult(
+                name=check.name,
+                passed=shell.exit_code == 0 and not shell.timed_out,
+                output=shell.stdout + shell.stderr,
+                command=check.command,
+                status=self._status(shell),
+                exit_code=shell.exit_code,
+                duration_s=duration_s,
+                truncated=shell.truncated,
             )
-        )
-    return results
+        if not result.passed and self.policy.fail_fast and result.status != CANCELED:
+            self.cancel.set()
+        if self.cache is not None and key is not None and result.status in CACHEABLE_STATUSES:
+            self.cache.put(key, _to_cache(result))
+        self._emit(lambda events: events.check_finished(result.name, result.status, result.exit_code, duration_s))
+        return result
+
+    def _status(self, shell: ShellResult) -> str:
+        if shell.exit_code == 0 and not shell.timed_out:
+            return PASSED
+        if self.cancel.is_set():
+            return CANCELED
+        return TIMED_OUT if shell.timed_out else FAILED
+
+    def _output(self, name: str) -> OutputCallback:
+        def on_output(stream: str, text: str) -> None:
+            self._emit(lambda events: events.check_output(name, stream, text))
+
+        return on_output
+
+    def _emit(self, build: Callable[[EventFactory], EventEnvelope]) -> None:
+        if self.event_log is None:
+            return
+        # The lock keeps id order and log order the same across threads.
+        with self._lock:
+            self.event_log.append(build(self.events))
+
+
+def _command(check: Check) -> str:
+    return check.limits.wrap(check.command) if check.limits is not None else check.command
+
+
+def _to_cache(result: CheckResult) -> dict[str, Any]:
+    stored = asdict(result)
+    # The name is the caller's label, not part of what was run.
+    del stored["name"], stored["cached"]
+    return stored
+
+
+def _from_cache(check: Check, stored: Mapping[str, Any]) -> CheckResult | None:
+    try:
+        return CheckResult(name=check.name, cached=True, **stored)
+    except TypeError:
+        # Written with other fields, e.g. by an older version; run the check instead.
+        return None
+
+
+def _as_check(check: Check | str) -> Check:
+    if isinstance(check, str):
+        return Check(name=check, command=check)
+    if not isinstance(check, Check):
+        raise TypeError("check must be Check or str")
+    return check
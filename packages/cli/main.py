@@ -1,5 +1,6 @@
 import argparse
 import json
+import urllib.error
 import urllib.request
 from dataclasses import dataclass
 from typing import Iterable, Mapping
@@ -35,8 +36,21 @@ class ApiClient:
     def register_repo(self, url: str) -> Mapping[str, object]:
         return self._request("POST", "/repos", {"url": url})
 
-    def list_events(self, session_id: str) -> Mapping[str, object]:
-        return self._request("GET", f"/events/{session_id}")
+    def heartbeat(self, run_id: str) -> bool:
+        """Renew a run's lease; False once the control plane has dropped it."""
+        try:
+            self._request("POST", f"/runs/{run_id}/heartbeat")
+        except urllib.error.HTTPError as exc:
+            if exc.code == 404:
+                return False
+            raise
+        return True
+
+    def list_events(self, session_id: str, after_seq: int = 0) -> Mapping[str, object]:
+        return self._request("GET", f"/events/{session_id}?after_seq={after_seq}")
+
+    def poll_events(self, session_id: str, after_seq: int = 0, timeout_s: float = 25.0) -> Mapping[str, object]:
+        return self._request("GET", f"/events/{session_id}/poll?after_seq={after_seq}&timeout_s={timeout_s}")
 
 
 def format_events(events: Iterable[Mapping[str, object]]) -> str:
@@ -65,6 +79,17 @@ def create_session(client: ApiClient, repo_id: str) -> None:
     print(session)
 
 
+def follow_events(client: ApiClient, session_id: str, follow: bool) -> None:
+    page = client.list_events(session_id)
+    while True:
+        events = page.get("events", [])
+        if events:
+            print(format_events(events))
+        if not follow:
+            return
+        page = client.poll_events(session_id, after_seq=int(page.get("next_seq", 0)))
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(prog="bg-agent")
     sub = parser.add_subparsers(dest="command")
@@ -81,6 +106,10 @@ def build_parser() -> argparse.ArgumentParser:
     repo_parser = sub.add_parser("repo")
     repo_parser.add_argument("url")
 
+    events_parser = sub.add_parser("events")
+    events_parser.add_argument("session_id")
+    events_parser.add_argument("--follow", action="store_true")
+
     return parser
 
 
@@ -101,6 +130,9 @@ def main() -> None:
     if args.command == "repo":
         register_repo(client, args.url)
         return
+    if args.command == "events":
+        follow_events(client, args.session_id, args.follow)
+        return
 
     parser.print_help()
 
@@ -1,11 +1,13 @@
 import os
 import sys
-from dataclasses import dataclass
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Mapping
+from typing import AsyncIterator, Mapping
 
 import uvicorn
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 _SRC_ROOT = Path(__file__).resolve().parents[1]
@@ -15,7 +17,12 @@ _REPO_ROOT = Path(__file__).resolve().parents[3]
 if str(_REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(_REPO_ROOT))
 
-from main import ControlPlane, ControlPlaneState
+from dispatcher import QueueDispatcher
+from leases import DEFAULT_ORG_ID, LeasePolicy
+from main import AsyncControlPlane, ControlPlaneState
+from state_backends import AsyncBackendAdapter, PostgresBackend, SqliteBackend, StateBackend
+from storage import DbConfig
+from streaming import BatchIngest, StreamBroker, sse_stream
 
 
 @dataclass(frozen=True)
@@ -27,6 +34,12 @@ class ServerConfig:
     backlog: int = 2048
     keepalive_timeout_s: int = 5
     state_backend: str = "memory"
+    database_url: str = ""
+    db_pool_size: int = 10
+    max_active_runs: int = 2
+    max_active_per_org: int | None = None
+    max_active_per_repo: int | None = None
+    lease_ttl_s: float = 60.0
 
 
 class SessionCreateRequest(BaseModel):
@@ -36,10 +49,21 @@ class SessionCreateRequest(BaseModel):
 class RunCreateRequest(BaseModel):
     session_id: str
     prompt: str
+    priority: int = 0
 
 
 class RepoCreateRequest(BaseModel):
     url: str
+    org_id: str = DEFAULT_ORG_ID
+
+
+class RunCompleteRequest(BaseModel):
+    status: str
+
+
+def _optional_int(name: str) -> int | None:
+    value = os.getenv(name, "")
+    return int(value) if value else None
 
 
 def load_server_config() -> ServerConfig:
@@ -51,6 +75,12 @@ def load_server_config() -> ServerConfig:
         backlog=int(os.getenv("CONTROL_PLANE_BACKLOG", "2048")),
         keepalive_timeout_s=int(os.getenv("CONTROL_PLANE_KEEPALIVE_TIMEOUT", "5")),
         state_backend=os.getenv("CONTROL_PLANE_STATE_BACKEND", "memory"),
+        database_url=os.getenv("CONTROL_PLANE_DATABASE_URL", ""),
+        db_pool_size=int(os.getenv("CONTROL_PLANE_DB_POOL_SIZE", "10")),
+        max_active_runs=int(os.getenv("CONTROL_PLANE_MAX_ACTIVE_RUNS", "2")),
+        max_active_per_org=_optional_int("CONTROL_PLANE_MAX_ACTIVE_PER_ORG"),
+        max_active_per_repo=_optional_int("CONTROL_PLANE_MAX_ACTIVE_PER_REPO"),
+        lease_ttl_s=float(os.getenv("CONTROL_PLANE_LEASE_TTL_S", "60")),
     )
 
 
@@ -60,42 +90,183 @@ def validate_server_config(config: ServerConfig) -> None:
             "CONTROL_PLANE_WORKERS > 1 requires a durable shared state backend. "
             "Set CONTROL_PLANE_STATE_BACKEND to a non-memory backend before scaling workers."
         )
+    if config.state_backend not in {"memory", "postgres", "sqlite"}:
+        raise ValueError(f"unknown CONTROL_PLANE_STATE_BACKEND: {config.state_backend}")
+    if config.state_backend in {"postgres", "sqlite"} and not config.database_url:
+        raise ValueError(f"CONTROL_PLANE_STATE_BACKEND={config.state_backend} requires CONTROL_PLANE_DATABASE_URL")
+
+
+def build_lease_policy(config: ServerConfig) -> LeasePolicy:
+    return LeasePolicy(
+        max_active_runs=config.max_active_runs,
+        max_active_per_org=config.max_active_per_org,
+        max_active_per_repo=config.max_active_per_repo,
+        ttl_s=config.lease_ttl_s,
+    )
 
 
-app = FastAPI(title="Ganak Control Plane", version="0.1.0")
-app.state.control_plane = ControlPlane(state=ControlPlaneState())
-
-
-def _control_plane(request: Request) -> ControlPlane:
+def build_state_backend(config: ServerConfig) -> StateBackend:
+    if config.state_backend == "postgres":
+        backend = PostgresBackend(DbConfig(dsn=config.database_url, pool_size=config.db_pool_size))
+    elif config.state_backend == "sqlite":
+        backend = SqliteBackend(path=config.database_url, pool_size=config.db_pool_size)
+    else:
+        return ControlPlaneState()
+    backend.create_schema()
+    return backend
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Embedders attach a runner backend as app.state.runner before startup.
+    runner = getattr(app.state, "runner", None)
+    dispatcher = None
+    if runner is not None:
+        dispatcher = QueueDispatcher(app.state.control_plane, runner)
+        await dispatcher.start()
+    app.state.dispatcher = dispatcher
+    try:
+        yield
+    finally:
+        if dispatcher is not None:
+            await dispatcher.stop()
+
+
+app = FastAPI(title="Ganak Control Plane", version="0.1.0", lifespan=lifespan)
+_config = load_server_config()
+app.state.control_plane = AsyncControlPlane(
+    state=AsyncBackendAdapter(build_state_backend(_config)),
+    lease_policy=build_lease_policy(_config),
+)
+app.state.stream_broker = StreamBroker(reader=app.state.control_plane.read_events)
+app.state.control_plane.state.add_event_listener(app.state.stream_broker.notify)
+app.state.batch_ingest = BatchIngest(append=app.state.control_plane.append_stream_batch)
+
+
+def _control_plane(request: Request) -> AsyncControlPlane:
     control_plane = request.app.state.control_plane
-    if not isinstance(control_plane, ControlPlane):
-        raise TypeError("app.state.control_plane must be ControlPlane")
+    if not isinstance(control_plane, AsyncControlPlane):
+        raise TypeError("app.state.control_plane must be AsyncControlPlane")
     return control_plane
 
 
+def _stream_broker(request: Request) -> StreamBroker:
+    broker = request.app.state.stream_broker
+    if not isinstance(broker, StreamBroker):
+        raise TypeError("app.state.stream_broker must be StreamBroker")
+    return broker
+
+
+def _batch_ingest(request: Request) -> BatchIngest:
+    ingest = request.app.state.batch_ingest
+    if not isinstance(ingest, BatchIngest):
+        raise TypeError("app.state.batch_ingest must be BatchIngest")
+    return ingest
+
+
 @app.get("/health")
-def get_health(request: Request) -> dict[str, str]:
-    return _control_plane(request).health_status()
+async def get_health(request: Request) -> dict[str, str]:
+    return await _control_plane(request).health_status()
 
 
 @app.post("/sessions")
-def post_session(payload: SessionCreateRequest, request: Request) -> Mapping[str, str]:
-    return _control_plane(request).create_session(payload.repo_id)
+async def post_session(payload: SessionCreateRequest, request: Request) -> Mapping[str, str]:
+    return await _control_plane(request).create_session(payload.repo_id)
 
 
 @app.post("/runs")
-def post_run(payload: RunCreateRequest, request: Request) -> Mapping[str, str]:
-    return _control_plane(request).create_run(payload.session_id, payload.prompt)
+async def post_run(payload: RunCreateRequest, request: Request) -> Mapping[str, str]:
+    return await _control_plane(request).create_run(payload.session_id, payload.prompt, priority=payload.priority)
+
+
+@app.post("/runs/{run_id}/complete")
+async def post_run_complete(run_id: str, payload: RunCompleteRequest, request: Request) -> Mapping[str, str]:
+    await _control_plane(request).complete_run(run_id, payload.status)
+    return {"id": run_id, "status": payload.status}
+
+
+@app.post("/runs/{run_id}/heartbeat")
+async def post_run_heartbeat(run_id: str, request: Request) -> Mapping[str, object]:
+    control_plane = _control_plane(request)
+    if not await control_plane.heartbeat(run_id):
+        raise HTTPException(status_code=404, detail=f"no active lease for run: {run_id}")
+    return {"id": run_id, "lease_ttl_s": control_plane.lease_policy.ttl_s}
+
+
+@app.get("/queue/metrics")
+async def get_queue_metrics(request: Request) -> Mapping[str, float]:
+    return asdict(await _control_plane(request).queue_metrics())
 
 
 @app.post("/repos")
-def post_repo(payload: RepoCreateRequest, request: Request) -> Mapping[str, str]:
-    return _control_plane(request).create_repo(payload.url)
+async def post_repo(payload: RepoCreateRequest, request: Request) -> Mapping[str, str]:
+    return await _control_plane(request).create_repo(payload.url, org_id=payload.org_id)
+
+
+@app.post("/streams/{stream_id}/batches")
+async def post_stream_batch(
+    stream_id: str,
+    request: Request,
+    x_batch_seq: int = Header(..., ge=1),
+    x_dropped_events: int = Header(0, ge=0),
+    content_encoding: str = Header("identity"),
+    content_type: str | None = Header(None),
+) -> Mapping[str, object]:
+    ingest = _batch_ingest(request)
+    body = await request.body()
+    try:
+        acked_seq = await ingest.ingest(stream_id, x_batch_seq, body, content_encoding, x_dropped_events, content_type)
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {"stream_id": stream_id, "acked_seq": acked_seq, "codecs": list(ingest.codecs)}
 
 
 @app.get("/events/{session_id}")
-def get_events(session_id: str, request: Request) -> Mapping[str, object]:
-    return _control_plane(request).stream_events(session_id)
+async def get_events(
+    session_id: str,
+    request: Request,
+    after_seq: int = Query(0, ge=0),
+    limit: int | None = Query(None, ge=1, le=1000),
+) -> Mapping[str, object]:
+    return await _control_plane(request).stream_events(session_id, after_seq=after_seq, limit=limit)
+
+
+@app.get("/events/{session_id}/poll")
+async def poll_events(
+    session_id: str,
+    request: Request,
+    after_seq: int = Query(0, ge=0),
+    limit: int | None = Query(None, ge=1, le=1000),
+    timeout_s: float = Query(25.0, ge=0, le=60),
+) -> Mapping[str, object]:
+    try:
+        page = await _stream_broker(request).wait_for_events(session_id, after_seq, timeout_s, limit=limit)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    return {"session_id": session_id, "events": page.events, "next_seq": page.next_seq}
+
+
+@app.get("/events/{session_id}/stream")
+async def stream_events_sse(
+    session_id: str,
+    request: Request,
+    after_seq: int = Query(0, ge=0),
+    last_event_id: str | None = Header(None),
+) -> StreamingResponse:
+    cursor = after_seq
+    if last_event_id is not None:
+        if not last_event_id.isdigit():
+            raise HTTPException(status_code=400, detail="Last-Event-ID must be a sequence number")
+        cursor = int(last_event_id)
+    try:
+        subscription = _stream_broker(request).subscribe(session_id, after_seq=cursor)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    return StreamingResponse(
+        sse_stream(subscription, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 def serve() -> None:
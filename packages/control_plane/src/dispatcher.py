@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from main import AsyncControlPlane, JobSubmitter
+from runtime import log_event
+
+
+@dataclass
+class DispatchStats:
+    dispatched_total: int = 0
+    failed_total: int = 0
+    reaped_total: int = 0
+    batches: int = 0
+
+
+class QueueDispatcher:
+    """Background loop that drains the prompt queue into a runner backend.
+
+    The loop sleeps until a run is queued or completes (``notify``), then
+    claims as many runs as the lease policy allows, up to ``batch_size``,
+    and submits their jobs concurrently on a bounded executor. Every
+    ``reap_interval_s`` it also reclaims leases whose runner stopped
+    heartbeating. The idle timeout covers work made available by other
+    workers sharing the backend.
+    """
+
+    def __init__(
+        self,
+        control_plane: AsyncControlPlane,
+        runner: JobSubmitter,
+        batch_size: int = 64,
+        max_concurrent_submits: int = 32,
+        idle_timeout_s: float = 5.0,
+        reap_interval_s: float = 5.0,
+    ) -> None:
+        if not isinstance(control_plane, AsyncControlPlane):
+            raise TypeError("control_plane must be AsyncControlPlane")
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        if max_concurrent_submits < 1:
+            raise ValueError("max_concurrent_submits must be >= 1")
+        self.control_plane = control_plane
+        self.runner = runner
+        self.batch_size = batch_size
+        self.idle_timeout_s = idle_timeout_s
+        self.reap_interval_s = reap_interval_s
+        self._next_reap = 0.0
+        self.max_concurrent_submits = max_concurrent_submits
+        self.stats = DispatchStats()
+        # Created by start(): stop() shuts it down, and a restart needs a fresh one.
+        self._executor: ThreadPoolExecutor | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task[None] | None = None
+        self._lock = threading.Lock()
+        control_plane.queue_listeners.append(self.notify)
+
+    def notify(self) -> None:
+        """Wake the dispatch loop; safe to call from any thread."""
+        with self._lock:
+            loop, wakeup = self._loop, self._wakeup
+        if loop is None or wakeup is None:
+            return
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            pass
+
+    async def start(self) -> None:
+        if self._task is not None:
+            raise RuntimeError("dispatcher already started")
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_submits, thread_name_prefix="dispatch")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        with self._lock:
+            self._loop = None
+            self._wakeup = None
+        executor, self._executor = self._executor, None
+        # In-flight submits may take a while; don't block the loop on them.
+        await asyncio.to_thread(executor.shutdown, True)
+
+    async def drain_once(self) -> int:
+        """Dispatch one batch and return how many runs were submitted."""
+        executor = self._executor
+        if executor is None:
+            raise RuntimeError("dispatcher not started")
+        jobs = await self.control_plane.dispatch_runs(self.batch_size)
+        if not jobs:
+            return 0
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(executor, self.runner.submit_job, job) for job in jobs),
+            return_exceptions=True,
+        )
+        self.stats.batches += 1
+        for job, result in zip(jobs, results):
+            if isinstance(result, BaseException):
+                self.stats.failed_total += 1
+                await self.control_plane.complete_run(job.run_id, "failed", {"error": str(result)})
+            else:
+                self.stats.dispatched_total += 1
+        return len(jobs)
+
+    async def reap_if_due(self) -> int:
+        """Reap expired leases at most once per ``reap_interval_s``; returns how many were reaped."""
+        now = time.monotonic()
+        if now < self._next_reap:
+            return 0
+        self._next_reap = now + self.reap_interval_s
+        reaped = await self.control_plane.reap_expired_runs()
+        self.stats.reaped_total += len(reaped)
+        return len(reaped)
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.reap_if_due()
+                if await self.drain_once() >= self.batch_size:
+                    # A full batch means more may be waiting; go again without sleeping.
+                    continue
+            except Exception as exc:
+                log_event(f"dispatch batch failed: {exc}")
+            try:
+                async with asyncio.timeout(min(self.idle_timeout_s, self.reap_interval_s)):
+                    await self._wakeup.wait()
+            except TimeoutError:
+                pass
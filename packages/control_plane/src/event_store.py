@@ -0,0 +1,104 @@
+import threading
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+AppendListener = Callable[[str, int], None]
+
+
+@dataclass(frozen=True)
+class EventPage(Generic[T]):
+    events: list[T]
+    next_seq: int
+
+
+@dataclass
+class _RunSegment:
+    session_id: str
+    seqs: list[int] = field(default_factory=list)
+
+
+@dataclass
+class EventStore(Generic[T]):
+    """Append-only event store segmented per session and per run.
+
+    Every session owns a segment whose sequence numbers start at 1 and grow by
+    one per append, so a cursor read with ``after_seq`` is a list slice and
+    costs O(returned events) instead of a scan over every stored event.
+    """
+
+    _sessions: dict[str, list[T]] = field(default_factory=dict)
+    _runs: dict[str, _RunSegment] = field(default_factory=dict)
+    _listeners: list[AppendListener] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def append(self, session_id: str, run_id: str, event: T) -> int:
+        if not isinstance(session_id, str):
+            raise TypeError("session_id must be str")
+        if not isinstance(run_id, str):
+            raise TypeError("run_id must be str")
+        with self._lock:
+            run_segment = self._runs.get(run_id)
+            if run_segment is None:
+                run_segment = _RunSegment(session_id=session_id)
+                self._runs[run_id] = run_segment
+            elif run_segment.session_id != session_id:
+                raise ValueError(f"run {run_id} belongs to session {run_segment.session_id}")
+            segment = self._sessions.setdefault(session_id, [])
+            segment.append(event)
+            seq = len(segment)
+            run_segment.seqs.append(seq)
+        for listener in self._listeners:
+            listener(session_id, seq)
+        return seq
+
+    def last_seq(self, session_id: str) -> int:
+        if not isinstance(session_id, str):
+            raise TypeError("session_id must be str")
+        return len(self._sessions.get(session_id, ()))
+
+    def read_session(self, session_id: str, after_seq: int = 0, limit: int | None = None) -> EventPage[T]:
+        if not isinstance(session_id, str):
+            raise TypeError("session_id must be str")
+        _check_cursor(after_seq, limit)
+        segment = self._sessions.get(session_id, [])
+        end = len(segment) if limit is None else min(len(segment), after_seq + limit)
+        events = segment[after_seq:end]
+        return EventPage(events=events, next_seq=after_seq + len(events))
+
+    def read_run(self, run_id: str, after_seq: int = 0, limit: int | None = None) -> EventPage[T]:
+        """Read a run's events; cursors are the owning session's sequence numbers."""
+        if not isinstance(run_id, str):
+            raise TypeError("run_id must be str")
+        _check_cursor(after_seq, limit)
+        run_segment = self._runs.get(run_id)
+        if run_segment is None:
+            return EventPage(events=[], next_seq=after_seq)
+        start = bisect_right(run_segment.seqs, after_seq)
+        end = len(run_segment.seqs) if limit is None else min(len(run_segment.seqs), start + limit)
+        seqs = run_segment.seqs[start:end]
+        segment = self._sessions[run_segment.session_id]
+        events = [segment[seq - 1] for seq in seqs]
+        return EventPage(events=events, next_seq=seqs[-1] if seqs else after_seq)
+
+    def add_listener(self, listener: AppendListener) -> None:
+        if not callable(listener):
+            raise TypeError("listener must be callable")
+        self._listeners.append(listener)
+
+    def __len__(self) -> int:
+        return sum(len(segment) for segment in self._sessions.values())
+
+
+def _check_cursor(after_seq: int, limit: int | None) -> None:
+    if not isinstance(after_seq, int):
+        raise TypeError("after_seq must be int")
+    if after_seq < 0:
+        raise ValueError("after_seq must be >= 0")
+    if limit is not None:
+        if not isinstance(limit, int):
+            raise TypeError("limit must be int")
+        if limit < 1:
+            raise ValueError("limit must be >= 1")
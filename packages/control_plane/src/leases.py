@@ -0,0 +1,73 @@
+from collections import Counter
+from dataclasses import dataclass, field
+
+from shared_models import RunRecord
+
+DEFAULT_ORG_ID = "default"
+
+
+@dataclass(frozen=True)
+class LeasePolicy:
+    """Concurrency limits enforced through run leases in the shared state backend.
+
+    A dispatched run holds a lease until it completes or the lease expires.
+    Runners renew it with heartbeats; a crashed runner stops renewing and its
+    slot is reclaimed after ``ttl_s``. ``skip_limit`` bounds how many queued
+    runs one claim may pass over when their org or repo is at its limit.
+    """
+
+    max_active_runs: int = 2
+    max_active_per_org: int | None = None
+    max_active_per_repo: int | None = None
+    ttl_s: float = 60.0
+    skip_limit: int = 64
+
+    def __post_init__(self) -> None:
+        if self.max_active_runs < 0:
+            raise ValueError("max_active_runs must be >= 0")
+        if self.ttl_s <= 0:
+            raise ValueError("ttl_s must be > 0")
+
+
+@dataclass(frozen=True)
+class Lease:
+    run_id: str
+    org_id: str
+    repo_id: str
+    expires_at: float
+
+
+@dataclass(frozen=True)
+class RunClaim:
+    run: RunRecord
+    org_id: str
+    repo_id: str
+    lease_expires_at: float
+
+
+@dataclass
+class LeaseBudget:
+    """Active lease counts for one claim batch; seed with take() for every live lease."""
+
+    policy: LeasePolicy
+    active: int = 0
+    per_org: Counter[str] = field(default_factory=Counter)
+    per_repo: Counter[str] = field(default_factory=Counter)
+
+    def exhausted(self) -> bool:
+        return self.active >= self.policy.max_active_runs
+
+    def blocked_scope(self, org_id: str, repo_id: str) -> str | None:
+        """Return which limit blocks a run ("global", "org" or "repo"), or None if it may start."""
+        if self.exhausted():
+            return "global"
+        if self.policy.max_active_per_org is not None and self.per_org[org_id] >= self.policy.max_active_per_org:
+            return "org"
+        if self.policy.max_active_per_repo is not None and self.per_repo[repo_id] >= self.policy.max_active_per_repo:
+            return "repo"
+        return None
+
+    def take(self, org_id: str, repo_id: str) -> None:
+        self.active += 1
+        self.per_org[org_id] += 1
+        self.per_repo[repo_id] += 1
@@ -1,30 +1,32 @@
+import time
 import uuid
+import warnings
 from dataclasses import dataclass, field
-from typing import Mapping
+from typing import Callable, Mapping, Protocol, Sequence
 
-from shared_models import RunRecord, SessionRecord
+from event_store import AppendListener, EventPage, EventStore
+from leases import DEFAULT_ORG_ID, Lease, LeaseBudget, LeasePolicy, RunClaim
+from queueing import PromptQueue, QueueMetrics
+from shared_models import RunnerJob, RunRecord, SessionRecord
+from state_backends import AsyncStateBackend, StateBackend
 
-
-@dataclass
-class PromptQueue:
-    items: list[str] = field(default_factory=list)
-
-    def enqueue(self, run_id: str) -> None:
-        if not isinstance(run_id, str):
-            raise TypeError("run_id must be str")
-        self.items.append(run_id)
-
-    def dequeue(self) -> str | None:
-        if not self.items:
-            return None
-        return self.items.pop(0)
+LEASE_EXPIRED_STATUS = "lease_expired"
 
 
 @dataclass
 class ConcurrencyLimits:
+    """Deprecated: a per-process counter the control plane no longer consults.
+
+    Limits are enforced with run leases in the state backend; configure them
+    with ``LeasePolicy`` on ``ControlPlane.lease_policy``.
+    """
+
     max_active_runs: int
     active_runs: int = 0
 
+    def __post_init__(self) -> None:
+        warnings.warn("ConcurrencyLimits is deprecated; use leases.LeasePolicy", DeprecationWarning, stacklevel=3)
+
     def can_dispatch(self) -> bool:
         return self.active_runs < self.max_active_runs
 
@@ -36,13 +38,38 @@ class ConcurrencyLimits:
 
 
 @dataclass
-class ControlPlaneState:
+class ControlPlaneState(StateBackend):
+    """In-memory state backend; only valid for a single control-plane worker."""
+
+    blocking = False
+
     sessions: dict[str, SessionRecord] = field(default_factory=dict)
     runs: dict[str, RunRecord] = field(default_factory=dict)
-    events: list[Mapping[str, object]] = field(default_factory=list)
+    events: EventStore[Mapping[str, object]] = field(default_factory=EventStore)
     repos: dict[str, Mapping[str, str]] = field(default_factory=dict)
     prompt_queue: PromptQueue = field(default_factory=PromptQueue)
-    limits: ConcurrencyLimits = field(default_factory=lambda: ConcurrencyLimits(max_active_runs=2))
+    leases: dict[str, Lease] = field(default_factory=dict)
+    stream_acks: dict[str, int] = field(default_factory=dict)
+
+    def health(self) -> bool:
+        return True
+
+    def add_session(self, session: SessionRecord) -> None:
+        if not isinstance(session, SessionRecord):
+            raise TypeError("session must be SessionRecord")
+        self.sessions[session.id] = session
+
+    def get_session(self, session_id: str) -> SessionRecord:
+        if not isinstance(session_id, str):
+            raise TypeError("session_id must be str")
+        if session_id not in self.sessions:
+            raise KeyError(f"unknown session: {session_id}")
+        return self.sessions[session_id]
+
+    def add_run(self, run: RunRecord) -> None:
+        if not isinstance(run, RunRecord):
+            raise TypeError("run must be RunRecord")
+        self.runs[run.id] = run
 
     def get_run(self, run_id: str) -> RunRecord:
         if not isinstance(run_id, str):
@@ -64,65 +91,364 @@ class ControlPlaneState:
             status=new_status
         )
 
-    def mark_run_complete(self) -> None:
-        self.limits.mark_finished()
+    def add_repo(self, repo: Mapping[str, str]) -> None:
+        if not isinstance(repo, Mapping):
+            raise TypeError("repo must be a mapping")
+        self.repos[repo["id"]] = repo
+
+    def get_repo(self, repo_id: str) -> Mapping[str, str]:
+        if not isinstance(repo_id, str):
+            raise TypeError("repo_id must be str")
+        if repo_id not in self.repos:
+            raise KeyError(f"unknown repo: {repo_id}")
+        return self.repos[repo_id]
+
+    def append_events(self, events: Sequence[Mapping[str, object]]) -> list[int]:
+        seqs = []
+        for event in events:
+            if not isinstance(event, Mapping):
+                raise TypeError("event must be a mapping")
+            seqs.append(self.events.append(str(event["session_id"]), str(event["run_id"]), event))
+        return seqs
+
+    def append_stream_batch(self, stream_id: str, seq: int, events: Sequence[Mapping[str, object]]) -> int:
+        if not isinstance(stream_id, str):
+            raise TypeError("stream_id must be str")
+        if not isinstance(seq, int) or seq < 1:
+            raise ValueError("seq must be an int >= 1")
+        acked_seq = self.stream_acks.get(stream_id, 0)
+        if seq <= acked_seq:
+            return acked_seq
+        self.append_events(events)
+        self.stream_acks[stream_id] = seq
+        return seq
+
+    def read_events(self, session_id: str, after_seq: int = 0, limit: int | None = None) -> EventPage:
+        return self.events.read_session(session_id, after_seq=after_seq, limit=limit)
+
+    def enqueue_run(self, run_id: str, priority: int = 0, fairness_key: str | None = None) -> None:
+        self.prompt_queue.enqueue(run_id, priority=priority, fairness_key=fairness_key)
+
+    def dequeue_run(self) -> str | None:
+        return self.prompt_queue.dequeue()
+
+    def queue_metrics(self) -> QueueMetrics:
+        return self.prompt_queue.metrics()
+
+    def claim_runs(self, max_runs: int, policy: LeasePolicy) -> list[RunClaim]:
+        if not isinstance(max_runs, int):
+            raise TypeError("max_runs must be int")
+        if not isinstance(policy, LeasePolicy):
+            raise TypeError("policy must be LeasePolicy")
+        now = time.time()
+        budget = LeaseBudget(policy=policy)
+        for lease in self.leases.values():
+            if lease.expires_at > now:
+                budget.take(lease.org_id, lease.repo_id)
+        claims: list[RunClaim] = []
+        skipped = []
+        scanned = 0
+        while len(claims) < max_runs and scanned < max_runs + policy.skip_limit and not budget.exhausted():
+            entry = self.prompt_queue.pop_entry()
+            if entry is None:
+                break
+            scanned += 1
+            run = self.runs[entry.run_id]
+            repo_id = self.sessions[run.session_id].repo_id
+            org_id = self.repos.get(repo_id, {}).get("org_id", DEFAULT_ORG_ID)
+            if budget.blocked_scope(org_id, repo_id) is not None:
+                skipped.append(entry)
+                continue
+            budget.take(org_id, repo_id)
+            self.prompt_queue.commit(entry)
+            lease = Lease(run_id=run.id, org_id=org_id, repo_id=repo_id, expires_at=now + policy.ttl_s)
+            self.leases[run.id] = lease
+            self.update_run_status(run.id, "dispatched")
+            claims.append(
+                RunClaim(run=self.runs[run.id], org_id=org_id, repo_id=repo_id, lease_expires_at=lease.expires_at)
+            )
+        for entry in skipped:
+            self.prompt_queue.restore(entry)
+        return claims
+
+    def renew_lease(self, run_id: str, ttl_s: float) -> bool:
+        if not isinstance(run_id, str):
+            raise TypeError("run_id must be str")
+        now = time.time()
+        lease = self.leases.get(run_id)
+        if lease is None or lease.expires_at <= now:
+            return False
+        self.leases[run_id] = Lease(run_id=run_id, org_id=lease.org_id, repo_id=lease.repo_id, expires_at=now + ttl_s)
+        return True
+
+    def release_lease(self, run_id: str) -> bool:
+        if not isinstance(run_id, str):
+            raise TypeError("run_id must be str")
+        return self.leases.pop(run_id, None) is not None
+
+    def mark_run_complete(self, run_id: str) -> None:
+        """Deprecated: use ``release_lease``, or ``ControlPlane.complete_run`` to also record the status."""
+        warnings.warn("mark_run_complete is deprecated; use release_lease", DeprecationWarning, stacklevel=2)
+        self.release_lease(run_id)
+
+    def reap_expired_leases(self) -> list[str]:
+        now = time.time()
+        expired = [run_id for run_id, lease in self.leases.items() if lease.expires_at <= now]
+        for run_id in expired:
+            del self.leases[run_id]
+        return expired
+
+    def add_event_listener(self, listener: AppendListener) -> None:
+        self.events.add_listener(listener)
+
+
+class JobSubmitter(Protocol):
+    """The part of a runner backend the control plane dispatches to."""
+
+    def submit_job(self, job: RunnerJob) -> None: ...
+
 
 @dataclass
 class ControlPlane:
-    state: ControlPlaneState
+    state: StateBackend
+    lease_policy: LeasePolicy = field(default_factory=LeasePolicy)
+    runner: JobSubmitter | None = None
 
     def health_status(self) -> dict[str, str]:
-        return {"status": "ok"}
+        return {"status": "ok" if self.state.health() else "degraded"}
 
     def create_session(self, repo_id: str) -> Mapping[str, str]:
         if not isinstance(repo_id, str):
             raise TypeError("repo_id must be str")
         session_id = f"sess_{uuid.uuid4().hex}"
         session = SessionRecord(id=session_id, repo_id=repo_id, status="active")
-        self.state.sessions[session_id] = session
+        self.state.add_session(session)
         return {"id": session.id, "repo_id": session.repo_id, "status": session.status}
 
-    def create_run(self, session_id: str, prompt: str) -> Mapping[str, str]:
+    def create_run(self, session_id: str, prompt: str, priority: int = 0) -> Mapping[str, str]:
         if not isinstance(session_id, str):
             raise TypeError("session_id must be str")
         if not isinstance(prompt, str):
             raise TypeError("prompt must be str")
-        if session_id not in self.state.sessions:
-            raise KeyError(f"unknown session: {session_id}")
+        self.state.get_session(session_id)
         run_id = f"run_{uuid.uuid4().hex}"
         run = RunRecord(id=run_id, session_id=session_id, prompt=prompt, status="queued")
-        self.state.runs[run_id] = run
-        self.state.prompt_queue.enqueue(run_id)
-        self.state.events.append(self._make_event("run_queued", session_id, run_id, {"prompt": prompt}))
+        self.state.add_run(run)
+        self.state.enqueue_run(run_id, priority=priority, fairness_key=session_id)
+        self.state.append_events([self._make_event("run_queued", session_id, run_id, {"prompt": prompt})])
         return {"id": run.id, "session_id": run.session_id, "status": run.status}
 
     def process_queue(self) -> bool:
-        """Dispatch one run from the queue if concurrency limits allow."""
+        """Dispatch one run from the queue if the lease policy allows."""
+        if self.runner is None:
+            raise RuntimeError("control plane has no runner backend")
+        claims = self.state.claim_runs(1, self.lease_policy)
+        if not claims:
+            return False
+        run = claims[0].run
+        self.state.append_events([self._make_event("run_dispatched", run.session_id, run.id, {})])
+        job = _make_job(run, claims[0].repo_id)
+        try:
+            self.runner.submit_job(job)
+        except Exception as exc:
+            self.complete_run(run.id, "failed", {"error": str(exc)})
+            raise
+        return True
+
+    def heartbeat(self, run_id: str) -> bool:
+        """Renew a dispatched run's lease; False once it was released or reaped."""
+        return self.state.renew_lease(run_id, self.lease_policy.ttl_s)
+
+    def complete_run(self, run_id: str, status: str, payload: Mapping[str, object] | None = None) -> None:
+        """Record a dispatched run's terminal status and release its lease."""
+        if not isinstance(status, str):
+            raise TypeError("status must be str")
+        run = self.state.get_run(run_id)
+        self.state.release_lease(run_id)
+        self.state.update_run_status(run_id, status)
+        self.state.append_events([self._make_event("run_completed", run.session_id, run_id, {"status": status, **(payload or {})})])
+
+    def reap_expired_runs(self) -> list[str]:
+        """Fail runs whose runner stopped heartbeating, freeing their slots."""
+        expired = self.state.reap_expired_leases()
+        for run_id in expired:
+            run = self.state.get_run(run_id)
+            self.state.update_run_status(run_id, LEASE_EXPIRED_STATUS)
+            self.state.append_events(
+                [self._make_event("run_completed", run.session_id, run_id, {"status": LEASE_EXPIRED_STATUS})]
+            )
+        return expired
 
-    def create_repo(self, url: str) -> Mapping[str, str]:
+    def create_repo(self, url: str, org_id: str = DEFAULT_ORG_ID) -> Mapping[str, str]:
         if not isinstance(url, str):
             raise TypeError("url must be str")
+        if not isinstance(org_id, str):
+            raise TypeError("org_id must be str")
         repo_id = f"repo_{uuid.uuid4().hex}"
-        repo = {"id": repo_id, "url": url}
-        self.state.repos[repo_id] = repo
+        repo = {"id": repo_id, "url": url, "org_id": org_id}
+        self.state.add_repo(repo)
         return repo
 
+    def append_events(self, events: Sequence[Mapping[str, object]]) -> list[int]:
+        """Append runner-produced events to their sessions' logs."""
+        _check_runner_events(events)
+        return self.state.append_events(events)
+
+    def append_stream_batch(self, stream_id: str, seq: int, events: Sequence[Mapping[str, object]]) -> int:
+        """Append a runner stream's batch once; returns the stream's acknowledged sequence."""
+        _check_runner_events(events)
+        return self.state.append_stream_batch(stream_id, seq, events)
+
     def list_artifacts(self, run_id: str) -> list[Mapping[str, str]]:
         if not isinstance(run_id, str):
             raise TypeError("run_id must be str")
         return []
 
-    def stream_events(self, session_id: str) -> Mapping[str, object]:
+    def stream_events(self, session_id: str, after_seq: int = 0, limit: int | None = None) -> Mapping[str, object]:
+        if not isinstance(session_id, str):
+            raise TypeError("session_id must be str")
+        page = self.read_events(session_id, after_seq=after_seq, limit=limit)
+        return {"session_id": session_id, "events": page.events, "next_seq": page.next_seq}
+
+    def read_events(self, session_id: str, after_seq: int = 0, limit: int | None = None) -> EventPage:
         if not isinstance(session_id, str):
             raise TypeError("session_id must be str")
-        events = [event for event in self.state.events if event.get("session_id") == session_id]
-        return {"session_id": session_id, "events": events}
+        return self.state.read_events(session_id, after_seq=after_seq, limit=limit)
 
     def _make_event(self, event_type: str, session_id: str, run_id: str, payload: Mapping[str, object]) -> Mapping[str, object]:
-        return {
-            "id": f"evt_{uuid.uuid4().hex}",
-            "type": event_type,
-            "session_id": session_id,
-            "run_id": run_id,
-            "payload": dict(payload),
-        }
+        return _make_event(event_type, session_id, run_id, payload)
+
+
+@dataclass
+class AsyncControlPlane:
+    """ControlPlane API for the async request path."""
+
+    state: AsyncStateBackend
+    lease_policy: LeasePolicy = field(default_factory=LeasePolicy)
+    # Called after a run is queued or completes, e.g. to wake the dispatcher.
+    queue_listeners: list[Callable[[], None]] = field(default_factory=list)
+
+    async def health_status(self) -> dict[str, str]:
+        return {"status": "ok" if await self.state.health() else "degraded"}
+
+    async def create_session(self, repo_id: str) -> Mapping[str, str]:
+        if not isinstance(repo_id, str):
+            raise TypeError("repo_id must be str")
+        session = SessionRecord(id=f"sess_{uuid.uuid4().hex}", repo_id=repo_id, status="active")
+        await self.state.add_session(session)
+        return {"id": session.id, "repo_id": session.repo_id, "status": session.status}
+
+    async def create_run(self, session_id: str, prompt: str, priority: int = 0) -> Mapping[str, str]:
+        if not isinstance(session_id, str):
+            raise TypeError("session_id must be str")
+        if not isinstance(prompt, str):
+            raise TypeError("prompt must be str")
+        await self.state.get_session(session_id)
+        run = RunRecord(id=f"run_{uuid.uuid4().hex}", session_id=session_id, prompt=prompt, status="queued")
+        await self.state.add_run(run)
+        await self.state.enqueue_run(run.id, priority=priority, fairness_key=session_id)
+        await self.state.append_events([_make_event("run_queued", session_id, run.id, {"prompt": prompt})])
+        self._notify_queue()
+        return {"id": run.id, "session_id": run.session_id, "status": run.status}
+
+    async def dispatch_runs(self, max_runs: int) -> list[RunnerJob]:
+        """Claim up to ``max_runs`` queued runs the lease policy admits and return their jobs."""
+        claims = await self.state.claim_runs(max_runs, self.lease_policy)
+        if not claims:
+            return []
+        await self.state.append_events(
+            [_make_event("run_dispatched", claim.run.session_id, claim.run.id, {}) for claim in claims]
+        )
+        return [_make_job(claim.run, claim.repo_id) for claim in claims]
+
+    async def heartbeat(self, run_id: str) -> bool:
+        """Renew a dispatched run's lease; False once it was released or reaped."""
+        return await self.state.renew_lease(run_id, self.lease_policy.ttl_s)
+
+    async def complete_run(self, run_id: str, status: str, payload: Mapping[str, object] | None = None) -> None:
+        """Record a dispatched run's terminal status and release its lease."""
+        if not isinstance(status, str):
+            raise TypeError("status must be str")
+        run = await self.state.get_run(run_id)
+        await self.state.release_lease(run_id)
+        await self.state.update_run_status(run_id, status)
+        await self.state.append_events(
+            [_make_event("run_completed", run.session_id, run_id, {"status": status, **(payload or {})})]
+        )
+        self._notify_queue()
+
+    async def reap_expired_runs(self) -> list[str]:
+        """Fail runs whose runner stopped heartbeating, freeing their slots."""
+        expired = await self.state.reap_expired_leases()
+        for run_id in expired:
+            run = await self.state.get_run(run_id)
+            await self.state.update_run_status(run_id, LEASE_EXPIRED_STATUS)
+            await self.state.append_events(
+                [_make_event("run_completed", run.session_id, run_id, {"status": LEASE_EXPIRED_STATUS})]
+            )
+        if expired:
+            self._notify_queue()
+        return expired
+
+    def _notify_queue(self) -> None:
+        for listener in self.queue_listeners:
+            listener()
+
+    async def queue_metrics(self) -> QueueMetrics:
+        return await self.state.queue_metrics()
+
+    async def create_repo(self, url: str, org_id: str = DEFAULT_ORG_ID) -> Mapping[str, str]:
+        if not isinstance(url, str):
+            raise TypeError("url must be str")
+        if not isinstance(org_id, str):
+            raise TypeError("org_id must be str")
+        repo = {"id": f"repo_{uuid.uuid4().hex}", "url": url, "org_id": org_id}
+        await self.state.add_repo(repo)
+        return repo
+
+    async def append_events(self, events: Sequence[Mapping[str, object]]) -> list[int]:
+        """Append runner-produced events to their sessions' logs."""
+        _check_runner_events(events)
+        return await self.state.append_events(events)
+
+    async def append_stream_batch(self, stream_id: str, seq: int, events: Sequence[Mapping[str, object]]) -> int:
+        """Append a runner stream's batch once; returns the stream's acknowledged sequence."""
+        _check_runner_events(events)
+        return await self.state.append_stream_batch(stream_id, seq, events)
+
+    async def stream_events(self, session_id: str, after_seq: int = 0, limit: int | None = None) -> Mapping[str, object]:
+        page = await self.read_events(session_id, after_seq=after_seq, limit=limit)
+        return {"session_id": session_id, "events": page.events, "next_seq": page.next_seq}
+
+    async def read_events(self, session_id: str, after_seq: int = 0, limit: int | None = None) -> EventPage:
+        if not isinstance(session_id, str):
+            raise TypeError("session_id must be str")
+        return await self.state.read_events(session_id, after_seq=after_seq, limit=limit)
+
+
+def _check_runner_events(events: Sequence[Mapping[str, object]]) -> None:
+    for event in events:
+        if not isinstance(event, Mapping):
+            raise TypeError("event must be a mapping")
+        for key in ("type", "session_id", "run_id"):
+            if not isinstance(event.get(key), str):
+                raise TypeError(f"event {key} must be str")
+
+
+def _make_job(run: RunRecord, repo_id: str) -> RunnerJob:
+    return RunnerJob(
+        job_id=f"job_{uuid.uuid4().hex}",
+        session_id=run.session_id,
+        run_id=run.id,
+        snapshot_id=f"{repo_id}-HEAD",
+    )
+
+
+def _make_event(event_type: str, session_id: str, run_id: str, payload: Mapping[str, object]) -> Mapping[str, object]:
+    return {
+        "id": f"evt_{uuid.uuid4().hex}",
+        "type": event_type,
+        "session_id": session_id,
+        "run_id": run_id,
+        "payload": dict(payload),
+    }
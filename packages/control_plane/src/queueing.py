@@ -0,0 +1,144 @@
+import heapq
+import threading
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class QueueMetrics:
+    depth: int
+    enqueued_total: int
+    dequeued_total: int
+    avg_wait_s: float
+    max_wait_s: float
+    oldest_wait_s: float
+
+
+@dataclass(frozen=True)
+class QueuedRun:
+    run_id: str
+    priority: int
+    fairness_key: str
+    stamp: int
+    order: int
+    enqueued_at: float
+
+
+@dataclass
+class WaitStats:
+    enqueued_total: int = 0
+    dequeued_total: int = 0
+    total_wait_s: float = 0.0
+    max_wait_s: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record_enqueue(self) -> None:
+        with self._lock:
+            self.enqueued_total += 1
+
+    def record_dequeue(self, wait_s: float) -> None:
+        with self._lock:
+            self.dequeued_total += 1
+            self.total_wait_s += wait_s
+            self.max_wait_s = max(self.max_wait_s, wait_s)
+
+    def snapshot(self, depth: int, oldest_wait_s: float) -> QueueMetrics:
+        with self._lock:
+            avg = self.total_wait_s / self.dequeued_total if self.dequeued_total else 0.0
+            return QueueMetrics(
+                depth=depth,
+                enqueued_total=self.enqueued_total,
+                dequeued_total=self.dequeued_total,
+                avg_wait_s=avg,
+                max_wait_s=self.max_wait_s,
+                oldest_wait_s=oldest_wait_s,
+            )
+
+
+@dataclass
+class PromptQueue:
+    """Priority queue with start-time fair queueing across fairness keys.
+
+    Higher priorities always dispatch first. Within a priority every fairness
+    key (a session or an org) is stamped from a virtual clock: a new run gets
+    ``max(clock, key's last stamp) + 1`` and runs dispatch in stamp order, so
+    a key with 5,000 queued runs interleaves round-robin with a key that just
+    submitted one. Enqueue and dequeue are O(log n); nothing is ever moved, so
+    a run that cannot be dispatched yet keeps its place.
+    """
+
+    _heap: list[tuple[int, int, int, QueuedRun]] = field(default_factory=list)
+    _clock: dict[int, int] = field(default_factory=dict)
+    _last_stamp: dict[tuple[int, str], int] = field(default_factory=dict)
+    _enqueued_at: dict[str, float] = field(default_factory=dict)
+    _counter: int = 0
+    _stats: WaitStats = field(default_factory=WaitStats)
+
+    def enqueue(self, run_id: str, priority: int = 0, fairness_key: str | None = None) -> None:
+        if not isinstance(run_id, str):
+            raise TypeError("run_id must be str")
+        if not isinstance(priority, int):
+            raise TypeError("priority must be int")
+        if run_id in self._enqueued_at:
+            raise ValueError(f"run already queued: {run_id}")
+        key = run_id if fairness_key is None else fairness_key
+        stamp = max(self._clock.get(priority, 0), self._last_stamp.get((priority, key), 0)) + 1
+        self._last_stamp[(priority, key)] = stamp
+        self._counter += 1
+        self._push(
+            QueuedRun(
+                run_id=run_id,
+                priority=priority,
+                fairness_key=key,
+                stamp=stamp,
+                order=self._counter,
+                enqueued_at=time.monotonic(),
+            )
+        )
+        self._stats.record_enqueue()
+
+    def peek(self) -> str | None:
+        if not self._heap:
+            return None
+        return self._heap[0][3].run_id
+
+    def dequeue(self) -> str | None:
+        entry = self.pop_entry()
+        if entry is None:
+            return None
+        self.commit(entry)
+        return entry.run_id
+
+    def pop_entry(self) -> QueuedRun | None:
+        """Remove the next run without advancing the clock; follow with commit() or restore()."""
+        if not self._heap:
+            return None
+        entry = heapq.heappop(self._heap)[3]
+        del self._enqueued_at[entry.run_id]
+        return entry
+
+    def commit(self, entry: QueuedRun) -> None:
+        """Account for a popped run that was dispatched."""
+        self._clock[entry.priority] = max(self._clock.get(entry.priority, 0), entry.stamp)
+        if self._last_stamp.get((entry.priority, entry.fairness_key)) == entry.stamp:
+            # The key has nothing newer queued; the clock now covers it.
+            del self._last_stamp[(entry.priority, entry.fairness_key)]
+        self._stats.record_dequeue(time.monotonic() - entry.enqueued_at)
+
+    def restore(self, entry: QueuedRun) -> None:
+        """Put a popped run back in its original position."""
+        if entry.run_id in self._enqueued_at:
+            raise ValueError(f"run already queued: {entry.run_id}")
+        self._push(entry)
+
+    def _push(self, entry: QueuedRun) -> None:
+        heapq.heappush(self._heap, (-entry.priority, entry.stamp, entry.order, entry))
+        self._enqueued_at[entry.run_id] = entry.enqueued_at
+
+    def metrics(self) -> QueueMetrics:
+        oldest = min(self._enqueued_at.values(), default=None)
+        oldest_wait_s = 0.0 if oldest is None else time.monotonic() - oldest
+        return self._stats.snapshot(depth=len(self._heap), oldest_wait_s=oldest_wait_s)
+
+    def __len__(self) -> int:
+        return len(self._heap)
@@ -1,19 +1,844 @@
+import asyncio
+import json
+import queue
+import sqlite3
+import threading
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, Mapping, Sequence
+
+from event_store import AppendListener, EventPage
+from leases import DEFAULT_ORG_ID, LeaseBudget, LeasePolicy, RunClaim
+from queueing import QueueMetrics, WaitStats
+from shared_models import RunRecord, SessionRecord
+from storage import DbConfig
 
 
 class StateBackend(ABC):
     """Durable backend for session/run/event state."""
 
+    # Whether calls perform I/O; AsyncBackendAdapter runs blocking backends off the event loop.
+    blocking = True
+    # Upper bound on concurrent calls worth issuing, e.g. the connection pool size.
+    max_concurrency = 1
+
     @abstractmethod
     def health(self) -> bool:
         raise NotImplementedError
 
+    @abstractmethod
+    def add_session(self, session: SessionRecord) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_session(self, session_id: str) -> SessionRecord:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_run(self, run: RunRecord) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_run(self, run_id: str) -> RunRecord:
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_run_status(self, run_id: str, new_status: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_repo(self, repo: Mapping[str, str]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_repo(self, repo_id: str) -> Mapping[str, str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def append_events(self, events: Sequence[Mapping[str, object]]) -> list[int]:
+        """Append envelopes and return their per-session sequence numbers."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def append_stream_batch(self, stream_id: str, seq: int, events: Sequence[Mapping[str, object]]) -> int:
+        """Append batch ``seq`` of a runner stream unless it is at or below the stream's acknowledged sequence.
+
+        The events and the new acknowledged sequence are stored atomically, so
+        a retransmitted batch is applied once whichever worker receives it.
+        Returns the stream's acknowledged sequence.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_events(self, session_id: str, after_seq: int = 0, limit: int | None = None) -> EventPage:
+        raise NotImplementedError
+
+    @abstractmethod
+    def enqueue_run(self, run_id: str, priority: int = 0, fairness_key: str | None = None) -> None:
+        """Queue a run; higher priorities first, round-robin across fairness keys within one."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def dequeue_run(self) -> str | None:
+        raise NotImplementedError
 
-class PostgresBackend(StateBackend):
-    """Postgres backend placeholder."""
+    @abstractmethod
+    def queue_metrics(self) -> QueueMetrics:
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim_runs(self, max_runs: int, policy: LeasePolicy) -> list[RunClaim]:
+        """Atomically dequeue up to ``max_runs`` runs the policy admits, lease them and mark them dispatched.
+
+        Runs blocked only by their org or repo limit keep their queue position.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def renew_lease(self, run_id: str, ttl_s: float) -> bool:
+        """Extend a live lease; False if the run no longer holds one."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def release_lease(self, run_id: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def reap_expired_leases(self) -> list[str]:
+        """Drop expired leases and return their run ids."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_event_listener(self, listener: AppendListener) -> None:
+        """Register a callback for events appended through this backend instance."""
+        raise NotImplementedError
+
+
+class AsyncStateBackend(ABC):
+    """Async counterpart of StateBackend used by the async request path."""
+
+    @abstractmethod
+    async def health(self) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def add_session(self, session: SessionRecord) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_session(self, session_id: str) -> SessionRecord:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def add_run(self, run: RunRecord) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_run(self, run_id: str) -> RunRecord:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_run_status(self, run_id: str, new_status: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def add_repo(self, repo: Mapping[str, str]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_repo(self, repo_id: str) -> Mapping[str, str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def append_events(self, events: Sequence[Mapping[str, object]]) -> list[int]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def append_stream_batch(self, stream_id: str, seq: int, events: Sequence[Mapping[str, object]]) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def read_events(self, session_id: str, after_seq: int = 0, limit: int | None = None) -> EventPage:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def enqueue_run(self, run_id: str, priority: int = 0, fairness_key: str | None = None) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def dequeue_run(self) -> str | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def queue_metrics(self) -> QueueMetrics:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def claim_runs(self, max_runs: int, policy: LeasePolicy) -> list[RunClaim]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def renew_lease(self, run_id: str, ttl_s: float) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def release_lease(self, run_id: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def reap_expired_leases(self) -> list[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_event_listener(self, listener: AppendListener) -> None:
+        raise NotImplementedError
+
+
+class AsyncBackendAdapter(AsyncStateBackend):
+    """Exposes a StateBackend through the async interface.
+
+    Non-blocking backends are called inline. Blocking ones run on a private
+    executor sized to ``backend.max_concurrency``, so at most that many
+    requests hold a thread (and a pooled connection) at once; every other
+    request, including idle stream subscribers, just awaits on the loop.
+    """
+
+    def __init__(self, backend: StateBackend) -> None:
+        if not isinstance(backend, StateBackend):
+            raise TypeError("backend must be StateBackend")
+        self.backend = backend
+        self._executor = (
+            ThreadPoolExecutor(max_workers=backend.max_concurrency, thread_name_prefix="state-backend")
+            if backend.blocking
+            else None
+        )
+
+    async def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._executor is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def health(self) -> bool:
+        return await self._call(self.backend.health)
+
+    async def add_session(self, session: SessionRecord) -> None:
+        await self._call(self.backend.add_session, session)
+
+    async def get_session(self, session_id: str) -> SessionRecord:
+        return await self._call(self.backend.get_session, session_id)
+
+    async def add_run(self, run: RunRecord) -> None:
+        await self._call(self.backend.add_run, run)
+
+    async def get_run(self, run_id: str) -> RunRecord:
+        return await self._call(self.backend.get_run, run_id)
+
+    async def update_run_status(self, run_id: str, new_status: str) -> None:
+        await self._call(self.backend.update_run_status, run_id, new_status)
+
+    async def add_repo(self, repo: Mapping[str, str]) -> None:
+        await self._call(self.backend.add_repo, repo)
+
+    async def get_repo(self, repo_id: str) -> Mapping[str, str]:
+        return await self._call(self.backend.get_repo, repo_id)
+
+    async def append_events(self, events: Sequence[Mapping[str, object]]) -> list[int]:
+        return await self._call(self.backend.append_events, events)
+
+    async def append_stream_batch(self, stream_id: str, seq: int, events: Sequence[Mapping[str, object]]) -> int:
+        return await self._call(self.backend.append_stream_batch, stream_id, seq, events)
+
+    async def read_events(self, session_id: str, after_seq: int = 0, limit: int | None = None) -> EventPage:
+        return await self._call(self.backend.read_events, session_id, after_seq, limit)
+
+    async def enqueue_run(self, run_id: str, priority: int = 0, fairness_key: str | None = None) -> None:
+        await self._call(self.backend.enqueue_run, run_id, priority, fairness_key)
+
+    async def dequeue_run(self) -> str | None:
+        return await self._call(self.backend.dequeue_run)
+
+    async def queue_metrics(self) -> QueueMetrics:
+        return await self._call(self.backend.queue_metrics)
+
+    async def claim_runs(self, max_runs: int, policy: LeasePolicy) -> list[RunClaim]:
+        return await self._call(self.backend.claim_runs, max_runs, policy)
+
+    async def renew_lease(self, run_id: str, ttl_s: float) -> bool:
+        return await self._call(self.backend.renew_lease, run_id, ttl_s)
+
+    async def release_lease(self, run_id: str) -> bool:
+        return await self._call(self.backend.release_lease, run_id)
+
+    async def reap_expired_leases(self) -> list[str]:
+        return await self._call(self.backend.reap_expired_leases)
+
+    def add_event_listener(self, listener: AppendListener) -> None:
+        self.backend.add_event_listener(listener)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+@dataclass(frozen=True)
+class SqlDialect:
+    name: str
+    placeholder: str
+    json_type: str
+    json_param: str
+    serial_pk: str
+    skip_locked: str
+    greatest: str
+    prepare: bool
+
+
+POSTGRES_DIALECT = SqlDialect(
+    name="postgres",
+    placeholder="%s",
+    json_type="JSONB",
+    json_param="?::jsonb",
+    serial_pk="BIGSERIAL PRIMARY KEY",
+    skip_locked=" FOR UPDATE SKIP LOCKED",
+    greatest="GREATEST",
+    prepare=True,
+)
+
+SQLITE_DIALECT = SqlDialect(
+    name="sqlite",
+    placeholder="?",
+    json_type="TEXT",
+    json_param="?",
+    serial_pk="INTEGER PRIMARY KEY AUTOINCREMENT",
+    skip_locked="",
+    greatest="MAX",
+    prepare=False,
+)
+
+
+class ConnectionPool:
+    """Bounded DB-API connection pool.
+
+    Connections are opened lazily up to ``max_size``; callers beyond that wait
+    up to ``timeout_s`` for a connection to be returned. Connections released
+    as broken are closed instead of being handed to the next caller.
+    """
+
+    def __init__(self, connect: Callable[[], Any], max_size: int, timeout_s: float) -> None:
+        if max_size < 1:
+            raise ValueError("max_size must be >= 1")
+        self._connect = connect
+        self._max_size = max_size
+        self._timeout_s = timeout_s
+        self._idle: queue.LifoQueue[Any] = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Any:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self._max_size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self._connect()
+            except BaseException:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self._timeout_s)
+        except queue.Empty:
+            raise TimeoutError(f"no database connection available within {self._timeout_s}s") from None
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    def release(self, conn: Any, broken: bool = False) -> None:
+        if broken:
+            self._discard(conn)
+        else:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+    def _discard(self, conn: Any) -> None:
+        with self._lock:
+            self._opened -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class SqlStateBackend(StateBackend):
+    """StateBackend over any DB-API driver described by a SqlDialect.
+
+    Event appends are grouped per session: one ``UPDATE ... RETURNING`` on the
+    session row reserves a contiguous block of sequence numbers (and serializes
+    concurrent writers of that session across workers), then the envelopes go
+    out as multi-row INSERTs of up to ``insert_batch_size`` rows.
+
+    A runner stream's acknowledged batch sequence lives in ``stream_acks`` and
+    is advanced in the transaction that appends the batch's events.
+
+    Run claims take the single ``lease_lock`` row first, so claimers on every
+    worker serialize and the active-lease counts they check stay exact.
+    """
+
+    insert_batch_size = 500
+
+    def __init__(self, pool: ConnectionPool, dialect: SqlDialect) -> None:
+        self.max_concurrency = pool.max_size
+        self._pool = pool
+        self._dialect = dialect
+        self._statements: dict[str, str] = {}
+        self._listeners: list[AppendListener] = []
+        self._queue_stats = WaitStats()
+
+    def create_schema(self) -> None:
+        d = self._dialect
+        statements = [
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, repo_id TEXT NOT NULL, status TEXT NOT NULL, last_seq BIGINT NOT NULL DEFAULT 0)",
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "id TEXT PRIMARY KEY, session_id TEXT NOT NULL, prompt TEXT NOT NULL, status TEXT NOT NULL)",
+            "CREATE TABLE IF NOT EXISTS repos ("
+            f"id TEXT PRIMARY KEY, url TEXT NOT NULL, org_id TEXT NOT NULL DEFAULT '{DEFAULT_ORG_ID}')",
+            "CREATE TABLE IF NOT EXISTS events ("
+            "session_id TEXT NOT NULL, seq BIGINT NOT NULL, run_id TEXT NOT NULL, id TEXT NOT NULL, "
+            f"ts TEXT, type TEXT NOT NULL, payload {d.json_type} NOT NULL, PRIMARY KEY (session_id, seq))",
+            "CREATE INDEX IF NOT EXISTS events_run_idx ON events (run_id, seq)",
+            f"CREATE TABLE IF NOT EXISTS prompt_queue (position {d.serial_pk}, run_id TEXT NOT NULL UNIQUE, "
+            "priority INTEGER NOT NULL DEFAULT 0, fairness_key TEXT NOT NULL, vtime BIGINT NOT NULL, "
+            "enqueued_at DOUBLE PRECISION NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS prompt_queue_order_idx ON prompt_queue (priority DESC, vtime, position)",
+            "CREATE INDEX IF NOT EXISTS prompt_queue_key_idx ON prompt_queue (priority, fairness_key, vtime)",
+            "CREATE TABLE IF NOT EXISTS queue_clock (priority INTEGER PRIMARY KEY, vtime BIGINT NOT NULL)",
+            "CREATE TABLE IF NOT EXISTS run_leases ("
+            "run_id TEXT PRIMARY KEY, org_id TEXT NOT NULL, repo_id TEXT NOT NULL, "
+            "expires_at DOUBLE PRECISION NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS run_leases_expiry_idx ON run_leases (expires_at)",
+            "CREATE TABLE IF NOT EXISTS lease_lock (id INTEGER PRIMARY KEY, version BIGINT NOT NULL)",
+            "INSERT INTO lease_lock (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING",
+            "CREATE TABLE IF NOT EXISTS stream_acks (stream_id TEXT PRIMARY KEY, acked_seq BIGINT NOT NULL)",
+        ]
+        with self._transaction() as cur:
+            for statement in statements:
+                cur.execute(statement)
+
+    def close(self) -> None:
+        self._pool.close()
 
     def health(self) -> bool:
-        return False
+        try:
+            with self._transaction() as cur:
+                self._execute(cur, "SELECT 1")
+                return cur.fetchone() is not None
+        except Exception:
+            return False
+
+    def add_session(self, session: SessionRecord) -> None:
+        if not isinstance(session, SessionRecord):
+            raise TypeError("session must be SessionRecord")
+        with self._transaction() as cur:
+            self._execute(
+                cur,
+                "INSERT INTO sessions (id, repo_id, status) VALUES (?, ?, ?)",
+                (session.id, session.repo_id, session.status),
+            )
+
+    def get_session(self, session_id: str) -> SessionRecord:
+        if not isinstance(session_id, str):
+            raise TypeError("session_id must be str")
+        with self._transaction() as cur:
+            self._execute(cur, "SELECT id, repo_id, status FROM sessions WHERE id = ?", (session_id,))
+            row = cur.fetchone()
+        if row is None:
+            raise KeyError(f"unknown session: {session_id}")
+        return SessionRecord(id=row[0], repo_id=row[1], status=row[2])
+
+    def add_run(self, run: RunRecord) -> None:
+        if not isinstance(run, RunRecord):
+            raise TypeError("run must be RunRecord")
+        with self._transaction() as cur:
+            self._execute(
+                cur,
+                "INSERT INTO runs (id, session_id, prompt, status) VALUES (?, ?, ?, ?)",
+                (run.id, run.session_id, run.prompt, run.status),
+            )
+
+    def get_run(self, run_id: str) -> RunRecord:
+        if not isinstance(run_id, str):
+            raise TypeError("run_id must be str")
+        with self._transaction() as cur:
+            self._execute(cur, "SELECT id, session_id, prompt, status FROM runs WHERE id = ?", (run_id,))
+            row = cur.fetchone()
+        if row is None:
+            raise KeyError(f"unknown run: {run_id}")
+        return RunRecord(id=row[0], session_id=row[1], prompt=row[2], status=row[3])
+
+    def update_run_status(self, run_id: str, new_status: str) -> None:
+        if not isinstance(run_id, str):
+            raise TypeError("run_id must be str")
+        if not isinstance(new_status, str):
+            raise TypeError("new_status must be str")
+        with self._transaction() as cur:
+            self._execute(cur, "UPDATE runs SET status = ? WHERE id = ?", (new_status, run_id))
+            if cur.rowcount == 0:
+                raise KeyError(f"unknown run: {run_id}")
+
+    def add_repo(self, repo: Mapping[str, str]) -> None:
+        if not isinstance(repo, Mapping):
+            raise TypeError("repo must be a mapping")
+        with self._transaction() as cur:
+            self._execute(
+                cur,
+                "INSERT INTO repos (id, url, org_id) VALUES (?, ?, ?)",
+                (repo["id"], repo["url"], repo.get("org_id", DEFAULT_ORG_ID)),
+            )
+
+    def get_repo(self, repo_id: str) -> Mapping[str, str]:
+        if not isinstance(repo_id, str):
+            raise TypeError("repo_id must be str")
+        with self._transaction() as cur:
+            self._execute(cur, "SELECT id, url, org_id FROM repos WHERE id = ?", (repo_id,))
+            row = cur.fetchone()
+        if row is None:
+            raise KeyError(f"unknown repo: {repo_id}")
+        return {"id": row[0], "url": row[1], "org_id": row[2]}
+
+    def append_events(self, events: Sequence[Mapping[str, object]]) -> list[int]:
+        with self._transaction() as cur:
+            seqs, by_session = self._append_rows(cur, events)
+        self._notify(seqs, by_session)
+        return seqs
+
+    def append_stream_batch(self, stream_id: str, seq: int, events: Sequence[Mapping[str, object]]) -> int:
+        if not isinstance(stream_id, str):
+            raise TypeError("stream_id must be str")
+        if not isinstance(seq, int) or seq < 1:
+            raise ValueError("seq must be an int >= 1")
+        with self._transaction() as cur:
+            self._execute(
+                cur,
+                "INSERT INTO stream_acks (stream_id, acked_seq) VALUES (?, 0) ON CONFLICT (stream_id) DO NOTHING",
+                (stream_id,),
+            )
+            # The row lock taken here orders concurrent deliveries of the stream across workers.
+            self._execute(
+                cur,
+                "UPDATE stream_acks SET acked_seq = ? WHERE stream_id = ? AND acked_seq < ? RETURNING acked_seq",
+                (seq, stream_id, seq),
+            )
+            if cur.fetchone() is None:
+                self._execute(cur, "SELECT acked_seq FROM stream_acks WHERE stream_id = ?", (stream_id,))
+                return int(cur.fetchone()[0])
+            seqs, by_session = self._append_rows(cur, events)
+        self._notify(seqs, by_session)
+        return seq
+
+    def _append_rows(self, cur: Any, events: Sequence[Mapping[str, object]]) -> tuple[list[int], dict[str, list[int]]]:
+        by_session: dict[str, list[int]] = {}
+        for index, event in enumerate(events):
+            if not isinstance(event, Mapping):
+                raise TypeError("event must be a mapping")
+            by_session.setdefault(str(event["session_id"]), []).append(index)
+        seqs = [0] * len(events)
+        for session_id, indexes in by_session.items():
+            self._execute(
+                cur,
+                "UPDATE sessions SET last_seq = last_seq + ? WHERE id = ? RETURNING last_seq",
+                (len(indexes), session_id),
+            )
+            row = cur.fetchone()
+            if row is None:
+                raise KeyError(f"unknown session: {session_id}")
+            first_seq = int(row[0]) - len(indexes) + 1
+            rows = []
+            for offset, index in enumerate(indexes):
+                event = events[index]
+                seqs[index] = first_seq + offset
+                rows.append(
+                    (
+                        session_id,
+                        first_seq + offset,
+                        event["run_id"],
+                        event["id"],
+                        event.get("ts"),
+                        event["type"],
+                        json.dumps(event["payload"], separators=(",", ":")),
+                    )
+                )
+            for start in range(0, len(rows), self.insert_batch_size):
+                self._insert_event_rows(cur, rows[start : start + self.insert_batch_size])
+        return seqs, by_session
+
+    def _notify(self, seqs: list[int], by_session: Mapping[str, list[int]]) -> None:
+        for session_id, indexes in by_session.items():
+            for listener in self._listeners:
+                listener(session_id, seqs[indexes[-1]])
+
+    def read_events(self, session_id: str, after_seq: int = 0, limit: int | None = None) -> EventPage:
+        if not isinstance(session_id, str):
+            raise TypeError("session_id must be str")
+        if not isinstance(after_seq, int) or after_seq < 0:
+            raise ValueError("after_seq must be an int >= 0")
+        if limit is not None and (not isinstance(limit, int) or limit < 1):
+            raise ValueError("limit must be an int >= 1")
+        sql = (
+            "SELECT seq, id, ts, type, run_id, payload FROM events "
+            "WHERE session_id = ? AND seq > ? ORDER BY seq"
+        )
+        params: tuple[object, ...] = (session_id, after_seq)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params += (limit,)
+        with self._transaction() as cur:
+            self._execute(cur, sql, params)
+            rows = cur.fetchall()
+        events = []
+        for seq, event_id, ts, event_type, run_id, payload in rows:
+            event: dict[str, object] = {"id": event_id, "type": event_type, "session_id": session_id, "run_id": run_id}
+            if ts is not None:
+                event["ts"] = ts
+            event["payload"] = json.loads(payload) if isinstance(payload, (str, bytes)) else payload
+            events.append(event)
+        return EventPage(events=events, next_seq=int(rows[-1][0]) if rows else after_seq)
+
+    def enqueue_run(self, run_id: str, priority: int = 0, fairness_key: str | None = None) -> None:
+        if not isinstance(run_id, str):
+            raise TypeError("run_id must be str")
+        if not isinstance(priority, int):
+            raise TypeError("priority must be int")
+        key = run_id if fairness_key is None else fairness_key
+        # Same start-time fair stamping as PromptQueue, computed in SQL.
+        sql = (
+            "INSERT INTO prompt_queue (run_id, priority, fairness_key, vtime, enqueued_at) VALUES (?, ?, ?, "
+            f"1 + {self._dialect.greatest}("
+            "COALESCE((SELECT vtime FROM queue_clock WHERE priority = ?), 0), "
+            "COALESCE((SELECT MAX(vtime) FROM prompt_queue WHERE priority = ? AND fairness_key = ?), 0)"
+            "), ?)"
+        )
+        with self._transaction() as cur:
+            self._execute(cur, sql, (run_id, priority, key, priority, priority, key, time.time()))
+        self._queue_stats.record_enqueue()
+
+    def dequeue_run(self) -> str | None:
+        sql = (
+            "DELETE FROM prompt_queue WHERE position = ("
+            "SELECT position FROM prompt_queue ORDER BY priority DESC, vtime, position "
+            f"LIMIT 1{self._dialect.skip_locked}"
+            ") RETURNING run_id, priority, vtime, enqueued_at"
+        )
+        with self._transaction() as cur:
+            self._execute(cur, sql)
+            row = cur.fetchone()
+            if row is None:
+                return None
+            run_id, priority, vtime, enqueued_at = row
+            self._execute(
+                cur,
+                "INSERT INTO queue_clock (priority, vtime) VALUES (?, ?) ON CONFLICT (priority) "
+                f"DO UPDATE SET vtime = {self._dialect.greatest}(queue_clock.vtime, excluded.vtime)",
+                (priority, vtime),
+            )
+        self._queue_stats.record_dequeue(max(0.0, time.time() - float(enqueued_at)))
+        return run_id
+
+    def queue_metrics(self) -> QueueMetrics:
+        """Depth and oldest wait are global; totals and wait stats cover this process."""
+        with self._transaction() as cur:
+            self._execute(cur, "SELECT COUNT(*), MIN(enqueued_at) FROM prompt_queue")
+            depth, oldest = cur.fetchone()
+        oldest_wait_s = 0.0 if oldest is None else max(0.0, time.time() - float(oldest))
+        return self._queue_stats.snapshot(depth=int(depth), oldest_wait_s=oldest_wait_s)
+
+    def claim_runs(self, max_runs: int, policy: LeasePolicy) -> list[RunClaim]:
+        if not isinstance(max_runs, int):
+            raise TypeError("max_runs must be int")
+        if not isinstance(policy, LeasePolicy):
+            raise TypeError("policy must be LeasePolicy")
+        if max_runs < 1:
+            return []
+        now = time.time()
+        claims: list[RunClaim] = []
+        waits: list[float] = []
+        with self._transaction() as cur:
+            self._execute(cur, "UPDATE lease_lock SET version = version + 1 WHERE id = 1")
+            self._execute(cur, "SELECT org_id, repo_id FROM run_leases WHERE expires_at > ?", (now,))
+            budget = LeaseBudget(policy=policy)
+            for org_id, repo_id in cur.fetchall():
+                budget.take(org_id, repo_id)
+            if budget.exhausted():
+                return []
+            self._execute(
+                cur,
+                "SELECT q.position, q.run_id, q.priority, q.vtime, q.enqueued_at, s.repo_id, COALESCE(r.org_id, ?) "
+                "FROM prompt_queue q JOIN runs u ON u.id = q.run_id JOIN sessions s ON s.id = u.session_id "
+                "LEFT JOIN repos r ON r.id = s.repo_id ORDER BY q.priority DESC, q.vtime, q.position LIMIT ?",
+                (DEFAULT_ORG_ID, max_runs + policy.skip_limit),
+            )
+            candidates = cur.fetchall()
+            expires_at = now + policy.ttl_s
+            clock: dict[int, int] = {}
+            for position, run_id, priority, vtime, enqueued_at, repo_id, org_id in candidates:
+                if len(claims) >= max_runs:
+                    break
+                scope = budget.blocked_scope(org_id, repo_id)
+                if scope == "global":
+                    break
+                if scope is not None:
+                    continue
+                self._execute(cur, "DELETE FROM prompt_queue WHERE position = ?", (position,))
+                if cur.rowcount == 0:
+                    # A concurrent dequeue_run took it after the SELECT.
+                    continue
+                budget.take(org_id, repo_id)
+                self._execute(
+                    cur,
+                    "INSERT INTO run_leases (run_id, org_id, repo_id, expires_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (run_id) DO UPDATE SET org_id = excluded.org_id, repo_id = excluded.repo_id, "
+                    "expires_at = excluded.expires_at",
+                    (run_id, org_id, repo_id, expires_at),
+                )
+                self._execute(
+                    cur,
+                    "UPDATE runs SET status = 'dispatched' WHERE id = ? RETURNING id, session_id, prompt, status",
+                    (run_id,),
+                )
+                row = cur.fetchone()
+                run = RunRecord(id=row[0], session_id=row[1], prompt=row[2], status=row[3])
+                claims.append(RunClaim(run=run, org_id=org_id, repo_id=repo_id, lease_expires_at=expires_at))
+                waits.append(max(0.0, now - float(enqueued_at)))
+                clock[priority] = max(clock.get(priority, 0), int(vtime))
+            for priority, vtime in clock.items():
+                self._execute(
+                    cur,
+                    "INSERT INTO queue_clock (priority, vtime) VALUES (?, ?) ON CONFLICT (priority) "
+                    f"DO UPDATE SET vtime = {self._dialect.greatest}(queue_clock.vtime, excluded.vtime)",
+                    (priority, vtime),
+                )
+        for wait_s in waits:
+            self._queue_stats.record_dequeue(wait_s)
+        return claims
+
+    def renew_lease(self, run_id: str, ttl_s: float) -> bool:
+        if not isinstance(run_id, str):
+            raise TypeError("run_id must be str")
+        now = time.time()
+        with self._transaction() as cur:
+            self._execute(
+                cur,
+                "UPDATE run_leases SET expires_at = ? WHERE run_id = ? AND expires_at > ?",
+                (now + ttl_s, run_id, now),
+            )
+            return cur.rowcount == 1
+
+    def release_lease(self, run_id: str) -> bool:
+        if not isinstance(run_id, str):
+            raise TypeError("run_id must be str")
+        with self._transaction() as cur:
+            self._execute(cur, "DELETE FROM run_leases WHERE run_id = ?", (run_id,))
+            return cur.rowcount == 1
+
+    def reap_expired_leases(self) -> list[str]:
+        with self._transaction() as cur:
+            self._execute(cur, "DELETE FROM run_leases WHERE expires_at <= ? RETURNING run_id", (time.time(),))
+            return [row[0] for row in cur.fetchall()]
+
+    def add_event_listener(self, listener: AppendListener) -> None:
+        if not callable(listener):
+            raise TypeError("listener must be callable")
+        self._listeners.append(listener)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[Any]:
+        conn = self._pool.acquire()
+        broken = True
+        try:
+            cur = conn.cursor()
+            try:
+                yield cur
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                # Rollback succeeded, so the connection is reusable.
+                broken = False
+                raise
+            finally:
+                cur.close()
+            broken = False
+        finally:
+            self._pool.release(conn, broken=broken)
+
+    def _execute(self, cur: Any, sql: str, params: Sequence[object] = ()) -> None:
+        statement = self._statements.get(sql)
+        if statement is None:
+            statement = sql.replace("?", self._dialect.placeholder)
+            self._statements[sql] = statement
+        if self._dialect.prepare:
+            cur.execute(statement, params, prepare=True)
+        else:
+            cur.execute(statement, params)
+
+    def _insert_event_rows(self, cur: Any, rows: list[tuple[object, ...]]) -> None:
+        # Multi-row statements are keyed by row count, so a steady batch size
+        # reuses one prepared statement.
+        row_sql = f"(?, ?, ?, ?, ?, ?, {self._dialect.json_param})"
+        sql = "INSERT INTO events (session_id, seq, run_id, id, ts, type, payload) VALUES " + ", ".join(
+            [row_sql] * len(rows)
+        )
+        self._execute(cur, sql, [value for row in rows for value in row])
+
+
+class PostgresBackend(SqlStateBackend):
+    """Postgres backend using psycopg 3 with a bounded connection pool."""
+
+    def __init__(self, config: DbConfig) -> None:
+        if not isinstance(config, DbConfig):
+            raise TypeError("config must be DbConfig")
+        try:
+            import psycopg
+        except ImportError as exc:
+            raise RuntimeError("PostgresBackend requires psycopg (pip install 'psycopg[binary]')") from exc
+        pool = ConnectionPool(
+            connect=lambda: psycopg.connect(config.dsn),
+            max_size=config.pool_size,
+            timeout_s=config.pool_timeout_s,
+        )
+        super().__init__(pool, POSTGRES_DIALECT)
+
+
+class SqliteBackend(SqlStateBackend):
+    """SQLite stand-in for the Postgres backend, used for local runs and unit tests."""
+
+    def __init__(self, path: str = ":memory:", pool_size: int = 4) -> None:
+        if not isinstance(path, str):
+            raise TypeError("path must be str")
+        # Every connection to ":memory:" opens a separate database.
+        size = 1 if path == ":memory:" else pool_size
+
+        def connect() -> sqlite3.Connection:
+            conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+            if path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+            return conn
+
+        super().__init__(ConnectionPool(connect=connect, max_size=size, timeout_s=30.0), SQLITE_DIALECT)
 
 
 class CloudflareDoBackend(StateBackend):
@@ -21,3 +846,57 @@ class CloudflareDoBackend(StateBackend):
 
     def health(self) -> bool:
         return False
+
+    def add_session(self, session: SessionRecord) -> None:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def get_session(self, session_id: str) -> SessionRecord:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def add_run(self, run: RunRecord) -> None:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def get_run(self, run_id: str) -> RunRecord:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def update_run_status(self, run_id: str, new_status: str) -> None:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def add_repo(self, repo: Mapping[str, str]) -> None:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def get_repo(self, repo_id: str) -> Mapping[str, str]:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def append_events(self, events: Sequence[Mapping[str, object]]) -> list[int]:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def append_stream_batch(self, stream_id: str, seq: int, events: Sequence[Mapping[str, object]]) -> int:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def read_events(self, session_id: str, after_seq: int = 0, limit: int | None = None) -> EventPage:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def enqueue_run(self, run_id: str, priority: int = 0, fairness_key: str | None = None) -> None:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def dequeue_run(self) -> str | None:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def queue_metrics(self) -> QueueMetrics:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def claim_runs(self, max_runs: int, policy: LeasePolicy) -> list[RunClaim]:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def renew_lease(self, run_id: str, ttl_s: float) -> bool:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def release_lease(self, run_id: str) -> bool:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def reap_expired_leases(self) -> list[str]:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
+
+    def add_event_listener(self, listener: AppendListener) -> None:
+        raise NotImplementedError("Cloudflare Durable Objects backend not implemented")
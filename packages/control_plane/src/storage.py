@@ -1,10 +1,14 @@
 from dataclasses import dataclass, field
 from typing import Mapping
 
+from event_store import EventStore
+
 
 @dataclass(frozen=True)
 class DbConfig:
     dsn: str
+    pool_size: int = 10
+    pool_timeout_s: float = 5.0
 
 
 @dataclass(frozen=True)
@@ -75,17 +79,22 @@ class RunRepository:
 
 @dataclass
 class EventRepository:
-    _store: list[EventModel] = field(default_factory=list)
+    _store: EventStore[EventModel] = field(default_factory=EventStore)
 
-    def add(self, event: EventModel) -> None:
+    def add(self, event: EventModel) -> int:
         if not isinstance(event, EventModel):
             raise TypeError("event must be EventModel")
-        self._store.append(event)
+        return self._store.append(event.session_id, event.run_id, event)
 
-    def list_for_session(self, session_id: str) -> list[EventModel]:
+    def list_for_session(self, session_id: str, after_seq: int = 0, limit: int | None = None) -> list[EventModel]:
         if not isinstance(session_id, str):
             raise TypeError("session_id must be str")
-        return [event for event in self._store if event.session_id == session_id]
+        return self._store.read_session(session_id, after_seq=after_seq, limit=limit).events
+
+    def list_for_run(self, run_id: str, after_seq: int = 0, limit: int | None = None) -> list[EventModel]:
+        if not isinstance(run_id, str):
+            raise TypeError("run_id must be str")
+        return self._store.read_run(run_id, after_seq=after_seq, limit=limit).events
 
 
 @dataclass
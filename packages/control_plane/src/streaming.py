@@ -0,0 +1,262 @@
+import asyncio
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Mapping, Sequence
+
+from event_codecs import SUPPORTED_CODECS, codec_for_content_type
+from event_store import EventPage
+
+EventReader = Callable[[str, int, int], Awaitable[EventPage]]
+
+
+@dataclass(eq=False)
+class _Waiter:
+    loop: asyncio.AbstractEventLoop
+    wakeup: asyncio.Event
+
+    def wake(self) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+        except RuntimeError:
+            # The subscriber's loop has already shut down.
+            pass
+
+
+@dataclass
+class StreamBroker:
+    """Fans appended session events out to streaming subscribers.
+
+    Subscribers never receive pushed copies of events. They are woken when
+    their session grows and then read at most ``max_buffer`` events from the
+    store past their own cursor, so a slow consumer only ever holds one
+    bounded batch and simply falls behind on the durable log.
+    """
+
+    reader: EventReader
+    max_buffer: int = 256
+    max_subscribers: int = 10_000
+    poll_interval_s: float = 1.0
+    _waiters: dict[str, set[_Waiter]] = field(default_factory=dict)
+    _subscribers: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def notify(self, session_id: str, seq: int) -> None:
+        """Wake every subscriber of a session; safe to call from any thread."""
+        if not isinstance(session_id, str):
+            raise TypeError("session_id must be str")
+        with self._lock:
+            waiters = list(self._waiters.get(session_id, ()))
+        for waiter in waiters:
+            waiter.wake()
+
+    def subscribe(self, session_id: str, after_seq: int = 0, max_buffer: int | None = None) -> "Subscription":
+        if not isinstance(session_id, str):
+            raise TypeError("session_id must be str")
+        if not isinstance(after_seq, int) or after_seq < 0:
+            raise ValueError("after_seq must be an int >= 0")
+        buffer_size = self.max_buffer if max_buffer is None else min(max_buffer, self.max_buffer)
+        if buffer_size < 1:
+            raise ValueError("max_buffer must be >= 1")
+        with self._lock:
+            if self._subscribers >= self.max_subscribers:
+                raise RuntimeError("stream subscriber limit reached")
+            self._subscribers += 1
+        return Subscription(broker=self, session_id=session_id, cursor=after_seq, max_buffer=buffer_size)
+
+    async def wait_for_events(self, session_id: str, after_seq: int, timeout_s: float, limit: int | None = None) -> EventPage:
+        """Long-poll: return events after the cursor, waiting up to timeout_s for the first one."""
+        subscription = self.subscribe(session_id, after_seq=after_seq, max_buffer=limit)
+        try:
+            return await subscription.next_batch(timeout_s=timeout_s)
+        finally:
+            subscription.close()
+
+    def _register(self, session_id: str, waiter: _Waiter) -> None:
+        with self._lock:
+            self._waiters.setdefault(session_id, set()).add(waiter)
+
+    def _unregister(self, session_id: str, waiter: _Waiter) -> None:
+        with self._lock:
+            waiters = self._waiters.get(session_id)
+            if waiters is None:
+                return
+            waiters.discard(waiter)
+            if not waiters:
+                del self._waiters[session_id]
+
+    def _release(self) -> None:
+        with self._lock:
+            self._subscribers = max(0, self._subscribers - 1)
+
+
+@dataclass
+class Subscription:
+    """Cursor over one session's events.
+
+    Requesting the next batch acknowledges the previous one; clients that
+    reconnect resume by passing the last sequence they processed.
+    """
+
+    broker: StreamBroker
+    session_id: str
+    cursor: int
+    max_buffer: int
+    closed: bool = False
+
+    async def next_batch(self, timeout_s: float | None = None) -> EventPage:
+        """Return the next bounded batch, or an empty page if timeout_s elapses first."""
+        if self.closed:
+            raise RuntimeError("subscription closed")
+        deadline = None if timeout_s is None else time.monotonic() + timeout_s
+        waiter = _Waiter(loop=asyncio.get_running_loop(), wakeup=asyncio.Event())
+        self.broker._register(self.session_id, waiter)
+        try:
+            while True:
+                waiter.wakeup.clear()
+                page = await self.broker.reader(self.session_id, self.cursor, self.max_buffer)
+                if page.events:
+                    self.cursor = page.next_seq
+                    return page
+                wait_s = self.broker.poll_interval_s
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return EventPage(events=[], next_seq=self.cursor)
+                    wait_s = min(wait_s, remaining)
+                try:
+                    # The poll interval also picks up appends made by other
+                    # workers, which never call notify() in this process.
+                    async with asyncio.timeout(wait_s):
+                        await waiter.wakeup.wait()
+                except TimeoutError:
+                    pass
+        finally:
+            self.broker._unregister(self.session_id, waiter)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.broker._release()
+
+
+# append(stream_id, seq, events) -> the stream's acknowledged sequence; see StateBackend.append_stream_batch.
+BatchAppender = Callable[[str, int, Sequence[Mapping[str, object]]], Awaitable[int]]
+
+
+@dataclass(eq=False)
+class _IngestStream:
+    acked_seq: int = 0
+    dropped_events: int = 0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+@dataclass
+class BatchIngest:
+    """Applies runner event batches exactly once per (stream, sequence).
+
+    Runners number the batches of a stream 1, 2, 3, ... and resend a batch
+    until it is acknowledged. ``append`` stores a batch and advances the
+    stream's acknowledged sequence in one transaction, and skips a batch at
+    or below it, so a retransmit is applied once even when it reaches
+    another worker. Bodies may use any codec in ``codecs``, chosen by
+    Content-Type. Up to ``max_streams`` recently used streams keep their
+    last ack in memory, which lets known retransmits skip decoding, and the
+    drop count their runner reported.
+    """
+
+    append: BatchAppender
+    max_body_bytes: int = 16 * 1024 * 1024
+    max_streams: int = 10_000
+    codecs: tuple[str, ...] = SUPPORTED_CODECS
+    _streams: OrderedDict[str, _IngestStream] = field(default_factory=OrderedDict)
+
+    async def ingest(
+        self,
+        stream_id: str,
+        seq: int,
+        body: bytes,
+        encoding: str = "identity",
+        dropped_events: int = 0,
+        content_type: str | None = None,
+    ) -> int:
+        """Apply one batch if it is new and return the stream's acknowledged sequence."""
+        if not isinstance(stream_id, str) or not stream_id:
+            raise ValueError("stream_id must be a non-empty str")
+        if not isinstance(seq, int) or seq < 1:
+            raise ValueError("seq must be an int >= 1")
+        stream = self._stream(stream_id)
+        async with stream.lock:
+            stream.dropped_events = max(stream.dropped_events, dropped_events)
+            # Acks only grow, so anything at or below the last one seen here is a retransmit.
+            if seq <= stream.acked_seq:
+                return stream.acked_seq
+            acked_seq = await self.append(stream_id, seq, self._decode(body, encoding, content_type))
+            stream.acked_seq = max(stream.acked_seq, acked_seq)
+            return acked_seq
+
+    def dropped_events(self, stream_id: str) -> int:
+        """Events the runner reported discarding from its spool."""
+        stream = self._streams.get(stream_id)
+        return 0 if stream is None else stream.dropped_events
+
+    def _stream(self, stream_id: str) -> _IngestStream:
+        stream = self._streams.get(stream_id)
+        if stream is None:
+            stream = self._streams[stream_id] = _IngestStream()
+            while len(self._streams) > self.max_streams:
+                self._streams.popitem(last=False)
+        else:
+            self._streams.move_to_end(stream_id)
+        return stream
+
+    def _decode(self, body: bytes, encoding: str, content_type: str | None) -> list[Mapping[str, object]]:
+        try:
+            codec = codec_for_content_type(content_type)
+        except KeyError as exc:
+            raise ValueError(str(exc)) from exc
+        if codec.name not in self.codecs:
+            raise ValueError(f"unsupported codec: {codec.name}")
+        if encoding == "deflate":
+            decompressor = zlib.decompressobj()
+            try:
+                data = decompressor.decompress(body, self.max_body_bytes + 1)
+            except zlib.error as exc:
+                raise ValueError(f"invalid deflate body: {exc}") from exc
+        elif encoding == "identity":
+            data = body
+        else:
+            raise ValueError(f"unsupported content encoding: {encoding}")
+        if len(data) > self.max_body_bytes:
+            raise ValueError("batch too large")
+        return codec.decode_batch(data)
+
+
+def format_sse(seq: int, event: Mapping[str, object]) -> str:
+    data = json.dumps(event, separators=(",", ":"))
+    return f"id: {seq}\nevent: {event.get('type', 'message')}\ndata: {data}\n\n"
+
+
+async def sse_stream(
+    subscription: Subscription,
+    is_disconnected: Callable[[], Awaitable[bool]],
+    heartbeat_s: float = 15.0,
+) -> AsyncIterator[str]:
+    """Yield SSE frames for a subscription until the client disconnects."""
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            if await is_disconnected():
+                return
+            start = subscription.cursor
+            page = await subscription.next_batch(timeout_s=heartbeat_s)
+            if not page.events:
+                yield ": keepalive\n\n"
+                continue
+            for offset, event in enumerate(page.events, start=1):
+                yield format_sse(start + offset, event)
+    finally:
+        subscription.close()
@@ -0,0 +1,427 @@
+import http.client
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Sequence
+from urllib.parse import urlparse
+
+from event_codecs import JSON, SUPPORTED_CODECS, EventCodec, get_codec, negotiate
+from main import StreamClient
+
+IDENTITY = "identity"
+# zlib framing (RFC 1950), which is what HTTP calls "deflate".
+DEFLATE = "deflate"
+
+
+@dataclass(frozen=True)
+class StreamBatch:
+    """A sealed batch: ``body`` is ``count`` events framed by ``codec``, then encoded per ``encoding``."""
+
+    seq: int
+    count: int
+    body: bytes
+    encoding: str = IDENTITY
+    codec: str = JSON
+
+
+@dataclass(frozen=True)
+class BatchAck:
+    acked_seq: int
+    # Codecs the receiver accepts, most preferred first; empty when it did not say.
+    codecs: tuple[str, ...] = ()
+
+
+@dataclass
+class StreamClientStats:
+    events_accepted: int = 0
+    events_acked: int = 0
+    events_dropped: int = 0
+    batches_sealed: int = 0
+    batches_sent: int = 0
+    retransmits: int = 0
+    reconnects: int = 0
+    raw_bytes: int = 0
+    wire_bytes: int = 0
+
+
+class StreamTransportError(ConnectionError):
+    """The batch may or may not have been delivered; retransmit it."""
+
+
+class BatchRejectedError(ValueError):
+    """The control plane refused the batch itself; retransmitting cannot succeed."""
+
+
+class BatchTransport(ABC):
+    @abstractmethod
+    def send_batch(self, stream_id: str, batch: StreamBatch, dropped_events: int = 0) -> BatchAck:
+        """Deliver one batch and return the highest sequence the receiver has acknowledged."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        return None
+
+
+class HttpTransport(BatchTransport):
+    """POSTs batches to ``/streams/{stream_id}/batches`` over one keep-alive connection.
+
+    Any connection or 5xx/408/429 failure drops the connection, so the next
+    attempt reconnects.
+    """
+
+    retry_statuses = frozenset({408, 429})
+
+    def __init__(self, base_url: str, timeout_s: float = 10.0) -> None:
+        if not isinstance(base_url, str):
+            raise TypeError("base_url must be str")
+        parsed = urlparse(base_url)
+        if parsed.scheme not in {"http", "https"} or not parsed.hostname:
+            raise ValueError(f"invalid base_url: {base_url!r}")
+        self._scheme = parsed.scheme
+        self._host = parsed.hostname
+        self._port = parsed.port
+        self._prefix = parsed.path.rstrip("/")
+        self.timeout_s = timeout_s
+        self._conn: http.client.HTTPConnection | None = None
+
+    def send_batch(self, stream_id: str, batch: StreamBatch, dropped_events: int = 0) -> BatchAck:
+        headers = {
+            "Content-Type": get_codec(batch.codec).content_type,
+            "Content-Encoding": batch.encoding,
+            "X-Batch-Seq": str(batch.seq),
+            "X-Batch-Count": str(batch.count),
+            "X-Dropped-Events": str(dropped_events),
+        }
+        try:
+            conn = self._connection()
+            conn.request("POST", f"{self._prefix}/streams/{stream_id}/batches", body=batch.body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException) as exc:
+            self.close()
+            raise StreamTransportError(str(exc)) from exc
+        if response.status >= 500 or response.status in self.retry_statuses:
+            self.close()
+            raise StreamTransportError(f"HTTP {response.status}")
+        if response.status >= 400:
+            raise BatchRejectedError(f"HTTP {response.status}: {data[:200].decode('utf-8', 'replace')}")
+        try:
+            ack = json.loads(data)
+            return BatchAck(acked_seq=int(ack["acked_seq"]), codecs=tuple(str(name) for name in ack.get("codecs", ())))
+        except (ValueError, KeyError, TypeError, AttributeError) as exc:
+            self.close()
+            raise StreamTransportError(f"malformed ack: {data[:200]!r}") from exc
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            factory = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+            self._conn = factory(self._host, self._port, timeout=self.timeout_s)
+        return self._conn
+
+
+class BatchSpool:
+    """Sealed batches not yet acknowledged, oldest first, bounded by ``max_bytes``.
+
+    With a ``directory`` each batch is also a file there, so unacknowledged
+    events survive a runner restart and are resent under the same stream id.
+    Without one the spool is memory only. When a new batch would push the
+    spool past ``max_bytes`` the oldest batches are discarded and counted,
+    rather than blocking the producer.
+    """
+
+    def __init__(self, directory: str | None = None, max_bytes: int = 256 * 1024**2) -> None:
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be >= 1")
+        self.directory = None if directory is None else Path(directory)
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._batches: deque[StreamBatch] = deque()
+        self.stream_id = uuid.uuid4().hex
+        self.last_seq = 0
+        if self.directory is not None:
+            self._recover()
+
+    def __len__(self) -> int:
+        return len(self._batches)
+
+    @property
+    def pending_events(self) -> int:
+        return sum(batch.count for batch in self._batches)
+
+    def oldest(self) -> StreamBatch | None:
+        return self._batches[0] if self._batches else None
+
+    def append(self, count: int, body: bytes, encoding: str, codec: str = JSON) -> tuple[StreamBatch, list[StreamBatch]]:
+        """Seal the next batch; returns it and any batches dropped to make room."""
+        self.last_seq += 1
+        batch = StreamBatch(seq=self.last_seq, count=count, body=body, encoding=encoding, codec=codec)
+        dropped = []
+        while self._batches and self.total_bytes + len(body) > self.max_bytes:
+            dropped.append(self._pop())
+        if self.directory is not None:
+            path = self._path(batch)
+            tmp_path = path.with_name(f"{path.name}.tmp")
+            tmp_path.write_bytes(body)
+            os.replace(tmp_path, path)
+        self._batches.append(batch)
+        self.total_bytes += len(body)
+        return batch, dropped
+
+    def ack(self, seq: int) -> list[StreamBatch]:
+        """Forget batches up to and including ``seq``."""
+        acked = []
+        while self._batches and self._batches[0].seq <= seq:
+            acked.append(self._pop())
+        return acked
+
+    def _pop(self) -> StreamBatch:
+        batch = self._batches.popleft()
+        self.total_bytes -= len(batch.body)
+        if self.directory is not None:
+            self._path(batch).unlink(missing_ok=True)
+        return batch
+
+    def _path(self, batch: StreamBatch) -> Path:
+        assert self.directory is not None
+        suffix = ".zz" if batch.encoding == DEFLATE else ""
+        return self.directory / f"{batch.seq:020d}-{batch.count}.{batch.codec}{suffix}"
+
+    def _recover(self) -> None:
+        assert self.directory is not None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for leftover in self.directory.glob("*.tmp"):
+            leftover.unlink(missing_ok=True)
+        id_path = self.directory / "stream_id"
+        for path in sorted(self.directory.glob("*-*.*")):
+            name, codec, *compressed = path.name.split(".")
+            seq, count = name.split("-")
+            encoding = DEFLATE if compressed == ["zz"] else IDENTITY
+            body = path.read_bytes()
+            batch = StreamBatch(seq=int(seq), count=int(count), body=body, encoding=encoding, codec=codec)
+            self._batches.append(batch)
+            self.total_bytes += len(body)
+        if self._batches and id_path.exists():
+            self.stream_id = id_path.read_text(encoding="utf-8").strip()
+            self.last_seq = self._batches[-1].seq
+        else:
+            # Nothing left to resend: start a fresh stream so sequence numbers can restart at 1.
+            for batch in self._batches:
+                self._path(batch).unlink(missing_ok=True)
+            self._batches.clear()
+            self.total_bytes = 0
+            id_path.write_text(self.stream_id, encoding="utf-8")
+
+
+class BatchingStreamClient(StreamClient):
+    """StreamClient that batches, compresses and reliably delivers events.
+
+    ``send`` only serializes the events and queues them, so the caller never
+    waits on the network. A background thread seals a batch once it holds
+    ``max_batch_events`` events or ``max_batch_bytes`` of encoded events, or its first
+    event is ``max_delay_s`` old, deflates bodies over ``compress_min_bytes``
+    and puts it in the spool. A second thread sends spooled batches in order;
+    each batch carries a sequence number and stays spooled until the receiver
+    acknowledges it, and after a failed send the connection is reopened and
+    the same batch retransmitted with exponential backoff. The receiver
+    ignores sequences it has already acknowledged, so a batch whose ack was
+    lost is applied once.
+
+    Events are encoded as JSON until an ack lists the receiver's codecs;
+    from then on the first of ``codecs`` it accepts is used.
+    """
+
+    compresslevel = 1
+
+    def __init__(
+        self,
+        transport: BatchTransport,
+        spool: BatchSpool | None = None,
+        max_batch_events: int = 500,
+        max_batch_bytes: int = 256 * 1024,
+        max_delay_s: float = 0.05,
+        compress_min_bytes: int = 1024,
+        retry_initial_s: float = 0.1,
+        retry_max_s: float = 10.0,
+        codecs: Sequence[str] = SUPPORTED_CODECS,
+    ) -> None:
+        if not isinstance(transport, BatchTransport):
+            raise TypeError("transport must be BatchTransport")
+        if max_batch_events < 1 or max_batch_bytes < 1:
+            raise ValueError("max_batch_events and max_batch_bytes must be >= 1")
+        self.transport = transport
+        self.spool = spool if spool is not None else BatchSpool()
+        self.max_batch_events = max_batch_events
+        self.max_batch_bytes = max_batch_bytes
+        self.max_delay_s = max_delay_s
+        self.compress_min_bytes = compress_min_bytes
+        self.retry_initial_s = retry_initial_s
+        self.retry_max_s = retry_max_s
+        self.codecs = tuple(codecs)
+        self.codec: EventCodec = get_codec(JSON)
+        self.stats = StreamClientStats()
+        self._pending: list[tuple[EventCodec, bytes]] = []
+        self._pending_bytes = 0
+        self._pending_since = 0.0
+        self._lock = threading.Lock()
+        self._has_events = threading.Condition(self._lock)
+        self._has_batches = threading.Condition(self._lock)
+        self._progress = threading.Condition(self._lock)
+        self._sealing = False
+        self._closing = False
+        self._stopped = False
+        self._sealer = threading.Thread(target=self._seal_loop, name="stream-sealer", daemon=True)
+        self._sender = threading.Thread(target=self._send_loop, name="stream-sender", daemon=True)
+        self._sealer.start()
+        self._sender.start()
+
+    @property
+    def stream_id(self) -> str:
+        return self.spool.stream_id
+
+    def send(self, events: Iterable[dict]) -> None:
+        codec = self.codec
+        encoded = [(codec, codec.encode(event)) for event in events]
+        if not encoded:
+            return
+        with self._lock:
+            if self._closing:
+                raise RuntimeError("stream client is closed")
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            self._pending.extend(encoded)
+            self._pending_bytes += sum(len(item) + 1 for _, item in encoded)
+            self.stats.events_accepted += len(encoded)
+            if len(self._pending) >= self.max_batch_events or self._pending_bytes >= self.max_batch_bytes:
+                self._has_events.notify()
+
+    def flush(self, timeout_s: float | None = None) -> bool:
+        """Seal pending events and wait until everything sent so far is acknowledged."""
+        deadline = None if timeout_s is None else time.monotonic() + timeout_s
+        with self._lock:
+            self._pending_since = float("-inf") if self._pending else self._pending_since
+            self._has_events.notify()
+            while self._pending or self._sealing or len(self.spool):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._progress.wait(remaining)
+            return True
+
+    def close(self, timeout_s: float | None = 10.0) -> bool:
+        """Flush for up to ``timeout_s``, then stop; unacknowledged batches stay in the spool."""
+        with self._lock:
+            if self._stopped:
+                return not len(self.spool)
+            self._closing = True
+        flushed = self.flush(timeout_s)
+        with self._lock:
+            self._stopped = True
+            self._has_events.notify_all()
+            self._has_batches.notify_all()
+        self._sealer.join()
+        self._sender.join()
+        self.transport.close()
+        return flushed
+
+    def _seal_loop(self) -> None:
+        with self._lock:
+            while True:
+                while not self._stopped and not self._pending:
+                    self._has_events.wait()
+                if not self._pending:
+                    return
+                due = self._pending_since + self.max_delay_s
+                full = len(self._pending) >= self.max_batch_events or self._pending_bytes >= self.max_batch_bytes
+                if not full and not self._stopped and time.monotonic() < due:
+                    self._has_events.wait(due - time.monotonic())
+                    continue
+                items, self._pending = self._pending, []
+                self._pending_bytes = 0
+                self._sealing = True
+                self._lock.release()
+                try:
+                    sealed = [self._encode(codec, chunk) for codec, chunk in self._chunks(items)]
+                finally:
+                    self._lock.acquire()
+                    self._sealing = False
+                for count, body, encoding, codec, raw_bytes in sealed:
+                    _, dropped = self.spool.append(count, body, encoding, codec)
+                    self.stats.batches_sealed += 1
+                    self.stats.raw_bytes += raw_bytes
+                    self.stats.events_dropped += sum(batch.count for batch in dropped)
+                self._has_batches.notify()
+                self._progress.notify_all()
+
+    def _chunks(self, items: list[tuple[EventCodec, bytes]]) -> Iterable[tuple[EventCodec, list[bytes]]]:
+        chunk: list[bytes] = []
+        chunk_codec = items[0][0]
+        size = 0
+        for codec, item in items:
+            if chunk and (
+                codec is not chunk_codec or len(chunk) >= self.max_batch_events or size + len(item) > self.max_batch_bytes
+            ):
+                yield chunk_codec, chunk
+                chunk, size = [], 0
+            chunk_codec = codec
+            chunk.append(item)
+            size += len(item) + 1
+        if chunk:
+            yield chunk_codec, chunk
+
+    def _encode(self, codec: EventCodec, chunk: list[bytes]) -> tuple[int, bytes, str, str, int]:
+        raw = codec.join(chunk)
+        if len(raw) >= self.compress_min_bytes:
+            return len(chunk), zlib.compress(raw, self.compresslevel), DEFLATE, codec.name, len(raw)
+        return len(chunk), raw, IDENTITY, codec.name, len(raw)
+
+    def _send_loop(self) -> None:
+        backoff = self.retry_initial_s
+        last_seq = 0
+        while True:
+            with self._lock:
+                while not self._stopped and not len(self.spool):
+                    self._has_batches.wait()
+                if self._stopped:
+                    return
+                batch = self.spool.oldest()
+                dropped = self.stats.events_dropped
+            assert batch is not None
+            if batch.seq == last_seq:
+                self.stats.retransmits += 1
+            last_seq = batch.seq
+            try:
+                ack = self.transport.send_batch(self.stream_id, batch, dropped_events=dropped)
+            except StreamTransportError:
+                self.stats.reconnects += 1
+                with self._lock:
+                    # Wake early only to shut down.
+                    if not self._stopped:
+                        self._has_batches.wait(backoff)
+                backoff = min(backoff * 2, self.retry_max_s)
+                continue
+            except BatchRejectedError:
+                with self._lock:
+                    rejected = self.spool.ack(batch.seq)
+                    self.stats.events_dropped += sum(item.count for item in rejected)
+                    self._progress.notify_all()
+                continue
+            backoff = self.retry_initial_s
+            if ack.codecs:
+                self.codec = get_codec(negotiate(self.codecs, ack.codecs))
+            with self._lock:
+                self.stats.batches_sent += 1
+                self.stats.wire_bytes += len(batch.body)
+                self.stats.events_acked += sum(item.count for item in self.spool.ack(ack.acked_seq))
+                self._progress.notify_all()
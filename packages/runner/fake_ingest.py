@@ -0,0 +1,154 @@
+import json
+import socket
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Sequence
+
+from event_codecs import SUPPORTED_CODECS, codec_for_content_type
+from event_stream import DEFLATE
+
+
+class _Server(ThreadingHTTPServer):
+    # stop()/start() rebinds the same port straight away.
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class FakeIngestServer:
+    """Local stand-in for the control plane's ``POST /streams/{stream_id}/batches``.
+
+    Applies the same ack rules as the real route: a batch whose sequence is
+    not above the stream's acknowledged one is a retransmit and is not applied
+    again. Faults can be injected to exercise retransmission: ``fail_next``
+    rejects requests with a 503 before applying them, ``lose_acks`` applies
+    them and then answers 503, and ``stop``/``start`` take the listener down
+    and bring it back on the same port. ``codecs`` is what it advertises in
+    acks and accepts.
+    """
+
+    def __init__(
+        self, host: str = "127.0.0.1", port: int = 0, latency_s: float = 0.0, codecs: Sequence[str] = SUPPORTED_CODECS
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.latency_s = latency_s
+        self.codecs = tuple(codecs)
+        self.events: list[dict] = []
+        self.acked: dict[str, int] = {}
+        self.dropped_reported: dict[str, int] = {}
+        self.batches = 0
+        self.duplicates = 0
+        self._fail_next = 0
+        self._lose_acks = 0
+        self._lock = threading.Lock()
+        self._server: _Server | None = None
+        self._thread: threading.Thread | None = None
+        self._connections: set[socket.socket] = set()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "FakeIngestServer":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; don't let Nagle hold the body back.
+            disable_nagle_algorithm = True
+
+            def setup(self) -> None:
+                super().setup()
+                with fake._lock:
+                    fake._connections.add(self.connection)
+
+            def finish(self) -> None:
+                with fake._lock:
+                    fake._connections.discard(self.connection)
+                super().finish()
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+                status, payload = fake._handle(self.path, self.headers, body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format: str, *args: object) -> None:
+                return None
+
+        self._server = _Server((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ingest", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        with self._lock:
+            connections = list(self._connections)
+        # Keep-alive connections outlive the listener; cut them like a real outage would.
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def fail_next(self, count: int) -> None:
+        with self._lock:
+            self._fail_next += count
+
+    def lose_acks(self, count: int) -> None:
+        with self._lock:
+            self._lose_acks += count
+
+    def __enter__(self) -> "FakeIngestServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+    def _handle(self, path: str, headers: object, body: bytes) -> tuple[int, dict]:
+        parts = path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "streams" or parts[2] != "batches":
+            return 404, {"detail": "not found"}
+        stream_id = parts[1]
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        try:
+            seq = int(headers["X-Batch-Seq"])
+            codec = codec_for_content_type(headers.get("Content-Type"))
+            if codec.name not in self.codecs:
+                return 415, {"detail": f"unsupported codec: {codec.name}"}
+            if headers.get("Content-Encoding", "identity") == DEFLATE:
+                body = zlib.decompress(body)
+            events = codec.decode_batch(body)
+        except (KeyError, TypeError, ValueError, zlib.error) as exc:
+            return 400, {"detail": str(exc)}
+        with self._lock:
+            if self._fail_next:
+                self._fail_next -= 1
+                return 503, {"detail": "injected failure"}
+            self.dropped_reported[stream_id] = int(headers.get("X-Dropped-Events", "0"))
+            acked = self.acked.get(stream_id, 0)
+            if seq <= acked:
+                self.duplicates += 1
+            else:
+                self.events.extend(events)
+                self.batches += 1
+                self.acked[stream_id] = acked = seq
+            if self._lose_acks:
+                self._lose_acks -= 1
+                return 503, {"detail": "injected lost ack"}
+            return 200, {"stream_id": stream_id, "acked_seq": acked, "codecs": list(self.codecs)}
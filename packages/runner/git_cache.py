@@ -0,0 +1,282 @@
+import fcntl
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Iterator
+
+_FULL_SHA = re.compile(r"^[0-9a-f]{40}([0-9a-f]{24})?$")
+
+
+@dataclass(frozen=True)
+class Worktree:
+    repo_url: str
+    commit: str
+    path: str
+
+
+class GitCache:
+    """Shared bare mirrors with cheap per-run worktrees.
+
+    Each repository URL is cloned once into ``root/mirrors`` and kept up to
+    date with incremental fetches, serialized per mirror by an ``fcntl`` lock
+    so concurrent runs (threads or processes) never fetch the same repo at
+    once; a waiter that finds the commit already present skips its fetch.
+    ``checkout`` adds a detached ``git worktree`` sharing the mirror's
+    objects, so its cost depends on the size of the tree, not the history.
+
+    A checkout stays pinned by the process that made it (a shared ``fcntl``
+    lock, dropped by ``unpin``, ``release`` or the process exiting); ``gc``
+    removes worktrees that are neither pinned nor used within ``max_idle_s``.
+    """
+
+    def __init__(self, root: str, ref_fetch_ttl_s: float = 5.0) -> None:
+        if not isinstance(root, str):
+            raise TypeError("root must be str")
+        self.root = Path(root)
+        # checkout refetches symbolic refs (branches, HEAD) when the last fetch is older than this.
+        self.ref_fetch_ttl_s = ref_fetch_ttl_s
+        self._pins: dict[str, IO[str]] = {}
+        self._pins_lock = threading.Lock()
+        for sub in ("mirrors", "worktrees", "locks"):
+            (self.root / sub).mkdir(parents=True, exist_ok=True)
+
+    def mirror_path(self, repo_url: str) -> Path:
+        return self.root / "mirrors" / f"{_repo_slug(repo_url)}.git"
+
+    def fetch(self, repo_url: str) -> None:
+        """Clone the mirror if needed, otherwise fetch new objects and refs."""
+        with self._locked(_repo_slug(repo_url)):
+            self._fetch_locked(repo_url)
+
+    def resolve(self, repo_url: str, commit: str) -> str:
+        """Return the full sha for ``commit``, fetching only when the mirror lacks it or its refs are stale."""
+        if not isinstance(repo_url, str) or not isinstance(commit, str):
+            raise TypeError("repo_url and commit must be str")
+        mirror = self.mirror_path(repo_url)
+        if _FULL_SHA.match(commit) and mirror.exists() and self._has_commit(mirror, commit):
+            return commit
+        with self._locked(_repo_slug(repo_url)):
+            if _FULL_SHA.match(commit):
+                if not mirror.exists() or not self._has_commit(mirror, commit):
+                    self._fetch_locked(repo_url, commit)
+            elif not mirror.exists() or time.time() - self._last_fetch(mirror) > self.ref_fetch_ttl_s:
+                self._fetch_locked(repo_url)
+            sha = self._rev_parse(mirror, commit)
+        if sha is None:
+            raise KeyError(f"unknown commit: {commit}")
+        return sha
+
+    def checkout(self, repo_url: str, commit: str, name: str | None = None) -> Worktree:
+        """Create a detached worktree of ``commit`` for one run, pinned until ``unpin`` or ``release``."""
+        sha = self.resolve(repo_url, commit)
+        slug = _repo_slug(repo_url)
+        name = name or uuid.uuid4().hex
+        if not re.fullmatch(r"[A-Za-z0-9._-]+", name) or name in {".", ".."}:
+            raise ValueError(f"invalid worktree name: {name!r}")
+        path = self.root / "worktrees" / slug / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Pinned before it exists, so gc never sees it unpinned.
+        self._pin(path)
+        mirror = str(self.mirror_path(repo_url))
+        try:
+            # Concurrent "worktree add" on one repo races on the worktree metadata;
+            # register under a lock and populate the files outside it.
+            with self._locked(slug, "worktrees"):
+                _git("--git-dir", mirror, "worktree", "add", "--detach", "--force", "--no-checkout", str(path), sha)
+            _git("-C", str(path), "reset", "--hard", "--quiet", sha)
+        except BaseException:
+            self.unpin(str(path))
+            raise
+        self.touch(str(path))
+        return Worktree(repo_url=repo_url, commit=sha, path=str(path))
+
+    def sync(self, path: str, commit: str | None = None) -> str:
+        """Fetch a worktree's mirror and optionally move the worktree to ``commit``; returns HEAD.
+
+        Unlike ``checkout`` this always fetches first, so a branch or ``HEAD``
+        resolves to the upstream's latest commit.
+        """
+        mirror = self._cache_mirror(Path(path))
+        with self._locked(_mirror_slug(mirror)):
+            self._refresh_locked(mirror, commit if commit is not None and _FULL_SHA.match(commit) else None)
+            sha = None if commit is None else self._rev_parse(mirror, commit)
+        if commit is not None:
+            if sha is None:
+                raise KeyError(f"unknown commit: {commit}")
+            _git("-C", path, "checkout", "--detach", "--force", sha)
+        self.touch(path)
+        return _git("-C", path, "rev-parse", "HEAD").decode().strip()
+
+    def touch(self, path: str) -> None:
+        """Mark a worktree as in use, postponing its garbage collection."""
+        _marker(Path(path)).touch()
+
+    def unpin(self, path: str) -> None:
+        """Let ``gc`` remove this process's checkout once it has been idle for ``max_idle_s``."""
+        with self._pins_lock:
+            handle = self._pins.pop(str(Path(path)), None)
+        if handle is not None:
+            # Closing the file drops its lock.
+            handle.close()
+
+    def release(self, path: str) -> None:
+        """Remove a worktree now."""
+        self.unpin(path)
+        self._remove(Path(path))
+
+    def gc(self, max_idle_s: float = 3600.0) -> list[str]:
+        """Remove unpinned worktrees unused for ``max_idle_s`` and prune stale worktree metadata."""
+        removed = []
+        for repo_dir in (self.root / "worktrees").iterdir():
+            if not repo_dir.is_dir():
+                continue
+            for worktree in repo_dir.iterdir():
+                if not worktree.is_dir():
+                    continue
+                with self._unpinned(worktree) as unpinned:
+                    if not unpinned:
+                        continue
+                    marker = _marker(worktree)
+                    last_used = marker.stat().st_mtime if marker.exists() else worktree.stat().st_mtime
+                    if time.time() - last_used >= max_idle_s:
+                        self._remove(worktree)
+                        removed.append(str(worktree))
+        for mirror in (self.root / "mirrors").glob("*.git"):
+            with self._locked(_mirror_slug(mirror), "worktrees"):
+                subprocess.run(["git", "--git-dir", str(mirror), "worktree", "prune"], capture_output=True)
+        return removed
+
+    def _remove(self, worktree: Path) -> None:
+        mirror = self._worktree_mirror(worktree)
+        shutil.rmtree(worktree, ignore_errors=True)
+        _marker(worktree).unlink(missing_ok=True)
+        _pin_path(worktree).unlink(missing_ok=True)
+        if mirror is not None:
+            with self._locked(_mirror_slug(mirror), "worktrees"):
+                subprocess.run(["git", "--git-dir", str(mirror), "worktree", "prune"], capture_output=True)
+
+    def _pin(self, worktree: Path) -> None:
+        handle = open(_pin_path(worktree), "a")
+        fcntl.flock(handle, fcntl.LOCK_SH)
+        with self._pins_lock:
+            previous = self._pins.pop(str(worktree), None)
+            self._pins[str(worktree)] = handle
+        if previous is not None:
+            previous.close()
+
+    @contextmanager
+    def _unpinned(self, worktree: Path) -> Iterator[bool]:
+        """Hold off new pins and yield whether nothing else pins ``worktree``."""
+        with open(_pin_path(worktree), "a") as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _fetch_locked(self, repo_url: str, commit: str | None = None) -> None:
+        mirror = self.mirror_path(repo_url)
+        if mirror.exists():
+            self._refresh_locked(mirror, commit)
+            return
+        tmp = mirror.with_name(f"{mirror.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            _git("clone", "--mirror", "--quiet", repo_url, str(tmp))
+            # Worktrees do their own checkouts; never gc objects they might still need mid-run.
+            _git("--git-dir", str(tmp), "config", "gc.auto", "0")
+            os.replace(tmp, mirror)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self._fetch_missing(mirror, commit)
+        self._fetch_stamp(mirror).touch()
+
+    def _refresh_locked(self, mirror: Path, commit: str | None = None) -> None:
+        _git("--git-dir", str(mirror), "fetch", "--prune", "--quiet", "origin")
+        self._fetch_missing(mirror, commit)
+        self._fetch_stamp(mirror).touch()
+
+    def _fetch_missing(self, mirror: Path, commit: str | None) -> None:
+        if commit is not None and not self._has_commit(mirror, commit):
+            # Not reachable from any ref (e.g. a force-pushed PR head); ask for it directly.
+            subprocess.run(
+                ["git", "--git-dir", str(mirror), "fetch", "--quiet", "origin", commit],
+                capture_output=True,
+            )
+
+    def _last_fetch(self, mirror: Path) -> float:
+        stamp = self._fetch_stamp(mirror)
+        return stamp.stat().st_mtime if stamp.exists() else 0.0
+
+    def _fetch_stamp(self, mirror: Path) -> Path:
+        return self.root / "locks" / f"{_mirror_slug(mirror)}.fetched"
+
+    @contextmanager
+    def _locked(self, slug: str, scope: str = "fetch") -> Iterator[None]:
+        # Keyed by the mirror's slug, never by a URL read back from git config,
+        # which may be spelled differently from the one the mirror was made from.
+        lock_path = self.root / "locks" / f"{slug}.{scope}.lock"
+        with open(lock_path, "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _has_commit(self, mirror: Path, commit: str) -> bool:
+        result = subprocess.run(
+            ["git", "--git-dir", str(mirror), "cat-file", "-e", f"{commit}^{{commit}}"],
+            capture_output=True,
+        )
+        return result.returncode == 0
+
+    def _rev_parse(self, mirror: Path, commit: str) -> str | None:
+        result = subprocess.run(
+            ["git", "--git-dir", str(mirror), "rev-parse", "--verify", "--quiet", f"{commit}^{{commit}}"],
+            capture_output=True,
+        )
+        return result.stdout.decode().strip() if result.returncode == 0 else None
+
+    def _worktree_mirror(self, worktree: Path) -> Path | None:
+        result = subprocess.run(["git", "-C", str(worktree), "rev-parse", "--git-common-dir"], capture_output=True)
+        if result.returncode != 0:
+            return None
+        return (worktree / result.stdout.decode().strip()).resolve()
+
+    def _cache_mirror(self, worktree: Path) -> Path:
+        mirror = self._worktree_mirror(worktree)
+        if mirror is None or mirror.parent != (self.root / "mirrors").resolve():
+            raise KeyError(f"not a GitCache worktree: {worktree}")
+        return mirror
+
+
+def _repo_slug(repo_url: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", repo_url.rstrip("/").rsplit("/", 1)[-1].removesuffix(".git"))
+    return f"{name[:40]}-{hashlib.sha256(repo_url.encode('utf-8')).hexdigest()[:16]}"
+
+
+def _mirror_slug(mirror: Path) -> str:
+    return mirror.name.removesuffix(".git")
+
+
+def _marker(worktree: Path) -> Path:
+    return worktree.with_name(f"{worktree.name}.last-used")
+
+
+def _pin_path(worktree: Path) -> Path:
+    return worktree.with_name(f"{worktree.name}.pin")
+
+
+def _git(*args: str) -> bytes:
+    return subprocess.run(["git", *args], check=True, capture_output=True).stdout
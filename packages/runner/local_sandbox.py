@@ -0,0 +1,148 @@
+import os
+import shutil
+import stat
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Mapping
+
+from main import Filesystem, Sandbox
+from subprocess_executor import OutputSink, SubprocessExecutor
+
+# materialize(snapshot_id, dest_dir) fills an empty directory with the
+# snapshot's files, e.g. SnapshotStore.extract.
+Materialize = Callable[[str, str], object]
+
+# Relative path -> (mode, size, mtime_ns, ctime_ns, inode) of every entry under a workdir.
+_Manifest = dict[str, tuple[int, int, int, int, int]]
+
+
+class LocalFilesystem(Filesystem):
+    """Reads and writes files under ``root``; paths that resolve outside it are refused."""
+
+    def __init__(self, root: str) -> None:
+        if not isinstance(root, str):
+            raise TypeError("root must be str")
+        self.root = Path(root).resolve()
+
+    def read_text(self, path: str) -> str:
+        return self._resolve(path).read_text(encoding="utf-8")
+
+    def write_text(self, path: str, content: str) -> None:
+        if not isinstance(content, str):
+            raise TypeError("content must be str")
+        target = self._resolve(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(content, encoding="utf-8")
+
+    def _resolve(self, path: str) -> Path:
+        if not isinstance(path, str):
+            raise TypeError("path must be str")
+        target = (self.root / path).resolve()
+        if target != self.root and self.root not in target.parents:
+            raise PermissionError(f"path escapes sandbox: {path}")
+        return target
+
+
+@dataclass
+class LocalSandbox(Sandbox):
+    """Sandbox backed by a local directory: ``config.workdir`` holds the snapshot, commands run there.
+
+    ``start`` materializes the snapshot into an empty workdir, which is what
+    a pool keeps warm, and records the stat of every entry. ``reset`` puts
+    back only what changed since: entries a command added are deleted, and
+    changed or deleted ones are copied from a pristine copy next to the
+    workdir, materialized on the first reset and kept until ``stop``.
+    Isolation is only the working directory and the Filesystem's path check,
+    which is enough for tests and trusted local runs, not for untrusted code.
+    """
+
+    materialize: Materialize | None = None
+    env: Mapping[str, str] | None = None
+    emit: OutputSink | None = None
+    log_dir: str | None = None
+    executor: SubprocessExecutor | None = field(default=None, init=False)
+    filesystem: LocalFilesystem | None = field(default=None, init=False)
+    _manifest: _Manifest | None = field(default=None, init=False, repr=False)
+
+    @property
+    def pristine_dir(self) -> str:
+        return os.path.normpath(self.config.workdir) + ".pristine"
+
+    def start(self) -> None:
+        super().start()
+        workdir = self.config.workdir
+        os.makedirs(workdir, exist_ok=True)
+        if self.materialize is not None:
+            self.materialize(self.config.snapshot_id, workdir)
+        self._manifest = _scan(workdir)
+        self.executor = SubprocessExecutor(workdir, self.env, emit=self.emit, log_dir=self.log_dir)
+        self.filesystem = LocalFilesystem(workdir)
+
+    def reset(self) -> None:
+        if self._manifest is None:
+            super().reset()
+            return
+        workdir = self.config.workdir
+        pristine = self.pristine_dir
+        if not os.path.isdir(pristine):
+            os.makedirs(pristine)
+            if self.materialize is not None:
+                self.materialize(self.config.snapshot_id, pristine)
+        manifest = self._manifest
+        # Undo directory mode changes first, so a command that made a
+        # directory unreadable or read-only can't hide entries or block removals.
+        for directory, subdirs, _ in os.walk(workdir):
+            for name in subdirs:
+                full = os.path.join(directory, name)
+                expected = manifest.get(os.path.relpath(full, workdir))
+                if expected is not None and stat.S_ISDIR(expected[0]) and os.lstat(full).st_mode != expected[0]:
+                    os.chmod(full, stat.S_IMODE(expected[0]))
+        current = _scan(workdir)
+        # Remove what is new or changed, children before parents.
+        for path in sorted(current, reverse=True):
+            mode, expected = current[path][0], manifest.get(path)
+            if expected is not None and stat.S_ISDIR(mode) and stat.S_ISDIR(expected[0]):
+                continue
+            if expected is None or current[path] != expected:
+                full = os.path.join(workdir, path)
+                if stat.S_ISDIR(mode):
+                    shutil.rmtree(full)
+                else:
+                    os.unlink(full)
+                current.pop(path)
+        # Copy back what is missing, parents before children; directory
+        # attributes go last, in case one is read-only.
+        restored_dirs = []
+        for path in sorted(manifest):
+            if path in current:
+                continue
+            source, dest = os.path.join(pristine, path), os.path.join(workdir, path)
+            if os.path.islink(source):
+                os.symlink(os.readlink(source), dest)
+            elif os.path.isdir(source):
+                os.mkdir(dest)
+                restored_dirs.append((source, dest))
+            else:
+                shutil.copy2(source, dest)
+        for source, dest in reversed(restored_dirs):
+            shutil.copystat(source, dest)
+        self._manifest = _scan(workdir)
+
+    def stop(self) -> None:
+        self.executor = None
+        self.filesystem = None
+        self._manifest = None
+        shutil.rmtree(self.config.workdir, ignore_errors=True)
+        shutil.rmtree(self.pristine_dir, ignore_errors=True)
+
+
+def _scan(root: str) -> _Manifest:
+    manifest: _Manifest = {}
+    for directory, subdirs, files in os.walk(root):
+        for name in subdirs + files:
+            full = os.path.join(directory, name)
+            info = os.lstat(full)
+            # ctime moves on every write or chmod and can't be set back, unlike mtime.
+            manifest[os.path.relpath(full, root)] = (info.st_mode, info.st_size, info.st_mtime_ns, info.st_ctime_ns, info.st_ino)
+    return manifest
+
@@ -1,9 +1,12 @@
+import threading
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Iterable
+from typing import Callable, Iterable
 
+from git_cache import GitCache
 from shared_models import RunnerJob, SnapshotRequest, SnapshotResult
+from snapshot_store import Populate, SnapshotStore, snapshot_key
 
 
 class RunnerBackend(ABC):
@@ -54,26 +57,49 @@ class K8sBackend(RunnerBackend):
         raise NotImplementedError("K8s backend not implemented")
 
 
-def build_snapshot(request: SnapshotRequest) -> SnapshotResult:
+def build_snapshot(
+    request: SnapshotRequest, store: SnapshotStore | None = None, populate: Populate | None = None
+) -> SnapshotResult:
+    """Return the snapshot for ``request``, building it into ``store`` only if no run has yet.
+
+    The id is the store's content key for (repo, commit, toolchain);
+    ``populate`` fills an empty directory with the tree (e.g. through a
+    ``SnapshotBuilder``). Without a store the id is only named, not built.
+    """
     if not isinstance(request, SnapshotRequest):
         raise TypeError("request must be SnapshotRequest")
-    snapshot_id = f"{request.repo_id}-{request.commit}"
-    return SnapshotResult(snapshot_id=snapshot_id)
+    if store is None:
+        return SnapshotResult(snapshot_id=f"{request.repo_id}-{request.commit}")
+    if populate is None:
+        raise ValueError("populate is required with a store")
+    return SnapshotResult(snapshot_id=store.get_or_build(request, populate).key)
 
 
 @dataclass
 class SnapshotCache:
-    _cache: dict[str, str] = field(default_factory=dict)
+    """Snapshot ids by (repo, commit, toolchain), kept in a SnapshotStore.
+
+    The store's index is the persistent record and its ``max_bytes`` the
+    size bound, so this holds no state of its own.
+    """
+
+    store: SnapshotStore
 
-    def get(self, key: str) -> str | None:
-        if not isinstance(key, str):
-            raise TypeError("key must be str")
-        return self._cache.get(key)
+    def __post_init__(self) -> None:
+        if not isinstance(self.store, SnapshotStore):
+            raise TypeError("store must be SnapshotStore")
 
-    def set(self, key: str, snapshot_id: str) -> None:
-        if not isinstance(key, str) or not isinstance(snapshot_id, str):
-            raise TypeError("key and snapshot_id must be str")
-        self._cache[key] = snapshot_id
+    def get(self, request: SnapshotRequest) -> str | None:
+        if not isinstance(request, SnapshotRequest):
+            raise TypeError("request must be SnapshotRequest")
+        entry = self.store.get(snapshot_key(request.repo_id, request.commit, request.toolchain))
+        return None if entry is None else entry.key
+
+    def get_or_build(self, request: SnapshotRequest, populate: Populate) -> str:
+        return build_snapshot(request, self.store, populate).snapshot_id
+
+    def __len__(self) -> int:
+        return len(self.store.entries())
 
 
 def snapshot_name(repo_id: str, commit: str) -> str:
@@ -89,15 +115,21 @@ class CheckoutRequest:
     commit: str
 
 
-def checkout_repo(request: CheckoutRequest) -> str:
+def checkout_repo(request: CheckoutRequest, cache: GitCache | None = None) -> str:
+    """Check out ``request.commit`` and return the path; with a cache this is a worktree of a shared mirror."""
     if not isinstance(request, CheckoutRequest):
         raise TypeError("request must be CheckoutRequest")
-    return f"/tmp/{request.repo_url.replace('/', '_')}/{request.commit}"
+    if cache is None:
+        return f"/tmp/{request.repo_url.replace('/', '_')}/{request.commit}"
+    return cache.checkout(request.repo_url, request.commit).path
 
 
-def sync_repo(path: str) -> None:
+def sync_repo(path: str, cache: GitCache | None = None, commit: str | None = None) -> None:
+    """Fetch new objects for a checkout made by ``checkout_repo``, optionally moving it to ``commit``."""
     if not isinstance(path, str):
         raise TypeError("path must be str")
+    if cache is not None:
+        cache.sync(path, commit)
 
 
 @dataclass(frozen=True)
@@ -121,6 +153,62 @@ class StreamClient(ABC):
         raise NotImplementedError
 
 
+class LeaseHeartbeat:
+    """Renews a run's control-plane lease from a background thread.
+
+    ``renew`` sends one heartbeat (``POST /runs/{run_id}/heartbeat``) and
+    returns False once the lease is gone. The interval should be well under
+    the lease TTL; after a lost lease the control plane has already failed
+    the run, so the runner should cancel the job: ``on_lost(run_id)`` is
+    called from the heartbeat thread when that happens.
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        renew: Callable[[str], bool],
+        interval_s: float = 20.0,
+        on_lost: Callable[[str], None] | None = None,
+    ) -> None:
+        if not isinstance(run_id, str):
+            raise TypeError("run_id must be str")
+        if interval_s <= 0:
+            raise ValueError("interval_s must be > 0")
+        self.run_id = run_id
+        self.interval_s = interval_s
+        self._renew = renew
+        self._on_lost = on_lost
+        self._stopped = threading.Event()
+        self._lost = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{run_id}", daemon=True)
+
+    @property
+    def lost(self) -> bool:
+        return self._lost.is_set()
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        # on_lost may stop the heartbeat from its own thread.
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval_s):
+            try:
+                alive = self._renew(self.run_id)
+            except Exception:
+                # Transient failures are retried; the TTL absorbs a few missed beats.
+                continue
+            if not alive:
+                self._lost.set()
+                if self._on_lost is not None:
+                    self._on_lost(self.run_id)
+                return
+
+
 @dataclass(frozen=True)
 class SandboxConfig:
     snapshot_id: str
@@ -138,12 +226,22 @@ class Sandbox:
     def stop(self) -> None:
         return None
 
+    def reset(self) -> None:
+        """Return the sandbox to its snapshot's pristine state; backends may do better than a restart."""
+        self.stop()
+        self.start()
+
 
 @dataclass(frozen=True)
 class ExecResult:
     exit_code: int
     stdout: str
     stderr: str
+    timed_out: bool = False
+    # stdout/stderr were cut to a head and tail; the *_log paths, when set, hold the full streams.
+    truncated: bool = False
+    stdout_log: str | None = None
+    stderr_log: str | None = None
 
 
 class Executor(ABC):
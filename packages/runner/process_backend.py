@@ -0,0 +1,371 @@
+import multiprocessing
+import os
+import shutil
+import signal
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, replace
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
+from typing import Any, Callable, Mapping
+
+from main import LeaseHeartbeat, RunnerBackend, StreamClient
+from shared_models import RunnerJob
+
+# target(job, workdir, emit) runs in the worker process; it must be picklable
+# (a module-level function) when the start method is "spawn" or "forkserver".
+JobTarget = Callable[[RunnerJob, str, Callable[[Mapping[str, object]], None]], None]
+
+PENDING = "pending"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+CANCELED = "canceled"
+TERMINAL_STATUSES = frozenset({FINISHED, FAILED, CANCELED})
+
+
+@dataclass(frozen=True)
+class JobState:
+    job_id: str
+    run_id: str
+    status: str
+    workdir: str
+    pid: int | None = None
+    exit_code: int | None = None
+    error: str | None = None
+    submitted_at: float = 0.0
+    started_at: float | None = None
+    finished_at: float | None = None
+
+
+@dataclass
+class _Job:
+    job: RunnerJob
+    state: JobState
+    process: Any = None
+    conn: Connection | None = None
+    error: str | None = None
+    canceled: bool = False
+    kill_at: float | None = None
+    heartbeat: LeaseHeartbeat | None = None
+
+
+def _run_job(target: JobTarget, job: RunnerJob, workdir: str, conn: Connection) -> None:
+    """Worker-process entry point."""
+    if hasattr(os, "setsid"):
+        # Own process group, so cancellation also reaches anything the job spawns.
+        os.setsid()
+    os.chdir(workdir)
+
+    def emit(event: Mapping[str, object]) -> None:
+        conn.send(("event", dict(event)))
+
+    try:
+        target(job, workdir, emit)
+    except BaseException as exc:
+        conn.send(("error", f"{type(exc).__name__}: {exc}"))
+        conn.close()
+        raise SystemExit(1)
+    conn.close()
+
+
+class ProcessPoolBackend(RunnerBackend):
+    """Runs each job in its own worker process, at most ``max_workers`` at a time.
+
+    Jobs get a private working directory under ``workdir_root``. Events the
+    target emits travel over a per-job pipe and are forwarded to
+    ``stream_client`` in batches by a supervisor thread, which also starts
+    pending jobs as slots free up and records exit status. A job's final
+    status is set only after its pipe is drained, so ``on_complete`` always
+    runs after the job's last event was sent.
+
+    ``cancel_job`` sends SIGTERM to the job's process group and SIGKILL after
+    ``cancel_grace_s``.
+
+    With ``renew_lease`` (e.g. ``ApiClient.heartbeat``), every job renews its
+    run's control-plane lease every ``heartbeat_interval_s`` from submission
+    until it reaches a terminal status, including while it waits for a slot;
+    a job whose lease is lost is canceled.
+    """
+
+    def __init__(
+        self,
+        stream_client: StreamClient,
+        target: JobTarget,
+        workdir_root: str,
+        max_workers: int | None = None,
+        start_method: str | None = None,
+        on_complete: Callable[[JobState], None] | None = None,
+        keep_workdirs: bool = False,
+        cancel_grace_s: float = 5.0,
+        renew_lease: Callable[[str], bool] | None = None,
+        heartbeat_interval_s: float = 20.0,
+    ) -> None:
+        if not isinstance(stream_client, StreamClient):
+            raise TypeError("stream_client must be StreamClient")
+        if not callable(target):
+            raise TypeError("target must be callable")
+        if not isinstance(workdir_root, str):
+            raise TypeError("workdir_root must be str")
+        if renew_lease is not None and not callable(renew_lease):
+            raise TypeError("renew_lease must be callable")
+        if heartbeat_interval_s <= 0:
+            raise ValueError("heartbeat_interval_s must be > 0")
+        self.max_workers = max_workers or os.cpu_count() or 1
+        if self.max_workers < 1:
+            raise ValueError("max_workers must be >= 1")
+        self.stream_client = stream_client
+        self.target = target
+        self.workdir_root = Path(workdir_root)
+        self.on_complete = on_complete
+        self.keep_workdirs = keep_workdirs
+        self.cancel_grace_s = cancel_grace_s
+        self.renew_lease = renew_lease
+        self.heartbeat_interval_s = heartbeat_interval_s
+        self._ctx = multiprocessing.get_context(start_method)
+        self._jobs: dict[str, _Job] = {}
+        self._pending: deque[str] = deque()
+        self._running: dict[str, _Job] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._wake_r, self._wake_w = self._ctx.Pipe(duplex=False)
+        self.workdir_root.mkdir(parents=True, exist_ok=True)
+        self._supervisor = threading.Thread(target=self._supervise, name="process-backend", daemon=True)
+        self._supervisor.start()
+
+    def submit_job(self, job: RunnerJob) -> None:
+        if not isinstance(job, RunnerJob):
+            raise TypeError("job must be RunnerJob")
+        if not job.job_id or os.sep in job.job_id or job.job_id in {".", ".."}:
+            raise ValueError(f"invalid job_id: {job.job_id!r}")
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("backend is closed")
+            if job.job_id in self._jobs:
+                raise ValueError(f"job already submitted: {job.job_id}")
+            state = JobState(
+                job_id=job.job_id,
+                run_id=job.run_id,
+                status=PENDING,
+                workdir=str(self.workdir_root / job.job_id),
+                submitted_at=time.time(),
+            )
+            entry = _Job(job=job, state=state)
+            if self.renew_lease is not None:
+                entry.heartbeat = LeaseHeartbeat(
+                    job.run_id,
+                    self.renew_lease,
+                    self.heartbeat_interval_s,
+                    on_lost=lambda run_id, job_id=job.job_id: self.cancel_job(job_id),
+                )
+                entry.heartbeat.start()
+            self._jobs[job.job_id] = entry
+            self._pending.append(job.job_id)
+        self._wake()
+
+    def cancel_job(self, job_id: str) -> None:
+        if not isinstance(job_id, str):
+            raise TypeError("job_id must be str")
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None:
+                raise KeyError(f"unknown job: {job_id}")
+            if entry.state.status in TERMINAL_STATUSES or entry.canceled:
+                return
+            entry.canceled = True
+            finished = None
+            if job_id in self._pending:
+                self._pending.remove(job_id)
+                entry.state = replace(entry.state, status=CANCELED, finished_at=time.time())
+                finished = entry.state
+            elif entry.process is not None:
+                entry.kill_at = time.monotonic() + self.cancel_grace_s
+                _signal_job(entry.process, signal.SIGTERM)
+            # Otherwise the supervisor is starting it and signals it once started.
+        if finished is not None:
+            self._notify_complete(finished)
+        self._wake()
+
+    def job_status(self, job_id: str) -> JobState:
+        if not isinstance(job_id, str):
+            raise TypeError("job_id must be str")
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None:
+                raise KeyError(f"unknown job: {job_id}")
+            return entry.state
+
+    def active_jobs(self) -> list[JobState]:
+        with self._lock:
+            return [entry.state for entry in self._jobs.values() if entry.state.status not in TERMINAL_STATUSES]
+
+    def forget_job(self, job_id: str) -> None:
+        """Drop a finished job's status record."""
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is not None and entry.state.status in TERMINAL_STATUSES:
+                del self._jobs[job_id]
+
+    def close(self, cancel: bool = True) -> None:
+        """Stop accepting jobs, optionally cancel the rest, and wait for the supervisor."""
+        with self._lock:
+            self._closed = True
+            job_ids = [job_id for job_id, entry in self._jobs.items() if entry.state.status not in TERMINAL_STATUSES]
+        if cancel:
+            for job_id in job_ids:
+                self.cancel_job(job_id)
+        self._wake()
+        self._supervisor.join()
+        self._wake_r.close()
+        self._wake_w.close()
+
+    def _wake(self) -> None:
+        try:
+            self._wake_w.send_bytes(b"\0")
+        except OSError:
+            pass
+
+    def _supervise(self) -> None:
+        while True:
+            self._start_pending()
+            with self._lock:
+                if self._closed and not self._pending and not self._running:
+                    return
+                conns = {entry.conn: entry for entry in self._running.values()}
+                deadlines = [entry.kill_at for entry in self._running.values() if entry.kill_at is not None]
+            timeout = None
+            if deadlines:
+                timeout = max(0.0, min(deadlines) - time.monotonic())
+            ready = wait([self._wake_r, *conns], timeout=timeout)
+            for conn in ready:
+                if conn is self._wake_r:
+                    while self._wake_r.poll():
+                        self._wake_r.recv_bytes()
+                else:
+                    self._drain(conns[conn])
+            self._kill_overdue()
+
+    def _start_pending(self) -> None:
+        while True:
+            with self._lock:
+                if not self._pending or len(self._running) >= self.max_workers:
+                    return
+                entry = self._jobs[self._pending.popleft()]
+                self._running[entry.job.job_id] = entry
+            workdir = entry.state.workdir
+            try:
+                Path(workdir).mkdir(parents=True, exist_ok=True)
+                parent_conn, child_conn = self._ctx.Pipe(duplex=False)
+                process = self._ctx.Process(
+                    target=_run_job,
+                    args=(self.target, entry.job, workdir, child_conn),
+                    name=f"job-{entry.job.job_id}",
+                    daemon=True,
+                )
+                process.start()
+                # Only the child may hold the write end, so its exit reads as EOF here.
+                child_conn.close()
+            except Exception as exc:
+                with self._lock:
+                    del self._running[entry.job.job_id]
+                    entry.state = replace(entry.state, status=FAILED, error=str(exc), finished_at=time.time())
+                    finished = entry.state
+                self._notify_complete(finished)
+                continue
+            with self._lock:
+                entry.process = process
+                entry.conn = parent_conn
+                entry.state = replace(entry.state, status=RUNNING, pid=process.pid, started_at=time.time())
+                if entry.canceled:
+                    entry.kill_at = time.monotonic() + self.cancel_grace_s
+                    _signal_job(process, signal.SIGTERM)
+
+    def _drain(self, entry: _Job) -> None:
+        assert entry.conn is not None
+        events: list[dict] = []
+        eof = False
+        try:
+            while entry.conn.poll():
+                kind, value = entry.conn.recv()
+                if kind == "event":
+                    events.append(value)
+                elif kind == "error":
+                    entry.error = value
+        except (EOFError, OSError):
+            eof = True
+        if events:
+            try:
+                self.stream_client.send(events)
+            except Exception as exc:
+                entry.error = entry.error or f"event delivery failed: {exc}"
+        if eof:
+            self._finish(entry)
+
+    def _finish(self, entry: _Job) -> None:
+        assert entry.conn is not None
+        entry.conn.close()
+        entry.process.join()
+        exit_code = entry.process.exitcode
+        if entry.canceled:
+            status = CANCELED
+        elif exit_code == 0 and entry.error is None:
+            status = FINISHED
+        else:
+            status = FAILED
+        error = entry.error if status == FAILED else None
+        if status == FAILED and error is None:
+            error = f"worker exited with code {exit_code}"
+        with self._lock:
+            del self._running[entry.job.job_id]
+            entry.state = replace(entry.state, status=status, exit_code=exit_code, error=error, finished_at=time.time())
+            entry.process = None
+            entry.conn = None
+            finished = entry.state
+        if not self.keep_workdirs:
+            shutil.rmtree(finished.workdir, ignore_errors=True)
+        self._notify_complete(finished)
+
+    def _kill_overdue(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            overdue = [entry for entry in self._running.values() if entry.kill_at is not None and entry.kill_at <= now]
+            for entry in overdue:
+                _signal_job(entry.process, signal.SIGKILL)
+                # EOF on the pipe finishes the job once it is gone.
+                entry.kill_at = None
+
+    def _notify_complete(self, state: JobState) -> None:
+        with self._lock:
+            entry = self._jobs.get(state.job_id)
+            heartbeat = entry.heartbeat if entry is not None else None
+            if entry is not None:
+                entry.heartbeat = None
+        if heartbeat is not None:
+            heartbeat.stop()
+        if self.on_complete is None:
+            return
+        try:
+            self.on_complete(state)
+        except Exception:
+            # A failing callback must not take the supervisor down with it.
+            pass
+
+
+def _signal_job(process: Any, sig: int) -> None:
+    if process is None or process.pid is None:
+        return
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, sig)
+            return
+        except (ProcessLookupError, PermissionError):
+            # The worker has not called setsid() yet; signal it directly.
+            pass
+    try:
+        if sig == signal.SIGTERM:
+            process.terminate()
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
@@ -0,0 +1,366 @@
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator
+
+from main import Sandbox, SandboxConfig
+from shared_models import RunnerJob
+
+SandboxFactory = Callable[[SandboxConfig], Sandbox]
+
+
+@dataclass
+class SandboxPoolStats:
+    acquires: int = 0
+    # Acquires served by a warm sandbox; the rest paid a cold start.
+    hits: int = 0
+    cold_starts: int = 0
+    warm_starts: int = 0
+    resets: int = 0
+    # Stopped after release: failed reset, max_uses reached or not reusable.
+    recycled: int = 0
+    # Idle sandboxes stopped because demand for their snapshot dropped.
+    evicted: int = 0
+    start_failures: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.acquires if self.acquires else 0.0
+
+
+@dataclass
+class _Slot:
+    sandbox: Sandbox
+    uses: int = 0
+    idle_since: float = 0.0
+
+
+@dataclass
+class _Demand:
+    # (time, sandboxes of the snapshot in use right after an acquire)
+    samples: deque[tuple[float, int]] = field(default_factory=deque)
+    last_acquire: float = 0.0
+
+
+class SandboxPool:
+    """Keeps started sandboxes warm per snapshot and hands them out to jobs.
+
+    ``acquire`` returns an idle sandbox for the snapshot when there is one
+    (a hit) and otherwise starts one inline (a cold start). ``release``
+    resets the sandbox in the background and puts it back, or stops it when
+    it can't be reused or has served ``max_uses`` jobs.
+
+    Pool size follows demand: a snapshot's target is the most of its
+    sandboxes in use at once over the last ``demand_window_s``, capped at
+    ``max_warm_per_snapshot``. A maintenance pass every
+    ``maintain_interval_s`` starts sandboxes up to the target and stops idle
+    ones beyond it that have sat for ``idle_ttl_s``, or all of a snapshot's
+    once it saw no acquire for the whole window. At most ``max_idle``
+    sandboxes are kept idle overall, evicting the snapshots used least
+    recently first. Starts, resets and stops run on ``warm_workers`` threads.
+
+    ``metrics`` reports the hit rate and time-to-first-command: how long
+    ``acquire`` took to return a started sandbox.
+    """
+
+    def __init__(
+        self,
+        factory: SandboxFactory,
+        workdir_root: str,
+        max_warm_per_snapshot: int = 4,
+        max_idle: int = 32,
+        demand_window_s: float = 600.0,
+        idle_ttl_s: float = 120.0,
+        max_uses: int = 50,
+        maintain_interval_s: float = 1.0,
+        warm_workers: int = 2,
+        latency_samples: int = 1024,
+    ) -> None:
+        if not callable(factory):
+            raise TypeError("factory must be callable")
+        if not isinstance(workdir_root, str):
+            raise TypeError("workdir_root must be str")
+        if max_warm_per_snapshot < 0 or max_idle < 0:
+            raise ValueError("pool sizes must be >= 0")
+        if max_uses < 1:
+            raise ValueError("max_uses must be >= 1")
+        self.factory = factory
+        self.workdir_root = workdir_root
+        self.max_warm_per_snapshot = max_warm_per_snapshot
+        self.max_idle = max_idle
+        self.demand_window_s = demand_window_s
+        self.idle_ttl_s = idle_ttl_s
+        self.max_uses = max_uses
+        self.stats = SandboxPoolStats()
+        self._idle: dict[str, deque[_Slot]] = {}
+        self._in_use: dict[int, _Slot] = {}
+        # Sandboxes being started or reset per snapshot, which will turn idle.
+        self._pending: dict[str, int] = {}
+        self._demand: dict[str, _Demand] = {}
+        self._latencies: deque[float] = deque(maxlen=latency_samples)
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._workers = ThreadPoolExecutor(max_workers=warm_workers, thread_name_prefix="sandbox-pool")
+        os.makedirs(workdir_root, exist_ok=True)
+        self._maintainer = threading.Thread(target=self._maintain_loop, args=(maintain_interval_s,), name="sandbox-pool-maintain", daemon=True)
+        self._maintainer.start()
+
+    def acquire(self, snapshot_id: str) -> Sandbox:
+        if not isinstance(snapshot_id, str):
+            raise TypeError("snapshot_id must be str")
+        started = time.monotonic()
+        with self._lock:
+            if self._closed.is_set():
+                raise RuntimeError("sandbox pool is closed")
+            self.stats.acquires += 1
+            idle = self._idle.get(snapshot_id)
+            slot = idle.pop() if idle else None
+            if slot is not None:
+                self.stats.hits += 1
+                self._checkout(snapshot_id, slot, started)
+        if slot is None:
+            try:
+                slot = _Slot(self._start(snapshot_id))
+            except Exception:
+                with self._lock:
+                    self.stats.start_failures += 1
+                raise
+            with self._lock:
+                self.stats.cold_starts += 1
+                self._checkout(snapshot_id, slot, started)
+        # Replace what was just taken without waiting for the next pass.
+        self._refill(snapshot_id)
+        return slot.sandbox
+
+    def acquire_for_job(self, job: RunnerJob) -> Sandbox:
+        if not isinstance(job, RunnerJob):
+            raise TypeError("job must be RunnerJob")
+        return self.acquire(job.snapshot_id)
+
+    def release(self, sandbox: Sandbox, reusable: bool = True) -> None:
+        """Give a sandbox back; unless ``reusable`` is False it is reset and kept warm."""
+        with self._lock:
+            slot = self._in_use.pop(id(sandbox), None)
+            if slot is None:
+                raise KeyError("sandbox not acquired from this pool")
+            snapshot_id = slot.sandbox.config.snapshot_id
+            recycle = not reusable or slot.uses >= self.max_uses or self._closed.is_set()
+            if recycle:
+                self.stats.recycled += 1
+            else:
+                self._pending[snapshot_id] = self._pending.get(snapshot_id, 0) + 1
+        if recycle:
+            self._submit(self._stop, slot.sandbox)
+        else:
+            self._submit(self._reset, slot)
+
+    @contextmanager
+    def lease(self, snapshot_id: str) -> Iterator[Sandbox]:
+        """Acquire for the duration of a block; a block that raises recycles the sandbox."""
+        sandbox = self.acquire(snapshot_id)
+        try:
+            yield sandbox
+        except BaseException:
+            self.release(sandbox, reusable=False)
+            raise
+        self.release(sandbox)
+
+    def prewarm(self, snapshot_id: str, count: int) -> None:
+        """Start up to ``count`` idle sandboxes for a snapshot ahead of demand."""
+        if not isinstance(snapshot_id, str):
+            raise TypeError("snapshot_id must be str")
+        with self._lock:
+            demand = self._demand.setdefault(snapshot_id, _Demand())
+            demand.last_acquire = max(demand.last_acquire, time.monotonic())
+            demand.samples.append((time.monotonic(), min(count, self.max_warm_per_snapshot)))
+        self._refill(snapshot_id)
+
+    def metrics(self) -> dict[str, object]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            idle = {snapshot_id: len(slots) for snapshot_id, slots in self._idle.items() if slots}
+            in_use = len(self._in_use)
+            stats = SandboxPoolStats(**vars(self.stats))
+        return {
+            "acquires": stats.acquires,
+            "hit_rate": stats.hit_rate,
+            "cold_starts": stats.cold_starts,
+            "warm_starts": stats.warm_starts,
+            "resets": stats.resets,
+            "recycled": stats.recycled,
+            "evicted": stats.evicted,
+            "start_failures": stats.start_failures,
+            "in_use": in_use,
+            "idle": idle,
+            "time_to_first_command_p50_s": _percentile(latencies, 0.50),
+            "time_to_first_command_p95_s": _percentile(latencies, 0.95),
+        }
+
+    def maintain(self) -> None:
+        """One sizing pass: warm snapshots up to their targets and evict cold sandboxes."""
+        now = time.monotonic()
+        evict: list[Sandbox] = []
+        with self._lock:
+            for snapshot_id in list(self._demand):
+                demand = self._demand[snapshot_id]
+                while demand.samples and demand.samples[0][0] < now - self.demand_window_s:
+                    demand.samples.popleft()
+                if not demand.samples and not self._idle.get(snapshot_id) and not self._pending.get(snapshot_id):
+                    del self._demand[snapshot_id]
+            for snapshot_id, slots in self._idle.items():
+                target = self._target(snapshot_id)
+                cold = target == 0
+                # Oldest first; a slot's idle_since only moves forward.
+                while len(slots) > target and (cold or now - slots[0].idle_since >= self.idle_ttl_s):
+                    evict.append(slots.popleft().sandbox)
+            total_idle = sum(len(slots) for slots in self._idle.values())
+            if total_idle > self.max_idle:
+                by_recency = sorted(self._idle, key=lambda sid: self._demand[sid].last_acquire if sid in self._demand else 0.0)
+                for snapshot_id in by_recency:
+                    slots = self._idle[snapshot_id]
+                    while slots and total_idle > self.max_idle:
+                        evict.append(slots.popleft().sandbox)
+                        total_idle -= 1
+            self._idle = {snapshot_id: slots for snapshot_id, slots in self._idle.items() if slots}
+            self.stats.evicted += len(evict)
+            snapshots = list(self._demand)
+        for sandbox in evict:
+            self._submit(self._stop, sandbox)
+        for snapshot_id in snapshots:
+            self._refill(snapshot_id)
+
+    def close(self) -> None:
+        """Stop the pool and every idle sandbox; sandboxes still in use are stopped on release."""
+        with self._lock:
+            if self._closed.is_set():
+                return
+            self._closed.set()
+            idle = [slot.sandbox for slots in self._idle.values() for slot in slots]
+            self._idle.clear()
+        self._maintainer.join()
+        for sandbox in idle:
+            self._submit(self._stop, sandbox)
+        self._workers.shutdown(wait=True)
+
+    def __enter__(self) -> "SandboxPool":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _checkout(self, snapshot_id: str, slot: _Slot, started: float) -> None:
+        # Called with the lock held.
+        now = time.monotonic()
+        slot.uses += 1
+        self._in_use[id(slot.sandbox)] = slot
+        self._latencies.append(now - started)
+        demand = self._demand.setdefault(snapshot_id, _Demand())
+        demand.last_acquire = now
+        in_use = sum(1 for other in self._in_use.values() if other.sandbox.config.snapshot_id == snapshot_id)
+        demand.samples.append((now, in_use))
+
+    def _target(self, snapshot_id: str) -> int:
+        # Called with the lock held.
+        demand = self._demand.get(snapshot_id)
+        if demand is None or not demand.samples:
+            return 0
+        return min(self.max_warm_per_snapshot, max(count for _, count in demand.samples))
+
+    def _refill(self, snapshot_id: str) -> None:
+        with self._lock:
+            if self._closed.is_set():
+                return
+            target = self._target(snapshot_id)
+            total_idle = sum(len(slots) for slots in self._idle.values()) + sum(self._pending.values())
+            missing = target - len(self._idle.get(snapshot_id, ())) - self._pending.get(snapshot_id, 0)
+            missing = max(0, min(missing, self.max_idle - total_idle))
+            if missing:
+                self._pending[snapshot_id] = self._pending.get(snapshot_id, 0) + missing
+        for _ in range(missing):
+            self._submit(self._warm_start, snapshot_id)
+
+    def _start(self, snapshot_id: str) -> Sandbox:
+        name = f"{snapshot_id.replace(os.sep, '_')}-{uuid.uuid4().hex[:12]}"
+        sandbox = self.factory(SandboxConfig(snapshot_id=snapshot_id, workdir=os.path.join(self.workdir_root, name)))
+        if not isinstance(sandbox, Sandbox):
+            raise TypeError("factory must return Sandbox")
+        try:
+            sandbox.start()
+        except Exception:
+            self._stop(sandbox)
+            raise
+        return sandbox
+
+    def _warm_start(self, snapshot_id: str) -> None:
+        try:
+            sandbox = self._start(snapshot_id)
+        except Exception:
+            with self._lock:
+                self._pending[snapshot_id] -= 1
+                self.stats.start_failures += 1
+            return
+        with self._lock:
+            self.stats.warm_starts += 1
+        self._park(snapshot_id, _Slot(sandbox))
+
+    def _reset(self, slot: _Slot) -> None:
+        snapshot_id = slot.sandbox.config.snapshot_id
+        try:
+            slot.sandbox.reset()
+        except Exception:
+            with self._lock:
+                self._pending[snapshot_id] -= 1
+                self.stats.recycled += 1
+            self._stop(slot.sandbox)
+            return
+        with self._lock:
+            self.stats.resets += 1
+        self._park(snapshot_id, slot)
+
+    def _park(self, snapshot_id: str, slot: _Slot) -> None:
+        with self._lock:
+            self._pending[snapshot_id] -= 1
+            idle = self._idle.setdefault(snapshot_id, deque())
+            keep = not self._closed.is_set() and len(idle) < self.max_warm_per_snapshot
+            if keep:
+                slot.idle_since = time.monotonic()
+                idle.append(slot)
+            else:
+                self.stats.recycled += 1
+        if not keep:
+            self._stop(slot.sandbox)
+
+    def _stop(self, sandbox: Sandbox) -> None:
+        try:
+            sandbox.stop()
+        except Exception:
+            # Nothing to hand back; a sandbox that won't stop is simply dropped.
+            pass
+
+    def _submit(self, fn: Callable[..., object], *args: object) -> None:
+        try:
+            self._workers.submit(fn, *args)
+        except RuntimeError:
+            # Workers are shut down: finish the job inline.
+            fn(*args)
+
+    def _maintain_loop(self, interval_s: float) -> None:
+        while not self._closed.wait(interval_s):
+            try:
+                self.maintain()
+            except Exception:
+                # Sizing is best effort; the next pass retries.
+                continue
+
+
+def _percentile(sorted_values: list[float], fraction: float) -> float | None:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[max(0, index)]
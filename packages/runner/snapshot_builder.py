@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Sequence
+
+from shared_models import SnapshotRequest
+from snapshot_store import Layer, SnapshotEntry, SnapshotStore, snapshot_key
+
+FULL = "full"
+INCREMENTAL = "incremental"
+CACHED = "cached"
+
+
+@dataclass(frozen=True)
+class DependencyStep:
+    """An install step whose output directory is cached as a layer keyed by its lockfiles.
+
+    e.g. ``DependencyStep(lockfiles=("uv.lock",), command=("uv", "sync", "--frozen"), output_dir=".venv")``
+    """
+
+    lockfiles: tuple[str, ...]
+    command: tuple[str, ...]
+    output_dir: str
+
+
+@dataclass
+class BuildTiming:
+    repo_id: str
+    commit: str
+    key: str
+    mode: str
+    parent_commit: str | None = None
+    total_s: float = 0.0
+    phases: dict[str, float] = field(default_factory=dict)
+    deps_reused: int = 0
+    deps_installed: int = 0
+
+
+class SnapshotBuilder:
+    """Builds snapshots of one git repository into a SnapshotStore.
+
+    A commit whose snapshot is missing is built on the nearest ancestor that
+    has one (searching up to ``max_ancestor_depth`` commits back) as a delta
+    layer: only the paths in ``git diff`` between the two commits are written,
+    and deleted paths become whiteouts. Without a cached ancestor, or once the
+    chain reaches ``max_chain_depth`` layers, the full tree comes from
+    ``git archive``. Dependency outputs are keyed by the hash of their
+    lockfiles, so they are inherited from the parent, restored from the
+    store, or reinstalled only when a lockfile changed.
+
+    Every build records a BuildTiming, appended to ``timings_path`` as JSON
+    lines when one is given.
+    """
+
+    def __init__(
+        self,
+        store: SnapshotStore,
+        repo_path: str,
+        repo_id: str,
+        toolchain: str = "",
+        dependency_steps: Sequence[DependencyStep] = (),
+        incremental: bool = True,
+        max_ancestor_depth: int = 500,
+        max_chain_depth: int = 32,
+        timings_path: str | None = None,
+    ) -> None:
+        if not isinstance(store, SnapshotStore):
+            raise TypeError("store must be SnapshotStore")
+        if not isinstance(repo_path, str) or not isinstance(repo_id, str):
+            raise TypeError("repo_path and repo_id must be str")
+        self.store = store
+        self.repo_path = repo_path
+        self.repo_id = repo_id
+        self.toolchain = toolchain
+        self.dependency_steps = list(dependency_steps)
+        self.incremental = incremental
+        self.max_ancestor_depth = max_ancestor_depth
+        self.max_chain_depth = max_chain_depth
+        self.timings_path = timings_path
+        self.timings: list[BuildTiming] = []
+
+    archive_batch_size = 500
+
+    def build(self, commit: str) -> tuple[SnapshotEntry, BuildTiming]:
+        if not isinstance(commit, str):
+            raise TypeError("commit must be str")
+        start = time.perf_counter()
+        sha = self._git("rev-parse", "--verify", f"{commit}^{{commit}}").decode().strip()
+        key = snapshot_key(self.repo_id, sha, self.toolchain)
+        timing = BuildTiming(repo_id=self.repo_id, commit=sha, key=key, mode=CACHED)
+
+        def populate(staging: str) -> Layer | None:
+            return self._populate(sha, staging, timing)
+
+        request = SnapshotRequest(repo_id=self.repo_id, commit=sha, toolchain=self.toolchain)
+        entry = self.store.get_or_build(request, populate)
+        timing.total_s = time.perf_counter() - start
+        if timing.mode != CACHED:
+            timing.phases["pack"] = timing.total_s - sum(timing.phases.values())
+        self._record(timing)
+        return entry, timing
+
+    def find_parent(self, commit: str) -> SnapshotEntry | None:
+        """Nearest ancestor of ``commit`` (excluding itself) with a snapshot for this toolchain."""
+        cached = {
+            entry.commit: entry
+            for entry in self.store.entries(self.repo_id)
+            if entry.toolchain == self.toolchain and entry.commit != commit
+        }
+        if not cached:
+            return None
+        history = self._git("rev-list", f"--max-count={self.max_ancestor_depth}", commit).decode().split()
+        for ancestor in history:
+            if ancestor in cached:
+                return cached[ancestor]
+        return None
+
+    def _populate(self, sha: str, staging: str, timing: BuildTiming) -> Layer | None:
+        mark = time.perf_counter()
+        parent = self.find_parent(sha) if self.incremental else None
+        if parent is not None and parent.depth >= self.max_chain_depth:
+            # Start a new base so extraction never walks more than max_chain_depth layers.
+            parent = None
+        timing.phases["resolve_parent"] = time.perf_counter() - mark
+        if parent is None:
+            timing.mode = FULL
+            mark = time.perf_counter()
+            self._archive(sha, staging)
+            timing.phases["materialize"] = time.perf_counter() - mark
+            mark = time.perf_counter()
+            for step in self.dependency_steps:
+                self._install_dependencies(step, sha, staging, staging, timing)
+            timing.phases["deps"] = time.perf_counter() - mark
+            return None
+
+        timing.mode = INCREMENTAL
+        timing.parent_commit = parent.commit
+        mark = time.perf_counter()
+        changed, deleted = self._diff(parent.commit, sha)
+        timing.phases["diff"] = time.perf_counter() - mark
+        mark = time.perf_counter()
+        for start in range(0, len(changed), self.archive_batch_size):
+            self._archive(sha, staging, changed[start : start + self.archive_batch_size])
+        timing.phases["materialize"] = time.perf_counter() - mark
+        mark = time.perf_counter()
+        whiteouts = list(deleted)
+        for step in self.dependency_steps:
+            if self._layer_hash(step, parent.commit) == self._layer_hash(step, sha):
+                # Inherited from the parent layer unchanged.
+                timing.deps_reused += 1
+                continue
+            whiteouts.append(step.output_dir)
+            self._install_dependencies(step, sha, staging, None, timing)
+        timing.phases["deps"] = time.perf_counter() - mark
+        return Layer(parent_key=parent.key, whiteouts=tuple(whiteouts))
+
+    def _diff(self, parent_commit: str, sha: str) -> tuple[list[str], list[str]]:
+        """Paths to write at ``sha`` and paths to delete, from ``git diff --name-status``."""
+        out = self._git("diff", "--name-status", "--no-renames", "-z", parent_commit, sha)
+        fields = out.decode("utf-8", "surrogateescape").split("\0")
+        changed, deleted = [], []
+        for status, path in zip(fields[0::2], fields[1::2]):
+            if status == "D":
+                deleted.append(path)
+            else:
+                if status == "T":
+                    # Type change (file <-> symlink): drop the old entry first.
+                    deleted.append(path)
+                changed.append(path)
+        return changed, deleted
+
+    def _install_dependencies(
+        self, step: DependencyStep, sha: str, staging: str, source_tree: str | None, timing: BuildTiming
+    ) -> None:
+        """Put ``step.output_dir`` for ``sha`` into staging, from the store or by running the install.
+
+        Installs run in ``source_tree``, or in a scratch checkout of ``sha`` when the
+        staging dir only holds a delta.
+        """
+        output = Path(staging) / step.output_dir
+        shutil.rmtree(output, ignore_errors=True)
+        layer_request = SnapshotRequest(
+            repo_id=f"{self.repo_id}#deps:{step.output_dir}", commit=self._layer_hash(step, sha), toolchain=self.toolchain
+        )
+        layer_key = snapshot_key(layer_request.repo_id, layer_request.commit, layer_request.toolchain)
+        try:
+            self.store.extract(layer_key, str(output))
+            timing.deps_reused += 1
+            return
+        except KeyError:
+            pass
+        scratch = None
+        if source_tree is None:
+            scratch = tempfile.mkdtemp(dir=Path(staging).parent)
+            self._archive(sha, scratch)
+            source_tree = scratch
+        try:
+            subprocess.run(list(step.command), cwd=source_tree, check=True, capture_output=True)
+            installed = Path(source_tree) / step.output_dir
+            if installed.is_dir():
+                self.store.put_dir(layer_request, str(installed))
+                if scratch is not None:
+                    output.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.move(str(installed), str(output))
+        finally:
+            if scratch is not None:
+                shutil.rmtree(scratch, ignore_errors=True)
+        timing.deps_installed += 1
+
+    def _archive(self, sha: str, dest: str, paths: Sequence[str] = ()) -> None:
+        args = ["archive", "--format=tar", sha]
+        if paths:
+            args += ["--", *paths]
+        archive = self._git(*args)
+        subprocess.run(["tar", "-xf", "-", "-C", dest], input=archive, check=True)
+
+    def _layer_hash(self, step: DependencyStep, commit: str) -> str:
+        digest = hashlib.sha256()
+        digest.update("\0".join(step.command).encode("utf-8"))
+        for lockfile in step.lockfiles:
+            digest.update(b"\0" + lockfile.encode("utf-8") + b"\0")
+            result = subprocess.run(
+                ["git", "-C", self.repo_path, "rev-parse", "--verify", "--quiet", f"{commit}:{lockfile}"],
+                capture_output=True,
+            )
+            # Blob ids already hash the lockfile contents; a missing file hashes as empty.
+            digest.update(result.stdout.strip())
+        return digest.hexdigest()
+
+    def _record(self, timing: BuildTiming) -> None:
+        self.timings.append(timing)
+        if self.timings_path is not None:
+            with open(self.timings_path, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps(asdict(timing)) + "\n")
+
+    def _git(self, *args: str) -> bytes:
+        env = dict(os.environ)
+        # Changed paths are passed to git archive verbatim, never as globs.
+        env["GIT_LITERAL_PATHSPECS"] = "1"
+        return subprocess.run(["git", "-C", self.repo_path, *args], check=True, capture_output=True, env=env).stdout
@@ -0,0 +1,370 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import Callable, Iterable
+
+from shared_models import SnapshotRequest
+
+# Tar member listing the paths a delta layer removes from its parent.
+WHITEOUTS_MEMBER = ".snapshot-whiteouts"
+
+# Extraction filters arrived in 3.11.4; older interpreters get _check_member instead.
+_HAS_DATA_FILTER = hasattr(tarfile, "data_filter")
+
+
+@dataclass(frozen=True)
+class Layer:
+    """Marks a snapshot as a delta on top of ``parent_key``."""
+
+    parent_key: str
+    whiteouts: tuple[str, ...] = ()
+
+
+# populate(staging_dir) writes the snapshot's file tree into an empty
+# directory, or only the changed files when it returns a Layer.
+Populate = Callable[[str], Layer | None]
+
+
+def snapshot_key(repo_id: str, commit: str, toolchain: str = "") -> str:
+    """Content address of a snapshot: sha256 over (repo, commit, toolchain)."""
+    if not isinstance(repo_id, str) or not isinstance(commit, str) or not isinstance(toolchain, str):
+        raise TypeError("repo_id, commit and toolchain must be str")
+    digest = hashlib.sha256()
+    for part in (repo_id, commit, toolchain):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class SnapshotEntry:
+    key: str
+    repo_id: str
+    commit: str
+    toolchain: str
+    path: str
+    size_bytes: int
+    created_at: float
+    last_used_at: float
+    parent_key: str | None = None
+    depth: int = 0
+
+
+@dataclass
+class SnapshotStoreStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    evictions: int = 0
+
+
+class SnapshotStore:
+    """Content-addressed store of packed snapshots on local disk.
+
+    Snapshots are gzip tarballs under ``root/objects``, listed in
+    ``root/index.json``, which is rewritten atomically whenever an entry is
+    added or evicted, so the store survives restarts. A snapshot is either a
+    full tree or a delta layer over a parent snapshot; ``extract`` unpacks the
+    chain base-first. Once the total size passes ``max_bytes`` the least
+    recently used snapshots are evicted together with any layers built on
+    them. ``get_or_build`` is single-flight: concurrent callers for a missing
+    key wait for one build instead of each running their own.
+
+    One process should own a given ``root``; threads may share the instance.
+    """
+
+    compresslevel = 1
+
+    def __init__(self, root: str, max_bytes: int = 20 * 1024**3) -> None:
+        if not isinstance(root, str):
+            raise TypeError("root must be str")
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be >= 1")
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.stats = SnapshotStoreStats()
+        self._entries: dict[str, SnapshotEntry] = {}
+        self._inflight: dict[str, Future[SnapshotEntry]] = {}
+        self._lock = threading.Lock()
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+        # Leftovers of builds interrupted by a crash.
+        shutil.rmtree(self.root / "tmp", ignore_errors=True)
+        (self.root / "tmp").mkdir()
+        self._load_index()
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.size_bytes for entry in self._entries.values())
+
+    def get(self, key: str) -> SnapshotEntry | None:
+        if not isinstance(key, str):
+            raise TypeError("key must be str")
+        with self._lock:
+            return self._touch(key)
+
+    def entries(self, repo_id: str | None = None) -> list[SnapshotEntry]:
+        with self._lock:
+            return [entry for entry in self._entries.values() if repo_id is None or entry.repo_id == repo_id]
+
+    def get_or_build(self, request: SnapshotRequest, populate: Populate) -> SnapshotEntry:
+        if not isinstance(request, SnapshotRequest):
+            raise TypeError("request must be SnapshotRequest")
+        key = snapshot_key(request.repo_id, request.commit, request.toolchain)
+        with self._lock:
+            entry = self._touch(key)
+            if entry is not None:
+                self.stats.hits += 1
+                return entry
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+                self.stats.misses += 1
+            else:
+                self.stats.coalesced += 1
+        assert future is not None
+        if not owner:
+            return future.result()
+        try:
+            entry = self._build(key, request, populate)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        future.set_result(entry)
+        return entry
+
+    def put_dir(self, request: SnapshotRequest, source_dir: str, layer: Layer | None = None) -> SnapshotEntry:
+        """Pack an existing directory as the snapshot for ``request``."""
+        if not isinstance(request, SnapshotRequest):
+            raise TypeError("request must be SnapshotRequest")
+        key = snapshot_key(request.repo_id, request.commit, request.toolchain)
+        return self._add(key, request, self._pack(key, source_dir, layer), layer)
+
+    def extract(self, key: str, dest_dir: str) -> SnapshotEntry:
+        """Unpack a snapshot, and the layers beneath it, into ``dest_dir``."""
+        chain = []
+        with self._lock:
+            next_key: str | None = key
+            while next_key is not None:
+                entry = self._touch(next_key)
+                if entry is None:
+                    raise KeyError(f"unknown snapshot: {next_key}")
+                chain.append(entry)
+                next_key = entry.parent_key
+        dest = Path(dest_dir)
+        dest.mkdir(parents=True, exist_ok=True)
+        for entry in reversed(chain):
+            with tarfile.open(entry.path, "r:gz") as tar:
+                members = []
+                for member in tar:
+                    if member.name == WHITEOUTS_MEMBER:
+                        handle = tar.extractfile(member)
+                        assert handle is not None
+                        _remove_paths(dest, json.load(handle))
+                    else:
+                        members.append(member)
+                if _HAS_DATA_FILTER:
+                    tar.extractall(dest, members=members, filter="data")
+                else:
+                    for member in members:
+                        _check_member(member, dest)
+                    tar.extractall(dest, members=members)
+        return chain[0]
+
+    def evict(self, key: str) -> bool:
+        """Evict a snapshot and every layer built on it."""
+        with self._lock:
+            if key not in self._entries:
+                return False
+            evicted = self._remove_with_descendants(key)
+            self._write_index()
+        for victim in evicted:
+            Path(victim.path).unlink(missing_ok=True)
+        return True
+
+    def flush(self) -> None:
+        """Persist last-used times, which are otherwise only written with the next add or eviction."""
+        with self._lock:
+            self._write_index()
+
+    def _build(self, key: str, request: SnapshotRequest, populate: Populate) -> SnapshotEntry:
+        staging = self.root / "tmp" / f"{key}-{uuid.uuid4().hex}"
+        staging.mkdir()
+        try:
+            layer = populate(str(staging))
+            packed = self._pack(key, str(staging), layer)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return self._add(key, request, packed, layer)
+
+    def _pack(self, key: str, source_dir: str, layer: Layer | None) -> Path:
+        tmp_path = self.root / "tmp" / f"{key}-{uuid.uuid4().hex}.tar.gz"
+        with tarfile.open(tmp_path, "w:gz", compresslevel=self.compresslevel) as tar:
+            if layer is not None and layer.whiteouts:
+                data = json.dumps(list(layer.whiteouts)).encode("utf-8")
+                info = tarfile.TarInfo(WHITEOUTS_MEMBER)
+                info.size = len(data)
+                info.mtime = int(time.time())
+                tar.addfile(info, io.BytesIO(data))
+            for name in sorted(os.listdir(source_dir)):
+                tar.add(os.path.join(source_dir, name), arcname=name)
+        return tmp_path
+
+    def _add(self, key: str, request: SnapshotRequest, packed: Path, layer: Layer | None = None) -> SnapshotEntry:
+        path = self.root / "objects" / key[:2] / f"{key}.tar.gz"
+        path.parent.mkdir(exist_ok=True)
+        now = time.time()
+        with self._lock:
+            parent = None
+            if layer is not None:
+                parent = self._entries.get(layer.parent_key)
+                if parent is None:
+                    packed.unlink(missing_ok=True)
+                    raise KeyError(f"parent snapshot evicted during build: {layer.parent_key}")
+            os.replace(packed, path)
+            entry = SnapshotEntry(
+                key=key,
+                repo_id=request.repo_id,
+                commit=request.commit,
+                toolchain=request.toolchain,
+                path=str(path),
+                size_bytes=path.stat().st_size,
+                created_at=now,
+                last_used_at=now,
+                parent_key=None if parent is None else parent.key,
+                depth=0 if parent is None else parent.depth + 1,
+            )
+            self._entries[key] = entry
+            evicted = self._evict_over_budget(keep=key)
+            self._write_index()
+        for victim in evicted:
+            Path(victim.path).unlink(missing_ok=True)
+        return entry
+
+    def _evict_over_budget(self, keep: str) -> list[SnapshotEntry]:
+        total = sum(entry.size_bytes for entry in self._entries.values())
+        protected = set()
+        next_key: str | None = keep
+        while next_key is not None:
+            protected.add(next_key)
+            next_key = self._entries[next_key].parent_key
+        evicted: list[SnapshotEntry] = []
+        for entry in sorted(self._entries.values(), key=lambda item: item.last_used_at):
+            if total <= self.max_bytes:
+                break
+            if entry.key in protected or entry.key not in self._entries:
+                continue
+            removed = self._remove_with_descendants(entry.key)
+            total -= sum(victim.size_bytes for victim in removed)
+            evicted.extend(removed)
+        return evicted
+
+    def _remove_with_descendants(self, key: str) -> list[SnapshotEntry]:
+        children: dict[str, list[str]] = {}
+        for entry in self._entries.values():
+            if entry.parent_key is not None:
+                children.setdefault(entry.parent_key, []).append(entry.key)
+        removed = []
+        stack = [key]
+        while stack:
+            current = stack.pop()
+            entry = self._entries.pop(current, None)
+            if entry is None:
+                continue
+            removed.append(entry)
+            self.stats.evictions += 1
+            stack.extend(children.get(current, ()))
+        return removed
+
+    def _touch(self, key: str) -> SnapshotEntry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        entry = replace(entry, last_used_at=time.time())
+        self._entries[key] = entry
+        return entry
+
+    def _load_index(self) -> None:
+        index_path = self.root / "index.json"
+        if not index_path.exists():
+            return
+        with open(index_path, encoding="utf-8") as handle:
+            records = json.load(handle)
+        for record in records:
+            entry = SnapshotEntry(**record)
+            if Path(entry.path).exists():
+                self._entries[entry.key] = entry
+        # Layers whose parent did not survive are unusable.
+        for key in [key for key, entry in self._entries.items() if entry.parent_key is not None]:
+            if key in self._entries and not self._has_chain(key):
+                self._remove_with_descendants(key)
+
+    def _has_chain(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        while entry is not None and entry.parent_key is not None:
+            entry = self._entries.get(entry.parent_key)
+        return entry is not None
+
+    def _write_index(self) -> None:
+        index_path = self.root / "index.json"
+        tmp_path = index_path.with_name(f"index.json.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump([asdict(entry) for entry in self._entries.values()], handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, index_path)
+
+
+def _remove_paths(root: Path, paths: Iterable[str]) -> None:
+    """Delete whiteout paths under ``root`` and prune directories they leave empty."""
+    resolved_root = root.resolve()
+    for relative in paths:
+        normalized = os.path.normpath(relative)
+        if os.path.isabs(normalized) or normalized in {".", ".."} or normalized.startswith(".." + os.sep):
+            raise ValueError(f"invalid whiteout path: {relative}")
+        target = root / normalized
+        if not target.parent.resolve().is_relative_to(resolved_root):
+            raise ValueError(f"whiteout path escapes snapshot root: {relative}")
+        if target.is_dir() and not target.is_symlink():
+            shutil.rmtree(target)
+        elif target.is_symlink() or target.exists():
+            target.unlink()
+        parent = target.parent
+        while parent != root and parent.is_dir() and not any(parent.iterdir()):
+            parent.rmdir()
+            parent = parent.parent
+
+
+def _check_member(member: tarfile.TarInfo, dest: Path) -> None:
+    """Reject what tarfile's "data" filter would: special files and paths or links leaving ``dest``."""
+    if not (member.isfile() or member.isdir() or member.issym() or member.islnk()):
+        raise ValueError(f"unsupported member in snapshot: {member.name}")
+    root = dest.resolve()
+    if os.path.isabs(member.name) or not (root / member.name).resolve().is_relative_to(root):
+        raise ValueError(f"snapshot member escapes destination: {member.name}")
+    if member.issym():
+        if os.path.isabs(member.linkname):
+            raise ValueError(f"snapshot symlink is absolute: {member.name}")
+        link_target = (root / member.name).parent / member.linkname
+    elif member.islnk():
+        link_target = root / member.linkname
+    else:
+        link_target = None
+    if link_target is not None and not link_target.resolve().is_relative_to(root):
+        raise ValueError(f"snapshot link escapes destination: {member.name}")
+    # No setuid, setgid or sticky bits, as with the data filter.
+    member.mode &= 0o777
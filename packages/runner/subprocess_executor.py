@@ -0,0 +1,330 @@
+import codecs
+import os
+import selectors
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from typing import IO, Callable, Mapping
+
+from main import ExecResult, Executor
+
+# emit(event) receives {"type": "command_output", "stream": ..., "text": ...}
+# events while a command runs; ProcessPoolBackend's emit fits.
+OutputSink = Callable[[Mapping[str, object]], None]
+# on_output(stream, text), stream being "stdout" or "stderr"; a per-command alternative to emit.
+OutputCallback = Callable[[str, str], None]
+
+TIMEOUT_EXIT_CODE = 124
+_READ_SIZE = 64 * 1024
+# How long to keep reading after the command exits, and the longest select()
+# wait, so an exit is noticed even while nothing is printed.
+_DRAIN_S = 0.1
+_POLL_S = 0.05
+# Why _pump stopped a command early.
+_TIMED_OUT = "timed out"
+_CANCELED = "canceled"
+
+
+class OutputBuffer:
+    """Keeps the first ``head_bytes`` and last ``tail_bytes`` of a stream.
+
+    Once output exceeds both, the middle is dropped from memory; with a
+    ``spill_path`` the whole stream is written there instead, starting from
+    the moment the first byte would be dropped, so memory stays bounded by
+    ``head_bytes + tail_bytes`` however much a command prints.
+    """
+
+    def __init__(self, head_bytes: int, tail_bytes: int, spill_path: str | None = None) -> None:
+        if head_bytes < 0 or tail_bytes < 0:
+            raise ValueError("buffer sizes must be >= 0")
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.spill_path = spill_path
+        self.total_bytes = 0
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._spill: IO[bytes] | None = None
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > len(self._head) + len(self._tail)
+
+    @property
+    def spilled(self) -> bool:
+        return self._spill is not None
+
+    def write(self, data: bytes) -> None:
+        self.total_bytes += len(data)
+        if self._spill is not None:
+            self._spill.write(data)
+        room = self.head_bytes - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        if not data:
+            return
+        self._tail += data
+        excess = len(self._tail) - self.tail_bytes
+        if excess > 0:
+            if self._spill is None and self.spill_path is not None:
+                self._open_spill()
+            # Deleting from the front of a bytearray does not copy the rest.
+            del self._tail[:excess]
+
+    def text(self) -> str:
+        head = self._head.decode("utf-8", "replace")
+        if not self.truncated:
+            return head + self._tail.decode("utf-8", "replace")
+        omitted = self.total_bytes - len(self._head) - len(self._tail)
+        where = f"; full output in {self.spill_path}" if self.spilled else ""
+        marker = f"\n[... {omitted} bytes omitted{where} ...]\n"
+        return head + marker + self._tail.decode("utf-8", "replace")
+
+    def close(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+
+    def _open_spill(self) -> None:
+        # Called before the first byte is dropped, so head + tail is everything so far.
+        self._spill = open(self.spill_path, "wb")
+        self._spill.write(self._head)
+        self._spill.write(self._tail)
+
+
+class SubprocessExecutor(Executor):
+    """Runs shell commands as local processes, streaming their output as it arrives.
+
+    Each command runs in its own session, so a timeout reaches everything it
+    spawned: the process group gets SIGTERM at ``timeout_s`` and SIGKILL
+    ``kill_grace_s`` later, and the result has exit code 124 and ``timed_out``
+    set. When the command exits, whatever it left running in the background
+    gets SIGKILL once its output is drained, so nothing outlives the command
+    into a reused sandbox. Output is read incrementally; ``emit`` receives it
+    as ``command_output`` events, coalesced up to ``event_bytes`` or every
+    ``event_interval_s``, and so does a ``run``'s ``on_output``. Setting a
+    ``run``'s ``cancel`` event stops the command like a timeout, except that
+    the exit code is the signal's and ``timed_out`` stays unset. Each stream
+    keeps at most ``max_output_bytes`` (half head, half tail) in memory; with
+    a ``log_dir``, a stream that overflows is spilled in full to
+    ``<log_dir>/<command id>.<stream>.log``, and the result's
+    ``stdout_log``/``stderr_log`` point there.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        env: Mapping[str, str] | None = None,
+        emit: OutputSink | None = None,
+        max_output_bytes: int = 1024 * 1024,
+        log_dir: str | None = None,
+        kill_grace_s: float = 5.0,
+        event_bytes: int = 16 * 1024,
+        event_interval_s: float = 0.1,
+    ) -> None:
+        if not isinstance(root, str):
+            raise TypeError("root must be str")
+        if emit is not None and not callable(emit):
+            raise TypeError("emit must be callable")
+        if max_output_bytes < 0:
+            raise ValueError("max_output_bytes must be >= 0")
+        if log_dir is not None and not isinstance(log_dir, str):
+            raise TypeError("log_dir must be str")
+        self.root = root
+        self.env = dict(env) if env is not None else None
+        self.emit = emit
+        self.max_output_bytes = max_output_bytes
+        self.log_dir = log_dir
+        self.kill_grace_s = kill_grace_s
+        self.event_bytes = event_bytes
+        self.event_interval_s = event_interval_s
+        if log_dir is not None:
+            os.makedirs(log_dir, exist_ok=True)
+
+    def run(
+        self,
+        command: str,
+        timeout_s: int,
+        on_output: OutputCallback | None = None,
+        cancel: threading.Event | None = None,
+    ) -> ExecResult:
+        if not isinstance(command, str):
+            raise TypeError("command must be str")
+        if on_output is not None and not callable(on_output):
+            raise TypeError("on_output must be callable")
+        command_id = uuid.uuid4().hex
+        buffers = {name: self._buffer(command_id, name) for name in ("stdout", "stderr")}
+        process = subprocess.Popen(
+            command,
+            shell=True,
+            cwd=self.root,
+            env=self.env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+        try:
+            stopped = self._pump(process, buffers, timeout_s, on_output, cancel)
+        finally:
+            # _pump leaves the shell unreaped, so its pid still names the group here.
+            _kill_group(process, signal.SIGKILL)
+            exit_code = process.wait()
+            for buffer in buffers.values():
+                buffer.close()
+        stdout, stderr = buffers["stdout"], buffers["stderr"]
+        stderr_text = stderr.text()
+        timed_out = stopped == _TIMED_OUT
+        if timed_out:
+            exit_code = TIMEOUT_EXIT_CODE
+            stderr_text += f"timed out after {timeout_s}s\n"
+        elif stopped == _CANCELED:
+            stderr_text += "canceled\n"
+        return ExecResult(
+            exit_code=exit_code,
+            stdout=stdout.text(),
+            stderr=stderr_text,
+            timed_out=timed_out,
+            truncated=stdout.truncated or stderr.truncated,
+            stdout_log=stdout.spill_path if stdout.spilled else None,
+            stderr_log=stderr.spill_path if stderr.spilled else None,
+        )
+
+    def _buffer(self, command_id: str, name: str) -> OutputBuffer:
+        head = self.max_output_bytes // 2
+        spill_path = os.path.join(self.log_dir, f"{command_id}.{name}.log") if self.log_dir is not None else None
+        return OutputBuffer(head, self.max_output_bytes - head, spill_path)
+
+    def _pump(
+        self,
+        process: subprocess.Popen,
+        buffers: Mapping[str, OutputBuffer],
+        timeout_s: float,
+        on_output: OutputCallback | None = None,
+        cancel: threading.Event | None = None,
+    ) -> str | None:
+        """Read both pipes until EOF, feeding buffers and output callbacks.
+
+        Returns _TIMED_OUT or _CANCELED if the command was stopped, else None.
+        """
+        selector = selectors.DefaultSelector()
+        streams = {"stdout": process.stdout, "stderr": process.stderr}
+        decoders = {}
+        pending: dict[str, list[str]] = {}
+        pending_bytes = {name: 0 for name in streams}
+        for name, pipe in streams.items():
+            os.set_blocking(pipe.fileno(), False)
+            selector.register(pipe, selectors.EVENT_READ, name)
+            decoders[name] = codecs.getincrementaldecoder("utf-8")("replace")
+            pending[name] = []
+
+        def flush(name: str, final: bool = False) -> None:
+            text = "".join(pending[name]) + (decoders[name].decode(b"", final=True) if final else "")
+            pending[name].clear()
+            pending_bytes[name] = 0
+            if not text:
+                return
+            if self.emit is not None:
+                self.emit({"type": "command_output", "stream": name, "text": text})
+            if on_output is not None:
+                on_output(name, text)
+
+        def stop_requested(now: float) -> str | None:
+            if now >= deadline:
+                return _TIMED_OUT
+            if cancel is not None and cancel.is_set():
+                return _CANCELED
+            return None
+
+        streaming = self.emit is not None or on_output is not None
+        deadline = time.monotonic() + timeout_s
+        kill_at: float | None = None
+        drain_until: float | None = None
+        stopped: str | None = None
+        last_flush = time.monotonic()
+        try:
+            while selector.get_map():
+                now = time.monotonic()
+                if drain_until is None and _exited(process):
+                    # The command is done; something it left running may hold the pipes open.
+                    drain_until = now + _DRAIN_S
+                if drain_until is not None:
+                    if now >= drain_until:
+                        break
+                    wake = drain_until
+                elif kill_at is not None:
+                    if now >= kill_at:
+                        _kill_group(process, signal.SIGKILL)
+                        process.wait()
+                        continue
+                    wake = kill_at
+                else:
+                    stopped = stop_requested(now)
+                    if stopped is not None:
+                        _kill_group(process, signal.SIGTERM)
+                        kill_at = wake = now + self.kill_grace_s
+                    else:
+                        wake = deadline
+                if streaming:
+                    wake = min(wake, last_flush + self.event_interval_s)
+                for key, _ in selector.select(max(0.0, min(wake - now, _POLL_S))):
+                    name = key.data
+                    try:
+                        data = os.read(key.fd, _READ_SIZE)
+                    except BlockingIOError:
+                        continue
+                    if not data:
+                        selector.unregister(key.fileobj)
+                        continue
+                    buffers[name].write(data)
+                    if streaming:
+                        pending[name].append(decoders[name].decode(data))
+                        pending_bytes[name] += len(data)
+                        if pending_bytes[name] >= self.event_bytes:
+                            flush(name)
+                if streaming and time.monotonic() - last_flush >= self.event_interval_s:
+                    for name in streams:
+                        flush(name)
+                    last_flush = time.monotonic()
+        finally:
+            selector.close()
+            for pipe in streams.values():
+                pipe.close()
+            if streaming:
+                for name in streams:
+                    flush(name, final=True)
+        # Both pipes may close while the command runs on; give it the rest of its time.
+        while stopped is None and not _exited(process):
+            now = time.monotonic()
+            stopped = stop_requested(now)
+            if stopped is None:
+                time.sleep(min(_POLL_S, deadline - now))
+                continue
+            _kill_group(process, signal.SIGTERM)
+            try:
+                process.wait(self.kill_grace_s)
+            except subprocess.TimeoutExpired:
+                _kill_group(process, signal.SIGKILL)
+        return stopped
+
+
+def _exited(process: subprocess.Popen) -> bool:
+    """Whether the process has exited, without reaping it (unlike ``poll``)."""
+    if process.returncode is not None:
+        return True
+    try:
+        return os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+    except ChildProcessError:
+        return True
+
+
+def _kill_group(process: subprocess.Popen, sig: int) -> None:
+    try:
+        os.killpg(process.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        # The group is gone; signal the shell itself in case it is not.
+        try:
+            process.send_signal(sig)
+        except (ProcessLookupError, PermissionError):
+            pass
@@ -1,20 +1,33 @@
-from dataclasses import dataclass
-from typing import Any, Callable, Iterable, Mapping
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Mapping
 
+from schema_compiler import Validator, compile_schema
 from shared_models import ToolContract
-
-ToolHandler = Callable[[Mapping[str, Any]], Mapping[str, Any]]
-
+from tool_handlers import AsyncToolHandler, ToolHandler, acall_handler, call_handler, is_async_handler
 
 ToolDefinition = ToolContract
 
 
 @dataclass(frozen=True)
 class ScopePolicy:
-    allowed: set[str]
+    """Allowed scopes; stored as a frozenset so policies are hashable and can key cached decisions."""
+
+    allowed: frozenset[str]
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.allowed, frozenset):
+            object.__setattr__(self, "allowed", frozenset(self.allowed))
+
+    def __hash__(self) -> int:
+        # frozenset caches its hash; cheaper than the generated tuple hash on every lookup.
+        return hash(self.allowed)
+
+    def denied(self, required: Iterable[str]) -> list[str]:
+        return [scope for scope in required if scope not in self.allowed]
 
     def assert_allowed(self, required: Iterable[str]) -> None:
-        missing = [scope for scope in required if scope not in self.allowed]
+        missing = self.denied(required)
         if missing:
             raise PermissionError(f"scopes not allowed: {', '.join(missing)}")
 
@@ -28,21 +41,40 @@ class ToolContext:
     secrets_handle: str
 
 
+_VALIDATORS: dict[int, tuple[Mapping[str, Any], Validator]] = {}
+_MAX_CACHED_VALIDATORS = 1024
+# Per tool: scope decisions cached by policy.
+_MAX_CACHED_DECISIONS = 64
+
+
 def validate_payload(schema: Mapping[str, Any], payload: Mapping[str, Any]) -> None:
-    if not isinstance(schema, Mapping):
-        raise TypeError("schema must be a mapping")
+    """Validate ``payload`` against ``schema``, compiling each schema object once.
+
+    Compiled validators are cached by schema identity, so schemas must not be
+    mutated after first use.
+    """
     if not isinstance(payload, Mapping):
         raise TypeError("payload must be a mapping")
-    required = schema.get("required", [])
-    if required:
-        if not isinstance(required, list):
-            raise TypeError("schema required must be list")
-        for key in required:
-            if key not in payload:
-                raise ValueError(f"missing required key: {key}")
+    cached = _VALIDATORS.get(id(schema))
+    if cached is None or cached[0] is not schema:
+        if len(_VALIDATORS) >= _MAX_CACHED_VALIDATORS:
+            _VALIDATORS.clear()
+        cached = (schema, compile_schema(schema))
+        _VALIDATORS[id(schema)] = cached
+    cached[1](payload)
+
+
+def with_logging(handler: ToolHandler | AsyncToolHandler, name: str) -> ToolHandler | AsyncToolHandler:
+    if is_async_handler(handler):
+
+        async def wrapped_async(payload: Mapping[str, Any]) -> Mapping[str, Any]:
+            if not isinstance(payload, Mapping):
+                raise TypeError("payload must be a mapping")
+            result = await handler(payload)
+            return {"tool": name, "result": result}
 
+        return wrapped_async
 
-def with_logging(handler: ToolHandler, name: str) -> ToolHandler:
     def wrapped(payload: Mapping[str, Any]) -> Mapping[str, Any]:
         if not isinstance(payload, Mapping):
             raise TypeError("payload must be a mapping")
@@ -54,10 +86,48 @@ def with_logging(handler: ToolHandler, name: str) -> ToolHandler:
 
 @dataclass
 class Tool:
+    """A tool definition and its handler, which may be a plain or an ``async def`` function.
+
+    ``arun`` awaits async handlers and runs sync ones on ``executor`` (the
+    event loop's default thread pool when None); ``run`` drives an async
+    handler on a private event loop for sync callers.
+    """
+
     definition: ToolDefinition
-    handler: ToolHandler
+    handler: ToolHandler | AsyncToolHandler
+    _validate_input: Validator = field(init=False, repr=False, compare=False)
+    _scope_decisions: dict[ScopePolicy, str | None] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Compiled once here rather than interpreted on every call.
+        self._validate_input = compile_schema(self.definition.input_schema)
+
+    @property
+    def is_async(self) -> bool:
+        return is_async_handler(self.handler)
+
+    def check(self, payload: Mapping[str, Any], policy: ScopePolicy) -> None:
+        """Enforce ``policy`` and the input schema, raising PermissionError or ValueError."""
+        try:
+            denial = self._scope_decisions[policy]
+        except KeyError:
+            missing = policy.denied(self.definition.scopes)
+            denial = f"scopes not allowed: {', '.join(missing)}" if missing else None
+            if len(self._scope_decisions) >= _MAX_CACHED_DECISIONS:
+                self._scope_decisions.clear()
+            self._scope_decisions[policy] = denial
+        if denial is not None:
+            raise PermissionError(denial)
+        if type(payload) is not dict and not isinstance(payload, Mapping):
+            raise TypeError("payload must be a mapping")
+        self._validate_input(payload)
 
     def run(self, payload: Mapping[str, Any], policy: ScopePolicy) -> Mapping[str, Any]:
-        policy.assert_allowed(self.definition.scopes)
-        validate_payload(self.definition.input_schema, payload)
-        return self.handler(payload)
+        self.check(payload, policy)
+        return call_handler(self.handler, payload, self.definition.name)
+
+    async def arun(
+        self, payload: Mapping[str, Any], policy: ScopePolicy, executor: Executor | None = None
+    ) -> Mapping[str, Any]:
+        self.check(payload, policy)
+        return await acall_handler(self.handler, payload, executor)
@@ -0,0 +1,261 @@
+"""Compile JSON schemas into validator functions once, instead of interpreting them per call.
+
+Supports the subset of draft 2020-12 the contracts use: ``type`` (one type or
+a list), ``enum``, ``const``, ``required``, ``properties``,
+``additionalProperties`` (bool or schema), ``items``, ``minItems``/``maxItems``,
+``minLength``/``maxLength`` and ``minimum``/``maximum``. Annotations such as
+``format``, ``description`` and ``$id`` are ignored.
+
+Each schema becomes the source of one straight-line Python function, so a
+call costs a few inline checks per property rather than a walk over the
+schema. A validator returns None or raises ValueError naming the offending
+path (``input.cmd``, ``scopes[1]``; ``payload`` for the value itself).
+"""
+
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Mapping
+
+Validator = Callable[[Any], None]
+
+CONTRACT_SCHEMAS_DIR = Path(__file__).resolve().parents[2] / "contracts" / "schemas"
+
+# Inline type tests; {v} is the variable under test.
+_TYPE_TESTS = {
+    "string": "isinstance({v}, str)",
+    "integer": "(isinstance({v}, int) and not isinstance({v}, bool))",
+    "number": "(isinstance({v}, (int, float)) and not isinstance({v}, bool))",
+    "boolean": "isinstance({v}, bool)",
+    "object": "(type({v}) is dict or isinstance({v}, _Mapping))",
+    "array": "(type({v}) is list or isinstance({v}, tuple))",
+    "null": "{v} is None",
+}
+
+# keyword: (applies when, violated when, message)
+_BOUNDS = {
+    "minLength": ("string", "len({v}) < {b}", "shorter than"),
+    "maxLength": ("string", "len({v}) > {b}", "longer than"),
+    "minItems": ("array", "len({v}) < {b}", "fewer items than"),
+    "maxItems": ("array", "len({v}) > {b}", "more items than"),
+    "minimum": ("number", "{v} < {b}", "less than"),
+    "maximum": ("number", "{v} > {b}", "greater than"),
+}
+
+_NO_VALUE = object()
+
+
+def compile_schema(schema: Mapping[str, Any]) -> Validator:
+    """Compile ``schema`` into a function that validates one value."""
+    if not isinstance(schema, Mapping):
+        raise TypeError("schema must be a mapping")
+    generator = _Generator()
+    generator.node(schema, "value", ("", True), 1)
+    source = "def validate(value):\n" + "\n".join(generator.lines or ["    pass"]) + "\n    return None\n"
+    namespace = {
+        "_Mapping": Mapping,
+        "_NO_VALUE": _NO_VALUE,
+        "_fail": _fail,
+        "_fail_type": _fail_type,
+        "_fail_missing": _fail_missing,
+        "_fail_unexpected": _fail_unexpected,
+        "_in_enum": _in_enum,
+        **generator.consts,
+    }
+    exec(compile(source, "<schema>", "exec"), namespace)
+    return namespace["validate"]
+
+
+@lru_cache(maxsize=None)
+def contract_validator(name: str, directory: str | None = None) -> Validator:
+    """Validator for ``contracts/schemas/<name>.json``, compiled on first use."""
+    if not isinstance(name, str):
+        raise TypeError("name must be str")
+    path = Path(directory) if directory is not None else CONTRACT_SCHEMAS_DIR
+    with open(path / f"{name}.json", encoding="utf-8") as handle:
+        return compile_schema(json.load(handle))
+
+
+def _where(path: str) -> str:
+    return path or "payload"
+
+
+def _fail(path: str, message: str) -> None:
+    raise ValueError(f"{_where(path)}: {message}")
+
+
+def _fail_type(path: str, expected: str, value: Any) -> None:
+    raise ValueError(f"{_where(path)}: expected {expected}, got {type(value).__name__}")
+
+
+def _fail_missing(value: Mapping[str, Any], required: tuple[str, ...], path: str) -> None:
+    for key in required:
+        if key not in value:
+            raise ValueError(f"missing required key: {f'{path}.{key}' if path else key}")
+
+
+def _fail_unexpected(extra: set[Any], path: str) -> None:
+    raise ValueError(f"{_where(path)}: unexpected keys: {', '.join(sorted(map(str, extra)))}")
+
+
+def _enum_key(value: Any) -> Any:
+    # JSON keeps booleans and numbers apart; Python's True == 1 does not.
+    return (bool, value) if isinstance(value, bool) else value
+
+
+def _in_enum(value: Any, allowed: frozenset | None, options: list[Any]) -> bool:
+    key = _enum_key(value)
+    try:
+        if allowed is not None:
+            return key in allowed
+    except TypeError:
+        pass
+    return any(key == _enum_key(option) for option in options)
+
+
+class _Generator:
+    """Emits the body of a validator function, one schema node at a time.
+
+    A path is (source, is_literal): a string literal while the location is
+    known at compile time, or an expression once it depends on an array
+    index. It is only evaluated on the way to raising.
+    """
+
+    def __init__(self) -> None:
+        self.lines: list[str] = []
+        self.consts: dict[str, Any] = {}
+        self._vars = 0
+
+    def const(self, value: Any) -> str:
+        name = f"_c{len(self.consts)}"
+        self.consts[name] = value
+        return name
+
+    def var(self) -> str:
+        self._vars += 1
+        return f"v{self._vars}"
+
+    def emit(self, indent: int, line: str) -> None:
+        self.lines.append("    " * indent + line)
+
+    def node(self, schema: Mapping[str, Any], v: str, path: tuple[str, bool], indent: int) -> None:
+        if not isinstance(schema, Mapping):
+            raise TypeError("schema must be a mapping")
+        path_src = repr(path[0]) if path[1] else path[0]
+
+        types = schema.get("type")
+        names: list[str] = []
+        if types is not None:
+            names = [types] if isinstance(types, str) else list(types)
+            unknown = [name for name in names if name not in _TYPE_TESTS]
+            if unknown:
+                raise ValueError(f"unsupported schema type: {', '.join(unknown)}")
+            test = " or ".join(_TYPE_TESTS[name].format(v=v) for name in names)
+            self.emit(indent, f"if not ({test}):")
+            self.emit(indent + 1, f"_fail_type({path_src}, {' or '.join(names)!r}, {v})")
+
+        if "const" in schema:
+            const = self.const(schema["const"])
+            # JSON keeps booleans and numbers apart; Python's True == 1 does not.
+            self.emit(indent, f"if {v} != {const} or isinstance({v}, bool) != isinstance({const}, bool):")
+            self.emit(indent + 1, f"_fail({path_src}, {'must be ' + repr(schema['const'])!r})")
+
+        if "enum" in schema:
+            options = schema["enum"]
+            if not isinstance(options, list):
+                raise TypeError("schema enum must be list")
+            try:
+                allowed = frozenset(_enum_key(option) for option in options)
+            except TypeError:
+                allowed = None
+            self.emit(indent, f"if not _in_enum({v}, {self.const(allowed)}, {self.const(options)}):")
+            self.emit(indent + 1, f"_fail({path_src}, {'must be one of ' + repr(options)!r})")
+
+        for keyword, (applies, violated, describe) in _BOUNDS.items():
+            if keyword not in schema:
+                continue
+            bound = schema[keyword]
+            if not isinstance(bound, (int, float)) or isinstance(bound, bool):
+                raise TypeError("schema bounds must be numbers")
+            guard = "" if names == [applies] else f"{_TYPE_TESTS[applies].format(v=v)} and "
+            self.emit(indent, f"if {guard}{violated.format(v=v, b=repr(bound))}:")
+            self.emit(indent + 1, f"_fail({path_src}, {f'{describe} {bound}'!r})")
+
+        if any(keyword in schema for keyword in ("required", "properties", "additionalProperties")):
+            start = len(self.lines)
+            inner = indent
+            if names != ["object"]:
+                self.emit(indent, f"if {_TYPE_TESTS['object'].format(v=v)}:")
+                inner = indent + 1
+            self.object_node(schema, v, path, path_src, inner)
+            self.drop_if_empty(start, inner - indent)
+
+        items = schema.get("items")
+        if items is not None:
+            if not isinstance(items, Mapping):
+                raise TypeError("schema items must be a mapping")
+            start = len(self.lines)
+            inner = indent
+            if names != ["array"]:
+                self.emit(indent, f"if {_TYPE_TESTS['array'].format(v=v)}:")
+                inner = indent + 1
+            index, item = self.var(), self.var()
+            self.emit(inner, f"for {index}, {item} in enumerate({v}):")
+            self.node(items, item, (f"({path_src} + '[' + str({index}) + ']')", False), inner + 1)
+            self.drop_if_empty(start, inner - indent + 1)
+
+    def drop_if_empty(self, start: int, headers: int) -> None:
+        # Guards and loops around a schema that checks nothing.
+        if len(self.lines) == start + headers:
+            del self.lines[start:]
+
+    def object_node(self, schema: Mapping[str, Any], v: str, path: tuple[str, bool], path_src: str, indent: int) -> None:
+        required = schema.get("required", [])
+        if not isinstance(required, list):
+            raise TypeError("schema required must be list")
+        properties = schema.get("properties", {})
+        if not isinstance(properties, Mapping):
+            raise TypeError("schema properties must be a mapping")
+        additional = schema.get("additionalProperties", True)
+        if not isinstance(additional, (bool, Mapping)):
+            raise TypeError("schema additionalProperties must be bool or a mapping")
+
+        if required:
+            self.emit(indent, f"if not {self.const(frozenset(required))} <= {v}.keys():")
+            self.emit(indent + 1, f"_fail_missing({v}, {self.const(tuple(required))}, {path_src})")
+        for key, sub_schema in properties.items():
+            if sub_schema == {}:
+                continue
+            item = self.var()
+            start = len(self.lines)
+            self.emit(indent, f"{item} = {v}.get({key!r}, _NO_VALUE)")
+            self.emit(indent, f"if {item} is not _NO_VALUE:")
+            self.node(sub_schema, item, self.child(path, key), indent + 1)
+            self.drop_if_empty(start, 2)
+        if additional is True:
+            return
+        known = self.const(frozenset(properties))
+        extra = self.var()
+        self.emit(indent, f"{extra} = {v}.keys() - {known}")
+        if additional is False:
+            self.emit(indent, f"if {extra}:")
+            self.emit(indent + 1, f"_fail_unexpected({extra}, {path_src})")
+            return
+        key, item = self.var(), self.var()
+        start = len(self.lines) - 1
+        self.emit(indent, f"for {key} in {extra}:")
+        self.emit(indent + 1, f"{item} = {v}[{key}]")
+        if path[1]:
+            prefix = f"{path[0]}." if path[0] else ""
+            child = (f"({prefix!r} + str({key}))", False)
+        else:
+            child = (f"({path[0]} + '.' + str({key}))", False)
+        self.node(additional, item, child, indent + 1)
+        self.drop_if_empty(start, 3)
+
+    @staticmethod
+    def child(path: tuple[str, bool], key: str) -> tuple[str, bool]:
+        source, literal = path
+        if literal:
+            return (f"{source}.{key}" if source else key, True)
+        return (f"({source} + {('.' + key)!r})", False)
@@ -0,0 +1,87 @@
+"""Benchmark QueueDispatcher throughput and queue-to-dispatch latency.
+
+Queues N runs against the in-memory backend, starts the dispatcher with a fake
+runner that finishes each job after a fixed delay, and reports runs/sec plus
+the queue wait observed at dispatch.
+
+    python scripts/bench_dispatch.py --runs 5000 --max-active 256
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+_REPO_ROOT = Path(__file__).resolve().parents[1]
+for path in (_REPO_ROOT, _REPO_ROOT / "packages" / "control_plane" / "src"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from dispatcher import QueueDispatcher
+from leases import LeasePolicy
+from main import AsyncControlPlane, ControlPlaneState
+from shared_models import RunnerJob
+from state_backends import AsyncBackendAdapter
+
+
+class FakeRunner:
+    def __init__(self, control_plane: AsyncControlPlane, loop: asyncio.AbstractEventLoop, job_s: float) -> None:
+        self.control_plane = control_plane
+        self.loop = loop
+        self.job_s = job_s
+        self.finished = 0
+        self.done = asyncio.Event()
+        self.expected = 0
+
+    def submit_job(self, job: RunnerJob) -> None:
+        self.loop.call_soon_threadsafe(self.loop.call_later, self.job_s, self._finish, job.run_id)
+
+    def _finish(self, run_id: str) -> None:
+        async def complete() -> None:
+            await self.control_plane.complete_run(run_id, "finished")
+            self.finished += 1
+            if self.finished >= self.expected:
+                self.done.set()
+
+        asyncio.ensure_future(complete())
+
+
+async def bench(runs: int, sessions: int, max_active: int, batch_size: int, job_s: float) -> None:
+    control_plane = AsyncControlPlane(
+        state=AsyncBackendAdapter(ControlPlaneState()),
+        lease_policy=LeasePolicy(max_active_runs=max_active),
+    )
+    session_ids = [(await control_plane.create_session("bench_repo"))["id"] for _ in range(sessions)]
+    for i in range(runs):
+        await control_plane.create_run(session_ids[i % sessions], f"prompt {i}")
+
+    runner = FakeRunner(control_plane, asyncio.get_running_loop(), job_s)
+    runner.expected = runs
+    dispatcher = QueueDispatcher(control_plane, runner, batch_size=batch_size)
+    start = time.perf_counter()
+    await dispatcher.start()
+    await runner.done.wait()
+    elapsed = time.perf_counter() - start
+    await dispatcher.stop()
+
+    metrics = await control_plane.queue_metrics()
+    print(f"runs={runs} sessions={sessions} max_active={max_active} batch={batch_size} job_s={job_s}")
+    print(f"dispatch+complete throughput: {runs / elapsed:,.0f} runs/sec ({elapsed:.2f}s)")
+    print(f"batches={dispatcher.stats.batches} failed={dispatcher.stats.failed_total}")
+    print(f"queue-to-dispatch wait: avg={metrics.avg_wait_s * 1000:.1f}ms max={metrics.max_wait_s * 1000:.1f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5000)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--max-active", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--job-s", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(bench(args.runs, args.sessions, args.max_active, args.batch_size, args.job_s))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Microbenchmark event codecs: encode/decode throughput and bytes per event.
+
+Compares stdlib JSON, orjson and the msgpack codec (pure Python, plus the
+msgpack package when installed) on a few representative event shapes, with
+and without the per-batch deflate the runner stream applies:
+
+    python scripts/bench_event_codecs.py --events 20000
+"""
+
+import argparse
+import sys
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+_REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(_REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(_REPO_ROOT))
+
+import event_codecs
+from event_codecs import EventCodec, JsonCodec, MsgpackCodec
+from shared_models import EventEnvelope
+
+
+def make_envelope(event_type: str, payload: dict) -> EventEnvelope:
+    return EventEnvelope(
+        id=f"evt_{uuid.uuid4().hex}",
+        ts=datetime.now(timezone.utc).isoformat(),
+        type=event_type,
+        session_id=f"sess_{uuid.uuid4().hex}",
+        run_id=f"run_{uuid.uuid4().hex}",
+        payload=payload,
+    )
+
+
+def shapes() -> dict[str, Callable[[int], object]]:
+    return {
+        "step": lambda i: make_envelope("step_started", {"description": f"step {i}"}).to_dict(),
+        "tool_output": lambda i: make_envelope(
+            "tool_output", {"tool": "shell", "exit_code": 0, "stdout": "ok: test passed\n" * 64, "elapsed_ms": 12.5}
+        ).to_dict(),
+        "envelope": lambda i: make_envelope("step_finished", {"description": f"step {i}"}),
+        "untyped": lambda i: {"id": f"evt_{uuid.uuid4().hex}", "type": "run_queued", "session_id": "sess_1", "run_id": "run_1", "payload": {"prompt": "fix the build"}},
+    }
+
+
+def codecs() -> dict[str, EventCodec]:
+    result: dict[str, EventCodec] = {"json": JsonCodec(fast=False)}
+    if event_codecs.orjson is not None:
+        result["orjson"] = JsonCodec()
+    result["msgpack-py"] = MsgpackCodec(native=False)
+    if event_codecs.msgpack is not None:
+        result["msgpack"] = MsgpackCodec()
+    return result
+
+
+def bench(codec: EventCodec, events: list, batch_size: int) -> tuple[float, float, float, float]:
+    start = time.perf_counter()
+    encoded = [codec.encode(event) for event in events]
+    encode_s = time.perf_counter() - start
+    start = time.perf_counter()
+    for data in encoded:
+        codec.decode(data)
+    decode_s = time.perf_counter() - start
+    raw = sum(len(data) for data in encoded) / len(encoded)
+    batches = [codec.join(encoded[i : i + batch_size]) for i in range(0, len(encoded), batch_size)]
+    deflated = sum(len(zlib.compress(batch, 1)) for batch in batches) / len(encoded)
+    return len(events) / encode_s, len(events) / decode_s, raw, deflated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=500, help="events per deflated batch")
+    args = parser.parse_args()
+
+    print(f"{'shape':<13}{'codec':<12}{'encode/s':>12}{'decode/s':>12}{'B/event':>9}{'deflated':>10}")
+    for shape, make in shapes().items():
+        events = [make(i) for i in range(args.events)]
+        for name, codec in codecs().items():
+            encode_rate, decode_rate, raw, deflated = bench(codec, events, args.batch_size)
+            print(f"{shape:<13}{name:<12}{encode_rate:>12.0f}{decode_rate:>12.0f}{raw:>9.1f}{deflated:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark event construction for a long run: events/sec into an EventLog.
+
+Emits the events of an N-step run (run_started, step_started/step_finished
+per step, run_finished) the way the agent loop does, with the previous
+construction path (uuid4 ids, datetime.now() timestamps, a dict copy of
+every envelope), the protocol helpers and a per-run EventFactory:
+
+    python scripts/bench_event_factory.py --steps 10000 --repeat 5
+"""
+
+import argparse
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+_REPO_ROOT = Path(__file__).resolve().parents[1]
+for path in (_REPO_ROOT, _REPO_ROOT / "packages" / "agent_core" / "src"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from protocol import EventFactory, event_run_finished, event_run_started, event_step_finished, event_step_started
+from shared_models import EventEnvelope, EventLog
+
+SESSION_ID = f"sess_{uuid.uuid4().hex}"
+RUN_ID = f"run_{uuid.uuid4().hex}"
+
+
+def legacy_event(event_type: str, payload: dict) -> dict:
+    return EventEnvelope(
+        id=f"evt_{uuid.uuid4().hex}",
+        ts=datetime.now(timezone.utc).isoformat(),
+        type=event_type,
+        session_id=SESSION_ID,
+        run_id=RUN_ID,
+        payload=payload,
+    ).to_dict()
+
+
+def run_legacy(steps: int, log: EventLog) -> None:
+    log.append(legacy_event("run_started", {"prompt": "fix the build"}))
+    for i in range(steps):
+        log.append(legacy_event("step_started", {"description": f"step {i}"}))
+        log.append(legacy_event("step_finished", {"description": f"step {i}"}))
+    log.append(legacy_event("run_finished", {"stopped": False}))
+
+
+def run_helpers(steps: int, log: EventLog) -> None:
+    log.append(event_run_started(SESSION_ID, RUN_ID, "fix the build"))
+    for i in range(steps):
+        log.append(event_step_started(SESSION_ID, RUN_ID, f"step {i}"))
+        log.append(event_step_finished(SESSION_ID, RUN_ID, f"step {i}"))
+    log.append(event_run_finished(SESSION_ID, RUN_ID, False))
+
+
+def run_factory(steps: int, log: EventLog) -> None:
+    events = EventFactory(SESSION_ID, RUN_ID)
+    log.append(events.run_started("fix the build"))
+    for i in range(steps):
+        log.append(events.step_started(f"step {i}"))
+        log.append(events.step_finished(f"step {i}"))
+    log.append(events.run_finished(False))
+
+
+def bench(run: Callable[[int, EventLog], None], steps: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        log = EventLog()
+        start = time.perf_counter()
+        run(steps, log)
+        best = min(best, time.perf_counter() - start)
+        events = log.list()
+        assert len(events) == 2 * steps + 2
+    return (2 * steps + 2) / best
+
+
+def log_of(run: Callable[[int, EventLog], None], steps: int) -> list:
+    log = EventLog()
+    run(steps, log)
+    return list(log.list())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5, help="report the best of this many runs")
+    args = parser.parse_args()
+
+    ids = [event["id"] for event in log_of(run_factory, args.steps)]
+    assert ids == sorted(ids), "factory ids are not in creation order"
+
+    baseline = bench(run_legacy, args.steps, args.repeat)
+    print(f"{'path':<10}{'events/s':>12}{'us/event':>10}{'speedup':>9}")
+    for name, run in (("legacy", run_legacy), ("helpers", run_helpers), ("factory", run_factory)):
+        rate = baseline if run is run_legacy else bench(run, args.steps, args.repeat)
+        print(f"{name:<10}{rate:>12.0f}{1e6 / rate:>10.2f}{rate / baseline:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark patch creation and application: difflib.ndiff against unified diffs.
+
+Generates files of each size (a repetitive lockfile and unique source-like
+lines), changes a fraction of their lines (edits, insertions, deletions),
+and reports diff and apply latency, patch size and whether the round trip
+reproduced the file byte for byte (ndiff drops a final newline), for
+patch_ndiff and for patch_unified with each algorithm. ndiff grows roughly
+quadratically, so it is skipped above ``--ndiff-limit`` lines:
+
+    python scripts/bench_patch_engine.py --lines 10000 30000 100000 --ndiff-limit 30000
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+_REPO_ROOT = Path(__file__).resolve().parents[1]
+for path in (_REPO_ROOT, _REPO_ROOT / "packages" / "agent_core" / "src"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from patch_ndiff import apply_ndiff, make_ndiff, ndiff_to_text
+from patch_unified import ALGORITHMS, apply_patch, make_patch, parse_patch, patch_to_text
+
+
+def lockfile(lines: int, rng: random.Random) -> list[str]:
+    out = []
+    for index in range(lines // 4):
+        out += [f'name = "pkg-{index}"', f'version = "{rng.randrange(4)}.{rng.randrange(20)}.{rng.randrange(9)}"', 'source = "registry"', ""]
+    return out
+
+
+def source(lines: int, rng: random.Random) -> list[str]:
+    out = []
+    for index in range(lines // 4):
+        out += [f"def handler_{index}(value):", f"    total = value * {rng.randrange(1000)}", "    return total", ""]
+    return out
+
+
+def mutate(lines: list[str], rate: float, rng: random.Random) -> list[str]:
+    out = list(lines)
+    for _ in range(max(1, int(len(lines) * rate))):
+        at = rng.randrange(len(out))
+        choice = rng.random()
+        if choice < 0.5:
+            out[at] = out[at] + "  # changed"
+        elif choice < 0.75:
+            out.insert(at, f"inserted = {rng.randrange(10**6)}")
+        else:
+            del out[at]
+    return out
+
+
+def timed(fn: Callable[[], object]) -> tuple[object, float]:
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run_ndiff(original: str, updated: str) -> tuple[float, float, int, bool]:
+    diff, diff_ms = timed(lambda: make_ndiff(original, updated))
+    text = ndiff_to_text(diff)
+    result, apply_ms = timed(lambda: apply_ndiff(text.split("\n")))
+    return diff_ms, apply_ms, len(text.encode("utf-8")), result == updated
+
+
+def run_unified(original: str, updated: str, algorithm: str) -> tuple[float, float, int, bool]:
+    patch, diff_ms = timed(lambda: make_patch(original, updated, "bench.txt", algorithm=algorithm))
+    text = patch_to_text(patch)
+    result, apply_ms = timed(lambda: apply_patch(original, parse_patch(text)[0], fuzz=0))
+    return diff_ms, apply_ms, len(text.encode("utf-8")), result == updated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, nargs="+", default=[10_000, 30_000, 100_000])
+    parser.add_argument("--edit-rate", type=float, default=0.005, help="fraction of lines changed")
+    parser.add_argument("--ndiff-limit", type=int, default=30_000, help="skip ndiff for larger files")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'file':<10}{'lines':>8}  {'engine':<18}{'diff ms':>10}{'apply ms':>10}{'patch KiB':>11}{'exact':>7}")
+    for kind, generate in (("lockfile", lockfile), ("source", source)):
+        for size in args.lines:
+            rng = random.Random(args.seed)
+            original_lines = generate(size, rng)
+            original = "\n".join(original_lines) + "\n"
+            updated = "\n".join(mutate(original_lines, args.edit_rate, rng)) + "\n"
+            runs: list[tuple[str, Callable[[], tuple[float, float, int, bool]]]] = []
+            if size <= args.ndiff_limit:
+                runs.append(("ndiff", lambda: run_ndiff(original, updated)))
+            for algorithm in ALGORITHMS:
+                runs.append((f"unified/{algorithm}", lambda algorithm=algorithm: run_unified(original, updated, algorithm)))
+            for name, run in runs:
+                diff_ms, apply_ms, patch_bytes, exact = run()
+                print(f"{kind:<10}{size:>8}  {name:<18}{diff_ms:>10.1f}{apply_ms:>10.1f}{patch_bytes / 1024:>11.1f}{'yes' if exact else 'no':>7}")
+            if size > args.ndiff_limit:
+                print(f"{kind:<10}{size:>8}  {'ndiff':<18}{'skipped (--ndiff-limit)':>38}")
+
+
+if __name__ == "__main__":
+    main()
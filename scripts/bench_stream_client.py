@@ -0,0 +1,87 @@
+"""Benchmark BatchingStreamClient throughput against a local fake ingest endpoint.
+
+Sends N events one call at a time, the way an agent loop would, for each batch
+size, and reports events/sec until every event was acknowledged, plus batch
+counts and compression:
+
+    python scripts/bench_stream_client.py --events 100000 --batch-events 1 50 500 2000
+
+--latency-ms adds per-request latency at the fake endpoint, and --outage-s
+keeps it down for that long from the start to measure catch-up from the spool.
+"""
+
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+_REPO_ROOT = Path(__file__).resolve().parents[1]
+for path in (_REPO_ROOT, _REPO_ROOT / "packages" / "runner"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from event_stream import BatchingStreamClient, BatchSpool, HttpTransport
+from fake_ingest import FakeIngestServer
+
+
+def make_event(i: int, payload_bytes: int) -> dict:
+    return {
+        "id": f"evt_{i:012d}",
+        "ts": "2024-01-01T00:00:00Z",
+        "type": "tool_output",
+        "session_id": "sess_bench",
+        "run_id": "run_bench",
+        "payload": {"seq": i, "text": ("line of tool output " * (payload_bytes // 20 + 1))[:payload_bytes]},
+    }
+
+
+def bench(events: int, batch_events: int, payload_bytes: int, latency_s: float, outage_s: float, spool_dir: str | None) -> None:
+    with FakeIngestServer(latency_s=latency_s) as fake:
+        spool = BatchSpool(tempfile.mkdtemp(dir=spool_dir)) if spool_dir is not None else None
+        client = BatchingStreamClient(HttpTransport(fake.url), spool=spool, max_batch_events=batch_events, retry_max_s=0.5)
+        outage = None
+        if outage_s:
+            # The endpoint is down from the first event and comes back after outage_s.
+            fake.stop()
+            outage = threading.Timer(outage_s, fake.start)
+        start = time.perf_counter()
+        if outage is not None:
+            outage.start()
+        send_s = 0.0
+        for i in range(events):
+            mark = time.perf_counter()
+            client.send([make_event(i, payload_bytes)])
+            send_s += time.perf_counter() - mark
+        client.flush()
+        elapsed = time.perf_counter() - start
+        if outage is not None:
+            outage.join()
+        client.close()
+        stats = client.stats
+        assert len(fake.events) == events, f"delivered {len(fake.events)} of {events}"
+        ratio = stats.raw_bytes / stats.wire_bytes if stats.wire_bytes else 0.0
+        print(
+            f"{batch_events:>7}{events / elapsed:>13.0f}{send_s / events * 1e6:>11.1f}"
+            f"{stats.batches_sent:>9}{stats.retransmits:>8}{stats.wire_bytes / 1024**2:>10.2f}{ratio:>8.1f}x"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--batch-events", type=int, nargs="+", default=[1, 50, 500, 2000])
+    parser.add_argument("--payload-bytes", type=int, default=256)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--outage-s", type=float, default=0.0)
+    parser.add_argument("--spool-dir", help="spool batches to disk under this directory")
+    args = parser.parse_args()
+
+    print(f"{'batch':>7}{'events/s':>13}{'send us':>11}{'batches':>9}{'resent':>8}{'wire MiB':>10}{'ratio':>9}")
+    for batch_events in args.batch_events:
+        bench(args.events, batch_events, args.payload_bytes, args.latency_ms / 1000, args.outage_s, args.spool_dir)
+
+
+if __name__ == "__main__":
+    main()
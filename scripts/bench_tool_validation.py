@@ -0,0 +1,93 @@
+"""Benchmark per-call tool checks: the previous interpreted checks against compiled validators.
+
+Times, per call, the scope check plus input validation a tool_sdk Tool runs
+before its handler, and validation of a tool call against the full
+contracts/schemas/tool_call.json, which the previous code only checked for
+required keys:
+
+    python scripts/bench_tool_validation.py --calls 200000
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterable, Mapping
+
+_REPO_ROOT = Path(__file__).resolve().parents[1]
+for path in (_REPO_ROOT, _REPO_ROOT / "packages" / "tool_sdk"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from main import ScopePolicy, Tool, ToolDefinition
+from schema_compiler import contract_validator
+
+
+def legacy_validate_payload(schema: Mapping[str, Any], payload: Mapping[str, Any]) -> None:
+    if not isinstance(schema, Mapping):
+        raise TypeError("schema must be a mapping")
+    if not isinstance(payload, Mapping):
+        raise TypeError("payload must be a mapping")
+    required = schema.get("required", [])
+    if required:
+        if not isinstance(required, list):
+            raise TypeError("schema required must be list")
+        for key in required:
+            if key not in payload:
+                raise ValueError(f"missing required key: {key}")
+
+
+def legacy_assert_allowed(allowed: set[str], required: Iterable[str]) -> None:
+    missing = [scope for scope in required if scope not in allowed]
+    if missing:
+        raise PermissionError(f"scopes not allowed: {', '.join(missing)}")
+
+
+def per_call_us(check: Callable[[], None], calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        check()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200_000)
+    args = parser.parse_args()
+
+    definition = ToolDefinition(
+        name="github.pr.create",
+        input_schema={"required": ["repo", "title"]},
+        output_schema={"required": ["url"]},
+        scopes=["git.write"],
+    )
+    tool = Tool(definition=definition, handler=lambda payload: {"url": "https://example.invalid/pr/1"})
+    policy = ScopePolicy(allowed={"git.write"})
+    allowed = {"git.write"}
+    payload = {"repo": "ganak-ai/ganak", "title": "Ganak Example"}
+
+    schema_path = _REPO_ROOT / "contracts" / "schemas" / "tool_call.json"
+    schema = json.loads(schema_path.read_text(encoding="utf-8"))
+    sample_path = _REPO_ROOT / "contracts" / "examples" / "sample-events" / "tool-call.json"
+    call = json.loads(sample_path.read_text(encoding="utf-8"))["payload"]
+    validate_call = contract_validator("tool_call")
+
+    def legacy_tool_check() -> None:
+        legacy_assert_allowed(allowed, definition.scopes)
+        legacy_validate_payload(definition.input_schema, payload)
+
+    cases = (
+        ("tool check", "legacy (scopes + required)", legacy_tool_check, "compiled", lambda: tool.check(payload, policy)),
+        ("tool_call", "legacy (required only)", lambda: legacy_validate_payload(schema, call), "compiled (full schema)", lambda: validate_call(call)),
+    )
+    print(f"{'case':<12}{'path':<28}{'us/call':>9}{'speedup':>9}")
+    for case, old_name, old, new_name, new in cases:
+        old_us = per_call_us(old, args.calls)
+        new_us = per_call_us(new, args.calls)
+        print(f"{case:<12}{old_name:<28}{old_us:>9.3f}{1:>8.2f}x")
+        print(f"{'':<12}{new_name:<28}{new_us:>9.3f}{old_us / new_us:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
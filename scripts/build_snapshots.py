@@ -1,6 +1,85 @@
+"""Build repo snapshots into a local SnapshotStore and report build timings.
+
+Builds the given commits (or the last N first-parent commits, oldest first),
+each incrementally from the nearest cached ancestor unless --full is set:
+
+    python scripts/build_snapshots.py --repo /src/monorepo --repo-id monorepo \\
+        --store /var/cache/snapshots --last 20 \\
+        --deps "uv.lock:.venv:uv sync --frozen"
+
+Run once with --full against an empty store and once without to compare.
+"""
+
+import argparse
+import shlex
+import subprocess
+import sys
+from pathlib import Path
+
+_REPO_ROOT = Path(__file__).resolve().parents[1]
+for path in (_REPO_ROOT, _REPO_ROOT / "packages" / "runner"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from snapshot_builder import FULL, INCREMENTAL, DependencyStep, SnapshotBuilder
+from snapshot_store import SnapshotStore
+
+
+def parse_dependency_step(spec: str) -> DependencyStep:
+    """Parse ``lockfile[,lockfile...]:output_dir:command``."""
+    lockfiles, output_dir, command = spec.split(":", 2)
+    return DependencyStep(lockfiles=tuple(lockfiles.split(",")), command=tuple(shlex.split(command)), output_dir=output_dir)
+
 
 def main() -> None:
-    print("snapshot build placeholder")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repo", required=True, help="path to a local clone")
+    parser.add_argument("--repo-id", required=True)
+    parser.add_argument("--store", required=True, help="snapshot store directory")
+    parser.add_argument("--max-store-gb", type=float, default=20.0)
+    parser.add_argument("--toolchain", default="")
+    parser.add_argument("--deps", action="append", default=[], help="lockfiles:output_dir:command; repeatable")
+    parser.add_argument("--full", action="store_true", help="disable incremental builds")
+    parser.add_argument("--timings", help="append BuildTiming records to this JSON-lines file")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--commits", nargs="+")
+    group.add_argument("--last", type=int)
+    args = parser.parse_args()
+
+    commits = args.commits
+    if commits is None:
+        out = subprocess.run(
+            ["git", "-C", args.repo, "rev-list", "--first-parent", "--reverse", f"--max-count={args.last}", "HEAD"],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        # --max-count applies before --reverse, so this is the newest N, oldest first.
+        commits = out.split()
+
+    store = SnapshotStore(args.store, max_bytes=int(args.max_store_gb * 1024**3))
+    builder = SnapshotBuilder(
+        store,
+        repo_path=args.repo,
+        repo_id=args.repo_id,
+        toolchain=args.toolchain,
+        dependency_steps=[parse_dependency_step(spec) for spec in args.deps],
+        incremental=not args.full,
+        timings_path=args.timings,
+    )
+
+    print(f"{'commit':<14}{'mode':<13}{'total s':>9}{'deps':>6}  phases")
+    for commit in commits:
+        entry, timing = builder.build(commit)
+        phases = " ".join(f"{name}={seconds:.3f}" for name, seconds in timing.phases.items())
+        deps = f"{timing.deps_installed}/{timing.deps_reused}"
+        print(f"{timing.commit[:12]:<14}{timing.mode:<13}{timing.total_s:>9.3f}{deps:>6}  {phases}")
+
+    for mode in (FULL, INCREMENTAL):
+        runs = [timing.total_s for timing in builder.timings if timing.mode == mode]
+        if runs:
+            print(f"{mode}: {len(runs)} builds, mean {sum(runs) / len(runs):.3f}s")
+    print(f"store: {len(store.entries())} snapshots, {store.total_bytes / 1024**2:.1f} MiB, {store.stats}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,117 @@
+"""Load-test one or more running control planes and compare throughput and latency.
+
+Start the servers to compare (for example the sync build on :8000 and the async
+build on :8001), then run:
+
+    python scripts/load_test_control_plane.py \
+        --target before=http://localhost:8000 --target after=http://localhost:8001
+"""
+
+import argparse
+import http.client
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+
+
+@dataclass
+class LoadResult:
+    label: str
+    requests: int = 0
+    errors: int = 0
+    elapsed_s: float = 0.0
+    latencies_ms: list[float] = field(default_factory=list)
+
+    @property
+    def rps(self) -> float:
+        return self.requests / self.elapsed_s if self.elapsed_s else 0.0
+
+    def percentile(self, pct: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+def _request(conn: http.client.HTTPConnection, method: str, path: str, body: dict | None = None) -> dict:
+    data = None if body is None else json.dumps(body).encode("utf-8")
+    conn.request(method, path, body=data, headers={"Content-Type": "application/json"})
+    resp = conn.getresponse()
+    payload = resp.read()
+    if resp.status >= 400:
+        raise RuntimeError(f"{method} {path} -> {resp.status}")
+    return json.loads(payload) if payload else {}
+
+
+def _worker(base_url: str, deadline: float, read_ratio: int, result: LoadResult, lock: threading.Lock) -> None:
+    url = urlparse(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    session_id = _request(conn, "POST", "/sessions", {"repo_id": "load_repo"})["id"]
+    latencies: list[float] = []
+    errors = 0
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if i % (read_ratio + 1) == 0:
+                _request(conn, "POST", "/runs", {"session_id": session_id, "prompt": "load"})
+            else:
+                _request(conn, "GET", f"/events/{session_id}?limit=100")
+        except (OSError, RuntimeError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        latencies.append((time.perf_counter() - start) * 1000)
+        i += 1
+    conn.close()
+    with lock:
+        result.requests += len(latencies)
+        result.errors += errors
+        result.latencies_ms.extend(latencies)
+
+
+def run_load(label: str, base_url: str, concurrency: int, duration_s: float, read_ratio: int) -> LoadResult:
+    result = LoadResult(label=label)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration_s
+    threads = [
+        threading.Thread(target=_worker, args=(base_url, deadline, read_ratio, result, lock), daemon=True)
+        for _ in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed_s = time.perf_counter() - start
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", action="append", required=True, help="label=base_url; repeat to compare")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--read-ratio", type=int, default=4, help="event reads per run creation")
+    args = parser.parse_args()
+
+    results = []
+    for target in args.target:
+        label, _, base_url = target.partition("=")
+        if not base_url:
+            parser.error(f"--target must be label=url, got {target!r}")
+        results.append(run_load(label, base_url, args.concurrency, args.duration, args.read_ratio))
+
+    print(f"{'target':<12}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for result in results:
+        print(
+            f"{result.label:<12}{result.requests:>10}{result.errors:>8}{result.rps:>10.1f}"
+            f"{result.percentile(50):>10.2f}{result.percentile(99):>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,19 @@
+from collections.abc import Mapping as MappingABC
 from dataclasses import dataclass, field
-from typing import Any, Iterable, Mapping
+from typing import Any, Iterable, Iterator, Mapping
 
+_ENVELOPE_FIELDS = ("id", "ts", "type", "session_id", "run_id", "payload")
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class EventEnvelope(MappingABC):
+    """An event, readable as the mapping ``to_dict()`` would build without copying anything.
+
+    Equality and hashing follow Mapping, so an envelope compares equal to the
+    dict of the same event. The payload is shared, not copied: treat it as
+    read-only once the envelope is built.
+    """
 
-@dataclass(frozen=True)
-class EventEnvelope:
     id: str
     ts: str
     type: str
@@ -11,6 +21,17 @@ class EventEnvelope:
     run_id: str
     payload: Mapping[str, Any]
 
+    def __getitem__(self, key: str) -> Any:
+        if key not in _ENVELOPE_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_ENVELOPE_FIELDS)
+
+    def __len__(self) -> int:
+        return len(_ENVELOPE_FIELDS)
+
     def to_dict(self) -> Mapping[str, Any]:
         return {
             "id": self.id,
@@ -34,6 +55,7 @@ class RunnerJob:
 class SnapshotRequest:
     repo_id: str
     commit: str
+    toolchain: str = ""
 
 
 @dataclass(frozen=True)
@@ -47,6 +69,8 @@ class ToolContract:
     input_schema: Mapping[str, Any]
     output_schema: Mapping[str, Any]
     scopes: list[str]
+    # Same input, same workspace, same result, and no side effects: safe to memoize.
+    read_only: bool = False
 
 
 @dataclass(frozen=True)
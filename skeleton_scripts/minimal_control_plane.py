@@ -44,6 +44,12 @@ class PromptQueue:
             return None
         return self.items.pop(0)
 
+    def peek(self) -> str | None:
+        """Return next run without removing it."""
+        if not self.items:
+            return None
+        return self.items[0]
+
 
 @dataclass
 class ConcurrencyLimits:
@@ -135,13 +141,12 @@ class ControlPlane:
         return run
 
     def process_once(self) -> bool:
-        """Dispatch one queued run."""
-        run_id = self.state.queue.dequeue()
+        """Dispatch one queued run; a blocked run stays at the head of the queue."""
+        run_id = self.state.queue.peek()
         if run_id is None:
             return False
         if not self.state.limits.can_dispatch():
             run = self.state.runs[run_id]
-            self.state.queue.enqueue(run_id)
             self.state.event_log.append(
                 make_event(
                     "run_dispatch_blocked",
@@ -151,6 +156,7 @@ class ControlPlane:
                 )
             )
             return False
+        self.state.queue.dequeue()
         run = self.state.get_run(run_id)
         self.state.update_run_status(run_id, "dispatched")
         self.state.limits.mark_dispatched()
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+_REPO_ROOT = Path(__file__).resolve().parents[3]
+for path in (_REPO_ROOT, _REPO_ROOT / "packages" / "agent_core" / "src"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
@@ -0,0 +1,124 @@
+import importlib.util
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from shared_models import EventLog, ToolContract
+from tools import Tool, ToolRegistry, current_cancel
+
+# Loaded under another name: the runner's main module owns "main" in a full run.
+_spec = importlib.util.spec_from_file_location("agent_main", Path(__file__).resolve().parents[3] / "packages/agent_core/src/main.py")
+agent_main = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(agent_main)
+PlanStep = agent_main.PlanStep
+
+
+class _Sleeper:
+    """A tool that sleeps for payload["s"] seconds unless its cancel event is set first."""
+
+    def __init__(self) -> None:
+        self.canceled: list[str] = []
+        self.finished: list[str] = []
+
+    def __call__(self, payload):
+        if payload.get("fail"):
+            raise RuntimeError(f"{payload['name']} broke")
+        cancel = current_cancel()
+        if cancel.wait(payload["s"]):
+            self.canceled.append(payload["name"])
+            raise RuntimeError("canceled")
+        self.finished.append(payload["name"])
+        return {}
+
+
+def _step(name: str, seconds: float, depends_on: tuple[str, ...] = (), **extra: object) -> PlanStep:
+    return PlanStep(name, "sleep", {"name": name, "s": seconds, **extra}, step_id=name, depends_on=depends_on)
+
+
+@pytest.fixture
+def sleeper():
+    return _Sleeper()
+
+
+@pytest.fixture
+def run(monkeypatch, sleeper):
+    registry = ToolRegistry()
+    registry.register(Tool(ToolContract("sleep", {}, {}, []), sleeper))
+
+    def run(plan: list[PlanStep], stop: agent_main.StopController | None = None, **policy: object):
+        monkeypatch.setattr(agent_main, "plan_from_prompt", lambda prompt: plan)
+        log = EventLog()
+        try:
+            result = agent_main.run_agent_loop(
+                agent_main.AgentInput("s1", "r1", "prompt"),
+                registry,
+                log,
+                agent_main.RunPolicy(**policy),
+                stop or agent_main.StopController(),
+            )
+        finally:
+            run.events = [(event["type"], event["payload"].get("step_id")) for event in log.list()]
+        return result
+
+    return run
+
+
+def test_dependents_start_as_soon_as_their_dependencies_finish(run):
+    plan = [_step("slow", 0.6), _step("fast", 0.1), _step("after_fast", 0.1, ("fast",))]
+    started = time.monotonic()
+
+    result = run(plan, max_parallel=2)
+
+    assert time.monotonic() - started < 0.9
+    assert result.steps_executed == 3 and not result.stopped
+    finished = [step_id for kind, step_id in run.events if kind == "step_finished"]
+    assert finished == ["fast", "after_fast", "slow"]
+
+
+def test_timeouts_are_per_step(run):
+    # Each step fits its own deadline, though together they outlast it.
+    plan = [_step("a", 0.2), _step("b", 0.2, ("a",)), _step("c", 0.2, ("b",))]
+
+    assert run(plan, max_parallel=2, step_timeout_s=0.4).steps_executed == 3
+
+
+def test_timed_out_step_is_canceled(run, sleeper):
+    plan = [_step("hang", 5.0), _step("after", 0.0, ("hang",))]
+    started = time.monotonic()
+
+    with pytest.raises(TimeoutError, match="step timed out after 0.2s: hang"):
+        run(plan, step_timeout_s=0.2)
+
+    assert time.monotonic() - started < 2.0
+    assert sleeper.canceled == ["hang"]
+    assert run.events[-1] == ("step_failed", "hang")
+    assert ("step_started", "after") not in run.events
+
+
+def test_stop_cancels_running_steps(run, sleeper):
+    stop = agent_main.StopController()
+    threading.Timer(0.2, stop.request_stop).start()
+    plan = [_step("long", 5.0), _step("other", 5.0), _step("next", 0.0, ("long",))]
+    started = time.monotonic()
+
+    result = run(plan, stop, max_parallel=2)
+
+    assert time.monotonic() - started < 2.0
+    assert result.stopped and result.steps_executed == 0
+    assert sorted(sleeper.canceled) == ["long", "other"]
+    assert ("step_started", "next") not in run.events
+    assert run.events[-1] == ("run_finished", None)
+
+
+def test_failure_cancels_the_other_steps(run, sleeper):
+    plan = [_step("long", 5.0), _step("broken", 0.0, fail=True)]
+    started = time.monotonic()
+
+    with pytest.raises(RuntimeError, match="broken broke"):
+        run(plan, max_parallel=2)
+
+    assert time.monotonic() - started < 2.0
+    assert sleeper.canceled == ["long"]
+    assert [kind for kind, _ in run.events].count("step_failed") == 2
@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from event_log import BufferedEventLog, EventSink, FileSink
+
+
+class _Sink(EventSink):
+    def __init__(self, fail_times: int = 0, delay_s: float = 0.0) -> None:
+        self.batches: list[list[int]] = []
+        self.fail_times = fail_times
+        self.delay_s = delay_s
+        self.flushes = 0
+        self.closed = False
+
+    def write(self, events) -> None:
+        time.sleep(self.delay_s)
+        if self.fail_times:
+            self.fail_times -= 1
+            raise OSError("sink unavailable")
+        self.batches.append([event["n"] for event in events])
+
+    def flush(self) -> None:
+        self.flushes += 1
+
+    def close(self) -> None:
+        self.closed = True
+
+    @property
+    def events(self) -> list[int]:
+        return [n for batch in self.batches for n in batch]
+
+
+def _log(*sinks: EventSink, **kwargs: object) -> BufferedEventLog:
+    kwargs.setdefault("retry_initial_s", 0.0)
+    return BufferedEventLog(sinks, **kwargs)
+
+
+def test_flush_waits_for_every_sink_in_append_order(tmp_path):
+    sink = _Sink()
+    file_sink = FileSink(str(tmp_path / "events.jsonl"))
+    log = _log(sink, file_sink, max_batch=4)
+    for n in range(10):
+        log.append({"n": n})
+
+    assert log.flush(timeout_s=5.0)
+
+    assert sink.events == list(range(10))
+    assert all(len(batch) <= 4 for batch in sink.batches)
+    assert sink.flushes >= 1
+    assert len((tmp_path / "events.jsonl").read_text().splitlines()) == 10
+    assert log.stats.written == 10 and log.stats.dropped == 0
+    assert [event["n"] for event in log.list()] == list(range(10))
+    assert log.close(timeout_s=5.0)
+
+
+def test_failed_writes_are_retried():
+    sink = _Sink(fail_times=2)
+    log = _log(sink, max_retries=2)
+    log.append({"n": 1})
+
+    assert log.flush(timeout_s=5.0)
+
+    assert sink.events == [1]
+    assert log.stats.retries == 2 and log.stats.written == 1
+    log.close()
+
+
+def test_flush_reports_dropped_batches_once():
+    healthy, broken = _Sink(), _Sink(fail_times=100)
+    log = _log(healthy, broken, max_retries=1)
+    log.append({"n": 1})
+
+    with pytest.raises(RuntimeError, match="sink unavailable"):
+        log.flush(timeout_s=5.0)
+
+    assert healthy.events == [1]
+    assert log.stats.dropped == 1 and log.stats.retries == 1
+    # The error belonged to the earlier flush.
+    assert log.flush(timeout_s=5.0)
+    log.close()
+
+
+def test_close_that_times_out_stays_pending():
+    sink = _Sink(delay_s=0.3)
+    log = _log(sink)
+    log.append({"n": 1})
+
+    assert not log.close(timeout_s=0.05)
+    with pytest.raises(RuntimeError, match="closed"):
+        log.append({"n": 2})
+    assert not log.flush(timeout_s=0.0)
+
+    assert log.close(timeout_s=5.0)
+    assert sink.events == [1] and sink.closed
+    assert log.flush(timeout_s=0.0)
+
+
+def test_appends_racing_close_are_written_or_refused():
+    sink = _Sink()
+    log = _log(sink)
+    accepted: list[int] = []
+    start = threading.Barrier(5)
+
+    def produce(worker: int) -> None:
+        start.wait()
+        for n in range(worker * 100_000, (worker + 1) * 100_000):
+            try:
+                log.append({"n": n})
+            except RuntimeError:
+                return
+            accepted.append(n)
+
+    threads = [threading.Thread(target=produce, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    time.sleep(0.02)
+    assert log.close(timeout_s=10.0)
+    for thread in threads:
+        thread.join()
+
+    assert sorted(sink.events) == sorted(accepted)
+    assert log.stats.written == len(accepted)
@@ -0,0 +1,68 @@
+from pathlib import Path
+
+import pytest
+
+import impact_analysis
+from impact_analysis import ImpactConfig, ImpactRule, impacted_checks
+from verification_runtime import Check
+
+_FULL_SUITE = [Check("tests", "python -m pytest -q")]
+
+
+@pytest.fixture
+def root(tmp_path):
+    files = {
+        "pkg/__init__.py": "",
+        "pkg/util.py": "VALUE = 1\n",
+        "pkg/core.py": "from pkg.util import VALUE\n",
+        "pkg/other.py": "",
+        "scripts/report.py": "import sys\n",
+        "impact_analysis.py": "import pkg.core\n",
+        "tests/test_core.py": "from pkg import core\n",
+        "tests/test_other.py": "import pkg.other\n",
+        "tests/test_misc.py": "",
+        "docs/guide.md": "# guide\n",
+    }
+    for name, content in files.items():
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    return tmp_path
+
+
+def _analyzer(root: Path) -> impact_analysis.TestImpactAnalyzer:
+    # Imported through the module so pytest doesn't take the Test* class for a test.
+    return impact_analysis.TestImpactAnalyzer(str(root), ImpactConfig(rules=(ImpactRule("docs/*"),)))
+
+
+def test_module_selects_the_tests_importing_it(root):
+    selection = _analyzer(root).select(["pkg/util.py"])
+
+    assert not selection.full_suite
+    assert selection.targets == ("tests/test_core.py",)
+    assert selection.reason == "1 of 3 test files affected"
+    assert [check.command for check in impacted_checks(selection, _FULL_SUITE)] == ["python -m pytest -q tests/test_core.py"]
+
+
+def test_module_no_test_imports_runs_the_full_suite(root):
+    selection = _analyzer(root).select(["scripts/report.py"])
+
+    assert selection.full_suite
+    assert selection.unmapped == ("scripts/report.py",)
+    assert impacted_checks(selection, _FULL_SUITE) == _FULL_SUITE
+
+
+def test_deleted_test_file_runs_the_full_suite(root):
+    (root / "tests/test_misc.py").unlink()
+    assert _analyzer(root).select(["tests/test_misc.py"]).full_suite
+
+
+def test_no_changes_run_the_full_suite(root):
+    assert _analyzer(root).select([]).full_suite
+
+
+def test_rules_can_map_paths_to_no_tests(root):
+    selection = _analyzer(root).select(["docs/guide.md"])
+
+    assert not selection.full_suite and selection.targets == ()
+    assert impacted_checks(selection, _FULL_SUITE) == []
@@ -0,0 +1,77 @@
+import os
+
+from json_store import JsonLruStore
+from tool_cache import CacheScope, ToolResultCache
+from verification_cache import VerificationCache
+
+
+def _files(root) -> list[str]:
+    return sorted(name for _, _, files in os.walk(root) for name in files)
+
+
+def test_memory_tier_evicts_the_least_recently_used():
+    store = JsonLruStore(max_entries=2)
+    store.put("a", {"v": 1}, disk=False)
+    store.put("b", {"v": 2}, disk=False)
+    store.get("a")
+    store.put("c", {"v": 3}, disk=False)
+
+    assert store.get("b") is None
+    assert store.get("a") == {"v": 1} and store.get("c") == {"v": 3}
+    assert (store.stats.hits, store.stats.misses, store.stats.evictions) == (3, 1, 1)
+
+
+def test_disk_tier_outlives_the_store(tmp_path):
+    JsonLruStore(directory=str(tmp_path)).put("ab12", {"out": "x", "n": 1})
+    JsonLruStore(directory=str(tmp_path)).put("cd34", {"out": "y"}, disk=False)
+
+    store = JsonLruStore(directory=str(tmp_path))
+
+    assert store.get("ab12") == {"out": "x", "n": 1}
+    assert store.get("cd34") is None
+    assert (store.stats.disk_hits, store.stats.misses) == (1, 1)
+    # Not JSON: kept in memory only.
+    store.put("ef56", {"out": object()})
+    assert _files(tmp_path) == ["ab12.json"]
+
+
+def test_disk_tier_stays_under_max_bytes(tmp_path):
+    store = JsonLruStore(directory=str(tmp_path), max_bytes=40)
+    store.put("aa", {"out": "1" * 10})
+    store.put("bb", {"out": "2" * 10})
+    store.clear()
+    # A disk hit makes "aa" the most recently used file.
+    store.get("aa")
+    store.put("cc", {"out": "3" * 10})
+
+    assert _files(tmp_path) == ["aa.json", "cc.json"]
+    assert store.stats.disk_evictions == 1
+    reopened = JsonLruStore(directory=str(tmp_path), max_bytes=20)
+    assert _files(tmp_path) == ["cc.json"]
+    assert reopened.stats.disk_bytes == os.path.getsize(tmp_path / "cc" / "cc.json")
+
+
+def test_tool_cache_keeps_workspace_results_off_disk(tmp_path):
+    cache = ToolResultCache(directory=str(tmp_path))
+    scope = CacheScope("snap")
+    pristine = cache.key(scope, "read_file", {"path": "a.py"})
+    cache.put(pristine, {"content": "a"})
+    cache.invalidate(scope)
+    written = cache.key(scope, "read_file", {"path": "a.py"})
+    cache.put(written, {"content": "b"})
+
+    reopened = ToolResultCache(directory=str(tmp_path))
+
+    assert _files(tmp_path) == [f"{pristine[1:]}.json"]
+    assert reopened.get(pristine) == {"content": "a"}
+    assert reopened.get(written) is None
+
+
+def test_verification_cache_shares_results_through_disk(tmp_path):
+    key = "f" * 64
+    VerificationCache(directory=str(tmp_path)).put(key, {"status": "passed", "exit_code": 0})
+
+    cache = VerificationCache(directory=str(tmp_path))
+
+    assert cache.get(key) == {"status": "passed", "exit_code": 0}
+    assert cache.stats.disk_hits == 1 and len(cache) == 1
@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from patch_unified import (
+    ALGORITHMS,
+    NO_NEWLINE,
+    PatchError,
+    apply_patch,
+    apply_patch_set,
+    make_patch,
+    make_patch_set,
+    parse_patch,
+    patch_to_text,
+)
+
+
+def _lines(count: int, prefix: str = "line") -> str:
+    return "".join(f"{prefix} {index}\n" for index in range(count))
+
+
+def _mutate(text: str, rng: random.Random) -> str:
+    lines = text.splitlines(keepends=True)
+    for _ in range(rng.randrange(1, 8)):
+        at = rng.randrange(len(lines) + 1)
+        choice = rng.random()
+        if choice < 0.4 and at < len(lines):
+            lines[at] = lines[at].rstrip("\n") + " changed\n"
+        elif choice < 0.7:
+            lines.insert(at, f"inserted {rng.randrange(1000)}\n")
+        elif at < len(lines):
+            del lines[at]
+    return "".join(lines)
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+def test_round_trip(algorithm):
+    rng = random.Random(algorithm)
+    # Repeated lines give the anchoring algorithms few unique lines to work with.
+    base = "".join(f"{'}' if index % 3 else 'def f():'}\n" for index in range(60)) + _lines(60)
+    for _ in range(30):
+        original = _mutate(base, rng)
+        updated = _mutate(original, rng)
+        patch = make_patch(original, updated, "src/f.py", algorithm=algorithm)
+
+        assert apply_patch(original, patch) == updated
+        [parsed] = parse_patch(patch_to_text(patch))
+        assert parsed == patch
+
+
+@pytest.mark.parametrize(
+    ("original", "updated", "marked"),
+    [("a\nb", "a\nc", True), ("a\nb\n", "a\nb", True), ("a\nb", "a\nb\n", True), ("", "a\n", False), ("a", "", True)],
+)
+def test_missing_final_newline_round_trips(original, updated, marked):
+    text = patch_to_text(make_patch(original, updated))
+
+    assert (NO_NEWLINE in text) == marked
+    assert apply_patch(original, parse_patch(text)[0]) == updated
+
+
+def test_hunks_apply_at_an_offset():
+    original = _lines(40)
+    patch = make_patch(original, original.replace("line 30\n", "line thirty\n"))
+    shifted = _lines(5, "header") + original
+
+    assert apply_patch(shifted, patch) == _lines(5, "header") + original.replace("line 30\n", "line thirty\n")
+
+
+def test_fuzz_drops_context_that_no_longer_matches():
+    original = _lines(20)
+    patch = make_patch(original, original.replace("line 10\n", "line ten\n"))
+    # The outermost context line on each side changed since the diff was made.
+    drifted = original.replace("line 7\n", "line seven\n").replace("line 13\n", "line thirteen\n")
+
+    assert apply_patch(drifted, patch, fuzz=1) == drifted.replace("line 10\n", "line ten\n")
+    with pytest.raises(PatchError, match="hunk 1 does not apply"):
+        apply_patch(drifted, patch, fuzz=0)
+
+
+def test_hunk_that_does_not_fit_fails():
+    original = _lines(30)
+    patch = make_patch(original, original.replace("line 5\n", "line five\n").replace("line 25\n", "line 25b\n"))
+
+    with pytest.raises(PatchError, match="file: hunk 2 does not apply at line 23"):
+        apply_patch(original.replace("line 25\n", "other\n"), patch)
+
+
+def test_patch_set_creates_and_deletes_files():
+    original = {"keep.py": _lines(5), "old.py": "gone\n"}
+    updated = {"keep.py": _lines(5).replace("line 2", "line two"), "new.py": "fresh\n"}
+    patches = make_patch_set(original, updated)
+
+    text = patch_to_text(patches)
+    assert "--- /dev/null\n+++ b/new.py\n" in text and "--- a/old.py\n+++ /dev/null\n" in text
+    assert apply_patch_set(original, parse_patch(text)) == {"keep.py": updated["keep.py"], "new.py": "fresh\n", "old.py": None}
+    with pytest.raises(PatchError, match="new.py: file already exists"):
+        apply_patch_set({**original, "new.py": "x\n"}, patches)
+    with pytest.raises(PatchError, match="old.py: file not found"):
+        apply_patch_set({"keep.py": original["keep.py"]}, patches)
+
+
+def test_patch_set_renames_a_file():
+    text = "diff --git a/old.py b/new.py\n--- a/old.py\n+++ b/new.py\n@@ -1,2 +1,2 @@\n a\n-b\n+c\n"
+
+    assert apply_patch_set({"old.py": "a\nb\n"}, parse_patch(text)) == {"old.py": None, "new.py": "a\nc\n"}
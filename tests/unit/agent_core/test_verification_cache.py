@@ -0,0 +1,42 @@
+import os
+import time
+
+import verification_cache
+from verification_cache import TreeHasher
+
+
+def _write_in_place(path, content: str, mtime_ns: int) -> None:
+    with open(path, "r+") as handle:
+        handle.write(content)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_same_stat_rewrite_right_after_a_scan_is_rehashed(tmp_path):
+    path = tmp_path / "result.txt"
+    path.write_text("passed")
+    mtime_ns = os.stat(path).st_mtime_ns
+    hasher = TreeHasher(str(tmp_path))
+    before = hasher.digests()["result.txt"]
+
+    # Same inode, size and mtime: only the content tells the versions apart.
+    _write_in_place(path, "failed", mtime_ns)
+
+    assert hasher.digests()["result.txt"] != before
+
+
+def test_settled_files_are_not_rehashed(tmp_path, monkeypatch):
+    path = tmp_path / "old.txt"
+    path.write_text("old")
+    old_ns = time.time_ns() - 10_000_000_000
+    os.utime(path, ns=(old_ns, old_ns))
+    hashed = []
+    file_digest = verification_cache._file_digest
+    monkeypatch.setattr(verification_cache, "_file_digest", lambda full: hashed.append(full) or file_digest(full))
+    hasher = TreeHasher(str(tmp_path))
+
+    first = hasher.digests()
+    # Past the racy window the stat is trusted, even across a same-stat rewrite.
+    _write_in_place(path, "new", old_ns)
+
+    assert hasher.digests() == first
+    assert len(hashed) == 1
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import zlib
+
+import pytest
+
+from event_codecs import JSON, get_codec
+from shared_models import SessionRecord
+from state_backends import AsyncBackendAdapter, SqliteBackend
+from streaming import BatchIngest
+
+
+def _event(index: int) -> dict[str, object]:
+    return {"id": f"evt_{index}", "ts": "2024-01-01T00:00:00Z", "type": "log", "session_id": "s1", "run_id": "run1", "payload": {"n": index}}
+
+
+def _body(*indexes: int) -> bytes:
+    return get_codec(JSON).encode_batch([_event(index) for index in indexes])
+
+
+def _numbers(backend) -> list[int]:
+    return [event["payload"]["n"] for event in backend.read_events("s1").events]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "state.db")
+    backend = SqliteBackend(path)
+    backend.create_schema()
+    backend.add_session(SessionRecord(id="s1", repo_id="r1", status="active"))
+    yield path
+    backend.close()
+
+
+def _worker(db_path: str, **kwargs: object) -> tuple[BatchIngest, AsyncBackendAdapter]:
+    adapter = AsyncBackendAdapter(SqliteBackend(db_path))
+    return BatchIngest(append=adapter.append_stream_batch, **kwargs), adapter
+
+
+def test_retransmit_to_another_worker_is_applied_once(db_path):
+    first, first_adapter = _worker(db_path)
+    second, second_adapter = _worker(db_path)
+
+    async def scenario() -> None:
+        assert await first.ingest("stream1", 1, _body(0, 1)) == 1
+        # The ack was lost and the runner's retry reached the other worker.
+        assert await second.ingest("stream1", 1, _body(0, 1)) == 1
+        assert await second.ingest("stream1", 2, zlib.compress(_body(2)), encoding="deflate") == 2
+        # A late duplicate of batch 1 is acknowledged, not applied.
+        assert await first.ingest("stream1", 1, _body(0, 1)) >= 1
+        third, third_adapter = _worker(db_path)
+        try:
+            assert await third.ingest("stream1", 1, _body(0, 1)) == 2
+        finally:
+            third_adapter.close()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        first_adapter.close()
+        second_adapter.close()
+
+    assert _numbers(SqliteBackend(db_path)) == [0, 1, 2]
+
+
+def test_acks_survive_stream_eviction(db_path):
+    ingest, adapter = _worker(db_path, max_streams=1)
+
+    async def scenario() -> None:
+        assert await ingest.ingest("stream1", 1, _body(0)) == 1
+        assert await ingest.ingest("stream2", 1, _body(1)) == 1
+        assert await ingest.ingest("stream1", 1, _body(0)) == 1
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        adapter.close()
+
+    assert _numbers(SqliteBackend(db_path)) == [0, 1]
+
+
+def test_concurrent_deliveries_of_one_batch_apply_it_once(db_path):
+    backends = [SqliteBackend(db_path) for _ in range(4)]
+    acks: list[int] = []
+    lock = threading.Lock()
+
+    def deliver(backend: SqliteBackend) -> None:
+        for seq in range(1, 11):
+            acked = backend.append_stream_batch("stream1", seq, [_event(seq)])
+            with lock:
+                acks.append(acked)
+
+    threads = [threading.Thread(target=deliver, args=(backend,)) for backend in backends]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert _numbers(backends[0]) == list(range(1, 11))
+    assert len(acks) == 40 and max(acks) == 10
+
+
+def test_ingest_rejects_bad_batches(db_path):
+    ingest, adapter = _worker(db_path, codecs=(JSON,))
+
+    async def scenario() -> None:
+        with pytest.raises(ValueError):
+            await ingest.ingest("stream1", 0, _body(0))
+        with pytest.raises(ValueError):
+            await ingest.ingest("stream1", 1, b"not deflate", encoding="deflate")
+        with pytest.raises(ValueError):
+            await ingest.ingest("stream1", 1, _body(0), content_type="application/msgpack")
+        # Nothing was acknowledged, so the batch still applies.
+        assert await ingest.ingest("stream1", 1, _body(0), dropped_events=3) == 1
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        adapter.close()
+
+    assert ingest.dropped_events("stream1") == 3
+    assert _numbers(SqliteBackend(db_path)) == [0]
@@ -0,0 +1,259 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from leases import LeasePolicy
+from shared_models import RunRecord, SessionRecord
+from state_backends import AsyncBackendAdapter, SqliteBackend
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SqliteBackend(str(tmp_path / "state.db"))
+    backend.create_schema()
+    yield backend
+    backend.close()
+
+
+def _event(session_id: str, run_id: str, index: int) -> dict[str, object]:
+    return {"id": f"evt_{index}", "ts": "2024-01-01T00:00:00Z", "type": "log", "session_id": session_id, "run_id": run_id, "payload": {"n": index}}
+
+
+def _queue_run(backend: SqliteBackend, run_id: str, session_id: str, repo_id: str) -> None:
+    backend.add_run(RunRecord(id=run_id, session_id=session_id))
+    backend.enqueue_run(run_id, fairness_key=repo_id)
+
+
+def test_append_allocates_contiguous_seqs_per_session(backend):
+    backend.add_session(SessionRecord(id="s1", repo_id="r1", status="active"))
+    backend.add_session(SessionRecord(id="s2", repo_id="r1", status="active"))
+
+    first = backend.append_events([_event("s1", "run1", 0), _event("s2", "run2", 1), _event("s1", "run1", 2)])
+    second = backend.append_events([_event("s1", "run1", 3)])
+
+    assert first == [1, 1, 2]
+    assert second == [3]
+    assert [event["payload"]["n"] for event in backend.read_events("s1").events] == [0, 2, 3]
+
+
+def test_concurrent_appends_never_share_a_seq(backend):
+    backend.add_session(SessionRecord(id="s1", repo_id="r1", status="active"))
+    seqs: list[int] = []
+    lock = threading.Lock()
+
+    def append(worker: int) -> None:
+        for index in range(20):
+            got = backend.append_events([_event("s1", "run1", worker * 100 + index)] * 3)
+            with lock:
+                seqs.extend(got)
+
+    threads = [threading.Thread(target=append, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(seqs) == list(range(1, 241))
+
+
+def test_append_to_unknown_session_raises_and_writes_nothing(backend):
+    backend.add_session(SessionRecord(id="s1", repo_id="r1", status="active"))
+    with pytest.raises(KeyError):
+        backend.append_events([_event("s1", "run1", 0), _event("missing", "run1", 1)])
+    assert backend.read_events("s1").events == []
+    assert backend.append_events([_event("s1", "run1", 2)]) == [1]
+
+
+def test_read_events_pages_with_cursor_and_limit(backend):
+    backend.add_session(SessionRecord(id="s1", repo_id="r1", status="active"))
+    backend.append_events([_event("s1", "run1", index) for index in range(5)])
+
+    page = backend.read_events("s1", after_seq=0, limit=2)
+    assert [event["id"] for event in page.events] == ["evt_0", "evt_1"]
+    assert page.next_seq == 2
+    page = backend.read_events("s1", after_seq=page.next_seq)
+    assert [event["id"] for event in page.events] == ["evt_2", "evt_3", "evt_4"]
+    assert page.next_seq == 5
+    page = backend.read_events("s1", after_seq=5)
+    assert page.events == [] and page.next_seq == 5
+    assert backend.read_events("other").events == []
+
+
+def test_read_events_rejects_bad_cursors(backend):
+    with pytest.raises(ValueError):
+        backend.read_events("s1", after_seq=-1)
+    with pytest.raises(ValueError):
+        backend.read_events("s1", limit=0)
+
+
+def test_append_notifies_listeners_with_last_seq(backend):
+    backend.add_session(SessionRecord(id="s1", repo_id="r1", status="active"))
+    seen: list[tuple[str, int]] = []
+    backend.add_event_listener(lambda session_id, seq: seen.append((session_id, seq)))
+    backend.append_events([_event("s1", "run1", 0), _event("s1", "run1", 1)])
+    assert seen == [("s1", 2)]
+
+
+def test_claim_runs_respects_global_and_repo_limits(backend):
+    backend.add_repo({"id": "r1", "url": "https://example.com/r1.git", "org_id": "acme"})
+    backend.add_repo({"id": "r2", "url": "https://example.com/r2.git", "org_id": "acme"})
+    backend.add_session(SessionRecord(id="s1", repo_id="r1", status="active"))
+    backend.add_session(SessionRecord(id="s2", repo_id="r2", status="active"))
+    _queue_run(backend, "run1", "s1", "r1")
+    _queue_run(backend, "run2", "s1", "r1")
+    _queue_run(backend, "run3", "s2", "r2")
+    policy = LeasePolicy(max_active_runs=2, max_active_per_repo=1, ttl_s=30.0)
+
+    claims = backend.claim_runs(5, policy)
+
+    assert [claim.run.id for claim in claims] == ["run1", "run3"]
+    assert {claim.org_id for claim in claims} == {"acme"}
+    assert all(claim.run.status == "dispatched" for claim in claims)
+    assert backend.get_run("run1").status == "dispatched"
+    # run2 was passed over for its repo limit and keeps its place.
+    assert backend.queue_metrics().depth == 1
+    assert backend.claim_runs(5, policy) == []
+
+    assert backend.release_lease("run1")
+    assert not backend.release_lease("run1")
+    assert [claim.run.id for claim in backend.claim_runs(5, policy)] == ["run2"]
+
+
+def test_claim_runs_skips_runs_dequeued_after_its_select(backend, monkeypatch):
+    backend.add_session(SessionRecord(id="s1", repo_id="r1", status="active"))
+    _queue_run(backend, "run1", "s1", "r1")
+    _queue_run(backend, "run2", "s1", "r1")
+    execute = backend._execute
+    raced = []
+
+    def racing_execute(cur, sql, params=()):
+        if sql.startswith("DELETE FROM prompt_queue WHERE position") and not raced:
+            # Stands in for a concurrent dequeue_run under READ COMMITTED.
+            raced.append(params)
+            execute(cur, sql, params)
+        execute(cur, sql, params)
+
+    monkeypatch.setattr(backend, "_execute", racing_execute)
+    claims = backend.claim_runs(1, LeasePolicy(max_active_runs=1))
+
+    assert [claim.run.id for claim in claims] == ["run2"]
+    assert backend.get_run("run1").status != "dispatched"
+
+
+def test_claim_runs_respects_org_limit(backend):
+    backend.add_repo({"id": "r1", "url": "u1", "org_id": "acme"})
+    backend.add_repo({"id": "r2", "url": "u2", "org_id": "acme"})
+    backend.add_repo({"id": "r3", "url": "u3", "org_id": "other"})
+    for index, repo_id in enumerate(("r1", "r2", "r3")):
+        backend.add_session(SessionRecord(id=f"s{index}", repo_id=repo_id, status="active"))
+        _queue_run(backend, f"run{index}", f"s{index}", repo_id)
+
+    claims = backend.claim_runs(5, LeasePolicy(max_active_runs=5, max_active_per_org=1))
+
+    assert [(claim.run.id, claim.org_id) for claim in claims] == [("run0", "acme"), ("run2", "other")]
+
+
+def test_renew_and_reap_leases(backend):
+    backend.add_session(SessionRecord(id="s1", repo_id="r1", status="active"))
+    _queue_run(backend, "run1", "s1", "r1")
+    _queue_run(backend, "run2", "s1", "r1")
+    policy = LeasePolicy(max_active_runs=2, ttl_s=0.2)
+    claims = backend.claim_runs(2, policy)
+    assert len(claims) == 2
+    assert claims[0].lease_expires_at > time.time()
+
+    assert backend.renew_lease("run1", 30.0)
+    time.sleep(0.3)
+    assert backend.reap_expired_leases() == ["run2"]
+    assert backend.reap_expired_leases() == []
+    # An expired lease can't be renewed; the live one still can.
+    assert not backend.renew_lease("run2", 30.0)
+    assert backend.renew_lease("run1", 30.0)
+
+
+def test_expired_leases_free_their_slot(backend):
+    backend.add_session(SessionRecord(id="s1", repo_id="r1", status="active"))
+    _queue_run(backend, "run1", "s1", "r1")
+    _queue_run(backend, "run2", "s1", "r1")
+    policy = LeasePolicy(max_active_runs=1, ttl_s=0.2)
+    assert [claim.run.id for claim in backend.claim_runs(2, policy)] == ["run1"]
+    assert backend.claim_runs(2, policy) == []
+    time.sleep(0.3)
+    assert [claim.run.id for claim in backend.claim_runs(2, policy)] == ["run2"]
+
+
+def test_concurrent_claims_never_exceed_the_limit(backend):
+    backend.add_session(SessionRecord(id="s1", repo_id="r1", status="active"))
+    for index in range(20):
+        _queue_run(backend, f"run{index}", "s1", f"key{index}")
+    policy = LeasePolicy(max_active_runs=5)
+    claimed: list[str] = []
+    lock = threading.Lock()
+
+    def claim() -> None:
+        for _ in range(5):
+            got = backend.claim_runs(2, policy)
+            with lock:
+                claimed.extend(claim.run.id for claim in got)
+
+    threads = [threading.Thread(target=claim) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(claimed) == 5
+    assert len(set(claimed)) == 5
+
+
+def test_memory_database_uses_one_connection():
+    backend = SqliteBackend(":memory:")
+    backend.create_schema()
+    assert backend.max_concurrency == 1
+    backend.add_session(SessionRecord(id="s1", repo_id="r1", status="active"))
+    assert backend.get_session("s1").repo_id == "r1"
+    assert backend.health()
+
+
+def test_async_adapter_runs_backend_calls_off_the_loop(backend):
+    adapter = AsyncBackendAdapter(backend)
+    append_threads: set[str] = set()
+    backend.add_event_listener(lambda session_id, seq: append_threads.add(threading.current_thread().name))
+
+    async def scenario() -> None:
+        assert await adapter.health()
+        await adapter.add_session(SessionRecord(id="s1", repo_id="r1", status="active"))
+        await adapter.add_run(RunRecord(id="run1", session_id="s1"))
+        seqs = await asyncio.gather(*(adapter.append_events([_event("s1", "run1", index)]) for index in range(8)))
+        assert sorted(seq for got in seqs for seq in got) == list(range(1, 9))
+        page = await adapter.read_events("s1", 4, 2)
+        assert page.next_seq == 6
+        await adapter.enqueue_run("run1")
+        claims = await adapter.claim_runs(1, LeasePolicy())
+        assert [claim.run.id for claim in claims] == ["run1"]
+        assert (await adapter.get_run("run1")).status == "dispatched"
+        assert await adapter.renew_lease("run1", 30.0)
+        assert await adapter.release_lease("run1")
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        adapter.close()
+
+    assert append_threads and all(name.startswith("state-backend") for name in append_threads)
+
+
+def test_async_adapter_propagates_backend_errors(backend):
+    adapter = AsyncBackendAdapter(backend)
+    try:
+        with pytest.raises(KeyError):
+            asyncio.run(adapter.get_run("missing"))
+    finally:
+        adapter.close()
+
+
+def test_async_adapter_rejects_non_backends():
+    with pytest.raises(TypeError):
+        AsyncBackendAdapter(object())
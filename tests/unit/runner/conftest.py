@@ -0,0 +1,12 @@
+import sys
+from pathlib import Path
+
+_REPO_ROOT = Path(__file__).resolve().parents[3]
+for path in (_REPO_ROOT, _REPO_ROOT / "packages" / "runner"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+# Agent core drives runner executors in some tests; it goes last so its
+# main module can't shadow the runner's.
+_AGENT_CORE = str(_REPO_ROOT / "packages" / "agent_core" / "src")
+if _AGENT_CORE not in sys.path:
+    sys.path.append(_AGENT_CORE)
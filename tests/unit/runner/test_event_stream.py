@@ -0,0 +1,58 @@
+from event_stream import BatchingStreamClient, BatchSpool, HttpTransport
+from fake_ingest import FakeIngestServer
+
+
+def _event(index: int) -> dict:
+    return {"id": f"evt_{index}", "ts": "2024-01-01T00:00:00Z", "type": "log", "session_id": "s1", "run_id": "run1", "payload": {"n": index}}
+
+
+def _client(fake: FakeIngestServer, **kwargs: object) -> BatchingStreamClient:
+    return BatchingStreamClient(HttpTransport(fake.url, timeout_s=2.0), retry_initial_s=0.01, retry_max_s=0.05, **kwargs)
+
+
+def _numbers(fake: FakeIngestServer) -> list[int]:
+    return [event["payload"]["n"] for event in fake.events]
+
+
+def test_events_arrive_in_order_and_batched():
+    with FakeIngestServer() as fake:
+        client = _client(fake, max_batch_events=10)
+        for index in range(35):
+            client.send([_event(index)])
+        assert client.close(timeout_s=5.0)
+
+    assert _numbers(fake) == list(range(35))
+    assert fake.batches == client.stats.batches_sealed >= 4
+    assert fake.acked[client.stream_id] == fake.batches
+    assert client.stats.retransmits == 0
+
+
+def test_lost_acks_are_retransmitted_and_applied_once():
+    with FakeIngestServer() as fake:
+        fake.lose_acks(2)
+        fake.fail_next(1)
+        client = _client(fake, max_batch_events=5)
+        client.send([_event(index) for index in range(12)])
+        assert client.close(timeout_s=5.0)
+
+    assert _numbers(fake) == list(range(12))
+    assert fake.duplicates == 2
+    assert client.stats.retransmits == 3
+    assert not len(client.spool)
+
+
+def test_outage_is_bridged_by_the_spool(tmp_path):
+    fake = FakeIngestServer().start()
+    try:
+        fake.stop()
+        client = _client(fake, spool=BatchSpool(str(tmp_path / "spool")), max_batch_events=4)
+        client.send([_event(index) for index in range(10)])
+        assert not client.flush(timeout_s=0.2)
+        assert client.spool.pending_events == 10
+        fake.start()
+        assert client.close(timeout_s=5.0)
+    finally:
+        fake.stop()
+
+    assert _numbers(fake) == list(range(10))
+    assert client.stats.reconnects >= 1
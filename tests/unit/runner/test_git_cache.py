@@ -0,0 +1,183 @@
+import os
+import subprocess
+import threading
+from pathlib import Path
+
+import pytest
+
+from git_cache import GitCache
+from main import CheckoutRequest, checkout_repo, sync_repo
+
+
+def _git(cwd: Path, *args: str) -> str:
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def _commit(repo: Path, name: str, content: str) -> str:
+    (repo / name).write_text(content)
+    _git(repo, "add", name)
+    _git(repo, "commit", "--quiet", "-m", f"write {name}")
+    return _git(repo, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def upstream(tmp_path, monkeypatch):
+    for key, value in {
+        "GIT_AUTHOR_NAME": "test",
+        "GIT_AUTHOR_EMAIL": "test@example.com",
+        "GIT_COMMITTER_NAME": "test",
+        "GIT_COMMITTER_EMAIL": "test@example.com",
+        "GIT_CONFIG_GLOBAL": os.devnull,
+    }.items():
+        monkeypatch.setenv(key, value)
+    repo = tmp_path / "upstream"
+    repo.mkdir()
+    _git(repo, "init", "--quiet", "--initial-branch=main")
+    _commit(repo, "a.txt", "one")
+    return repo
+
+
+def _url(repo: Path) -> str:
+    return f"file://{repo}"
+
+
+def test_checkout_materializes_the_commit(tmp_path, upstream):
+    cache = GitCache(str(tmp_path / "cache"))
+    first = _git(upstream, "rev-parse", "HEAD")
+    second = _commit(upstream, "a.txt", "two")
+
+    worktree = cache.checkout(_url(upstream), first)
+    head = cache.checkout(_url(upstream), "main")
+
+    assert worktree.commit == first
+    assert Path(worktree.path, "a.txt").read_text() == "one"
+    assert head.commit == second
+    assert Path(head.path, "a.txt").read_text() == "two"
+    assert len(list((tmp_path / "cache" / "mirrors").iterdir())) == 1
+
+
+def test_checkout_repo_uses_the_cache(tmp_path, upstream):
+    cache = GitCache(str(tmp_path / "cache"))
+    path = checkout_repo(CheckoutRequest(repo_url=_url(upstream), commit="HEAD"), cache)
+    assert Path(path, "a.txt").read_text() == "one"
+
+
+def test_sync_fetches_symbolic_refs_inside_the_fetch_ttl(tmp_path, upstream):
+    cache = GitCache(str(tmp_path / "cache"), ref_fetch_ttl_s=3600.0)
+    worktree = cache.checkout(_url(upstream), "HEAD")
+    pushed = _commit(upstream, "a.txt", "two")
+
+    # checkout trusts its recent fetch for symbolic refs...
+    assert cache.resolve(_url(upstream), "HEAD") == worktree.commit
+    # ...sync always fetches first.
+    assert cache.sync(worktree.path, "HEAD") == pushed
+    assert Path(worktree.path, "a.txt").read_text() == "two"
+
+
+def test_sync_without_commit_fetches_and_keeps_head(tmp_path, upstream):
+    cache = GitCache(str(tmp_path / "cache"))
+    worktree = cache.checkout(_url(upstream), "HEAD")
+    pushed = _commit(upstream, "b.txt", "new")
+
+    sync_repo(worktree.path, cache)
+
+    assert _git(Path(worktree.path), "rev-parse", "HEAD") == worktree.commit
+    assert cache.sync(worktree.path, pushed) == pushed
+    assert Path(worktree.path, "b.txt").read_text() == "new"
+
+
+def test_sync_rejects_unknown_commits_and_foreign_paths(tmp_path, upstream):
+    cache = GitCache(str(tmp_path / "cache"))
+    worktree = cache.checkout(_url(upstream), "HEAD")
+    with pytest.raises(KeyError):
+        cache.sync(worktree.path, "no-such-branch")
+    with pytest.raises(KeyError):
+        cache.sync(str(upstream))
+
+
+def test_resolve_skips_the_fetch_for_known_shas(tmp_path, upstream):
+    cache = GitCache(str(tmp_path / "cache"), ref_fetch_ttl_s=0.0)
+    sha = cache.resolve(_url(upstream), "HEAD")
+    stamp = next((tmp_path / "cache" / "locks").glob("*.fetched"))
+    fetched_at = stamp.stat().st_mtime_ns
+    os.utime(stamp, ns=(fetched_at - 10**9, fetched_at - 10**9))
+
+    assert cache.resolve(_url(upstream), sha) == sha
+    assert stamp.stat().st_mtime_ns == fetched_at - 10**9
+    with pytest.raises(KeyError):
+        cache.resolve(_url(upstream), "0" * 40)
+
+
+def test_concurrent_checkouts_share_one_mirror(tmp_path, upstream):
+    cache = GitCache(str(tmp_path / "cache"))
+    paths: list[str] = []
+    errors: list[BaseException] = []
+
+    def checkout() -> None:
+        try:
+            paths.append(cache.checkout(_url(upstream), "main").path)
+        except BaseException as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=checkout) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(set(paths)) == 6
+    assert all(Path(path, "a.txt").read_text() == "one" for path in paths)
+    assert len(list((tmp_path / "cache" / "mirrors").iterdir())) == 1
+
+
+def test_gc_skips_pinned_worktrees(tmp_path, upstream):
+    cache = GitCache(str(tmp_path / "cache"))
+    pinned = cache.checkout(_url(upstream), "HEAD")
+    idle = cache.checkout(_url(upstream), "HEAD")
+    cache.unpin(idle.path)
+
+    # A second instance stands in for another process running gc.
+    removed = GitCache(str(tmp_path / "cache")).gc(max_idle_s=0.0)
+
+    assert removed == [idle.path]
+    assert not Path(idle.path).exists()
+    assert Path(pinned.path, "a.txt").exists()
+
+    cache.unpin(pinned.path)
+    assert GitCache(str(tmp_path / "cache")).gc(max_idle_s=0.0) == [pinned.path]
+
+
+def test_gc_keeps_recently_used_worktrees(tmp_path, upstream):
+    cache = GitCache(str(tmp_path / "cache"))
+    worktree = cache.checkout(_url(upstream), "HEAD")
+    cache.unpin(worktree.path)
+    assert cache.gc(max_idle_s=3600.0) == []
+    assert Path(worktree.path).exists()
+
+
+def test_release_removes_the_worktree_and_its_metadata(tmp_path, upstream):
+    cache = GitCache(str(tmp_path / "cache"))
+    worktree = cache.checkout(_url(upstream), "HEAD")
+    cache.release(worktree.path)
+
+    assert os.listdir(Path(worktree.path).parent) == []
+    mirror = next((tmp_path / "cache" / "mirrors").iterdir())
+    assert _git(mirror, "worktree", "list").count("\n") == 0
+
+
+def test_locks_follow_the_mirror_when_the_stored_url_differs(tmp_path, upstream, monkeypatch):
+    # git stores a relative clone source as an absolute path, so the mirror's
+    # remote.origin.url differs from the URL it was created for.
+    monkeypatch.chdir(upstream.parent)
+    cache = GitCache(str(tmp_path / "cache"))
+    worktree = cache.checkout("upstream", "HEAD")
+    pushed = _commit(upstream, "a.txt", "two")
+
+    assert cache.sync(worktree.path, "HEAD") == pushed
+    cache.release(worktree.path)
+
+    locks = {path.name for path in (tmp_path / "cache" / "locks").iterdir()}
+    mirrors = {path.name.removesuffix(".git") for path in (tmp_path / "cache" / "mirrors").iterdir()}
+    assert len(mirrors) == 1
+    assert {name.split(".", 1)[0] for name in locks} == mirrors
@@ -0,0 +1,110 @@
+import threading
+import time
+
+from main import StreamClient
+from process_backend import CANCELED, FINISHED, JobState, ProcessPoolBackend
+from shared_models import RunnerJob
+
+
+class _Collector(StreamClient):
+    def __init__(self) -> None:
+        self.events: list[dict] = []
+
+    def send(self, events) -> None:
+        self.events.extend(events)
+
+
+def _sleep_job(job, workdir, emit) -> None:
+    emit({"type": "started", "run_id": job.run_id})
+    time.sleep(float(job.snapshot_id))
+
+
+class _Leases:
+    def __init__(self, lost: set[str] = frozenset()) -> None:
+        self.lost = lost
+        self.renewals: list[str] = []
+        self._lock = threading.Lock()
+
+    def renew(self, run_id: str) -> bool:
+        with self._lock:
+            self.renewals.append(run_id)
+        return run_id not in self.lost
+
+
+class _Completions:
+    def __init__(self) -> None:
+        self.states: dict[str, JobState] = {}
+        self._changed = threading.Condition()
+
+    def __call__(self, state: JobState) -> None:
+        with self._changed:
+            self.states[state.job_id] = state
+            self._changed.notify_all()
+
+    def wait_for(self, *job_ids: str, timeout_s: float = 10.0) -> None:
+        with self._changed:
+            assert self._changed.wait_for(lambda: set(job_ids) <= self.states.keys(), timeout=timeout_s)
+
+
+def _backend(tmp_path, leases: _Leases, done: _Completions, **kwargs) -> ProcessPoolBackend:
+    return ProcessPoolBackend(
+        _Collector(),
+        _sleep_job,
+        str(tmp_path / "jobs"),
+        start_method="fork",
+        on_complete=done,
+        renew_lease=leases.renew,
+        heartbeat_interval_s=0.05,
+        cancel_grace_s=0.5,
+        **kwargs,
+    )
+
+
+def test_running_and_pending_jobs_renew_their_leases(tmp_path):
+    leases = _Leases()
+    done = _Completions()
+    backend = _backend(tmp_path, leases, done, max_workers=1)
+    try:
+        backend.submit_job(RunnerJob(job_id="job1", session_id="s1", run_id="run1", snapshot_id="0.4"))
+        backend.submit_job(RunnerJob(job_id="job2", session_id="s1", run_id="run2", snapshot_id="0.1"))
+        time.sleep(0.25)
+        # job2 is still waiting for job1's slot, but its lease is kept alive too.
+        assert backend.job_status("job2").status == "pending"
+        assert {"run1", "run2"} <= set(leases.renewals)
+        done.wait_for("job1", "job2")
+        assert done.states["job1"].status == FINISHED and done.states["job2"].status == FINISHED
+        count = len(leases.renewals)
+        time.sleep(0.2)
+        assert len(leases.renewals) == count
+    finally:
+        backend.close()
+
+
+def test_lost_lease_cancels_the_job(tmp_path):
+    leases = _Leases(lost={"run1"})
+    done = _Completions()
+    backend = _backend(tmp_path, leases, done)
+    try:
+        started = time.monotonic()
+        backend.submit_job(RunnerJob(job_id="job1", session_id="s1", run_id="run1", snapshot_id="30"))
+        done.wait_for("job1")
+        assert done.states["job1"].status == CANCELED
+        assert time.monotonic() - started < 5
+        assert leases.renewals == ["run1"]
+    finally:
+        backend.close()
+
+
+def test_lost_lease_cancels_a_pending_job(tmp_path):
+    leases = _Leases(lost={"run2"})
+    done = _Completions()
+    backend = _backend(tmp_path, leases, done, max_workers=1)
+    try:
+        backend.submit_job(RunnerJob(job_id="job1", session_id="s1", run_id="run1", snapshot_id="0.5"))
+        backend.submit_job(RunnerJob(job_id="job2", session_id="s1", run_id="run2", snapshot_id="0"))
+        done.wait_for("job1", "job2")
+        assert done.states["job1"].status == FINISHED
+        assert done.states["job2"].status == CANCELED
+        assert done.states["job2"].started_at is None
+    finally:
+        backend.close()
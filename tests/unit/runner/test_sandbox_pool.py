@@ -0,0 +1,182 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from local_sandbox import LocalSandbox
+from main import SandboxConfig
+from sandbox_pool import SandboxPool
+
+_FILES = {"README.md": "hello\n", "src/app.py": "print('app')\n", "src/pkg/__init__.py": ""}
+
+
+class _Snapshots:
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+
+    def materialize(self, snapshot_id: str, dest: str) -> None:
+        self.calls.append(dest)
+        for name, content in _FILES.items():
+            path = Path(dest, name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(f"{snapshot_id}:{content}")
+        os.symlink("src/app.py", os.path.join(dest, "entry"))
+
+    def factory(self, config: SandboxConfig) -> LocalSandbox:
+        return LocalSandbox(config, materialize=self.materialize)
+
+
+def _tree(root: str) -> dict[str, str]:
+    tree = {}
+    for directory, _, files in os.walk(root):
+        for name in files:
+            full = os.path.join(directory, name)
+            rel = os.path.relpath(full, root)
+            tree[rel] = f"-> {os.readlink(full)}" if os.path.islink(full) else Path(full).read_text()
+    return tree
+
+
+def _wait_for(predicate, timeout_s: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def snapshots():
+    return _Snapshots()
+
+
+@pytest.fixture
+def make_pool(tmp_path, snapshots):
+    pools: list[SandboxPool] = []
+
+    def make(**kwargs: object) -> SandboxPool:
+        # Maintenance runs only when a test calls maintain().
+        kwargs.setdefault("maintain_interval_s", 3600.0)
+        pool = SandboxPool(snapshots.factory, str(tmp_path / "sandboxes"), **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def _idle(pool: SandboxPool, snapshot_id: str = "snap") -> int:
+    return pool.metrics()["idle"].get(snapshot_id, 0)
+
+
+def test_reset_restores_only_what_changed(tmp_path, snapshots):
+    sandbox = LocalSandbox(SandboxConfig(snapshot_id="snap", workdir=str(tmp_path / "box")), materialize=snapshots.materialize)
+    sandbox.start()
+    workdir = sandbox.config.workdir
+    pristine = _tree(workdir)
+    untouched = os.stat(os.path.join(workdir, "src/pkg/__init__.py")).st_ino
+
+    sandbox.filesystem.write_text("src/app.py", "changed")
+    sandbox.filesystem.write_text("build/out/result.txt", "new")
+    os.unlink(os.path.join(workdir, "README.md"))
+    os.unlink(os.path.join(workdir, "entry"))
+    os.symlink("README.md", os.path.join(workdir, "entry"))
+    os.chmod(os.path.join(workdir, "src"), 0o500)
+    sandbox.reset()
+
+    assert _tree(workdir) == pristine
+    assert not os.path.exists(os.path.join(workdir, "build"))
+    assert os.stat(os.path.join(workdir, "src")).st_mode & 0o777 != 0o500
+    assert os.stat(os.path.join(workdir, "src/pkg/__init__.py")).st_ino == untouched
+    # The workdir and the pristine copy; later resets reuse the copy.
+    assert len(snapshots.calls) == 2
+    sandbox.filesystem.write_text("src/app.py", "again")
+    sandbox.reset()
+    assert _tree(workdir) == pristine
+    assert len(snapshots.calls) == 2
+
+    sandbox.stop()
+    assert not os.path.exists(workdir)
+    assert not os.path.exists(sandbox.pristine_dir)
+
+
+def test_acquire_hits_a_prewarmed_sandbox(make_pool):
+    pool = make_pool()
+    pool.prewarm("snap", 1)
+    _wait_for(lambda: _idle(pool) == 1)
+
+    sandbox = pool.acquire("snap")
+
+    assert pool.stats.hits == 1 and pool.stats.cold_starts == 0
+    assert _tree(sandbox.config.workdir)["README.md"] == "snap:hello\n"
+    pool.release(sandbox)
+
+
+def test_release_resets_the_sandbox_for_reuse(make_pool, snapshots):
+    pool = make_pool()
+    first = pool.acquire("snap")
+    assert pool.stats.cold_starts == 1 and pool.stats.hits == 0
+    # The acquire also started a spare in the background.
+    _wait_for(lambda: _idle(pool) == 1)
+    pristine = _tree(first.config.workdir)
+    first.filesystem.write_text("README.md", "dirty")
+    first.filesystem.write_text("scratch.txt", "tmp")
+
+    pool.release(first)
+    _wait_for(lambda: _idle(pool) == 2)
+    again = pool.acquire("snap")
+
+    # The most recently parked sandbox is handed out first.
+    assert again is first
+    assert _tree(again.config.workdir) == pristine
+    assert pool.stats.resets == 1 and pool.stats.hits == 1
+    pool.release(again)
+
+
+def test_max_uses_recycles_the_sandbox(make_pool):
+    pool = make_pool(max_uses=1, max_warm_per_snapshot=0)
+    sandbox = pool.acquire("snap")
+    pool.release(sandbox)
+    _wait_for(lambda: not os.path.exists(sandbox.config.workdir))
+
+    other = pool.acquire("snap")
+
+    assert other is not sandbox
+    assert pool.stats.recycled == 1 and pool.stats.resets == 0
+    pool.release(other, reusable=False)
+    _wait_for(lambda: pool.stats.recycled == 2)
+
+
+def test_idle_sandboxes_without_demand_are_evicted(make_pool):
+    pool = make_pool(demand_window_s=0.2, idle_ttl_s=0.0)
+    sandbox = pool.acquire("snap")
+    pool.release(sandbox)
+    _wait_for(lambda: _idle(pool) == 2)
+
+    pool.maintain()
+    # Still inside the demand window: the peak of one in use keeps one warm.
+    assert _idle(pool) == 1
+    time.sleep(0.3)
+    pool.maintain()
+
+    assert pool.metrics()["idle"] == {}
+    assert pool.stats.evicted == 2
+    _wait_for(lambda: os.listdir(pool.workdir_root) == [])
+
+
+def test_metrics_report_hit_rate_and_time_to_first_command(make_pool):
+    pool = make_pool()
+    first = pool.acquire("snap")
+    _wait_for(lambda: _idle(pool) == 1)
+    second = pool.acquire("snap")
+
+    metrics = pool.metrics()
+
+    assert metrics["acquires"] == 2
+    assert metrics["hit_rate"] == 0.5
+    assert metrics["cold_starts"] == 1 and metrics["warm_starts"] >= 1
+    assert metrics["in_use"] == 2
+    assert metrics["time_to_first_command_p95_s"] >= metrics["time_to_first_command_p50_s"] >= 0.0
+    pool.release(first)
+    pool.release(second)
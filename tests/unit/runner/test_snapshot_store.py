@@ -0,0 +1,161 @@
+import io
+import os
+import tarfile
+import threading
+import time
+
+import pytest
+
+import snapshot_store
+from main import SnapshotCache, build_snapshot
+from shared_models import SnapshotRequest
+from snapshot_store import SnapshotStore, snapshot_key
+
+
+def _write_tree(files: dict[str, str]):
+    def populate(staging: str) -> None:
+        for name, content in files.items():
+            path = os.path.join(staging, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as handle:
+                handle.write(content)
+
+    return populate
+
+
+def test_build_snapshot_reuses_the_stored_snapshot(tmp_path):
+    store = SnapshotStore(str(tmp_path / "store"))
+    builds: list[str] = []
+
+    def populate(staging: str) -> None:
+        builds.append(staging)
+        _write_tree({"README.md": "hello"})(staging)
+
+    request = SnapshotRequest(repo_id="repo", commit="abc", toolchain="py311")
+    first = build_snapshot(request, store, populate)
+    second = build_snapshot(request, store, populate)
+
+    assert first.snapshot_id == second.snapshot_id == snapshot_key("repo", "abc", "py311")
+    assert len(builds) == 1
+    other = build_snapshot(SnapshotRequest(repo_id="repo", commit="abc", toolchain="py312"), store, populate)
+    assert other.snapshot_id != first.snapshot_id
+    assert len(builds) == 2
+
+
+def test_build_snapshot_without_a_store_only_names_the_snapshot():
+    assert build_snapshot(SnapshotRequest(repo_id="repo", commit="abc")).snapshot_id == "repo-abc"
+    with pytest.raises(ValueError):
+        build_snapshot(SnapshotRequest(repo_id="repo", commit="abc"), SnapshotStore.__new__(SnapshotStore))
+
+
+def test_snapshot_cache_survives_restarts(tmp_path):
+    request = SnapshotRequest(repo_id="repo", commit="abc")
+    cache = SnapshotCache(SnapshotStore(str(tmp_path / "store")))
+    assert cache.get(request) is None
+    snapshot_id = cache.get_or_build(request, _write_tree({"a.txt": "a"}))
+
+    reopened = SnapshotCache(SnapshotStore(str(tmp_path / "store")))
+    assert reopened.get(request) == snapshot_id
+    assert len(reopened) == 1
+    reopened.store.extract(snapshot_id, str(tmp_path / "out"))
+    assert (tmp_path / "out" / "a.txt").read_text() == "a"
+
+
+def test_concurrent_builds_of_one_key_are_coalesced(tmp_path):
+    store = SnapshotStore(str(tmp_path / "store"))
+    request = SnapshotRequest(repo_id="repo", commit="abc")
+    builds = 0
+    lock = threading.Lock()
+
+    def populate(staging: str) -> None:
+        nonlocal builds
+        with lock:
+            builds += 1
+        time.sleep(0.2)
+        _write_tree({"a.txt": "a"})(staging)
+
+    results: list[str] = []
+    threads = [threading.Thread(target=lambda: results.append(store.get_or_build(request, populate).key)) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert builds == 1
+    assert len(set(results)) == 1 and len(results) == 10
+    assert store.stats.misses == 1 and store.stats.coalesced + store.stats.hits == 9
+
+
+def test_store_evicts_least_recently_used_over_budget(tmp_path):
+    store = SnapshotStore(str(tmp_path / "store"), max_bytes=1)
+    first = store.get_or_build(SnapshotRequest(repo_id="repo", commit="one"), _write_tree({"a.txt": "a"}))
+    second = store.get_or_build(SnapshotRequest(repo_id="repo", commit="two"), _write_tree({"b.txt": "b"}))
+
+    assert store.get(first.key) is None
+    assert store.get(second.key) is not None
+    assert not os.path.exists(first.path)
+    assert store.stats.evictions == 1
+
+
+def _tarball(path, members: list[tuple[tarfile.TarInfo, bytes | None]]) -> None:
+    with tarfile.open(path, "w:gz") as tar:
+        for info, data in members:
+            if data is not None:
+                info.size = len(data)
+            tar.addfile(info, io.BytesIO(data) if data is not None else None)
+
+
+@pytest.mark.parametrize("filtered", [True, False])
+@pytest.mark.parametrize(
+    "member",
+    [
+        lambda: (tarfile.TarInfo("../escape.txt"), b"x"),
+        lambda: (tarfile.TarInfo("/abs.txt"), b"x"),
+        lambda: (_link("link", "../../outside", tarfile.SYMTYPE), None),
+        lambda: (_link("link", "/etc/passwd", tarfile.SYMTYPE), None),
+        lambda: (_link("hard", "../outside", tarfile.LNKTYPE), None),
+    ],
+    ids=["dotdot", "absolute", "symlink-dotdot", "symlink-absolute", "hardlink-dotdot"],
+)
+def test_extract_never_writes_outside_the_destination(tmp_path, monkeypatch, filtered, member):
+    if filtered and not snapshot_store._HAS_DATA_FILTER:
+        pytest.skip("tarfile extraction filters need Python 3.11.4+")
+    monkeypatch.setattr(snapshot_store, "_HAS_DATA_FILTER", filtered)
+    store = SnapshotStore(str(tmp_path / "store"))
+    source = tmp_path / "evil.tar.gz"
+    _tarball(source, [member()])
+    entry = store._add("k" * 64, SnapshotRequest(repo_id="repo", commit="evil"), source)
+
+    try:
+        store.extract(entry.key, str(tmp_path / "out" / "dest"))
+    except (ValueError, tarfile.TarError):
+        pass
+    # Refused, or (an absolute name under the data filter) extracted inside.
+    assert os.listdir(tmp_path / "out") == ["dest"]
+    assert not os.path.lexists("/abs.txt")
+    for directory, _, files in os.walk(tmp_path / "out" / "dest"):
+        for name in files:
+            path = os.path.join(directory, name)
+            assert os.path.realpath(path).startswith(str(tmp_path / "out" / "dest"))
+
+
+def test_unfiltered_extract_keeps_links_inside_the_destination(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_store, "_HAS_DATA_FILTER", False)
+    store = SnapshotStore(str(tmp_path / "store"))
+    source = tmp_path / "ok.tar.gz"
+    info = tarfile.TarInfo("bin/tool")
+    info.mode = 0o4755
+    _tarball(source, [(info, b"#!/bin/sh\n"), (_link("tool", "bin/tool", tarfile.SYMTYPE), None)])
+    entry = store._add("k" * 64, SnapshotRequest(repo_id="repo", commit="ok"), source)
+
+    store.extract(entry.key, str(tmp_path / "dest"))
+
+    assert (tmp_path / "dest" / "tool").read_text() == "#!/bin/sh\n"
+    assert not (tmp_path / "dest" / "bin" / "tool").stat().st_mode & 0o4000
+
+
+def _link(name: str, target: str, kind: bytes) -> tarfile.TarInfo:
+    info = tarfile.TarInfo(name)
+    info.type = kind
+    info.linkname = target
+    return info
@@ -0,0 +1,37 @@
+import os
+import time
+
+from subprocess_executor import TIMEOUT_EXIT_CODE, SubprocessExecutor
+
+
+def test_exit_code_and_streams_are_reported(tmp_path):
+    result = SubprocessExecutor(str(tmp_path)).run("echo out; echo err >&2; exit 3", timeout_s=10)
+
+    assert (result.exit_code, result.stdout, result.stderr) == (3, "out\n", "err\n")
+    assert not result.timed_out
+
+
+def test_background_jobs_do_not_outlive_the_command(tmp_path):
+    started = time.monotonic()
+    result = SubprocessExecutor(str(tmp_path)).run("(sleep 0.5; echo late > late.txt) & echo fast", timeout_s=10)
+
+    assert result.exit_code == 0 and result.stdout == "fast\n"
+    assert time.monotonic() - started < 0.5
+    time.sleep(1.0)
+    assert not os.path.exists(tmp_path / "late.txt")
+
+
+def test_background_jobs_without_the_pipes_are_killed_too(tmp_path):
+    result = SubprocessExecutor(str(tmp_path)).run("(sleep 0.5; touch late.txt) >/dev/null 2>&1 & echo fast", timeout_s=10)
+
+    assert result.stdout == "fast\n"
+    time.sleep(1.0)
+    assert not os.path.exists(tmp_path / "late.txt")
+
+
+def test_timeout_kills_the_process_group(tmp_path):
+    started = time.monotonic()
+    result = SubprocessExecutor(str(tmp_path), kill_grace_s=0.2).run("sleep 5 & sleep 5", timeout_s=1)
+
+    assert result.timed_out and result.exit_code == TIMEOUT_EXIT_CODE
+    assert time.monotonic() - started < 3.0
@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+
+import pytest
+
+from local_sandbox import LocalSandbox
+from main import SandboxConfig
+from shared_models import ToolContract
+from tools import ExecutorProxy, Tool, ToolRegistry
+from verification_runtime import CANCELED, FAILED, PASSED, Check, VerificationPolicy, run_verification
+
+
+@pytest.fixture
+def sandbox(tmp_path):
+    sandbox = LocalSandbox(SandboxConfig(snapshot_id="snap", workdir=str(tmp_path / "box")))
+    sandbox.start()
+    yield sandbox
+    sandbox.stop()
+
+
+@pytest.fixture
+def proxy(sandbox):
+    return ExecutorProxy(sandbox.executor, sandbox.filesystem)
+
+
+def test_output_streams_while_the_command_runs(proxy):
+    seen: list[tuple[float, str, str]] = []
+
+    result = proxy.run_streaming("echo one; sleep 0.5; echo two >&2", 10, lambda stream, text: seen.append((time.monotonic(), stream, text)))
+    finished = time.monotonic()
+
+    assert result.exit_code == 0 and result.stdout == "one\n" and result.stderr == "two\n"
+    assert [(stream, text) for _, stream, text in seen] == [("stdout", "one\n"), ("stderr", "two\n")]
+    assert finished - seen[0][0] >= 0.3
+
+
+def test_cancel_stops_a_running_command(proxy, sandbox):
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    started = time.monotonic()
+
+    result = proxy.run_streaming("sleep 3; touch done.txt", 10, lambda stream, text: None, cancel)
+
+    assert time.monotonic() - started < 2.0
+    assert result.exit_code != 0 and not result.timed_out
+    assert result.stderr.endswith("canceled\n")
+    assert not os.path.exists(os.path.join(sandbox.config.workdir, "done.txt"))
+
+
+def test_a_tool_call_cancel_stops_its_commands(proxy):
+    registry = ToolRegistry()
+    registry.register(Tool(ToolContract("shell", {}, {}, []), lambda payload: {"exit_code": proxy.run(payload["cmd"], 10).exit_code}))
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    started = time.monotonic()
+
+    result = registry.run("shell", {"cmd": "sleep 3"}, cancel)
+
+    assert time.monotonic() - started < 2.0
+    assert result["exit_code"] != 0
+
+
+def test_fail_fast_kills_a_running_check(proxy, sandbox):
+    checks = [Check("slow", "sleep 2 && touch slow.txt"), Check("broken", "sleep 0.2; exit 1")]
+    started = time.monotonic()
+
+    report = run_verification(proxy, checks, VerificationPolicy(max_parallel=2, fail_fast=True))
+
+    assert time.monotonic() - started < 1.5
+    assert report.canceled
+    assert [(result.name, result.status) for result in report.results] == [("slow", CANCELED), ("broken", FAILED)]
+    time.sleep(0.3)
+    assert not os.path.exists(os.path.join(sandbox.config.workdir, "slow.txt"))
+
+
+def test_passing_checks_run_to_completion(proxy):
+    report = run_verification(proxy, ["echo a", "echo b"], VerificationPolicy(max_parallel=2, fail_fast=True))
+
+    assert [result.status for result in report.results] == [PASSED, PASSED]
+    assert [result.output for result in report.results] == ["a\n", "b\n"]
@@ -0,0 +1,11 @@
+import sys
+from pathlib import Path
+
+_REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(_REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(_REPO_ROOT))
+# Appended, so the tool SDK's main module can't shadow the runner's in a
+# full run; these tests import schema_compiler only.
+_TOOL_SDK = str(_REPO_ROOT / "packages" / "tool_sdk")
+if _TOOL_SDK not in sys.path:
+    sys.path.append(_TOOL_SDK)
@@ -0,0 +1,86 @@
+import pytest
+
+from schema_compiler import compile_schema, contract_validator
+
+_CALL = {
+    "type": "object",
+    "required": ["name", "input"],
+    "properties": {
+        "name": {"type": "string", "minLength": 1},
+        "mode": {"enum": ["fast", "full", 1]},
+        "input": {
+            "type": "object",
+            "required": ["cmd"],
+            "properties": {"cmd": {"type": "string"}, "timeout_s": {"type": ["number", "null"], "minimum": 0}},
+            "additionalProperties": {"type": "string"},
+        },
+        "scopes": {"type": "array", "maxItems": 3, "items": {"type": "string"}},
+    },
+    "additionalProperties": False,
+}
+
+
+@pytest.fixture(scope="module")
+def validate():
+    return compile_schema(_CALL)
+
+
+def test_valid_payloads_pass(validate):
+    validate({"name": "shell", "input": {"cmd": "ls"}})
+    validate({"name": "shell", "mode": 1, "input": {"cmd": "ls", "timeout_s": None, "cwd": "src"}, "scopes": ("fs",)})
+
+
+@pytest.mark.parametrize(
+    ("payload", "message"),
+    [
+        ([], "payload: expected object, got list"),
+        ({"input": {"cmd": "ls"}}, "missing required key: name"),
+        ({"name": "shell", "input": {}}, "missing required key: input.cmd"),
+        ({"name": 3, "input": {"cmd": "ls"}}, "name: expected string, got int"),
+        ({"name": "", "input": {"cmd": "ls"}}, "name: shorter than 1"),
+        ({"name": "shell", "input": {"cmd": "ls", "timeout_s": "5"}}, "input.timeout_s: expected number or null, got str"),
+        ({"name": "shell", "input": {"cmd": "ls", "timeout_s": -1}}, "input.timeout_s: less than 0"),
+        ({"name": "shell", "input": {"cmd": "ls", "cwd": 1}}, "input.cwd: expected string, got int"),
+        ({"name": "shell", "input": {"cmd": "ls"}, "extra": 1}, "payload: unexpected keys: extra"),
+        ({"name": "shell", "input": {"cmd": "ls"}, "scopes": ["fs", 2]}, r"scopes\[1\]: expected string, got int"),
+        ({"name": "shell", "input": {"cmd": "ls"}, "scopes": ["a", "b", "c", "d"]}, "scopes: more items than 3"),
+        ({"name": "shell", "input": {"cmd": "ls"}, "mode": "slow"}, "mode: must be one of"),
+    ],
+)
+def test_failures_name_the_offending_path(validate, payload, message):
+    with pytest.raises(ValueError, match=message):
+        validate(payload)
+
+
+def test_enum_and_const_keep_booleans_and_numbers_apart():
+    numbers = compile_schema({"enum": [1, 0.5]})
+    booleans = compile_schema({"enum": [True]})
+    unhashable = compile_schema({"enum": [[1], {"a": 1}, 1]})
+    const = compile_schema({"const": 1})
+
+    numbers(1)
+    numbers(1.0)
+    booleans(True)
+    unhashable({"a": 1})
+    unhashable(1)
+    for validator, value in ((numbers, True), (booleans, 1), (unhashable, True), (const, True)):
+        with pytest.raises(ValueError, match="must be"):
+            validator(value)
+
+
+def test_unsupported_schemas_are_rejected_at_compile_time():
+    with pytest.raises(ValueError, match="unsupported schema type"):
+        compile_schema({"type": "decimal"})
+    with pytest.raises(TypeError):
+        compile_schema({"enum": "abc"})
+    with pytest.raises(TypeError):
+        compile_schema({"items": [{"type": "string"}]})
+
+
+def test_contract_validator_compiles_the_shared_schema():
+    validate = contract_validator("tool_call")
+
+    validate({"id": "c1", "name": "shell", "input": {"cmd": "ls"}, "scopes": ["fs"]})
+    with pytest.raises(ValueError, match=r"scopes\[0\]"):
+        validate({"id": "c1", "name": "shell", "input": {}, "scopes": [1]})
+    assert contract_validator("tool_call") is validate
@@ -0,0 +1,38 @@
+"""Sync/async tool handler dispatch, shared by agent core and the tool SDK."""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+from concurrent.futures import Executor
+from typing import Any, Awaitable, Callable, Mapping
+
+ToolHandler = Callable[[Mapping[str, Any]], Mapping[str, Any]]
+AsyncToolHandler = Callable[[Mapping[str, Any]], Awaitable[Mapping[str, Any]]]
+
+
+def is_async_handler(handler: object) -> bool:
+    """True for ``async def`` handlers, including callable objects with an ``async def __call__``."""
+    return inspect.iscoroutinefunction(handler) or inspect.iscoroutinefunction(getattr(handler, "__call__", None))
+
+
+def call_handler(handler: ToolHandler | AsyncToolHandler, payload: Mapping[str, Any], name: str) -> Mapping[str, Any]:
+    """Call ``handler`` from sync code, driving an async one on a private event loop."""
+    if not is_async_handler(handler):
+        return handler(payload)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(handler(payload))
+    raise RuntimeError(f"async tool {name} called from a running event loop; use arun")
+
+
+async def acall_handler(
+    handler: ToolHandler | AsyncToolHandler, payload: Mapping[str, Any], executor: Executor | None = None
+) -> Mapping[str, Any]:
+    """Await an async ``handler``, or run a sync one on ``executor`` (the loop's default when None)."""
+    if is_async_handler(handler):
+        return await handler(payload)
+    # Carry context variables (request ids, deadlines) into the worker thread.
+    call = functools.partial(contextvars.copy_context().run, handler, payload)
+    return await asyncio.get_running_loop().run_in_executor(executor, call)